@@ -0,0 +1,283 @@
+# agent_archive.py
+#
+# Arsip kolumnar memori percakapan. Hari yang sudah lewat dipindah dari ribuan file kecil
+# storage/memory/<user>/daily/<tanggal>.json ke Parquet berpartisi:
+#   storage/memory_archive/month=2026-09/bucket=07/part-<hash>.parquet
+# Satu baris per giliran (user_id, date, turn, q, a, collection, summary), urut (user_id, date) agar
+# statistik row group memangkas bacaan satu user/hari. Hari tanpa giliran tapi punya ringkasan
+# disimpan sebagai satu baris turn = -1.
+#   python agent_archive.py compact                  # padatkan semua hari sebelum hari ini
+#   python agent_archive.py top --days 30 --limit 10 # pertanyaan teratas per koleksi
+
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from agent_perf import PERF
+
+SCHEMA = pa.schema([
+    ("user_id", pa.int64()),
+    ("date", pa.string()),
+    ("turn", pa.int32()),
+    ("q", pa.string()),
+    ("a", pa.string()),
+    ("collection", pa.string()),
+    ("summary", pa.string()),
+])
+META_FILE = "_archive.json"
+DEFAULT_BUCKETS = 16
+MAX_PARTS = 8  # part per partisi sebelum digabung jadi satu
+
+def _read_meta(archive_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(archive_dir, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def bucket_count(archive_dir: str, default: int = DEFAULT_BUCKETS) -> int:
+    """Jumlah bucket ditetapkan saat arsip pertama kali ditulis; pembaca & penulis berikutnya memakainya."""
+    return int(_read_meta(archive_dir).get("buckets", default))
+
+def partition_dir(archive_dir: str, user_id: int, date: str, buckets: int) -> str:
+    return os.path.join(archive_dir, f"month={date[:7]}", f"bucket={int(user_id) % buckets:02d}")
+
+def _parts(pdir: str) -> List[str]:
+    # urut waktu tulis: bila satu hari ada di beberapa part, part terbaru yang berlaku
+    return sorted(glob.glob(os.path.join(pdir, "part-*.parquet")), key=lambda p: (os.path.getmtime(p), p))
+
+def _day_rows(user_id: int, date: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    summary = (data.get("daily_summary") or "").strip() or None
+    turns = data.get("turns") or []
+    if not turns:
+        return [{"user_id": user_id, "date": date, "turn": -1, "q": None, "a": None,
+                 "collection": None, "summary": summary}] if summary else []
+    return [{"user_id": user_id, "date": date, "turn": i, "q": t.get("q"), "a": t.get("a"),
+             "collection": t.get("c"), "summary": summary} for i, t in enumerate(turns)]
+
+def _rows_to_day(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    rows = sorted(rows, key=lambda r: r["turn"])
+    turns = [{"q": r["q"] or "", "a": r["a"] or "", **({"c": r["collection"]} if r["collection"] else {})}
+             for r in rows if r["turn"] >= 0]
+    return {"turns": turns, "daily_summary": rows[0]["summary"] or ""}
+
+def merge_day(archived: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Hari yang sudah ada di arsip + file JSON yang muncul lagi untuk hari itu (ringkasan malam, !end):
+    giliran arsip tidak hilang, ringkasan terbaru yang berlaku. File yang dibuat ulang dari arsip
+    (agent_memory) sudah diawali giliran arsip, jadi tidak digandakan.
+    """
+    old, new = archived.get("turns") or [], data.get("turns") or []
+    pairs = lambda ts: [(t.get("q") or "", t.get("a") or "") for t in ts]
+    turns = new if pairs(new[:len(old)]) == pairs(old) else old + new
+    summary = (data.get("daily_summary") or "").strip() or archived.get("daily_summary") or ""
+    return {**data, "turns": turns, "daily_summary": summary}
+
+def _archived_days(pdir: str, dates: List[str], keys: Optional[set] = None) -> Dict[Tuple[int, str], Dict[str, Any]]:
+    """Hari-hari pada `dates` (opsional hanya `keys` = {(user_id, date)}) yang ada di partisi, format read_daily."""
+    found: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for p in _parts(pdir):  # part terbaru menimpa yang lama
+        t = pq.read_table(p, schema=SCHEMA, filters=pc.field("date").isin(sorted(dates)))
+        rows: Dict[Tuple[int, str], List[Dict[str, Any]]] = defaultdict(list)
+        for r in t.to_pylist():
+            if keys is None or (r["user_id"], r["date"]) in keys:
+                rows[(r["user_id"], r["date"])].append(r)
+        for key, rs in rows.items():
+            found[key] = _rows_to_day(rs)
+    return found
+
+def _write_part(pdir: str, rows: List[Dict[str, Any]], name_seed: str) -> str:
+    rows.sort(key=lambda r: (r["user_id"], r["date"], r["turn"]))
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    os.makedirs(pdir, exist_ok=True)
+    # nama deterministik dari daftar sumber: compact yang diulang setelah crash menimpa part yang sama
+    path = os.path.join(pdir, f"part-{hashlib.sha1(name_seed.encode('utf-8')).hexdigest()[:16]}.parquet")
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd", row_group_size=8192)
+    os.replace(tmp, path)
+    return path
+
+def _merge_parts(pdir: str) -> int:
+    """Gabungkan semua part satu partisi jadi satu; hari ganda diambil dari part terbaru."""
+    parts = _parts(pdir)
+    if len(parts) < 2:
+        return 0
+    latest: Dict[Tuple[int, str], int] = {}
+    tables = []
+    for i, p in enumerate(parts):
+        t = pq.read_table(p, schema=SCHEMA)
+        for uid, date in set(zip(t.column("user_id").to_pylist(), t.column("date").to_pylist())):
+            latest[(uid, date)] = i
+        tables.append(t)
+    rows = [r for i, t in enumerate(tables) for r in t.to_pylist() if latest[(r["user_id"], r["date"])] == i]
+    _write_part(pdir, rows, "merge:" + "|".join(os.path.basename(p) for p in parts))
+    merged = set(_parts(pdir)) - set(parts)
+    for p in parts:
+        if p not in merged:
+            os.remove(p)
+    return len(parts)
+
+def compact(base_dir: str, archive_dir: str, before: str, buckets: Optional[int] = None,
+            max_parts: int = MAX_PARTS, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Pindahkan semua file harian dengan tanggal < before (YYYY-MM-DD) ke arsip. File JSON baru dihapus
+    setelah part Parquet-nya tertulis utuh (tmp + rename). Hari yang sudah ada di arsip digabung
+    (merge_day), bukan diganti. Partisi yang part-nya > max_parts digabung.
+    """
+    t0 = time.perf_counter()
+    os.makedirs(archive_dir, exist_ok=True)
+    meta = _read_meta(archive_dir)
+    buckets = int(meta.get("buckets") or buckets or DEFAULT_BUCKETS)
+    if not meta and not dry_run:
+        with open(os.path.join(archive_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"buckets": buckets, "schema": 1}, f)
+
+    groups: Dict[str, Dict[Tuple[int, str], Dict[str, Any]]] = defaultdict(dict)
+    sources: Dict[str, List[str]] = defaultdict(list)
+    stats = {"days": 0, "turns": 0, "files_removed": 0, "parts_written": 0, "parts_merged": 0, "skipped": 0}
+    for uid in (os.listdir(base_dir) if os.path.isdir(base_dir) else []):
+        if not uid.isdigit():
+            continue
+        for p in glob.glob(os.path.join(base_dir, uid, "daily", "*.json")):
+            date = os.path.basename(p)[:-5]
+            if date >= before:
+                continue
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                stats["skipped"] += 1  # file rusak dibiarkan untuk diperiksa manual
+                continue
+            pdir = partition_dir(archive_dir, int(uid), date, buckets)
+            groups[pdir][(int(uid), date)] = data
+            st = os.stat(p)
+            sources[pdir].append(f"{p}:{st.st_size}:{st.st_mtime_ns}")
+            stats["days"] += 1
+            stats["turns"] += len(data.get("turns") or [])
+    if dry_run:
+        return stats
+
+    for pdir, days in groups.items():
+        archived = _archived_days(pdir, sorted({d for _, d in days}), set(days))
+        rows = [r for (uid, date), data in sorted(days.items())
+                for r in _day_rows(uid, date, merge_day(archived[(uid, date)], data) if (uid, date) in archived else data)]
+        if rows:
+            _write_part(pdir, rows, "\n".join(sorted(sources[pdir])))
+            stats["parts_written"] += 1
+        for src in sources[pdir]:
+            os.remove(src.split(":", 1)[0])
+            stats["files_removed"] += 1
+        if len(_parts(pdir)) > max_parts:
+            stats["parts_merged"] += _merge_parts(pdir)
+    PERF.observe("memory_compact", time.perf_counter() - t0)
+    PERF.incr("memory_compact_days", stats["days"])
+    return stats
+
+def read_day(archive_dir: str, user_id: int, date: str) -> Optional[Dict[str, Any]]:
+    """Satu hari seorang user dari arsip dalam format read_daily, atau None bila tidak ada."""
+    if not os.path.isdir(archive_dir):
+        return None
+    t0 = time.perf_counter()
+    pdir = partition_dir(archive_dir, user_id, date, bucket_count(archive_dir))
+    flt = (pc.field("user_id") == int(user_id)) & (pc.field("date") == date)
+    try:
+        for p in reversed(_parts(pdir)):
+            t = pq.read_table(p, schema=SCHEMA, filters=flt, columns=["turn", "q", "a", "collection", "summary"])
+            if t.num_rows == 0:
+                continue
+            return _rows_to_day(t.to_pylist())
+        return None
+    finally:
+        PERF.observe("memory_archive_read", time.perf_counter() - t0)
+
+def read_date(archive_dir: str, date: str) -> Dict[int, Dict[str, Any]]:
+    """Semua user yang punya hari `date` di arsip: {user_id: hari dalam format read_daily}."""
+    out: Dict[int, Dict[str, Any]] = {}
+    for pdir in glob.glob(os.path.join(archive_dir, f"month={date[:7]}", "bucket=*")):
+        out.update({uid: day for (uid, _), day in _archived_days(pdir, [date]).items()})
+    return out
+
+def _month_of(part_path: str) -> str:
+    return os.path.basename(os.path.dirname(os.path.dirname(part_path)))[len("month="):]
+
+def dataset(archive_dir: str, since: Optional[str] = None, until: Optional[str] = None) -> Optional[ds.Dataset]:
+    """Dataset semua part; partisi bulan di luar [since, until) dibuang dari nama direktorinya saja."""
+    files = [p for p in glob.glob(os.path.join(archive_dir, "month=*", "bucket=*", "part-*.parquet"))
+             if (not since or _month_of(p) >= since[:7]) and (not until or _month_of(p) <= until[:7])]
+    if not files:
+        return None
+    return ds.dataset(files, schema=SCHEMA, format="parquet")
+
+def _turn_filter(since: Optional[str], until: Optional[str]):
+    flt = pc.field("turn") >= 0
+    if since:
+        flt = flt & (pc.field("date") >= since)
+    if until:
+        flt = flt & (pc.field("date") < until)
+    return flt
+
+def question_counts(archive_dir: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Tuple[str, str, str, int]]:
+    """
+    (collection, pertanyaan_ternormalisasi, contoh_asli, jumlah) dari arsip. Hanya kolom q & collection
+    yang dibaca; file yang statistiknya di luar rentang tanggal dilewati tanpa dibuka isinya.
+    """
+    d = dataset(archive_dir, since, until) if os.path.isdir(archive_dir) else None
+    if d is None:
+        return []
+    t0 = time.perf_counter()
+    t = d.to_table(columns=["q", "collection"], filter=_turn_filter(since, until))
+    key = pc.utf8_trim_whitespace(pc.replace_substring_regex(pc.utf8_lower(t.column("q")), r"\s+", " "))
+    t = pa.table({"collection": pc.fill_null(t.column("collection"), ""), "key": key, "q": t.column("q")})
+    t = t.filter(pc.not_equal(t.column("key"), ""))
+    agg = t.group_by(["collection", "key"]).aggregate([("key", "count"), ("q", "min")])
+    PERF.observe("memory_archive_scan", time.perf_counter() - t0)
+    return list(zip(agg.column("collection").to_pylist(), agg.column("key").to_pylist(),
+                    agg.column("q_min").to_pylist(), agg.column("key_count").to_pylist()))
+
+def main(argv=None) -> int:
+    import agent_memory as mem
+
+    ap = argparse.ArgumentParser(description="Arsip Parquet memori percakapan Psionic")
+    ap.add_argument("cmd", choices=["compact", "top", "stats"])
+    ap.add_argument("--memory-dir", default=mem.BASE_DIR)
+    ap.add_argument("--archive-dir", default=mem.ARCHIVE_DIR)
+    ap.add_argument("--before", default=None, help="padatkan hari sebelum tanggal ini (default: hari ini)")
+    ap.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="hanya dipakai saat arsip pertama dibuat")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--limit", type=int, default=10)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "compact":
+        before = args.before or mem.today_date_str()
+        st = compact(args.memory_dir, args.archive_dir, before, args.buckets, dry_run=args.dry_run)
+        print(("[dry-run] " if args.dry_run else "") + f"{st['days']} hari / {st['turns']} giliran sebelum {before}: "
+              f"{st['parts_written']} part ditulis, {st['files_removed']} file JSON dihapus, "
+              f"{st['parts_merged']} part digabung, {st['skipped']} file rusak dilewati")
+        return 0
+    if args.cmd == "top":
+        for coll, qs in mem.top_questions_by_collection(limit=args.limit, days=args.days).items():
+            print(f"[{coll or '(tanpa koleksi)'}]")
+            for q in qs:
+                print(f"  - {q}")
+        return 0
+    files = glob.glob(os.path.join(args.archive_dir, "month=*", "bucket=*", "part-*.parquet"))
+    rows = sum(pq.ParquetFile(p).metadata.num_rows for p in files)
+    size = sum(os.path.getsize(p) for p in files)
+    months = sorted({_month_of(p) for p in files})
+    print(f"{len(files)} part, {rows} baris, {size / 1e6:.1f} MB; bulan: {', '.join(months) or '-'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,20 @@
 # agent_brain.py
 
-from typing import List, Tuple, Optional
+import hashlib
+from typing import Dict, List, Tuple, Optional
 from langchain.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-from psionic_agent import PsionicAgent
+from psionic_agent import PsionicAgent, stage_estimate_s, shed_stage, shed_failed_stage
 from tools.book_finder import guess_book_focus
+from agent_perf import PERF
+import agent_trace
+from agent_trace import TRACER
+from tools.single_flight import SingleFlight
+from tools.ttl_cache import TTLCache
+from agent_scheduler import LLMScheduler, SchedulerBusy, wrap_llm
+from tools.circuit_breaker import CircuitBreaker
+from tools.deadline import Deadline, run_with_timeout
 import re
 
 PLANNER_PROMPT = ChatPromptTemplate.from_template(
@@ -51,6 +60,9 @@ Tulis versi akhir yang siap diberikan ke pengguna.
 """
 )
 
+# dokumen jangkar sesi (tetangga kutipan sebelumnya, topik, buku fokus) yang ditambahkan per giliran
+SESSION_EXTRA_DOCS = 4
+
 RETRY_KEYWORDS = " parasosial identifikasi pembaca empati narrative transportation attachment media psikologi"
 
 # Pola meta language yang harus dihapus
@@ -85,16 +97,111 @@ def _strip_meta(answer: str) -> str:
     out = "\n".join(clean).strip()
     return out or answer
 
+def _merge_docs(docs: List[object], extra: List[object], limit: int) -> List[object]:
+    """Gabung tanpa duplikat (source, page, chunk_index); urutan `docs` dipertahankan."""
+    seen = set(); merged = []
+    for d in (docs + extra):
+        md = getattr(d, "metadata", {}) or {}
+        key = (md.get("source"), md.get("page"), md.get("chunk_index"))
+        if key not in seen:
+            seen.add(key); merged.append(d)
+    return merged[:limit]
+
 class AgentBrain:
-    def __init__(self, agent: PsionicAgent, model_name: str = "gemini-2.5-flash"):
+    def __init__(
+        self,
+        agent: PsionicAgent,
+        model_name: str = "gemini-2.5-flash",
+        llm=None,
+        answer_cache_size: int = 512,      # 0 = cache jawaban mati
+        answer_cache_ttl: float = 1800.0,
+        scheduler: Optional[LLMScheduler] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        budgets: Optional[Dict[str, float]] = None,   # anggaran latensi per mode (detik)
+        default_budget_s: float = 0.0,                # 0 = tanpa anggaran
+        llm_timeout_s: float = 0.0,                   # batas per panggilan LLM; 0 = tanpa batas
+    ):
         self.agent = agent
-        self.llm = ChatGoogleGenerativeAI(model=model_name, temperature=0.0)
+        self.model_name = model_name
+        self.llm = llm or ChatGoogleGenerativeAI(model=model_name, temperature=0.0)
+        self.llm = wrap_llm(self.llm, model_name, scheduler, breaker)
+        self.breaker = breaker
+        self.budgets = {k.lower(): v for k, v in (budgets or {}).items()}
+        self.default_budget_s = default_budget_s
+        self.llm_timeout_s = llm_timeout_s
+        self._flight = SingleFlight()
+        # jawaban akhir untuk permintaan tanpa riwayat; kunci memuat generasi & versi indeks
+        self.answer_cache = TTLCache(answer_cache_size, answer_cache_ttl)
+        PERF.gauge_fn("singleflight_inflight", self._flight.inflight)
+
+    @staticmethod
+    def flight_key(
+        question: str,
+        style: str,
+        mode: str,
+        history_window: List[Tuple[str, str]],
+        memory_summary: Optional[str],
+        default_collection: Optional[str],
+        session_context: Optional[Dict] = None,
+    ) -> Tuple:
+        """Pertanyaan identik hanya digabung bila konteks personalnya (riwayat + ringkasan + sesi) juga sama."""
+        qn = " ".join((question or "").lower().split())
+        ctx = repr((history_window or [], memory_summary or "", sorted((session_context or {}).items()))).encode("utf-8")
+        return (qn, default_collection or "*", (style or "").lower(), (mode or "").lower(),
+                hashlib.sha1(ctx).hexdigest())
+
+    def answer_cache_key(self, question: str, docs: List[object], style: str, mode: str) -> Tuple:
+        qn = " ".join((question or "").lower().split())
+        doc_keys = sorted(
+            (str(md.get("source")), str(md.get("page")), str(md.get("chunk_index")))
+            for md in ((getattr(d, "metadata", {}) or {}) for d in docs)
+        )
+        models = (self.model_name, getattr(self.agent, "model_name", None))
+        index = (getattr(self.agent, "generation", 0), getattr(self.agent, "index_version", 0))
+        return (qn, tuple(doc_keys), (style or "").lower(), (mode or "").lower(), models, index)
+
+    def new_deadline(self, mode: str) -> Deadline:
+        return Deadline(self.budgets.get((mode or "").lower(), self.default_budget_s), self.llm_timeout_s)
 
-    def plan(self, question: str, mode: str) -> List[str]:
-        res = self.llm.invoke(PLANNER_PROMPT.format_messages(question=question, mode=mode)).content
+    def plan(self, question: str, mode: str, deadline: Optional[Deadline] = None) -> List[str]:
+        msgs = PLANNER_PROMPT.format_messages(question=question, mode=mode)
+        with PERF.span("llm_plan"):
+            res = run_with_timeout(lambda: self.llm.invoke(msgs).content,
+                                   deadline.call_timeout() if deadline else None)
+        agent_trace.note_llm("llm_plan", msgs, res)
         steps = [ln.strip("-• ").strip() for ln in res.splitlines() if ln.strip()]
         return steps[:5]
 
+    def _degraded(self, question: str, docs: List[object], reason: str) -> Tuple[str, List[object], dict]:
+        """Jawaban ekstraktif tanpa LLM; tidak masuk cache jawaban."""
+        PERF.incr("extractive_answers")
+        agent_trace.note(degraded=reason)
+        answer = self.agent.extractive_answer(docs, question)
+        return answer, docs, {"plan_steps": [], "critique": "", "shed": [], "degraded": reason}
+
+    def _critique_and_refine(self, answer: str, deadline: Deadline) -> Tuple[str, str]:
+        msgs = CRITIC_PROMPT.format_messages(answer=answer)
+        with PERF.span("llm_critique"):
+            critique = run_with_timeout(lambda: self.llm.invoke(msgs).content, deadline.call_timeout())
+        agent_trace.note_llm("llm_critique", msgs, critique)
+        need_refine = "TIDAK" in critique or ("Rujukan:" not in answer)
+        agent_trace.note(refine=need_refine)
+        if not need_refine:
+            return answer, critique
+        if not deadline.allows(stage_estimate_s("llm_refine")):
+            shed_stage(deadline, "refine")
+            return answer, critique
+        PERF.incr("refine_runs")
+        msgs = REFINE_PROMPT.format_messages(answer=answer, critique=critique)
+        try:
+            with PERF.span("llm_refine"):
+                refined = run_with_timeout(lambda: self.llm.invoke(msgs).content, deadline.call_timeout())
+        except Exception as e:  # kritik sudah ada: dikembalikan bersama jawaban sebelum refine
+            shed_failed_stage(deadline, "refine", e)
+            return answer, critique
+        agent_trace.note_llm("llm_refine", msgs, refined)
+        return refined, critique
+
     def answer_with_pipeline(
         self,
         user_id: int,
@@ -104,49 +211,166 @@ class AgentBrain:
         history_window: List[Tuple[str, str]],
         memory_summary: Optional[str],
         default_collection: Optional[str] = None,
+        session_context: Optional[Dict] = None,
     ) -> Tuple[str, List[object], dict]:
-        # 0) planning untuk mode non-ringan
-        do_plan = mode in ("panjang", "banding", "langkah", "definisi")
-        plan_steps = self.plan(question, mode) if do_plan else []
+        """session_context: jangkar sesi !new (lihat session_docs); None di luar sesi."""
+        key = self.flight_key(question, style, mode, history_window, memory_summary, default_collection, session_context)
+        (answer, docs, meta), shared = self._flight.do(
+            key,
+            lambda: self._execute(user_id, question, style, mode, history_window, memory_summary, default_collection,
+                                  session_context),
+        )
+        if shared:
+            # hasil eksekusi milik permintaan identik yang sedang berjalan
+            PERF.incr("singleflight_saved")
+            return answer, list(docs), {**meta, "coalesced": True}
+        PERF.incr("singleflight_executed")
+        return answer, docs, meta
+
+    def _execute(
+        self,
+        user_id: int,
+        question: str,
+        style: str,
+        mode: str,
+        history_window: List[Tuple[str, str]],
+        memory_summary: Optional[str],
+        default_collection: Optional[str],
+        session_context: Optional[Dict] = None,
+    ) -> Tuple[str, List[object], dict]:
+        PERF.add_gauge("pipelines_inflight", 1)
+        try:
+            with TRACER.start(user_id, mode=mode, style=style, question_chars=len(question or "")) as tr, \
+                    PERF.collect() as timings, PERF.span("pipeline"):
+                answer, docs, meta = self._run_pipeline(
+                    question, style, mode, history_window, memory_summary, default_collection, session_context
+                )
+                if tr is not None:
+                    TRACER.finish_docs(tr, docs)
+                    tr.answer_chars = len(answer or "")
+        finally:
+            PERF.add_gauge("pipelines_inflight", -1)
+        meta["timings"] = {stage: round(ms, 1) for stage, ms in timings.items()}
+        meta["trace_id"] = tr.trace_id if tr is not None else None
+        return answer, docs, meta
+
+    def session_docs(self, session_context: Dict, prefetch: bool = False, cached_only: bool = False) -> List[object]:
+        """
+        Dokumen jangkar sesi: tetangga chunk yang dikutip giliran sebelumnya ("neighbors_of"), topik
+        sesi ("topic", dalam "collection" bila ada), dan buku fokus ("book"). Lookup-nya tidak bergantung
+        pada pertanyaan baru, jadi prefetch=True setelah menjawab mengisi tepat cache yang dibaca di sini.
+        cached_only=True (pipeline): hanya jangkar yang sudah di-cache; tidak pernah mencari inline.
+        """
+        ctx = session_context or {}
+        docs = list(self.agent.neighbor_chunks(ctx.get("neighbors_of") or [], prefetch=prefetch, cached_only=cached_only))
+        topic = (ctx.get("topic") or "").strip()
+        if topic:
+            docs += self.agent.retrieve(topic, collection=ctx.get("collection"), k_override=3, use_mmr=False,
+                                        prefetch=prefetch, cached_only=cached_only)
+        book = ctx.get("book") or {}
+        if book.get("collection") and book.get("title"):
+            docs += self.agent.retrieve_by_book(topic or book["title"], book["collection"], book["title"],
+                                                k_override=12, prefetch=prefetch, cached_only=cached_only)
+        return docs
 
+    def _run_pipeline(
+        self,
+        question: str,
+        style: str,
+        mode: str,
+        history_window: List[Tuple[str, str]],
+        memory_summary: Optional[str],
+        default_collection: Optional[str],
+        session_context: Optional[Dict] = None,
+    ) -> Tuple[str, List[object], dict]:
+        deadline = self.new_deadline(mode)
+        book_focus = None
         # 1) fokus judul / koleksi
-        if default_collection:
-            docs = self.agent.retrieve(question, collection=default_collection, k_override=5, use_mmr=False)
-        else:
-            book_focus = guess_book_focus(self.agent, question)
-            if book_focus:
-                docs = self.agent.retrieve_by_book(question, book_focus["collection"], book_focus["title"], k_override=12)
+        with PERF.span("retrieval"):
+            if default_collection:
+                docs = self.agent.retrieve(question, collection=default_collection, k_override=5, use_mmr=False)
             else:
-                docs, _, _ = self.agent.smart_retrieve(question)
+                book_focus = guess_book_focus(self.agent, question)
+                if book_focus:
+                    agent_trace.note(book_focus={"collection": book_focus["collection"], "title": book_focus["title"]})
+                    docs = self.agent.retrieve_by_book(question, book_focus["collection"], book_focus["title"], k_override=12)
+                else:
+                    docs, _, _ = self.agent.smart_retrieve(question)
+
+        # 1a) jangkar sesi !new: hanya yang sudah di-prefetch setelah giliran sebelumnya. Prefetch yang
+        #     dilewati saat ramai tidak diganti pencarian inline (hit/miss: session_anchor_hit/miss).
+        if session_context:
+            with PERF.span("retrieval_session"):
+                extra = self.session_docs(session_context, cached_only=True)
+            docs = _merge_docs(docs, extra, len(docs) + SESSION_EXTRA_DOCS)
 
         # 1b) retry recall-first jika bukti < 3
         if len(docs) < 3:
             aug_q = (question or "") + RETRY_KEYWORDS
-            rd = self.agent.retrieve(aug_q, collection=default_collection, k_override=12, use_mmr=False) if default_collection \
-                 else self.agent.retrieve(aug_q, k_override=12, use_mmr=False)
-            seen = set(); merged = []
-            for d in (docs + rd):
-                md = getattr(d, "metadata", {}) or {}
-                key = (md.get("source"), md.get("page"), md.get("chunk_index"))
-                if key not in seen:
-                    seen.add(key); merged.append(d)
-            docs = merged[: max(self.agent.retrieval_k, 12)]
-
-        # 2) generate jawaban (psionic_agent sudah kompres konteks aman)
-        answer = self.agent.answer_from_docs(
-            docs,
-            question=question,
-            style=style,
-            history_window=history_window,
-            memory_summary=memory_summary,
-            mode=mode,
-        )
+            with PERF.span("retrieval_retry"):
+                rd = self.agent.retrieve(aug_q, collection=default_collection, k_override=12, use_mmr=False) if default_collection \
+                     else self.agent.retrieve(aug_q, k_override=12, use_mmr=False)
+            docs = _merge_docs(docs, rd, max(self.agent.retrieval_k, 12))
 
-        # 3) kritik & refine bila perlu
-        critique = self.llm.invoke(CRITIC_PROMPT.format_messages(answer=answer)).content
-        need_refine = "TIDAK" in critique or ("Rujukan:" not in answer)
-        if need_refine:
-            answer = self.llm.invoke(REFINE_PROMPT.format_messages(answer=answer, critique=critique)).content
+        # 1c) cache jawaban akhir: hanya bila tanpa riwayat/ringkasan memori (jawaban tidak personal)
+        cache_key = None
+        if history_window or memory_summary:
+            PERF.incr("answer_cache_bypass")
+        elif self.answer_cache.enabled:
+            cache_key = self.answer_cache_key(question, docs, style, mode)
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                PERF.incr("answer_cache_hit")
+                agent_trace.note_cache_hit("answer")
+                answer, meta = cached
+                return answer, docs, {**meta, "answer_cache": "hit"}
+            PERF.incr("answer_cache_miss")
+
+        # 0) planning untuk mode non-ringan (setelah cek cache; rencana hanya dilaporkan di meta)
+        #    tahap opsional: dilewati bila sisa anggaran tak cukup untuk plan + draft + rewrite
+        do_plan = mode in ("panjang", "banding", "langkah", "definisi")
+        plan_steps: List[str] = []
+        if self.breaker is not None and self.breaker.is_open():
+            # 1d) LLM sedang tidak tersedia: jawaban ekstraktif lokal, tanpa plan/draft/kritik
+            return self._degraded(question, docs, "circuit_open")
+        if do_plan:
+            if deadline.allows(stage_estimate_s("llm_plan") + stage_estimate_s("llm_draft") + stage_estimate_s("llm_rewrite")):
+                try:
+                    plan_steps = self.plan(question, mode, deadline)
+                except Exception as e:  # rencana hanya pelengkap
+                    shed_failed_stage(deadline, "plan", e)
+            else:
+                shed_stage(deadline, "plan")
+
+        # 2) generate jawaban (psionic_agent sudah kompres konteks aman; rewrite bisa dilewati)
+        try:
+            answer = self.agent.answer_from_docs(
+                docs,
+                question=question,
+                style=style,
+                history_window=history_window,
+                memory_summary=memory_summary,
+                mode=mode,
+                deadline=deadline,
+            )
+        except SchedulerBusy:
+            raise
+        except Exception as e:  # draft gagal (sirkuit terbuka, timeout, error API)
+            return self._degraded(question, docs, type(e).__name__)
+
+        # 3) kritik & refine bila perlu dan waktu masih cukup; bila tidak, jawaban terbaik sejauh ini dipakai
+        critique = ""
+        if deadline.allows(stage_estimate_s("llm_critique") + stage_estimate_s("llm_refine")):
+            try:
+                answer, critique = self._critique_and_refine(answer, deadline)
+            except Exception as e:  # draft yang sudah jadi tetap dipakai
+                shed_failed_stage(deadline, "critique", e)
+        else:
+            shed_stage(deadline, "critique")
+        if deadline.shed and "Rujukan:" not in answer:
+            # tahap yang dilewati tidak boleh menghilangkan sitasi
+            cites = self.agent.format_citations(docs[:3], max_len=80, texts=getattr(self.agent, "chunk_texts", None))
+            answer = answer.rstrip() + "\n\nRujukan:\n" + "\n".join(cites)
 
         # 4) sanitasi meta/editorial supaya langsung natural
         answer = _strip_meta(answer)
@@ -159,5 +383,9 @@ class AgentBrain:
         meta = {
             "plan_steps": plan_steps,
             "critique": critique,
+            "shed": list(deadline.shed),
+            "book_focus": book_focus,
         }
+        if cache_key is not None and not deadline.shed:  # jawaban terpangkas tidak di-cache
+            self.answer_cache.put(cache_key, (answer, dict(meta)))
         return answer, docs, meta
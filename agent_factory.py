@@ -0,0 +1,131 @@
+# agent_factory.py
+#
+# Konfigurasi agen dari .env dan pembangun pasangan (PsionicAgent, AgentBrain).
+# Dipakai bersama oleh bot.py (mode satu proses) dan worker.py (mode gateway + worker).
+
+import os
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from agent_perf import PERF
+from agent_trace import TRACER
+from agent_scheduler import LLMScheduler, parse_rpm
+from tools.deadline import parse_budgets
+from tools.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN
+import agent_memory as mem
+
+load_dotenv()
+PERSIST_DIR = os.getenv("PERSIST_DIR", "./bundle_psionic/vectorstore")
+USE_QUANT_INDEX = os.getenv("USE_QUANT_INDEX", "0") == "1"
+USE_CHUNK_STORE = os.getenv("USE_CHUNK_STORE", "1") == "1"     # teks chunk di-mmap untuk sitasi/konteks
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", "") or os.path.join(os.path.dirname(PERSIST_DIR), "chunk_store")
+WARMUP_QUERIES = [q.strip() for q in os.getenv("WARMUP_QUERIES", "").split("|") if q.strip()]
+WARMUP_POPULAR_N = int(os.getenv("WARMUP_POPULAR_N", "10"))
+PERF_DUMP_PATH = os.getenv("PERF_DUMP_PATH", "./storage/perf/metrics.prom")
+PERF_DUMP_SECONDS = int(os.getenv("PERF_DUMP_SECONDS", "60"))  # 0 = tidak menulis file
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))   # 0 = cache jawaban mati
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "1800"))
+TRACE_PATH = os.getenv("TRACE_PATH", "./storage/traces/requests.jsonl")  # kosong = trace mati
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "8000"))      # permintaan selambat ini selalu disimpan
+TRACE_MAX_MB = int(os.getenv("TRACE_MAX_MB", "20"))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RPM = parse_rpm(os.getenv("LLM_RPM", ""))                  # "gemini-2.5-flash=60,..."; kosong = tanpa batas
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "0"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_WAIT_S = float(os.getenv("LLM_MAX_WAIT_S", "20"))
+PIPELINE_BUDGET_S = float(os.getenv("PIPELINE_BUDGET_S", "25"))   # anggaran latensi default; 0 = tanpa anggaran
+PIPELINE_BUDGETS = parse_budgets(os.getenv("PIPELINE_BUDGETS", "ringkas=15,bullet=15"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))          # batas per panggilan LLM; 0 = tanpa batas
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # kegagalan beruntun sebelum sirkuit terbuka
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+LLM_BREAKER_SLOW_S = float(os.getenv("LLM_BREAKER_SLOW_S", str(LLM_TIMEOUT_S)))  # panggilan selambat ini dihitung gagal
+# anggaran token konteks+riwayat per mode, mis. "ringkas=1000,panjang=3000"; kosong = default agen
+CONTEXT_TOKEN_BUDGETS = {m: int(v) for m, v in parse_budgets(os.getenv("CONTEXT_TOKEN_BUDGETS", "")).items()}
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "16"))          # micro-batch embedding kueri; 0/1 = mati
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+def with_suffix(path: str, suffix: str) -> str:
+    """metrics.prom + "w1" -> metrics.w1.prom (file trace/metrik terpisah per proses worker)."""
+    if not suffix:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{suffix}{ext}"
+
+def configure_tracing(suffix: str = "") -> None:
+    if TRACE_PATH:
+        TRACER.configure(with_suffix(TRACE_PATH, suffix), sample_rate=TRACE_SAMPLE, slow_ms=TRACE_SLOW_MS,
+                         max_bytes=TRACE_MAX_MB * 1024 * 1024, backups=TRACE_BACKUPS)
+
+def make_scheduler(rpm_share: float = 1.0) -> LLMScheduler:
+    """rpm_share < 1 membagi kuota per menit antar proses worker (tiap proses punya bucket sendiri)."""
+    return LLMScheduler(
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        rpm={m: r * rpm_share for m, r in LLM_RPM.items()},
+        default_rpm=LLM_DEFAULT_RPM * rpm_share,
+        max_queue=LLM_MAX_QUEUE,
+        max_wait_s=LLM_MAX_WAIT_S,
+    )
+
+def _on_breaker_change(old: str, new: str):
+    PERF.incr(f"llm_breaker_{new}")
+    print(f"Sirkuit LLM: {old} -> {new}")
+
+def make_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(
+        failure_threshold=LLM_BREAKER_FAILURES,
+        reset_timeout_s=LLM_BREAKER_RESET_S,
+        slow_call_s=LLM_BREAKER_SLOW_S,
+        on_change=_on_breaker_change,
+    )
+    PERF.gauge_fn("llm_breaker_state", lambda: {CLOSED: 0, HALF_OPEN: 1}.get(breaker.state, 2))
+    return breaker
+
+def chunk_texts_reader():
+    """Store teks chunk untuk proses yang hanya membaca (gateway): versi indeks dicek tiap 10 detik."""
+    if not USE_CHUNK_STORE:
+        return None
+    from tools.chunk_store import ChunkStoreSet
+    from tools.index_version import read_index_version
+    return ChunkStoreSet(CHUNK_STORE_DIR, lambda: read_index_version(PERSIST_DIR), check_interval_s=10.0)
+
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+def build_agent_pair(fresh: bool, scheduler: Optional[LLMScheduler] = None, breaker: Optional[CircuitBreaker] = None):
+    t0 = time.perf_counter()
+    # chromadb, langchain, google-genai diimpor lazy: gateway tanpa agen tidak perlu memuatnya
+    from psionic_agent import PsionicAgent
+    from agent_brain import AgentBrain
+    STARTUP_TIMINGS.setdefault("import_s", time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    agent = PsionicAgent(
+        persist_dir=PERSIST_DIR,
+        use_quant_index=USE_QUANT_INDEX,
+        use_chunk_store=USE_CHUNK_STORE,
+        chunk_store_dir=CHUNK_STORE_DIR,
+        fresh_client=fresh,
+        auto_refresh=False,  # reload ditangani AgentRuntime (swap atomik per generasi)
+        scheduler=scheduler,
+        breaker=breaker,
+        context_budgets=CONTEXT_TOKEN_BUDGETS,
+        embed_batch=EMBED_BATCH_MAX,
+        embed_batch_wait_ms=EMBED_BATCH_WAIT_MS,
+    )
+    brain = AgentBrain(agent, answer_cache_size=ANSWER_CACHE_SIZE, answer_cache_ttl=ANSWER_CACHE_TTL,
+                       scheduler=scheduler, breaker=breaker, budgets=PIPELINE_BUDGETS, default_budget_s=PIPELINE_BUDGET_S,
+                       llm_timeout_s=LLM_TIMEOUT_S)
+    STARTUP_TIMINGS["agent_construct_s"] = time.perf_counter() - t0
+    return agent, brain
+
+def warmup_queries() -> List[str]:
+    # kueri eksplisit dari .env + pertanyaan populer 7 hari terakhir (log harian + arsip Parquet),
+    # bergiliran per koleksi agar koleksi kecil tidak tenggelam oleh koleksi paling ramai
+    popular: List[str] = []
+    if WARMUP_POPULAR_N > 0:
+        per_coll = list(mem.top_questions_by_collection(limit=WARMUP_POPULAR_N).values())
+        for rank in range(WARMUP_POPULAR_N):
+            popular.extend(qs[rank] for qs in per_coll if rank < len(qs))
+    return list(dict.fromkeys(WARMUP_QUERIES + popular))[: len(WARMUP_QUERIES) + WARMUP_POPULAR_N]
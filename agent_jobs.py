@@ -0,0 +1,481 @@
+# agent_jobs.py
+#
+# Antrean job lokal (SQLite, WAL) antara gateway Discord dan proses worker.
+# Gateway (bot.py) hanya mem-parsing perintah lalu memasukkan job; tiap worker (worker.py) punya
+# AgentRuntime sendiri, mengambil job, menjalankan pipeline, dan menulis hasilnya kembali.
+# Handler job (run_job) juga dipakai langsung oleh bot dalam mode satu proses.
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from agent_perf import PERF
+from agent_trace import TRACER
+from agent_scheduler import SchedulerBusy, llm_context, INTERACTIVE
+from tools.circuit_breaker import CircuitOpen
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    error_kind TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs(status, priority, id);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    pid INTEGER,
+    state TEXT,
+    started_at REAL,
+    heartbeat_at REAL,
+    stats TEXT
+);
+CREATE TABLE IF NOT EXISTS control (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+class JobFailed(RuntimeError):
+    """Job selesai dengan error di worker; pesan aslinya dibawa ke gateway."""
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    enqueued_at: float
+
+@dataclass
+class DocRef:
+    """Potongan hasil retrieval yang sudah lewat JSON (page_content + metadata, seperti Document)."""
+    page_content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+def dump_docs(docs: List[Any]) -> List[Dict[str, Any]]:
+    return [{"page_content": getattr(d, "page_content", "") or "", "metadata": dict(getattr(d, "metadata", {}) or {})}
+            for d in docs or []]
+
+def load_docs(rows: List[Dict[str, Any]]) -> List[DocRef]:
+    return [DocRef(r.get("page_content", ""), r.get("metadata") or {}) for r in rows or []]
+
+class JobQueue:
+    """
+    Antrean job di satu file SQLite; aman dipakai banyak proses dan thread (satu koneksi per thread).
+    Klaim job memakai BEGIN IMMEDIATE sehingga satu job hanya diambil satu worker. Job yang worker-nya
+    berhenti mengirim heartbeat lebih dari lease_s dikembalikan ke antrean (maks. max_attempts kali).
+    """
+
+    def __init__(self, path: str, lease_s: float = 30.0, max_attempts: int = 2, max_depth: int = 0):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.max_depth = max_depth  # 0 = tanpa batas; penuh -> SchedulerBusy ("sedang ramai")
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- gateway ----------
+    def enqueue(self, kind: str, payload: Dict[str, Any], priority: int = INTERACTIVE) -> int:
+        conn = self._conn()
+        if self.max_depth:
+            (depth,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+            if depth >= self.max_depth:
+                PERF.incr("jobs_rejected")
+                raise SchedulerBusy("antrean job penuh")
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, payload, priority, status, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, json.dumps(payload, ensure_ascii=False), priority, QUEUED, time.time()),
+        )
+        return int(cur.lastrowid)
+
+    def cancel(self, job_id: int) -> bool:
+        """Batalkan job yang belum diambil worker (mis. gateway sudah menyerah menunggu)."""
+        cur = self._conn().execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                                   (CANCELLED, time.time(), job_id, QUEUED))
+        return cur.rowcount > 0
+
+    def take_finished(self, job_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Ambil (dan hapus) job yang sudah selesai di antara job_ids."""
+        if not job_ids:
+            return {}
+        conn = self._conn()
+        marks = ",".join("?" * len(job_ids))
+        rows = conn.execute(
+            f"SELECT id, status, result, error, error_kind, enqueued_at, claimed_at, finished_at FROM jobs "
+            f"WHERE id IN ({marks}) AND status IN (?, ?)", (*job_ids, DONE, FAILED),
+        ).fetchall()
+        out = {}
+        for jid, status, result, error, error_kind, enq, claimed, finished in rows:
+            out[jid] = {
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error,
+                "error_kind": error_kind,
+                "wait_s": max(0.0, (claimed or enq) - enq),
+                "run_s": max(0.0, (finished or 0) - (claimed or enq)),
+            }
+        if out:
+            conn.execute(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(out))})", tuple(out))
+        return out
+
+    def request_reload(self) -> int:
+        """Naikkan generasi reload; tiap worker memuat ulang indeksnya saat melihat nilai baru."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            gen = self.reload_generation() + 1
+            conn.execute("INSERT OR REPLACE INTO control (key, value) VALUES ('reload', ?)", (str(gen),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return gen
+
+    def reload_generation(self) -> int:
+        row = self._conn().execute("SELECT value FROM control WHERE key = 'reload'").fetchone()
+        return int(row[0]) if row else 0
+
+    # ---------- worker ----------
+    def claim(self, worker: str) -> Optional[Job]:
+        conn = self._conn()
+        # cek murah tanpa kunci tulis: worker yang menganggur tidak saling berebut lock tiap poll
+        if conn.execute("SELECT 1 FROM jobs WHERE status = ? LIMIT 1", (QUEUED,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts, enqueued_at FROM jobs WHERE status = ? "
+                "ORDER BY priority, id LIMIT 1", (QUEUED,),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = ?, worker = ?, claimed_at = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (RUNNING, worker, time.time(), row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return Job(id=row[0], kind=row[1], payload=json.loads(row[2]), attempts=row[3] + 1, enqueued_at=row[4])
+
+    def finish(self, job_id: int, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None, error_kind: Optional[str] = None) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, error_kind = ?, finished_at = ? WHERE id = ?",
+            (FAILED if error is not None else DONE,
+             json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+             error, error_kind, time.time(), job_id),
+        )
+
+    def heartbeat(self, worker: str, state: str, stats: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO workers (name, pid, state, started_at, heartbeat_at, stats) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET started_at = CASE WHEN workers.pid = excluded.pid "
+            "THEN workers.started_at ELSE excluded.started_at END, pid = excluded.pid, state = excluded.state, "
+            "heartbeat_at = excluded.heartbeat_at, stats = excluded.stats",
+            (worker, os.getpid(), state, now, now, json.dumps(stats or {})),
+        )
+
+    # ---------- pengawasan ----------
+    def workers(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        rows = self._conn().execute("SELECT name, pid, state, started_at, heartbeat_at, stats FROM workers "
+                                    "ORDER BY name").fetchall()
+        return [{
+            "name": name, "pid": pid, "state": state, "uptime_s": now - started,
+            "heartbeat_age_s": now - hb, "alive": now - hb <= self.lease_s,
+            **json.loads(stats or "{}"),
+        } for name, pid, state, started, hb, stats in rows]
+
+    def _requeue_running(self, where: str, params: tuple) -> Dict[str, int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(f"SELECT id, attempts FROM jobs WHERE status = ? AND {where}",
+                                (RUNNING, *params)).fetchall()
+            requeued = failed = 0
+            for jid, attempts in rows:
+                if attempts < self.max_attempts:
+                    conn.execute("UPDATE jobs SET status = ?, worker = NULL, claimed_at = NULL WHERE id = ?",
+                                 (QUEUED, jid))
+                    requeued += 1
+                else:
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, error_kind = ?, finished_at = ? WHERE id = ?",
+                                 (FAILED, "worker berhenti saat memproses job", "WorkerLost", time.time(), jid))
+                    failed += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if requeued:
+            PERF.incr("jobs_requeued", requeued)
+        if failed:
+            PERF.incr("jobs_lost", failed)
+        return {"requeued": requeued, "failed": failed}
+
+    def release(self, worker: str) -> Dict[str, int]:
+        """Dipanggil worker saat start: job "running" atas namanya milik proses sebelumnya yang mati."""
+        return self._requeue_running("worker = ?", (worker,))
+
+    def recover(self) -> Dict[str, int]:
+        """Kembalikan job milik worker tanpa heartbeat ke antrean (yang terlalu sering dicoba digagalkan)
+        dan buang hasil yang tidak pernah diambil gateway (mis. gateway restart)."""
+        out = self._requeue_running("worker NOT IN (SELECT name FROM workers WHERE heartbeat_at >= ?)",
+                                    (time.time() - self.lease_s,))
+        self._conn().execute("DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?",
+                             (DONE, FAILED, CANCELLED, time.time() - 600))
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._conn()
+        now = time.time()
+        depth, oldest, interactive = conn.execute(
+            "SELECT COUNT(*), MIN(enqueued_at), COALESCE(SUM(priority = ?), 0) FROM jobs WHERE status = ?",
+            (INTERACTIVE, QUEUED)).fetchone()
+        (running,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (RUNNING,)).fetchone()
+        ws = self.workers()
+        return {
+            "depth": depth,
+            "depth_interactive": interactive,
+            "lag_ms": (now - oldest) * 1000.0 if oldest else 0.0,
+            "running": running,
+            "workers_alive": sum(1 for w in ws if w["alive"]),
+            "workers_ready": sum(1 for w in ws if w["alive"] and w["state"] == "ready"),
+        }
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+# ================== handler job ==================
+def _pairs(rows) -> List[tuple]:
+    return [tuple(p) for p in rows or []]  # JSON mengubah tuple jadi list
+
+def run_job(agent: Any, brain: Any, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Jalankan satu job di pasangan (agent, brain) yang aktif. payload = {"tenant", "guild", "args"}.
+    SchedulerBusy dan exception lain diteruskan ke pemanggil (worker menuliskannya sebagai error job).
+    """
+    args = dict(payload.get("args") or {})
+    ident = {k: payload[k] for k in ("tenant", "guild") if payload.get(k) is not None}
+    with llm_context(priority=INTERACTIVE, **ident):
+        if kind == "ask":
+            args["history_window"] = _pairs(args.get("history_window"))
+            answer, docs, meta = brain.answer_with_pipeline(**args)
+            return {"answer": answer, "docs": docs, "meta": meta}
+        if kind == "ask_in":
+            return _run_ask_in(agent, brain, **args)
+        if kind == "summarize":
+            return {"summary": agent.summarize_history(_pairs(args.get("pairs")))}
+        if kind == "summarize_batch":
+            return {"summaries": agent.summarize_batch([(k, _pairs(p)) for k, p in args.get("items") or []])}
+        if kind == "prefetch":
+            # hanya mengisi cache retrieval/embedding untuk giliran sesi berikutnya
+            return {"warmed": len(brain.session_docs(args.get("session_context") or {}, prefetch=True))}
+        if kind == "passage":
+            before, after = agent.chunk_neighbors(args.get("meta") or {}, int(args.get("span") or 1))
+            return {"docs": before + after, "before": len(before)}
+        if kind == "collections":
+            return {"collections": agent.list_collections()}
+        if kind == "books":
+            return {"books": agent.list_all_books()}
+    raise ValueError(f"jenis job tidak dikenal: {kind}")
+
+def _run_ask_in(agent, brain, user_id: int, question: str, collection: str, style: str, mode: str,
+                history_window=None, memory_summary: Optional[str] = None) -> Dict[str, Any]:
+    hw = _pairs(history_window)
+    breaker = getattr(brain, "breaker", None)
+    with TRACER.start(user_id, kind="ask_in", mode=mode, style=style, question_chars=len(question)) as tr:
+        docs = agent.retrieve(question, collection=collection)
+        try:
+            if breaker is not None and breaker.is_open():
+                raise CircuitOpen("sirkuit LLM terbuka")
+            answer = agent.answer_from_docs(docs, question, style, hw, memory_summary, mode)
+        except (CircuitOpen, TimeoutError):
+            PERF.incr("extractive_answers")
+            answer = agent.extractive_answer(docs, question)
+        TRACER.finish_docs(tr, docs)
+    return {"answer": answer, "docs": docs, "meta": {}}
+
+# ================== worker ==================
+class JobWorker:
+    """
+    Loop worker: mengambil job selama ada slot thread kosong, menjalankannya di snapshot runtime aktif,
+    mengirim heartbeat (status + statistik) dan memuat ulang indeks saat diminta gateway atau saat
+    versi indeks di disk berubah.
+    """
+
+    def __init__(self, queue: JobQueue, runtime: Any, name: str, threads: int = 4, poll_s: float = 0.02,
+                 heartbeat_s: float = 2.0, watch_s: float = 30.0):
+        self.queue = queue
+        self.runtime = runtime
+        self.name = name
+        self.threads = max(1, threads)
+        self.poll_s = poll_s
+        self.heartbeat_s = heartbeat_s
+        self.watch_s = watch_s
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=f"job-{name}")
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.done = 0
+        self.failed = 0
+        self._reload_gen = queue.reload_generation()
+        self._reloading: Optional[threading.Thread] = None
+
+    def _reload(self) -> None:
+        if self._reloading is not None and self._reloading.is_alive():
+            return
+        def run():
+            try:
+                self.runtime.reload()
+            except Exception as e:
+                print(f"[{self.name}] reload gagal:", e)
+        self._reloading = threading.Thread(target=run, name=f"reload-{self.name}", daemon=True)
+        self._reloading.start()
+
+    def _state(self) -> str:
+        return "ready" if self.runtime.ready else "warming"
+
+    def _beat(self) -> None:
+        with self._lock:
+            stats = {"inflight": self.inflight, "done": self.done, "failed": self.failed, "threads": self.threads}
+        stats["generation"] = self.runtime.generation
+        self.queue.heartbeat(self.name, self._state(), stats)
+
+    def _run_one(self, job: Job) -> None:
+        result, error, kind = None, None, None
+        try:
+            with self.runtime.use() as snap:
+                result = run_job(snap.agent, snap.brain, job.kind, job.payload)
+            if "docs" in result:
+                result["docs"] = dump_docs(result["docs"])
+        except SchedulerBusy as e:
+            error, kind = str(e), "busy"
+        except Exception as e:
+            error, kind = f"{e}", type(e).__name__
+        try:
+            self.queue.finish(job.id, result, error, kind)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+                if error is None:
+                    self.done += 1
+                else:
+                    self.failed += 1
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        self.queue.release(self.name)
+        if not self.runtime.ready:
+            self._reload()  # pembangunan awal di background; heartbeat tetap jalan ("warming")
+        last_beat = last_watch = 0.0
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                if now - last_beat >= self.heartbeat_s:
+                    self._beat()
+                    last_beat = now
+                    gen = self.queue.reload_generation()
+                    if gen != self._reload_gen and self.runtime.ready:
+                        self._reload_gen = gen
+                        self._reload()
+                if self.watch_s and now - last_watch >= self.watch_s:
+                    last_watch = now
+                    if self.runtime.ready and self.runtime.is_stale():
+                        self._reload()
+                with self._lock:
+                    free = self.inflight < self.threads
+                job = self.queue.claim(self.name) if free and self.runtime.ready else None
+                if job is None:
+                    stop.wait(self.poll_s)
+                    continue
+                with self._lock:
+                    self.inflight += 1
+                self._pool.submit(self._run_one, job)
+        finally:
+            self._pool.shutdown(wait=True)
+            self.queue.heartbeat(self.name, "stopped", {"inflight": 0, "done": self.done, "failed": self.failed})
+
+# ================== klien gateway ==================
+class JobClient:
+    """
+    Sisi gateway: submit() memasukkan job lalu menunggu hasilnya tanpa memblokir event loop.
+    Satu task polling membaca semua job yang ditunggu dalam satu kueri per putaran.
+    """
+
+    def __init__(self, queue: JobQueue, poll_s: float = 0.02):
+        self.queue = queue
+        self.poll_s = poll_s
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    async def submit(self, kind: str, payload: Dict[str, Any], timeout_s: float,
+                     priority: int = INTERACTIVE) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        job_id = await asyncio.to_thread(self.queue.enqueue, kind, payload, priority)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting[job_id] = fut
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            done = await asyncio.wait_for(fut, timeout_s)
+        except asyncio.TimeoutError:
+            self._waiting.pop(job_id, None)
+            await asyncio.to_thread(self.queue.cancel, job_id)
+            PERF.incr("jobs_timeout")
+            raise SchedulerBusy("job tidak selesai tepat waktu")
+        PERF.observe("job_wait", done["wait_s"])
+        PERF.observe("job_run", done["run_s"])
+        PERF.observe(f"job_{kind}", time.perf_counter() - t0)
+        if done["status"] == FAILED:
+            PERF.incr("jobs_failed")
+            if done["error_kind"] == "busy":
+                raise SchedulerBusy(done["error"] or "sedang ramai")
+            raise JobFailed(done["error"] or "job gagal")
+        PERF.incr("jobs_done")
+        result = done["result"] or {}
+        if "docs" in result:
+            result["docs"] = load_docs(result["docs"])
+        return result
+
+    async def _poll(self) -> None:
+        while self._waiting:
+            try:
+                finished = await asyncio.to_thread(self.queue.take_finished, list(self._waiting))
+            except Exception as e:
+                print("Gagal membaca antrean job:", e)
+                finished = {}
+            for jid, done in finished.items():
+                fut = self._waiting.pop(jid, None)
+                if fut is not None and not fut.done():
+                    fut.set_result(done)
+            await asyncio.sleep(self.poll_s)
@@ -3,10 +3,12 @@
 import os
 import json
 from datetime import datetime, timedelta, timezone
+from collections import Counter
 from typing import Dict, List, Tuple, Optional
 
 ASIA_JAKARTA = timezone(timedelta(hours=7))
 BASE_DIR = os.path.join("storage", "memory")
+ARCHIVE_DIR = os.path.join("storage", "memory_archive")  # hari yang sudah dipadatkan (agent_archive.py)
 
 def _ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
@@ -26,29 +28,39 @@ def _daily_path(user_id: int, date_str: Optional[str] = None) -> str:
 def _rolling_path(user_id: int) -> str:
     return os.path.join(_user_dir(user_id), "rolling.json")
 
-def append_turn(user_id: int, question: str, answer: str):
+def append_turn(user_id: int, question: str, answer: str, collection: Optional[str] = None):
     p = _daily_path(user_id)
     data = {"turns": [], "daily_summary": ""}
     if os.path.exists(p):
         with open(p, "r", encoding="utf-8") as f:
             data = json.load(f)
-    data["turns"].append({"q": question, "a": answer})
+    turn = {"q": question, "a": answer}
+    if collection:
+        turn["c"] = collection  # untuk statistik pertanyaan per koleksi
+    data["turns"].append(turn)
     with open(p, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
-def update_daily_summary(user_id: int, summary_text: str):
-    p = _daily_path(user_id)
-    data = {"turns": [], "daily_summary": ""}
-    if os.path.exists(p):
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
+def update_daily_summary(user_id: int, summary_text: str, date_str: Optional[str] = None,
+                         summarized_turns: Optional[int] = None):
+    p = _daily_path(user_id, date_str)
+    # hari yang sudah dipadatkan: mulai dari isi arsip agar gilirannya tidak tertutup file baru
+    data = read_daily(user_id, date_str)
     data["daily_summary"] = summary_text.strip()
+    # berapa giliran yang sudah tercakup ringkasan; batch malam hanya memproses hari yang bertambah
+    data["summarized_turns"] = len(data["turns"]) if summarized_turns is None else summarized_turns
     with open(p, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 def read_daily(user_id: int, date_str: Optional[str] = None) -> Dict:
     p = _daily_path(user_id, date_str)
     if not os.path.exists(p):
+        # hari yang sudah lewat mungkin sudah dipindah ke arsip Parquet
+        if date_str and date_str < today_date_str() and os.path.isdir(ARCHIVE_DIR):
+            import agent_archive
+            archived = agent_archive.read_day(ARCHIVE_DIR, user_id, date_str)
+            if archived is not None:
+                return archived
         return {"turns": [], "daily_summary": ""}
     with open(p, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -61,6 +73,14 @@ def update_rolling_summary(user_id: int, summary_text: str):
     with open(p, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
+def append_rolling_summary(user_id: int, text: str, max_chars: int = 800) -> str:
+    """Tambahkan ringkasan baru ke ringkasan bergulir; bila kepanjangan, bagian terlama yang dibuang."""
+    combined = (read_rolling_summary(user_id) + " " + (text or "").strip()).strip()
+    if len(combined) > max_chars:
+        combined = combined[-max_chars:].split(" ", 1)[-1]
+    update_rolling_summary(user_id, combined)
+    return combined
+
 def read_rolling_summary(user_id: int) -> str:
     p = _rolling_path(user_id)
     if not os.path.exists(p):
@@ -69,5 +89,72 @@ def read_rolling_summary(user_id: int) -> str:
         data = json.load(f)
     return data.get("summary", "")
 
+def today_date_str() -> str:
+    return datetime.now(ASIA_JAKARTA).strftime("%Y-%m-%d")
+
 def yesterday_date_str() -> str:
     return (datetime.now(ASIA_JAKARTA) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+def unsummarized_turns(data: Dict) -> int:
+    """Jumlah giliran yang belum tercakup ringkasan harian (file lama tanpa penanda dianggap tercakup)."""
+    turns = len(data.get("turns") or [])
+    done = data.get("summarized_turns", turns if data.get("daily_summary") else 0)
+    return max(0, turns - done)
+
+def _normalize_question(q: str) -> str:
+    return " ".join(q.lower().split())
+
+def question_counts(days: int = 7) -> Tuple[Counter, Dict[Tuple[str, str], str]]:
+    """
+    Jumlah pertanyaan ternormalisasi per (koleksi, pertanyaan) selama `days` hari terakhir: file harian
+    yang belum dipadatkan dibaca langsung, sisanya dipindai dari arsip Parquet (kolom q & koleksi saja).
+    Koleksi "" = tidak tercatat.
+    """
+    today = datetime.now(ASIA_JAKARTA)
+    dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    counts: Counter = Counter()
+    original: Dict[Tuple[str, str], str] = {}
+    wanted = {f"{ds}.json" for ds in dates}
+    if os.path.isdir(BASE_DIR):
+        for uid in os.listdir(BASE_DIR):
+            dd = os.path.join(BASE_DIR, uid, "daily")
+            # satu listdir per user: setelah compact biasanya hanya tersisa file hari ini
+            for fn in (wanted.intersection(os.listdir(dd)) if os.path.isdir(dd) else ()):
+                p = os.path.join(dd, fn)
+                try:
+                    with open(p, "r", encoding="utf-8") as f:
+                        turns = json.load(f).get("turns", [])
+                except (OSError, ValueError):
+                    continue
+                for t in turns:
+                    q = (t.get("q") or "").strip()
+                    if not q:
+                        continue
+                    key = (t.get("c") or "", _normalize_question(q))
+                    counts[key] += 1
+                    original.setdefault(key, q)
+    if os.path.isdir(ARCHIVE_DIR):
+        import agent_archive
+        for coll, norm, q, n in agent_archive.question_counts(ARCHIVE_DIR, since=dates[-1]):
+            counts[(coll, norm)] += n
+            original.setdefault((coll, norm), q)
+    return counts, original
+
+def top_questions(limit: int = 10, days: int = 7) -> List[str]:
+    """Pertanyaan paling sering (ternormalisasi) dari log harian semua pengguna beberapa hari terakhir."""
+    counts, original = question_counts(days)
+    merged: Counter = Counter()
+    first: Dict[str, str] = {}
+    for (coll, key), n in counts.items():
+        merged[key] += n
+        first.setdefault(key, original[(coll, key)])
+    return [first[k] for k, _ in merged.most_common(limit)]
+
+def top_questions_by_collection(limit: int = 10, days: int = 7) -> Dict[str, List[str]]:
+    """Pertanyaan teratas per koleksi (koleksi "" = tidak tercatat), koleksi terpopuler lebih dulu."""
+    counts, original = question_counts(days)
+    per: Dict[str, Counter] = {}
+    for (coll, key), n in counts.items():
+        per.setdefault(coll, Counter())[key] = n
+    ranked = sorted(per.items(), key=lambda kv: -sum(kv[1].values()))
+    return {coll: [original[(coll, k)] for k, _ in c.most_common(limit)] for coll, c in ranked}
@@ -0,0 +1,174 @@
+# agent_nightly.py
+#
+# Batch malam: ringkasan harian untuk semua user yang punya giliran belum terangkum (bukan hanya yang
+# menjalankan !end). Transkrip pendek beberapa user dikemas ke satu panggilan LLM, panggilan dibatasi
+# oleh pool kecil dan berprioritas BACKGROUND, dan batch mengalah selama ada antrean interaktif.
+# Progres dicatat per tanggal di storage/memory/_batch/<tanggal>.json sehingga run yang terputus
+# melanjutkan dari user yang belum selesai.
+
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import agent_memory as mem
+from agent_perf import PERF
+from agent_scheduler import SchedulerBusy
+from tools.batch_summary import pack, transcript
+
+Items = List[Tuple[str, List[List[str]]]]
+
+class DailySummaryBatch:
+    """
+    summarize(items) -> {id: ringkasan}: async, items = [(id, pairs)] untuk satu panggilan LLM
+    (di bot: job "summarize_batch"). busy() -> True selama trafik interaktif sedang antre.
+    """
+
+    def __init__(self, summarize: Callable[[Items], Awaitable[Dict[str, str]]], busy: Optional[Callable[[], bool]] = None,
+                 concurrency: int = 2, max_users_per_call: int = 8, pack_chars: int = 6000, user_chars: int = 4000,
+                 max_attempts: int = 3, yield_s: float = 1.0, busy_retries: int = 30):
+        self.summarize = summarize
+        self.busy = busy
+        self.concurrency = max(1, concurrency)
+        self.max_users_per_call = max(1, max_users_per_call)
+        self.pack_chars = pack_chars
+        self.user_chars = user_chars
+        self.max_attempts = max_attempts
+        self.yield_s = yield_s
+        self.busy_retries = busy_retries
+        self.running = False
+
+    # ---------- checkpoint ----------
+    @staticmethod
+    def checkpoint_path(date: str) -> str:
+        return os.path.join(mem.BASE_DIR, "_batch", f"{date}.json")
+
+    def load_checkpoint(self, date: str) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path(date), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"date": date, "done": [], "failed": {}, "calls": 0}
+
+    def _save_checkpoint(self, cp: Dict[str, Any]) -> None:
+        p = self.checkpoint_path(cp["date"])
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        with open(p + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(cp, f)
+        os.replace(p + ".tmp", p)
+
+    # ---------- pekerjaan ----------
+    def pending(self, date: str, cp: Optional[Dict[str, Any]] = None,
+                include_archived: bool = True) -> List[Tuple[int, List[List[str]], bool]]:
+        """
+        (user_id, pairs sehari penuh, sudah_punya_ringkasan) untuk user dengan giliran belum terangkum.
+        Hari yang sudah dipadatkan ke arsip (MEMORY_COMPACT_AT lebih awal dari batch ini) ikut dibaca
+        dari arsip bila include_archived; ringkasannya ditulis ke file JSON baru lalu digabung saat
+        pemadatan berikutnya (agent_archive.merge_day).
+        """
+        cp = cp or {"done": [], "failed": {}}
+        skip = set(cp["done"]) | {int(u) for u, n in cp["failed"].items() if n >= self.max_attempts}
+        archived: Dict[int, Dict[str, Any]] = {}
+        if include_archived and os.path.isdir(mem.ARCHIVE_DIR):
+            import agent_archive  # pyarrow hanya dimuat bila arsip ada
+            archived = agent_archive.read_date(mem.ARCHIVE_DIR, date)
+        days = dict(archived)
+        for uid in (os.listdir(mem.BASE_DIR) if os.path.isdir(mem.BASE_DIR) else []):
+            p = os.path.join(mem.BASE_DIR, uid, "daily", f"{date}.json")
+            if not uid.isdigit() or not os.path.exists(p):
+                continue
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # file JSON lebih baru dari arsip; digabung seperti saat pemadatan berikutnya
+            days[int(uid)] = agent_archive.merge_day(archived[int(uid)], data) if int(uid) in archived else data
+        out = []
+        for uid, data in sorted(days.items()):
+            if uid not in skip and mem.unsummarized_turns(data):
+                pairs = [[t.get("q") or "", t.get("a") or ""] for t in data["turns"]]
+                out.append((uid, pairs, bool(data.get("daily_summary"))))
+        return out
+
+    async def _wait_quiet(self) -> None:
+        while self.busy is not None and self.busy():
+            PERF.incr("nightly_yields")
+            await asyncio.sleep(self.yield_s)
+
+    async def _call(self, items: Items) -> Dict[str, str]:
+        for _ in range(self.busy_retries):
+            await self._wait_quiet()
+            t0 = time.perf_counter()
+            try:
+                res = await self.summarize(items)
+            except SchedulerBusy as e:
+                # antrean LLM penuh: mundur dan ulangi, bukan dihitung sebagai kegagalan user
+                await asyncio.sleep(max(e.retry_after, self.yield_s))
+                continue
+            PERF.observe("nightly_summary_call", time.perf_counter() - t0)
+            PERF.observe_value("nightly_users_per_call", len(items))
+            return res
+        raise SchedulerBusy("batch ringkasan malam: LLM terus sibuk")
+
+    async def run(self, date: str) -> Dict[str, int]:
+        """Ringkas semua giliran yang belum terangkum pada `date`; aman diulang (melanjutkan checkpoint)."""
+        self.running = True
+        t0 = time.perf_counter()
+        try:
+            cp = await asyncio.to_thread(self.load_checkpoint, date)
+            cp.setdefault("started_at", datetime.now(mem.ASIA_JAKARTA).isoformat())
+            todo = await asyncio.to_thread(self.pending, date, cp)
+            by_id = {str(uid): (uid, pairs, had) for uid, pairs, had in todo}
+            batches = pack([(k, transcript(p, self.user_chars)) for k, (_, p, _) in by_id.items()],
+                           self.pack_chars, self.max_users_per_call)
+            stats = {"users": len(todo), "summarized": 0, "failed": 0, "calls": 0}
+            sem = asyncio.Semaphore(self.concurrency)
+            lock = asyncio.Lock()
+
+            async def save(key: str, summary: str) -> None:
+                uid, pairs, had_summary = by_id[key]
+                await asyncio.to_thread(mem.update_daily_summary, uid, summary, date, len(pairs))
+                if not had_summary:  # hari yang sudah diringkas !end sudah masuk ringkasan bergulir
+                    await asyncio.to_thread(mem.append_rolling_summary, uid, summary)
+                cp["done"].append(uid)
+                stats["summarized"] += 1
+
+            async def one(members: List[Tuple[str, str]]) -> None:
+                async with sem:
+                    groups = [[k for k, _ in members]]
+                    while groups:
+                        group = groups.pop()
+                        try:
+                            res, errored = await self._call([(k, by_id[k][1]) for k in group]), False
+                        except Exception as e:
+                            print(f"Ringkasan malam gagal untuk {len(group)} user: {e}")
+                            res, errored = {}, True
+                        stats["calls"] += 1
+                        async with lock:
+                            missing = []
+                            for k in group:
+                                if res.get(k):
+                                    await save(k, res[k])
+                                else:
+                                    missing.append(k)
+                            if len(group) > 1 and not errored:
+                                # id yang hilang dari jawaban gabungan diulang satu per satu
+                                groups.extend([k] for k in missing)
+                            else:
+                                for k in missing:
+                                    cp["failed"][k] = cp["failed"].get(k, 0) + 1
+                                    stats["failed"] += 1
+                            cp["calls"] = cp.get("calls", 0) + 1
+                            await asyncio.to_thread(self._save_checkpoint, cp)
+
+            await asyncio.gather(*(one(b) for b in batches))
+            cp["finished_at"] = datetime.now(mem.ASIA_JAKARTA).isoformat()
+            await asyncio.to_thread(self._save_checkpoint, cp)
+            PERF.observe("nightly_summary", time.perf_counter() - t0)
+            PERF.incr("nightly_users_summarized", stats["summarized"])
+            return stats
+        finally:
+            self.running = False
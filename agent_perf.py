@@ -0,0 +1,230 @@
+# agent_perf.py
+
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+# dict timing milik permintaan yang sedang berjalan (diisi oleh PERF.span bila aktif)
+_REQUEST_TIMINGS: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "psionic_request_timings", default=None
+)
+
+class RollingHistogram:
+    """Jendela sampel terakhir (ms) untuk p50/p95/p99, plus count & sum kumulatif."""
+
+    def __init__(self, window: int = 1024):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self._samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+
+    def percentiles(self, qs=(50, 95, 99)) -> Dict[int, float]:
+        data = sorted(self._samples)
+        if not data:
+            return {q: 0.0 for q in qs}
+        out = {}
+        for q in qs:
+            idx = min(len(data) - 1, max(0, math.ceil(q / 100.0 * len(data)) - 1))  # nearest-rank
+            out[q] = data[idx]
+        return out
+
+class PerfRegistry:
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._hists: Dict[str, RollingHistogram] = {}
+        self._values: Dict[str, RollingHistogram] = {}   # distribusi non-waktu (mis. ukuran batch)
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._gauge_fns: Dict[str, Callable[[], float]] = {}
+        self._listeners: List[Callable[[str, float, float], None]] = []
+
+    # ---------- pencatatan ----------
+    def observe(self, stage: str, seconds: float, started: Optional[float] = None) -> None:
+        ms = seconds * 1000.0
+        with self._lock:
+            h = self._hists.get(stage)
+            if h is None:
+                h = self._hists[stage] = RollingHistogram(self.window)
+            h.observe(ms)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + ms
+        for fn in self._listeners:
+            try:
+                fn(stage, started if started is not None else time.perf_counter() - seconds, seconds)
+            except Exception:
+                pass
+
+    def observe_value(self, name: str, value: float) -> None:
+        """Sampel distribusi non-waktu (ukuran batch, jumlah token, ...)."""
+        with self._lock:
+            h = self._values.get(name)
+            if h is None:
+                h = self._values[name] = RollingHistogram(self.window)
+            h.observe(float(value))
+
+    def add_listener(self, fn: Callable[[str, float, float], None]) -> None:
+        """fn(stage, started_perf_counter, seconds) dipanggil untuk setiap span (mis. trace per permintaan)."""
+        self._listeners.append(fn)
+
+    @contextmanager
+    def span(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0, started=t0)
+
+    @contextmanager
+    def collect(self):
+        """Kumpulkan timing per tahap (ms) untuk satu permintaan; ikut terbawa ke asyncio.to_thread."""
+        timings: Dict[str, float] = {}
+        token = _REQUEST_TIMINGS.set(timings)
+        try:
+            yield timings
+        finally:
+            _REQUEST_TIMINGS.reset(token)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = float(value)
+
+    def add_gauge(self, name: str, delta: float) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0.0) + delta
+
+    def gauge_fn(self, name: str, fn: Callable[[], float]) -> None:
+        """Gauge yang dievaluasi saat dibaca (mis. kedalaman antrean)."""
+        with self._lock:
+            self._gauge_fns[name] = fn
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hists.clear()
+            self._values.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # ---------- pembacaan ----------
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, stage: str, q: int = 50, default: float = 0.0) -> float:
+        """Persentil (ms) satu tahap dari jendela terakhir; default bila belum ada sampel."""
+        with self._lock:
+            h = self._hists.get(stage)
+            if h is None or not h.count:
+                return default
+            return h.percentiles((q,))[q]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            stages = {
+                name: {"count": h.count, "sum_ms": h.total_ms, **{f"p{q}": v for q, v in h.percentiles().items()}}
+                for name, h in self._hists.items()
+            }
+            values = {
+                name: {"count": h.count, "sum": h.total_ms, **{f"p{q}": v for q, v in h.percentiles().items()}}
+                for name, h in self._values.items()
+            }
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            fns = dict(self._gauge_fns)
+        for name, fn in fns.items():
+            try:
+                gauges[name] = float(fn())
+            except Exception:
+                continue
+        return {"stages": stages, "values": values, "counters": counters, "gauges": gauges}
+
+    def render_text(self) -> str:
+        snap = self.snapshot()
+        lines = [f"{'tahap':<22}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)"]
+        for name in sorted(snap["stages"]):
+            st = snap["stages"][name]
+            lines.append(f"{name:<22}{st['count']:>7}{st['p50']:>9.1f}{st['p95']:>9.1f}{st['p99']:>9.1f}")
+        if snap["values"]:
+            lines.append("")
+            lines.append(f"{'distribusi':<22}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+            for name in sorted(snap["values"]):
+                st = snap["values"][name]
+                lines.append(f"{name:<22}{st['count']:>7}{st['p50']:>9g}{st['p95']:>9g}{st['p99']:>9g}")
+        if snap["counters"]:
+            lines.append("")
+            lines.append("counter:")
+            for name in sorted(snap["counters"]):
+                lines.append(f"  {name} = {snap['counters'][name]}")
+        hit_lines = _hit_rates(snap["counters"])
+        if hit_lines:
+            lines.append("hit rate:")
+            lines.extend(hit_lines)
+        if snap["gauges"]:
+            lines.append("gauge:")
+            for name in sorted(snap["gauges"]):
+                lines.append(f"  {name} = {snap['gauges'][name]:g}")
+        return "\n".join(lines)
+
+    def render_prometheus(self, prefix: str = "psionic") -> str:
+        snap = self.snapshot()
+        out: List[str] = [
+            f"# HELP {prefix}_stage_seconds Latensi per tahap (jendela bergulir).",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name in sorted(snap["stages"]):
+            st = snap["stages"][name]
+            for q in (50, 95, 99):
+                out.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="0.{q}"}} {st[f"p{q}"] / 1000.0:.6f}')
+            out.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {st["sum_ms"] / 1000.0:.6f}')
+            out.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {st["count"]}')
+        for name in sorted(snap["values"]):
+            st = snap["values"][name]
+            out.append(f"# TYPE {prefix}_{name} summary")
+            for q in (50, 95, 99):
+                out.append(f'{prefix}_{name}{{quantile="0.{q}"}} {st[f"p{q}"]:g}')
+            out.append(f"{prefix}_{name}_sum {st['sum']:g}")
+            out.append(f"{prefix}_{name}_count {st['count']}")
+        for name in sorted(snap["counters"]):
+            out.append(f"# TYPE {prefix}_{name}_total counter")
+            out.append(f"{prefix}_{name}_total {snap['counters'][name]}")
+        for name in sorted(snap["gauges"]):
+            out.append(f"# TYPE {prefix}_{name} gauge")
+            out.append(f"{prefix}_{name} {snap['gauges'][name]:g}")
+        return "\n".join(out) + "\n"
+
+    def dump_prometheus(self, path: str) -> None:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+def _hit_rates(counters: Dict[str, int]) -> List[str]:
+    out = []
+    for name in sorted(counters):
+        if not name.endswith("_hit"):
+            continue
+        base = name[: -len("_hit")]
+        hit = counters[name]
+        total = hit + counters.get(base + "_miss", 0)
+        if total:
+            out.append(f"  {base}: {100.0 * hit / total:.1f}% ({hit}/{total})")
+    return out
+
+PERF = PerfRegistry()
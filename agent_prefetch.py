@@ -0,0 +1,85 @@
+# agent_prefetch.py
+#
+# Prefetch sesi: setelah bot menjawab di sesi !new, lookup jangkar yang akan dibaca giliran berikutnya
+# (AgentBrain.session_docs: tetangga chunk yang dikutip, topik sesi, buku fokus) dijalankan lebih dulu
+# sebagai job BACKGROUND, sehingga retrieval giliran berikutnya kena cache. Prefetch selalu mengalah:
+# per sesi hanya permintaan terbaru yang disimpan dan prefetch dibuang selama ada antrean interaktif.
+
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from agent_perf import PERF
+
+def session_context(session: Any, docs: List[Any], focus_book: Optional[Dict[str, str]] = None,
+                    collection: Optional[str] = None, max_docs: int = 2) -> Optional[Dict[str, Any]]:
+    """
+    Jangkar sesi yang bisa di-JSON-kan (ikut payload job) dari SessionState dan dokumen jawaban
+    terakhir; None bila tidak ada yang bisa di-prefetch.
+    """
+    anchors = []
+    for d in (docs or [])[:max_docs]:
+        md = getattr(d, "metadata", {}) or {}
+        if md.get("collection") and md.get("source") and isinstance(md.get("chunk_index"), int):
+            anchors.append({k: md.get(k) for k in ("collection", "source", "page", "chunk_index")})
+    book = focus_book or getattr(session, "focus_book", None)
+    topic = getattr(session, "topic", None)
+    if not (anchors or book or topic):
+        return None
+    return {
+        "topic": topic,
+        "collection": collection or getattr(session, "default_collection", None),
+        "book": book,
+        "neighbors_of": anchors,
+    }
+
+class SessionPrefetcher:
+    """
+    run(ctx): async, menjalankan prefetch satu sesi (di bot: job "prefetch" berprioritas BACKGROUND).
+    busy() -> True selama trafik interaktif antre; prefetch tidak pernah menambah antrean itu.
+    """
+
+    def __init__(self, run: Callable[[Dict[str, Any]], Awaitable[Any]], busy: Optional[Callable[[], bool]] = None,
+                 max_inflight: int = 1):
+        self.run = run
+        self.busy = busy
+        self._sem = asyncio.Semaphore(max(1, max_inflight))
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _busy(self) -> bool:
+        if self.busy is not None and self.busy():
+            PERF.incr("prefetch_dropped")
+            return True
+        return False
+
+    def schedule(self, key: Hashable, ctx: Optional[Dict[str, Any]]) -> None:
+        """Jadwalkan prefetch untuk sesi `key`; permintaan lama sesi yang sama yang belum jalan diganti."""
+        if ctx is None or self._busy():
+            return
+        waiting = key in self._pending
+        self._pending[key] = ctx
+        if waiting:
+            PERF.incr("prefetch_superseded")
+            return
+        task = asyncio.get_running_loop().create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: Hashable) -> None:
+        async with self._sem:
+            ctx = self._pending.pop(key, None)
+            if ctx is None or self._busy():
+                return
+            t0 = time.perf_counter()
+            try:
+                await self.run(ctx)
+                PERF.incr("prefetch_runs")
+            except Exception:
+                PERF.incr("prefetch_errors")
+            PERF.observe("prefetch", time.perf_counter() - t0)
+
+    async def join(self) -> None:
+        """Tunggu semua prefetch yang terjadwal (dipakai tes dan saat shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
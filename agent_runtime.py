@@ -0,0 +1,157 @@
+# agent_runtime.py
+
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from tools.index_version import read_index_version
+
+@dataclass
+class Snapshot:
+    generation: int
+    agent: Any
+    brain: Any
+    index_version: int
+    built_at: float
+    inflight: int = 0
+    retired: bool = False
+
+class AgentRuntime:
+    """
+    Pemegang pasangan (PsionicAgent, AgentBrain) yang aktif.
+    Reload membangun pasangan baru di background, memanaskannya, lalu menukarnya secara atomik
+    dengan generasi baru. Permintaan yang sedang jalan tetap selesai di snapshot lamanya;
+    snapshot lama ditutup setelah tidak ada lagi yang memakainya.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[bool], Tuple[Any, Any]],
+        warm_queries: Optional[Union[List[str], Callable[[], List[str]]]] = None,
+    ):
+        # factory(fresh) -> (agent, brain); fresh=True memaksa client Chroma baru dari disk
+        # warm_queries boleh berupa list atau callable (mis. pertanyaan populer dari log memori)
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._snap: Optional[Snapshot] = None
+        self._generation = 0
+        self._hooks: List[Callable[[int, int], None]] = []
+        self.warm_queries = warm_queries or []
+        self.timings: Dict[str, float] = {}  # rincian waktu build terakhir
+
+    # ---------- status ----------
+    @property
+    def ready(self) -> bool:
+        return self._snap is not None
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def current(self) -> Snapshot:
+        snap = self._snap
+        if snap is None:
+            raise RuntimeError("Agen belum siap.")
+        return snap
+
+    def is_stale(self) -> bool:
+        snap = self._snap
+        if snap is None:
+            return False
+        return read_index_version(snap.agent.persist_dir) != snap.index_version
+
+    def on_swap(self, fn: Callable[[int, int], None]) -> None:
+        """Daftarkan callback(old_gen, new_gen) untuk membuang cache milik generasi lama."""
+        self._hooks.append(fn)
+
+    # ---------- pemakaian ----------
+    @contextmanager
+    def use(self):
+        """Pinjam snapshot aktif selama satu permintaan."""
+        with self._lock:
+            snap = self.current()
+            snap.inflight += 1
+        try:
+            yield snap
+        finally:
+            close = False
+            with self._lock:
+                snap.inflight -= 1
+                close = snap.retired and snap.inflight == 0
+            if close:
+                self._close(snap)
+
+    # ---------- build / swap ----------
+    def warm(self, agent: Any) -> Dict[str, float]:
+        t0 = time.perf_counter()
+        agent.list_all_books()  # katalog judul
+        adjacency = getattr(agent, "adjacency", None)
+        if adjacency is not None:  # urutan chunk untuk ekspansi tetangga (!source full, jangkar sesi)
+            for name in agent.list_collections():
+                adjacency(name)
+        quant_index = getattr(agent, "quant_index", None)
+        if quant_index is not None:  # indeks int8 dibangun/dimuat di sini, bukan di kueri pertama
+            for name in agent.list_collections():
+                quant_index(name)
+        t1 = time.perf_counter()
+        queries = self.warm_queries() if callable(self.warm_queries) else list(self.warm_queries)
+        for q in queries:
+            try:
+                agent.retrieve(q)  # mengisi cache embedding kueri + cache retrieval
+            except Exception:
+                pass
+        t2 = time.perf_counter()
+        return {"warm_catalog_s": t1 - t0, "warm_queries_s": t2 - t1, "warm_queries_n": float(len(queries))}
+
+    def build(self) -> Snapshot:
+        fresh = self._snap is not None
+        t0 = time.perf_counter()
+        agent, brain = self._factory(fresh)
+        timings = {"agent_init_s": time.perf_counter() - t0}
+        timings.update(self.warm(agent))
+        self.timings = timings
+        return Snapshot(
+            generation=self._generation + 1,
+            agent=agent,
+            brain=brain,
+            index_version=getattr(agent, "index_version", 0),
+            built_at=time.time(),
+        )
+
+    def swap(self, snap: Snapshot) -> None:
+        with self._lock:
+            old = self._snap
+            self._generation = snap.generation
+            snap.agent.generation = snap.generation
+            self._snap = snap
+            close = False
+            if old is not None:
+                old.retired = True
+                close = old.inflight == 0
+        old_gen = old.generation if old else 0
+        for fn in self._hooks:
+            try:
+                fn(old_gen, snap.generation)
+            except Exception:
+                pass
+        if old is not None and close:
+            self._close(old)
+
+    def reload(self) -> Snapshot:
+        """Bangun + panaskan + tukar. Aman dipanggil dari thread background."""
+        with self._reload_lock:
+            snap = self.build()
+            self.swap(snap)
+            return snap
+
+    @staticmethod
+    def _close(snap: Snapshot) -> None:
+        close = getattr(snap.agent, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
@@ -0,0 +1,306 @@
+# agent_scheduler.py
+
+import time
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from agent_perf import PERF
+from tools.circuit_breaker import CircuitBreaker, CircuitOpen
+
+INTERACTIVE = 0   # jawaban ke user (!ask, sesi)
+BACKGROUND = 1    # ringkasan, pemanasan, batch
+
+class SchedulerBusy(RuntimeError):
+    """Antrean LLM penuh/terlalu lama atau kuota API habis; bot membalas "sedang ramai"."""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+# siapa yang memanggil LLM (diset bot per permintaan, ikut terbawa ke asyncio.to_thread)
+_CTX: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("psionic_llm_ctx", default={})
+
+@contextmanager
+def llm_context(**fields):
+    """Set tenant/guild/priority untuk panggilan LLM di dalam blok ini (menimpa nilai luar)."""
+    token = _CTX.set({**_CTX.get(), **fields})
+    try:
+        yield
+    finally:
+        _CTX.reset(token)
+
+def current_llm_context() -> Dict[str, Any]:
+    return _CTX.get()
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float):
+        self.rate = rate_per_s
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """0 bila satu token tersedia; selain itu detik sampai token berikutnya."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1.0
+
+    def drain(self, seconds: float) -> None:
+        """Kosongkan bucket (dan berutang) setelah error kuota dari API."""
+        if self.rate > 0:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class _Ticket:
+    __slots__ = ("priority", "tag", "seq", "model", "flow", "granted")
+
+    def __init__(self, priority: int, tag: float, seq: int, model: str, flow: str):
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+        self.model = model
+        self.flow = flow
+        self.granted = False
+
+    def order(self):
+        return (self.priority, self.tag, self.seq)
+
+class LLMScheduler:
+    """
+    Penjadwal pusat untuk semua panggilan LLM (dipanggil dari thread worker).
+    - batas konkurensi global,
+    - token bucket per model (request/menit),
+    - weighted fair queuing: tiap user satu flow; user dalam guild yang sama berbagi bobot guild,
+      sehingga guild ramai tidak menenggelamkan guild/DM lain,
+    - prioritas: INTERACTIVE selalu didahulukan dari BACKGROUND,
+    - backpressure: SchedulerBusy bila antrean penuh, menunggu > max_wait_s, atau API mengembalikan error kuota.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        rpm: Optional[Dict[str, float]] = None,
+        default_rpm: float = 0.0,        # 0 = tanpa batas rate
+        max_queue: int = 64,
+        max_wait_s: float = 20.0,
+        quota_backoff_s: float = 10.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rpm = dict(rpm or {})
+        self.default_rpm = default_rpm
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.quota_backoff_s = quota_backoff_s
+        self._cond = threading.Condition()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queue: List[_Ticket] = []
+        self._running = 0
+        self._vtime = 0.0
+        self._last_tag: Dict[str, float] = {}
+        self._flow_guild: Dict[str, str] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[threading.Timer] = None
+        PERF.gauge_fn("llm_queue_depth", lambda: len(self._queue))
+        PERF.gauge_fn("llm_running", lambda: self._running)
+
+    # ---------- status ----------
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _bucket(self, model: str) -> TokenBucket:
+        b = self._buckets.get(model)
+        if b is None:
+            rpm = self.rpm.get(model, self.default_rpm)
+            b = self._buckets[model] = TokenBucket(rpm / 60.0, burst=max(1.0, rpm / 12.0))
+        return b
+
+    # ---------- antrean ----------
+    def _cost(self, flow: str, guild: Optional[str]) -> float:
+        """User di guild yang sama berbagi satu bobot: biaya = jumlah flow aktif di guild tsb."""
+        if not guild:
+            return 1.0
+        active = {t.flow for t in self._queue if self._flow_guild.get(t.flow) == guild}
+        active.add(flow)
+        return float(len(active))
+
+    def _dispatch(self) -> None:
+        """Beri izin ke tiket terdepan selama slot & token tersedia (dipanggil dengan _cond terkunci)."""
+        now = time.monotonic()
+        next_wake = None
+        self._queue.sort(key=_Ticket.order)
+        for t in list(self._queue):
+            if self._running >= self.max_concurrency:
+                break
+            wait = self._bucket(t.model).wait_time(now)
+            if wait > 0:
+                next_wake = wait if next_wake is None else min(next_wake, wait)
+                continue  # model lain mungkin masih punya kuota
+            self._bucket(t.model).take(now)
+            self._queue.remove(t)
+            self._running += 1
+            t.granted = True
+            self._vtime = max(self._vtime, t.tag)
+        if next_wake is not None and self._queue:
+            self._schedule_wake(next_wake)
+        self._prune_flows()
+        self._cond.notify_all()
+
+    def _prune_flows(self) -> None:
+        """
+        Lupakan flow tanpa tiket antre yang tag-nya <= _vtime: max(_vtime, tag) sama saja tanpa entri,
+        jadi state per user tidak tumbuh tanpa batas di bot yang berjalan lama.
+        """
+        queued = {t.flow for t in self._queue}
+        for flow, tag in list(self._last_tag.items()):
+            if tag <= self._vtime and flow not in queued:
+                del self._last_tag[flow]
+                self._flow_guild.pop(flow, None)
+
+    def _schedule_wake(self, delay: float) -> None:
+        if self._timer is not None and self._timer.is_alive():
+            return
+        def wake():
+            with self._cond:
+                self._timer = None
+                self._dispatch()
+        self._timer = threading.Timer(delay + 0.001, wake)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def acquire(self, model: str, tenant: Any = None, guild: Any = None, priority: int = INTERACTIVE) -> None:
+        flow = str(tenant if tenant is not None else "anon")
+        guild_key = str(guild) if guild else None
+        t0 = time.perf_counter()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                PERF.incr("llm_busy_rejected")
+                raise SchedulerBusy("antrean LLM penuh", retry_after=self.max_wait_s)
+            if guild_key:
+                self._flow_guild[flow] = guild_key
+            tag = max(self._vtime, self._last_tag.get(flow, 0.0)) + self._cost(flow, guild_key)
+            self._last_tag[flow] = tag
+            ticket = _Ticket(priority, tag, next(self._seq), model, flow)
+            self._queue.append(ticket)
+            self._dispatch()
+            deadline = time.monotonic() + self.max_wait_s
+            while not ticket.granted:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self._queue.remove(ticket)
+                    PERF.incr("llm_busy_timeout")
+                    raise SchedulerBusy("antrean LLM terlalu lama", retry_after=self.max_wait_s)
+                self._cond.wait(left)
+        PERF.observe("llm_queue_wait", time.perf_counter() - t0)
+
+    def release(self) -> None:
+        with self._cond:
+            self._running -= 1
+            self._dispatch()
+
+    def call(self, fn: Callable[[], Any], model: str, tenant: Any = None, guild: Any = None,
+             priority: int = INTERACTIVE) -> Any:
+        self.acquire(model, tenant, guild, priority)
+        try:
+            return fn()
+        except Exception as e:
+            if is_quota_error(e):
+                PERF.incr("llm_quota_errors")
+                with self._cond:
+                    self._bucket(model).drain(self.quota_backoff_s)
+                raise SchedulerBusy("kuota API LLM habis", retry_after=self.quota_backoff_s) from e
+            raise
+        finally:
+            self.release()
+
+def is_quota_error(e: BaseException) -> bool:
+    name = type(e).__name__
+    text = str(e)
+    return (name in ("ResourceExhausted", "TooManyRequests")
+            or "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower())
+
+class ScheduledLLM:
+    """
+    Pembungkus model chat: .invoke() lewat LLMScheduler dengan konteks pemanggil saat ini. Dengan
+    `breaker`, sirkuit terbuka ditolak sebelum antre, dan sukses/gagal/lambat hanya diukur di sekitar
+    panggilan backend (waktu tunggu antrean lokal tidak dihitung lambat).
+    """
+
+    def __init__(self, inner: Any, scheduler: LLMScheduler, model: Optional[str] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.inner = inner
+        self.scheduler = scheduler
+        self.model = model or getattr(inner, "model", None) or "default"
+        self.breaker = breaker
+
+    def invoke(self, messages: Any, *args, **kwargs) -> Any:
+        ctx = _CTX.get()
+        call = lambda: self.inner.invoke(messages, *args, **kwargs)
+        breaker = self.breaker
+        if breaker is not None:
+            if breaker.is_open():
+                raise CircuitOpen("layanan LLM sedang tidak tersedia")
+            backend = call
+            call = lambda: breaker.call(backend, ignore_if=is_quota_error)
+        return self.scheduler.call(
+            call,
+            model=self.model,
+            tenant=ctx.get("tenant"),
+            guild=ctx.get("guild"),
+            priority=ctx.get("priority", INTERACTIVE),
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+class BreakerLLM:
+    """Pembungkus model chat: .invoke() lewat CircuitBreaker; SchedulerBusy tidak dihitung sebagai kegagalan."""
+
+    def __init__(self, inner: Any, breaker: CircuitBreaker):
+        self.inner = inner
+        self.breaker = breaker
+
+    def invoke(self, messages: Any, *args, **kwargs) -> Any:
+        return self.breaker.call(lambda: self.inner.invoke(messages, *args, **kwargs), ignore=(SchedulerBusy,))
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+def wrap_llm(llm: Any, model: str, scheduler: Optional[LLMScheduler] = None,
+             breaker: Optional[CircuitBreaker] = None) -> Any:
+    """Sirkuit terbuka ditolak tanpa ikut antre; breaker hanya mengukur panggilan backend, bukan antrean."""
+    if scheduler is not None:
+        return ScheduledLLM(llm, scheduler, model, breaker=breaker)
+    if breaker is not None:
+        llm = BreakerLLM(llm, breaker)
+    return llm
+
+def parse_rpm(spec: str) -> Dict[str, float]:
+    """'gemini-2.5-flash=60,gemini-2.5-pro=10' -> {model: rpm}."""
+    out: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        model, _, val = part.partition("=")
+        if val:
+            out[model.strip()] = float(val)
+    return out
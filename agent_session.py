@@ -1,7 +1,8 @@
 # agent_session.py
 
-from typing import Dict, Tuple, Optional
-from dataclasses import dataclass, field
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Optional
+from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta, timezone
 
 ASIA_JAKARTA = timezone(timedelta(hours=7))
@@ -15,15 +16,49 @@ class SessionState:
     style: str = "hangat"
     mode: str = "ringkas"
     turns: int = 0
+    focus_book: Optional[Dict[str, str]] = None  # {"collection", "title"} terakhir yang disebut di sesi
 
 class SessionManager:
-    def __init__(self):
-        # key = (user_id, channel_id)
-        self._sessions: Dict[Tuple[int, int], SessionState] = {}
+    def __init__(self, store: Optional[MutableMapping] = None):
+        # key = (user_id, channel_id); store bisa dict biasa atau agent_state.SharedDict (bersama antar shard)
+        self._sessions: MutableMapping = store if store is not None else {}
+        # kunci sesi aktif yang dilihat proses ini: gauge tidak perlu membaca semua sesi dari backend
+        self._active: set = set()
 
     def _key(self, user_id: int, channel_id: int):
         return (user_id, channel_id)
 
+    def _modify(self, user_id: int, channel_id: int, fn: Callable[[SessionState], None]) -> Optional[SessionState]:
+        """Ubah sesi yang ada lalu tulis balik (SharedDict: optimistik, diulang bila bentrok)."""
+        k = self._key(user_id, channel_id)
+        update = getattr(self._sessions, "update_value", None)
+        if update is None:
+            s = self._sessions.get(k)
+            if s:
+                fn(s)
+            return s
+        def apply(s):
+            if s:
+                fn(s)
+            return s
+        if k not in self._sessions:
+            return None
+        return update(k, apply)
+
+    def _track(self, k, s: Optional[SessionState]) -> Optional[SessionState]:
+        if s is not None and s.is_on:
+            self._active.add(k)
+        else:
+            self._active.discard(k)
+        return s
+
+    def active_count(self) -> int:
+        """
+        Jumlah sesi aktif yang dimulai/dibaca lewat proses ini, O(1). Dengan SharedDict, sesi yang
+        diakhiri shard lain baru keluar dari hitungan saat dibaca lagi di sini.
+        """
+        return len(self._active)
+
     def start(self, user_id: int, channel_id: int, default_coll: Optional[str], style: str, mode: str, topic: Optional[str]=None) -> SessionState:
         k = self._key(user_id, channel_id)
         s = SessionState(
@@ -36,24 +71,36 @@ class SessionManager:
             turns=0,
         )
         self._sessions[k] = s
-        return s
+        return self._track(k, s)
 
     def end(self, user_id: int, channel_id: int) -> Optional[SessionState]:
-        k = self._key(user_id, channel_id)
-        s = self._sessions.get(k)
-        if s:
-            s.is_on = False
+        s = self._modify(user_id, channel_id, lambda s: setattr(s, "is_on", False))
+        self._active.discard(self._key(user_id, channel_id))
         return s
 
     def get(self, user_id: int, channel_id: int) -> Optional[SessionState]:
-        return self._sessions.get(self._key(user_id, channel_id))
+        k = self._key(user_id, channel_id)
+        return self._track(k, self._sessions.get(k))
 
     def set_topic(self, user_id: int, channel_id: int, topic: Optional[str]):
-        s = self.get(user_id, channel_id)
-        if s:
-            s.topic = topic
+        self._modify(user_id, channel_id, lambda s: setattr(s, "topic", topic))
+
+    def set_default_collection(self, user_id: int, channel_id: int, collection: Optional[str]):
+        """Hanya untuk sesi yang sedang aktif."""
+        def apply(s: SessionState):
+            if s.is_on:
+                s.default_collection = collection
+        self._modify(user_id, channel_id, apply)
+
+    def set_focus_book(self, user_id: int, channel_id: int, book: Optional[Dict[str, str]]):
+        self._modify(user_id, channel_id, lambda s: setattr(s, "focus_book", book))
 
     def bump_turn(self, user_id: int, channel_id: int):
-        s = self.get(user_id, channel_id)
-        if s:
-            s.turns += 1
+        self._modify(user_id, channel_id, lambda s: setattr(s, "turns", s.turns + 1))
+
+# encode/decode untuk SharedDict
+def session_to_dict(s: Optional[SessionState]) -> Optional[Dict]:
+    return asdict(s) if s is not None else None
+
+def session_from_dict(d: Optional[Dict]) -> Optional[SessionState]:
+    return SessionState(**d) if d is not None else None
@@ -0,0 +1,268 @@
+# agent_state.py
+#
+# Backend state per user (preferensi, riwayat singkat, sesi) yang bisa dipakai bersama beberapa
+# proses/shard bot. Nilai disimpan sebagai JSON dengan nomor versi; penulisan memakai versi yang
+# terakhir dibaca (optimistic concurrency) sehingga update bersamaan tidak saling menimpa diam-diam.
+# SharedDict membungkus satu namespace sebagai dict dengan cache baca ber-TTL pendek.
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from agent_perf import PERF
+
+class VersionConflict(RuntimeError):
+    """Versi di backend sudah berubah sejak dibaca (proses lain menulis lebih dulu)."""
+
+class StateBackend:
+    """
+    Antarmuka backend: nilai mentah (string JSON) per (namespace, key) dengan versi bulat.
+    Versi 0 berarti kunci tidak ada; put(expected_version=0) hanya berhasil bila kunci belum ada.
+    """
+
+    def get(self, ns: str, key: str) -> Tuple[Optional[str], int]:
+        raise NotImplementedError
+
+    def put(self, ns: str, key: str, raw: str, expected_version: int) -> int:
+        raise NotImplementedError
+
+    def delete(self, ns: str, key: str, expected_version: int) -> None:
+        raise NotImplementedError
+
+    def keys(self, ns: str) -> List[str]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class MemoryStateBackend(StateBackend):
+    """Satu proses (perilaku lama); tetap lewat JSON + versi agar semantiknya sama dengan SQLite."""
+
+    def __init__(self):
+        self._data: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, ns: str, key: str) -> Tuple[Optional[str], int]:
+        return self._data.get((ns, key), (None, 0))
+
+    def put(self, ns: str, key: str, raw: str, expected_version: int) -> int:
+        with self._lock:
+            _, ver = self._data.get((ns, key), (None, 0))
+            if ver != expected_version:
+                raise VersionConflict(f"{ns}/{key}: versi {ver}, diharapkan {expected_version}")
+            self._data[(ns, key)] = (raw, ver + 1)
+            return ver + 1
+
+    def delete(self, ns: str, key: str, expected_version: int) -> None:
+        with self._lock:
+            _, ver = self._data.get((ns, key), (None, 0))
+            if ver != expected_version:
+                raise VersionConflict(f"{ns}/{key}: versi {ver}, diharapkan {expected_version}")
+            self._data.pop((ns, key), None)
+
+    def keys(self, ns: str) -> List[str]:
+        with self._lock:
+            return [k for n, k in self._data if n == ns]
+
+class SQLiteStateBackend(StateBackend):
+    """File SQLite (WAL) bersama untuk beberapa proses/shard di satu host; satu koneksi per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS state (ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "version INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns: str, key: str) -> Tuple[Optional[str], int]:
+        row = self._conn().execute("SELECT value, version FROM state WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def put(self, ns: str, key: str, raw: str, expected_version: int) -> int:
+        conn = self._conn()
+        if expected_version == 0:
+            cur = conn.execute("INSERT OR IGNORE INTO state (ns, key, value, version, updated_at) "
+                               "VALUES (?, ?, ?, 1, ?)", (ns, key, raw, time.time()))
+        else:
+            cur = conn.execute("UPDATE state SET value = ?, version = version + 1, updated_at = ? "
+                               "WHERE ns = ? AND key = ? AND version = ?",
+                               (raw, time.time(), ns, key, expected_version))
+        if cur.rowcount == 0:
+            raise VersionConflict(f"{ns}/{key}: versi berubah sejak {expected_version}")
+        return expected_version + 1
+
+    def delete(self, ns: str, key: str, expected_version: int) -> None:
+        if expected_version == 0:
+            return
+        cur = self._conn().execute("DELETE FROM state WHERE ns = ? AND key = ? AND version = ?",
+                                   (ns, key, expected_version))
+        if cur.rowcount == 0:
+            raise VersionConflict(f"{ns}/{key}: versi berubah sejak {expected_version}")
+
+    def keys(self, ns: str) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT key FROM state WHERE ns = ?", (ns,))]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def make_backend(kind: str, path: str = "") -> StateBackend:
+    kind = (kind or "memory").lower()
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(path or "./storage/state/state.db")
+    raise ValueError(f"STATE_BACKEND tidak dikenal: {kind} (memory | sqlite)")
+
+def _encode_key(key: Hashable) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+def _decode_key(raw: str) -> Hashable:
+    key = json.loads(raw)
+    return tuple(key) if isinstance(key, list) else key
+
+_MISSING = object()
+
+class SharedDict(MutableMapping):
+    """
+    Satu namespace backend sebagai dict. Bacaan dilayani dari cache lokal selama ttl_s (termasuk kunci
+    yang tidak ada), jadi perintah beruntun tidak bolak-balik ke backend; perubahan dari shard lain
+    terlihat paling lambat setelah ttl_s. Penulisan selalu langsung ke backend dengan versi yang di-cache;
+    bila bentrok, nilai dibaca ulang dan fungsi update dijalankan lagi.
+
+    Nilai yang dikembalikan adalah salinan: ubah lewat d[k] = v atau update_value, bukan di tempat.
+    Dari coroutine pakai aget/aset/apop/aupdate_value: backend bisa memblokir (SQLite: timeout + retry),
+    jadi I/O-nya dijalankan di thread pool, bukan di event loop.
+    """
+
+    def __init__(self, backend: StateBackend, ns: str, ttl_s: float = 2.0, max_cached: int = 10000,
+                 encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None, retries: int = 5):
+        self.backend = backend
+        self.ns = ns
+        self.ttl_s = ttl_s
+        self.max_cached = max_cached
+        self._encode = encode or (lambda v: v)
+        self._decode = decode or (lambda v: v)
+        self.retries = retries
+        self._cache: "OrderedDict[str, Tuple[Optional[str], int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------- cache ----------
+    def _remember(self, k: str, raw: Optional[str], ver: int) -> None:
+        with self._lock:
+            self._cache[k] = (raw, ver, time.monotonic())
+            self._cache.move_to_end(k)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _cached(self, k: str) -> Optional[Tuple[Optional[str], int]]:
+        with self._lock:
+            hit = self._cache.get(k)
+        if hit is not None and time.monotonic() - hit[2] < self.ttl_s:
+            PERF.incr("state_cache_hit")
+            return hit[0], hit[1]
+        return None
+
+    def _load(self, k: str, fresh: bool = False) -> Tuple[Optional[str], int]:
+        if not fresh:
+            hit = self._cached(k)
+            if hit is not None:
+                return hit
+        PERF.incr("state_cache_miss")
+        raw, ver = self.backend.get(self.ns, k)
+        self._remember(k, raw, ver)
+        return raw, ver
+
+    def invalidate(self, key: Hashable = _MISSING) -> None:
+        with self._lock:
+            if key is _MISSING:
+                self._cache.clear()
+            else:
+                self._cache.pop(_encode_key(key), None)
+
+    # ---------- dict ----------
+    def __getitem__(self, key: Hashable) -> Any:
+        raw, ver = self._load(_encode_key(key))
+        if ver == 0:
+            raise KeyError(key)
+        return self._decode(json.loads(raw))
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.update_value(key, lambda _old: value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        k = _encode_key(key)
+        for attempt in range(self.retries):
+            _, ver = self._load(k, fresh=attempt > 0)
+            if ver == 0:
+                raise KeyError(key)
+            try:
+                self.backend.delete(self.ns, k, ver)
+            except VersionConflict:
+                PERF.incr("state_conflicts")
+                continue
+            self._remember(k, None, 0)
+            return
+        raise VersionConflict(f"{self.ns}/{k}: gagal menghapus setelah {self.retries} percobaan")
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter([_decode_key(k) for k in self.backend.keys(self.ns)])
+
+    def __len__(self) -> int:
+        return len(self.backend.keys(self.ns))
+
+    def update_value(self, key: Hashable, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        """
+        Read-modify-write atomik secara optimistik: fn(nilai_lama atau default) -> nilai baru.
+        fn bisa terpanggil lebih dari sekali bila ada penulis lain; jangan beri efek samping.
+        """
+        k = _encode_key(key)
+        for attempt in range(self.retries):
+            raw, ver = self._load(k, fresh=attempt > 0)
+            old = self._decode(json.loads(raw)) if ver else default
+            new = fn(old)
+            new_raw = json.dumps(self._encode(new), ensure_ascii=False)
+            try:
+                new_ver = self.backend.put(self.ns, k, new_raw, ver)
+            except VersionConflict:
+                PERF.incr("state_conflicts")
+                continue
+            self._remember(k, new_raw, new_ver)
+            return new
+        raise VersionConflict(f"{self.ns}/{k}: gagal menulis setelah {self.retries} percobaan")
+
+    # ---------- async (event loop bot) ----------
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        """get() untuk coroutine: cache yang masih segar dibaca langsung, selebihnya di thread pool."""
+        hit = self._cached(_encode_key(key))
+        if hit is not None:
+            return self._decode(json.loads(hit[0])) if hit[1] else default
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def aset(self, key: Hashable, value: Any) -> None:
+        await asyncio.to_thread(self.__setitem__, key, value)
+
+    async def apop(self, key: Hashable, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.pop, key, default)
+
+    async def aupdate_value(self, key: Hashable, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        return await asyncio.to_thread(self.update_value, key, fn, default)
@@ -0,0 +1,286 @@
+# agent_trace.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import argparse
+import contextvars
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agent_perf import PERF
+
+_CURRENT: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("psionic_trace", default=None)
+
+@dataclass
+class Trace:
+    trace_id: str
+    user_id: Any
+    kind: str = "pipeline"
+    mode: Optional[str] = None
+    style: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+    total_ms: float = 0.0
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    collections: List[str] = field(default_factory=list)
+    book_focus: Optional[Dict[str, str]] = None
+    docs: List[Dict[str, Any]] = field(default_factory=list)
+    llm: List[Dict[str, Any]] = field(default_factory=list)
+    cache_hits: List[str] = field(default_factory=list)
+    question_chars: int = 0
+    answer_chars: int = 0
+    refine: bool = False
+    shed: List[str] = field(default_factory=list)
+    stage_errors: Dict[str, str] = field(default_factory=dict)
+    degraded: Optional[str] = None
+    context_tokens: int = 0
+    error: Optional[str] = None
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+    _distances: Dict[Tuple, float] = field(default_factory=dict, repr=False)
+
+    def to_json(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("_t0", None)
+        d.pop("_distances", None)
+        return d
+
+def doc_key(d: Any) -> Tuple:
+    md = getattr(d, "metadata", {}) or {}
+    return (md.get("source"), md.get("page"), md.get("chunk_index"))
+
+# ---------- hook yang dipanggil dari hot path (no-op bila tidak ada trace aktif) ----------
+def current() -> Optional[Trace]:
+    return _CURRENT.get()
+
+def note_search(collection: str, scored: Iterable[Tuple[Any, Optional[float]]]) -> None:
+    """Catat koleksi yang dicari dan jarak tiap dokumen (None untuk MMR)."""
+    tr = _CURRENT.get()
+    if tr is None:
+        return
+    if collection not in tr.collections:
+        tr.collections.append(collection)
+    for d, dist in scored:
+        if dist is None:
+            continue
+        key = doc_key(d)
+        prev = tr._distances.get(key)
+        tr._distances[key] = dist if prev is None else min(prev, dist)
+
+def note_llm(stage: str, messages: Any, response: str) -> None:
+    tr = _CURRENT.get()
+    if tr is None:
+        return
+    prompt_chars = sum(len(getattr(m, "content", "") or "") for m in (messages or []))
+    tr.llm.append({"stage": stage, "prompt_chars": prompt_chars, "response_chars": len(response or "")})
+
+def note_stage_error(stage: str, e: BaseException) -> None:
+    """Catat tahap opsional yang gagal lalu dilewati (nama kelas error)."""
+    tr = _CURRENT.get()
+    if tr is not None:
+        tr.stage_errors[stage] = type(e).__name__
+
+def note_cache_hit(name: str) -> None:
+    tr = _CURRENT.get()
+    if tr is not None:
+        tr.cache_hits.append(name)
+
+def note(**fields) -> None:
+    """Set atribut trace (book_focus, refine, ...)."""
+    tr = _CURRENT.get()
+    if tr is None:
+        return
+    for k, v in fields.items():
+        setattr(tr, k, v)
+
+def _on_span(stage: str, started: float, seconds: float) -> None:
+    tr = _CURRENT.get()
+    if tr is None:
+        return
+    tr.spans.append({
+        "stage": stage,
+        "start_ms": round((started - tr._t0) * 1000.0, 1),
+        "dur_ms": round(seconds * 1000.0, 1),
+    })
+
+PERF.add_listener(_on_span)
+
+# ---------- sink ----------
+class Tracer:
+    """
+    Penulis trace JSONL. Penulisan ke file dilakukan thread QueueListener sehingga hot path
+    hanya memasukkan record ke antrean. File dirotasi berdasar ukuran.
+    Sampling: trace disimpan bila lolos sample_rate ATAU total_ms >= slow_ms (ekor lambat selalu tersimpan).
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.sample_rate = 1.0
+        self.slow_ms = 0.0
+        self._logger: Optional[logging.Logger] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._queue: Optional[queue.Queue] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._logger is not None
+
+    def configure(self, path: str, sample_rate: float = 1.0, slow_ms: float = 0.0,
+                  max_bytes: int = 20 * 1024 * 1024, backups: int = 5) -> None:
+        self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=10000)
+        logger = logging.getLogger(f"psionic.trace.{id(self)}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.handlers = [logging.handlers.QueueHandler(q)]
+        self._listener = logging.handlers.QueueListener(q, handler)
+        self._listener.start()
+        self._queue = q
+        self._logger = logger
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()  # menguras antrean sebelum berhenti
+            for h in self._listener.handlers:
+                h.close()
+        self._listener = None
+        self._queue = None
+        self._logger = None
+
+    def emit(self, tr: Trace) -> bool:
+        if self._logger is None:
+            return False
+        keep = random.random() < self.sample_rate or (self.slow_ms > 0 and tr.total_ms >= self.slow_ms)
+        if not keep:
+            PERF.incr("traces_dropped")
+            return False
+        line = json.dumps(tr.to_json(), ensure_ascii=False, default=str)
+        record = self._logger.makeRecord(self._logger.name, logging.INFO, __file__, 0, line, None, None)
+        try:
+            # langsung ke antrean (bukan logger.info: QueueHandler menelan queue.Full ke stderr)
+            self._queue.put_nowait(record)
+        except queue.Full:
+            PERF.incr("traces_dropped")  # penulis tertinggal; jangan menahan hot path
+            return False
+        PERF.incr("traces_written")
+        return True
+
+    @contextmanager
+    def start(self, user_id: Any, kind: str = "pipeline", **fields):
+        """Mulai trace untuk satu permintaan; yield None bila tracer belum dikonfigurasi."""
+        if self._logger is None or _CURRENT.get() is not None:
+            yield None
+            return
+        tr = Trace(trace_id=uuid.uuid4().hex[:16], user_id=user_id, kind=kind, **fields)
+        token = _CURRENT.set(tr)
+        try:
+            yield tr
+        except Exception as e:
+            tr.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _CURRENT.reset(token)
+            tr.total_ms = round((time.perf_counter() - tr._t0) * 1000.0, 1)
+            self.emit(tr)
+
+    @staticmethod
+    def finish_docs(tr: Optional[Trace], docs: List[Any]) -> None:
+        """Simpan kunci dokumen terpilih beserta jaraknya (bila tercatat saat pencarian)."""
+        if tr is None:
+            return
+        tr.docs = [
+            {"key": list(k), "distance": tr._distances.get(k)}
+            for k in (doc_key(d) for d in docs)
+        ]
+
+TRACER = Tracer()
+
+# ---------- CLI ----------
+def read_traces(path: str) -> List[Dict[str, Any]]:
+    """Baca file trace aktif beserta hasil rotasinya (path.1, path.2, ...)."""
+    files = [path] + sorted(
+        (p for p in (f"{path}.{i}" for i in range(1, 100)) if os.path.exists(p)),
+        key=lambda p: int(p.rsplit(".", 1)[1]),
+    )
+    out = []
+    for p in files:
+        if not os.path.exists(p):
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    out.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return out
+
+def stage_breakdown(traces: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    per_stage: Dict[str, List[float]] = {}
+    for tr in traces:
+        for sp in tr.get("spans", []):
+            per_stage.setdefault(sp["stage"], []).append(float(sp["dur_ms"]))
+    out = {}
+    for stage, vals in per_stage.items():
+        vals.sort()
+        out[stage] = {
+            "n": len(vals),
+            "mean_ms": sum(vals) / len(vals),
+            "p95_ms": vals[min(len(vals) - 1, int(0.95 * len(vals)))],
+            "total_ms": sum(vals),
+        }
+    return out
+
+def format_trace(tr: Dict[str, Any]) -> str:
+    lines = [
+        f"{tr.get('trace_id')}  {tr.get('total_ms', 0):.0f} ms  user={tr.get('user_id')}  "
+        f"mode={tr.get('mode')}  refine={tr.get('refine')}  koleksi={','.join(tr.get('collections') or []) or '-'}"
+        + (f"  buku={tr['book_focus'].get('title')}" if tr.get("book_focus") else "")
+        + (f"  error={tr['error']}" if tr.get("error") else "")
+    ]
+    for sp in sorted(tr.get("spans", []), key=lambda s: s["start_ms"]):
+        lines.append(f"    +{sp['start_ms']:>8.1f}  {sp['stage']:<20}{sp['dur_ms']:>9.1f} ms")
+    for call in tr.get("llm", []):
+        lines.append(f"    llm {call['stage']:<16} prompt={call['prompt_chars']} chars  respons={call['response_chars']} chars")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Ringkas trace permintaan Psionic (JSONL).")
+    ap.add_argument("--path", default=os.getenv("TRACE_PATH", "./storage/traces/requests.jsonl"))
+    ap.add_argument("--slowest", type=int, default=10, help="tampilkan N permintaan paling lambat")
+    ap.add_argument("--user", default=None, help="filter per user id")
+    args = ap.parse_args(argv)
+
+    traces = read_traces(args.path)
+    if args.user:
+        traces = [t for t in traces if str(t.get("user_id")) == args.user]
+    if not traces:
+        print(f"Tidak ada trace di {args.path}")
+        return 1
+
+    print(f"{len(traces)} trace dari {args.path}\n")
+    print(f"Rincian per tahap:\n{'tahap':<22}{'n':>7}{'rata2':>10}{'p95':>10}{'total':>12}  (ms)")
+    for stage, st in sorted(stage_breakdown(traces).items(), key=lambda x: -x[1]["total_ms"]):
+        print(f"{stage:<22}{st['n']:>7}{st['mean_ms']:>10.1f}{st['p95_ms']:>10.1f}{st['total_ms']:>12.0f}")
+
+    print(f"\n{args.slowest} permintaan paling lambat:")
+    for tr in sorted(traces, key=lambda t: -float(t.get("total_ms", 0)))[: args.slowest]:
+        print(format_trace(tr))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# bench/chunk_store_bench.py
+#
+# Bandingkan pembentukan teks sitasi/konteks dari page_content (strip/replace/regex per dokumen per
+# panggilan) dengan store teks chunk (tools/chunk_store.py, buffer UTF-8 di-mmap + tabel offset):
+# waktu format_citations, konteks ringkas, dan ringkasan ekstraktif, plus ukuran store di disk.
+#   python -m bench.chunk_store_bench --chunks 3000 --queries 200
+
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+
+from bench.corpus import build_corpus, synthetic_question, TOPICS
+from bench.fakes import HashEmbeddings, FakeChatModel
+
+def run(agent, batches: List[List], texts, rounds: int) -> Dict[str, float]:
+    saved = agent.chunk_texts
+    agent.chunk_texts = texts  # None = jalur string lama
+    out = {}
+    try:
+        for label, fn in (
+            ("citations", lambda docs: agent.format_citations(docs, max_len=220, texts=texts)),
+            ("context", lambda docs: agent.format_context_compact(docs, full_top_n=3, tail_summaries_max=5)),
+            ("extractive", lambda docs: agent.extractive_answer(docs, "empati kecemasan")),
+        ):
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                for docs in batches:
+                    fn(docs)
+            out[label] = 1e6 * (time.perf_counter() - t0) / max(1, rounds * len(batches))
+    finally:
+        agent.chunk_texts = saved
+    return out
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="page_content vs store teks chunk (mmap)")
+    ap.add_argument("--chunks", type=int, default=3000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--k", type=int, default=8)
+    args = ap.parse_args(argv)
+
+    from psionic_agent import PsionicAgent
+    emb = HashEmbeddings(dim=128)
+    rng = random.Random(1)
+    questions = [synthetic_question(rng, rng.choice(list(TOPICS))) for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        build_corpus(tmp, args.chunks, emb)
+        llm = FakeChatModel()
+        agent = PsionicAgent(persist_dir=tmp, embeddings=emb, llm=llm, rewriter=llm, auto_refresh=False,
+                             use_chunk_store=True, chunk_store_dir=f"{tmp}/chunk_store")
+        t0 = time.perf_counter()
+        stores = [agent.chunk_store(n) for n in agent.list_collections()]
+        size = sum(s.memory_bytes() for s in stores if s is not None)
+        print(f"store teks chunk: {sum(len(s) for s in stores if s is not None)} chunk, {size / 1024:.0f} KiB, "
+              f"dibangun dalam {1000 * (time.perf_counter() - t0):.0f} ms")
+        batches = [agent.retrieve(q, k_override=args.k, use_mmr=False) for q in questions]
+        print(f"{'jalur':<14}{'sitasi µs':>12}{'konteks µs':>12}{'ekstraktif µs':>15}")
+        for label, texts in (("page_content", None), ("chunk store", agent.chunk_texts)):
+            r = run(agent, batches, texts, args.rounds)
+            print(f"{label:<14}{r['citations']:>12.1f}{r['context']:>12.1f}{r['extractive']:>15.1f}")
+        agent.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/corpus.py
+#
+# Generator korpus Chroma sintetis (metadata sama dengan ingest.py) untuk benchmark.
+#   python -m bench.corpus --out /tmp/psionic_bench --chunks 10000
+
+import os
+import random
+import argparse
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from bench.fakes import HashEmbeddings
+from tools.enrich import enrich_metadata
+
+# kosakata per koleksi supaya kueri sintetis punya "topik" yang bisa ditemukan
+TOPICS: Dict[str, List[str]] = {
+    "psikologi": ["empati", "kecemasan", "emosi", "trauma", "regulasi", "kognitif", "perilaku",
+                  "motivasi", "identitas", "attachment", "stres", "resiliensi", "terapi", "diri"],
+    "media": ["parasosial", "narasi", "penonton", "tokoh", "identifikasi", "transportasi", "film",
+              "serial", "media", "penggemar", "cerita", "budaya", "layar", "komunitas"],
+    "filsafat": ["makna", "etika", "kebebasan", "kesadaran", "eksistensi", "nilai", "tanggung",
+                 "jawab", "kebenaran", "pikiran", "tubuh", "waktu", "relasi", "bahasa"],
+}
+FILLER = ["yang", "dan", "dalam", "pada", "sebagai", "kita", "dengan", "adalah", "untuk", "itu"]
+
+def synthetic_text(rng: random.Random, words: List[str], n_words: int = 120) -> str:
+    out = []
+    for i in range(n_words):
+        out.append(rng.choice(words) if rng.random() < 0.45 else rng.choice(FILLER))
+        if i % 15 == 14:
+            out[-1] += "."
+    return " ".join(out).capitalize() + "."
+
+def synthetic_question(rng: random.Random, collection: str) -> str:
+    words = rng.sample(TOPICS[collection], 3)
+    return f"Apa hubungan {words[0]} dengan {words[1]} dan {words[2]}?"
+
+def build_corpus(
+    persist_dir: str,
+    n_chunks: int,
+    embeddings: Embeddings,
+    collections: List[str] = None,
+    books_per_collection: int = 5,
+    chunks_per_page: int = 3,
+    seed: int = 0,
+    batch: int = 500,
+    enrich: bool = True,
+) -> Dict[str, int]:
+    """Isi vectorstore di persist_dir dengan n_chunks chunk yang dibagi rata antar koleksi."""
+    from chromadb import PersistentClient
+    from chromadb.config import Settings
+
+    collections = collections or list(TOPICS)
+    rng = random.Random(seed)
+    client = PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    counts = {}
+    per_coll = max(1, n_chunks // len(collections))
+    for coll_name in collections:
+        coll = client.get_or_create_collection(coll_name)
+        words = TOPICS.get(coll_name) or TOPICS["psikologi"]
+        ids, docs, metas = [], [], []
+        for i in range(per_coll):
+            book = i % books_per_collection
+            local = i // books_per_collection
+            title = f"{coll_name.title()} Sintetis {book + 1}"
+            ids.append(f"{coll_name}-{i}")
+            text = synthetic_text(rng, words)
+            docs.append(text)
+            metas.append({
+                "source": os.path.join("books", coll_name, f"buku_{book + 1}.pdf"),
+                "page": local // chunks_per_page,
+                "chunk_index": local % chunks_per_page,
+                "book_title": title,
+                "collection": coll_name,
+                **(enrich_metadata(text) if enrich else {}),
+            })
+        for start in range(0, len(ids), batch):
+            sl = slice(start, start + batch)
+            coll.upsert(ids=ids[sl], documents=docs[sl], metadatas=metas[sl],
+                        embeddings=embeddings.embed_documents(docs[sl]))
+        counts[coll_name] = coll.count()
+    return counts
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Bangun vectorstore sintetis untuk benchmark")
+    ap.add_argument("--out", required=True, help="folder bundle; vectorstore ditulis ke <out>/vectorstore")
+    ap.add_argument("--chunks", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    counts = build_corpus(os.path.join(args.out, "vectorstore"), args.chunks, HashEmbeddings(dim=args.dim), seed=args.seed)
+    print("Korpus sintetis:", ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+if __name__ == "__main__":
+    main()
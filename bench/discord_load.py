@@ -0,0 +1,265 @@
+# bench/discord_load.py
+#
+# Simulator beban Discord: menjalankan handler bot.py (ask_cmd, on_message saat sesi, end_cmd)
+# lewat lapisan ctx/channel palsu dengan backend LLM & embedding palsu.
+#   python -m bench.discord_load --users 200 --turns 3
+#   python -m bench.discord_load --users 500 --session-rate 0.7 --memory-off-rate 0.3 --llm-latency lognormal:400:0.5
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+
+# bot.py membaca env saat impor: token palsu, tanpa trace/dump metrik ke storage/
+os.environ.setdefault("DISCORD_TOKEN", "bench")
+os.environ["TRACE_PATH"] = ""
+os.environ["PERF_DUMP_SECONDS"] = "0"
+os.environ["WARMUP_POPULAR_N"] = "0"
+
+from bench.fakes import HashEmbeddings, FakeChatModel
+from bench.corpus import build_corpus, synthetic_question, TOPICS
+from bench.pipeline_bench import percentile
+
+MODES = ["ringkas", "panjang", "bullet", "banding", "definisi", "langkah"]
+STATE_DICTS = [
+    "USER_STYLE", "USER_MODE", "USER_DM_PREF", "USER_LAST_DOCS", "USER_MEMORY_ON",
+    "USER_HISTORY", "USER_SUMMARY", "USER_DEFAULT_COLL", "USER_LAST_TIMINGS",
+]
+
+# ---------- lapisan Discord palsu ----------
+class FakeUser:
+    def __init__(self, uid: int):
+        self.id = uid
+        self.bot = False
+        self.name = f"user{uid}"
+        self.mention = f"<@{uid}>"
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeChannel:
+    def __init__(self, cid: int):
+        self.id = cid
+        self.sent: List[tuple] = []  # (perf_counter, teks)
+
+    async def send(self, text: str = None, **kwargs):
+        self.sent.append((time.perf_counter(), text or ""))
+
+    def typing(self):
+        return _Typing()
+
+class FakeCtx:
+    def __init__(self, author: FakeUser, channel: FakeChannel):
+        self.author = author
+        self.channel = channel
+        self.guild = None  # perilaku DM/kanal sama; tanpa guild reply_or_dm langsung ke kanal
+        self.message = None
+
+    async def reply(self, text: str = None, **kwargs):
+        await self.channel.send(text, **kwargs)
+
+class FakeMessage:
+    def __init__(self, author: FakeUser, channel: FakeChannel, content: str):
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.guild = None
+
+# ---------- ukur ----------
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Perkiraan byte rekursif (dict/list/tuple/set/objek ber-__dict__)."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(x, seen) for x in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+def state_sizes(botmod) -> Dict[str, Dict[str, int]]:
+    def measure(d) -> Dict[str, int]:
+        # SharedDict: ukur isi namespace-nya saja (backend dipakai bersama semua dict)
+        items = dict(d.items()) if hasattr(d, "backend") else d
+        return {"len": len(items), "bytes": deep_sizeof(items)}
+
+    out = {}
+    for name in STATE_DICTS:
+        d = getattr(botmod, name, None)
+        if d is not None:
+            out[name] = measure(d)
+    out["sessions"] = measure(botmod.sessions._sessions)
+    return out
+
+async def loop_lag_monitor(samples: List[float], stop: asyncio.Event, interval: float = 0.05):
+    """Selisih antara jadwal bangun dan waktu bangun sebenarnya = lag event loop."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (time.perf_counter() - t0 - interval) * 1000.0))
+
+# ---------- skenario ----------
+class Stats:
+    def __init__(self):
+        self.latency_ms: List[float] = []
+        self.ok = 0
+        self.failed = 0
+        self.dropped = 0
+        self.busy = 0
+        self.errors: Dict[str, int] = {}
+
+    def record(self, channel: FakeChannel, n_before: int, t0: float, exc: Optional[BaseException],
+               busy_reply: str = ""):
+        new = channel.sent[n_before:]
+        if exc is not None:
+            self.failed += 1
+            key = type(exc).__name__
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return
+        if not new:
+            self.dropped += 1
+            return
+        self.latency_ms.append((new[0][0] - t0) * 1000.0)
+        if any(text.startswith("Terjadi kesalahan") for _, text in new):
+            self.failed += 1
+        elif busy_reply and any(text == busy_reply for _, text in new):
+            self.busy += 1
+        else:
+            self.ok += 1
+
+async def _drive(stats: Stats, channel: FakeChannel, coro, busy_reply: str = ""):
+    n_before = len(channel.sent)
+    t0 = time.perf_counter()
+    try:
+        await coro
+        exc = None
+    except Exception as e:
+        exc = e
+    stats.record(channel, n_before, t0, exc, busy_reply)
+
+async def simulate_user(botmod, uid: int, args, rng: random.Random, stats: Stats):
+    user = FakeUser(uid)
+    channel = FakeChannel(10_000 + uid % args.channels)
+    ctx = FakeCtx(user, channel)
+    await asyncio.sleep(rng.uniform(0, args.ramp_s))
+    if rng.random() < args.memory_off_rate:
+        botmod.USER_MEMORY_ON[uid] = False
+    mode = rng.choice(MODES) if args.mixed_modes else "ringkas"
+    coll = rng.choice(list(TOPICS))
+    if rng.random() < args.session_rate:
+        await botmod.new_cmd.callback(ctx, args=f"mode={mode}")
+        for _ in range(args.turns):
+            msg = FakeMessage(user, channel, synthetic_question(rng, coll))
+            await _drive(stats, channel, botmod.on_message(msg), botmod.BUSY_REPLY)
+            await asyncio.sleep(rng.uniform(0, args.think_s))
+        await _drive(stats, channel, botmod.end_cmd.callback(ctx))
+    else:
+        botmod.USER_MODE[uid] = mode
+        for _ in range(args.turns):
+            await _drive(stats, channel, botmod.ask_cmd.callback(ctx, question=synthetic_question(rng, coll)),
+                         botmod.BUSY_REPLY)
+            await asyncio.sleep(rng.uniform(0, args.think_s))
+
+async def run(args) -> Dict[str, Any]:
+    import agent_memory as mem
+    import bot as botmod
+
+    tmp = tempfile.TemporaryDirectory()
+    mem.BASE_DIR = os.path.join(tmp.name, "memory")
+    persist_dir = os.path.join(tmp.name, "vectorstore")
+    build_corpus(persist_dir, args.chunks, HashEmbeddings(dim=args.dim))
+
+    def factory(fresh: bool):
+        from psionic_agent import PsionicAgent
+        from agent_brain import AgentBrain
+        emb = HashEmbeddings(dim=args.dim, latency=args.embed_latency, seed=1)
+        llm = FakeChatModel(latency=args.llm_latency, seed=2)
+        # penjadwal & sirkuit LLM bot ikut dipakai agar antrean/backpressure terukur juga
+        agent = PsionicAgent(persist_dir=persist_dir, embeddings=emb, llm=llm, rewriter=llm,
+                             fresh_client=fresh, auto_refresh=False, scheduler=botmod.LLM_SCHEDULER,
+                             breaker=botmod.LLM_BREAKER)
+        return agent, AgentBrain(agent, llm=llm, scheduler=botmod.LLM_SCHEDULER, breaker=botmod.LLM_BREAKER)
+
+    # runtime bot diganti dengan pabrik palsu; hook swap tetap mengisi bot.agent/bot.brain
+    botmod.runtime._factory = factory
+    botmod.runtime.warm_queries = []
+    botmod.runtime.reload()
+
+    async def _no_commands(message):  # handler dipanggil langsung; tanpa koneksi Discord
+        return None
+    botmod.bot.process_commands = _no_commands
+    botmod.install_executor()
+
+    before = state_sizes(botmod)
+    stats = Stats()
+    lag: List[float] = []
+    stop = asyncio.Event()
+    mon = asyncio.create_task(loop_lag_monitor(lag, stop))
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        simulate_user(botmod, 1_000 + i, args, random.Random(rng.random()), stats) for i in range(args.users)
+    ))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await mon
+    after = state_sizes(botmod)
+    botmod.runtime.current().agent.close()
+    tmp.cleanup()
+    return {"wall_s": wall, "stats": stats, "lag_ms": lag, "before": before, "after": after}
+
+def report(res: Dict[str, Any], args) -> str:
+    st: Stats = res["stats"]
+    lat, lag = st.latency_ms, res["lag_ms"]
+    total = st.ok + st.failed + st.dropped + st.busy
+    lines = [
+        f"users={args.users} turns={args.turns} session_rate={args.session_rate} memory_off_rate={args.memory_off_rate} "
+        f"llm={args.llm_latency} embed={args.embed_latency}",
+        f"durasi: {res['wall_s']:.1f}s  balasan: {total} ({total / res['wall_s']:.1f}/s)",
+        f"ok={st.ok} gagal={st.failed} ramai={st.busy} tanpa-balasan={st.dropped}" + (f"  error: {st.errors}" if st.errors else ""),
+        f"latensi balasan (ms): p50={percentile(lat, 50):.0f} p95={percentile(lat, 95):.0f} "
+        f"p99={percentile(lat, 99):.0f} max={max(lat or [0]):.0f}",
+        f"lag event loop (ms):  p50={percentile(lag, 50):.0f} p95={percentile(lag, 95):.0f} "
+        f"p99={percentile(lag, 99):.0f} max={max(lag or [0]):.0f}",
+        "",
+        f"{'state per user':<20}{'len awal':>10}{'len akhir':>11}{'KB awal':>10}{'KB akhir':>10}",
+    ]
+    for name, a in res["after"].items():
+        b = res["before"].get(name, {"len": 0, "bytes": 0})
+        lines.append(f"{name:<20}{b['len']:>10}{a['len']:>11}{b['bytes'] / 1024:>10.1f}{a['bytes'] / 1024:>10.1f}")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Simulasi beban handler Discord bot.py")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--turns", type=int, default=3, help="pertanyaan per user")
+    ap.add_argument("--channels", type=int, default=20)
+    ap.add_argument("--session-rate", type=float, default=0.5, help="porsi user yang memakai !new/!end")
+    ap.add_argument("--memory-off-rate", type=float, default=0.2)
+    ap.add_argument("--mixed-modes", action=argparse.BooleanOptionalAction, default=True)
+    ap.add_argument("--ramp-s", type=float, default=2.0, help="sebaran waktu mulai user")
+    ap.add_argument("--think-s", type=float, default=0.5, help="jeda maksimum antar pertanyaan")
+    ap.add_argument("--chunks", type=int, default=3000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--embed-latency", default="lognormal:60:0.3")
+    ap.add_argument("--llm-latency", default="lognormal:200:0.4")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    res = asyncio.run(run(args))
+    print(report(res, args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
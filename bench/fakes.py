@@ -0,0 +1,118 @@
+# bench/fakes.py
+#
+# Pengganti lokal & deterministik untuk ChatGoogleGenerativeAI dan GoogleGenerativeAIEmbeddings,
+# dipakai benchmark agar pipeline bisa diukur tanpa Gemini.
+
+import re
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import Any, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+class LatencyModel:
+    """
+    Sebaran latensi per panggilan. Spesifikasi string:
+      "0"                    -> tanpa jeda
+      "fixed:50"             -> 50 ms
+      "uniform:20:80"        -> 20..80 ms
+      "lognormal:800:0.4"    -> median 800 ms, sigma 0.4 (ekor panjang seperti API LLM)
+    """
+
+    def __init__(self, spec: str = "0", seed: int = 0):
+        self.spec = spec or "0"
+        parts = self.spec.split(":")
+        self.kind = parts[0] if len(parts) > 1 else "fixed"
+        self.args = [float(x) for x in (parts[1:] if len(parts) > 1 else parts)]
+        if self.kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"sebaran latensi tidak dikenal: {spec}")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_ms(self) -> float:
+        with self._lock:
+            if self.kind == "uniform":
+                return self._rng.uniform(self.args[0], self.args[1])
+            if self.kind == "lognormal":
+                median, sigma = self.args[0], (self.args[1] if len(self.args) > 1 else 0.5)
+                return median * self._rng.lognormvariate(0.0, sigma)
+            return self.args[0]
+
+    def wait(self) -> float:
+        ms = self.sample_ms()
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+        return ms
+
+class HashEmbeddings(Embeddings):
+    """
+    Embedding feature-hashing: tiap kata dipetakan ke beberapa dimensi bertanda lewat sha1,
+    lalu dinormalisasi. Deterministik dan teks yang berbagi kata tetap berdekatan,
+    sehingga hasil retrieval masuk akal untuk benchmark.
+    """
+
+    def __init__(self, dim: int = 768, latency: str = "0", seed: int = 0):
+        self.dim = dim
+        self.latency = LatencyModel(latency, seed)
+        self.calls = 0
+
+    def _vec(self, text: str) -> List[float]:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for w in _WORD.findall((text or "").lower()):
+            h = hashlib.sha1(w.encode("utf-8")).digest()
+            for j in range(0, 12, 4):
+                idx = int.from_bytes(h[j:j + 3], "little") % self.dim
+                v[idx] += 1.0 if h[j + 3] & 1 else -1.0
+        n = float(np.linalg.norm(v))
+        return (v / n if n > 0 else v).tolist()
+
+    def embed_documents(self, texts: List[str], *args, **kwargs) -> List[List[float]]:
+        self.calls += 1
+        self.latency.wait()  # satu panggilan API per batch
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str, *args, **kwargs) -> List[float]:
+        self.calls += 1
+        self.latency.wait()
+        return self._vec(text)
+
+class FakeChatModel:
+    """
+    Pengganti ChatGoogleGenerativeAI.invoke(messages) -> objek ber-.content.
+    Jawaban ditentukan dari hash prompt sehingga run berulang identik:
+    - prompt pemeriksa (kritik) menjawab "TIDAK" dengan peluang refine_rate (memicu refine),
+    - prompt lain mendapat teks ~response_chars karakter berikut blok "Rujukan:".
+    """
+
+    def __init__(self, latency: str = "0", response_chars: int = 600, refine_rate: float = 0.3, seed: int = 0):
+        self.latency = LatencyModel(latency, seed)
+        self.response_chars = response_chars
+        self.refine_rate = refine_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prompt_text(messages: Any) -> str:
+        if isinstance(messages, str):
+            return messages
+        return "\n".join(getattr(m, "content", str(m)) for m in (messages or []))
+
+    def invoke(self, messages: Any, *args, **kwargs) -> SimpleNamespace:
+        with self._lock:
+            self.calls += 1
+        prompt = self._prompt_text(messages)
+        self.latency.wait()
+        h = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        if "pemeriksa singkat" in prompt:
+            verdict = "TIDAK" if (h % 1000) / 1000.0 < self.refine_rate else "YA"
+            return SimpleNamespace(content=f"1) {verdict}: uji.\n2) YA: uji.\n3) YA: uji.")
+        if prompt.startswith("Buat rencana"):
+            return SimpleNamespace(content="- pahami istilah\n- cari kutipan\n- susun jawaban")
+        body = ("Kita bisa melihat ini sebagai proses yang wajar. " * (self.response_chars // 48 + 1))[: self.response_chars]
+        return SimpleNamespace(content=body.strip() + "\n\nRujukan: [book:Sintetis, page:1]")
@@ -0,0 +1,91 @@
+# bench/memory_archive_bench.py
+#
+# Bandingkan memori harian JSON (satu file per user per hari) dengan arsip Parquet hasil compact:
+# jumlah file & ukuran, waktu compact, latensi baca satu hari (!yesterday), dan pemindaian
+# pertanyaan teratas (pemanasan cache).
+#   python -m bench.memory_archive_bench --users 500 --days 60
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import agent_archive
+import agent_memory as mem
+from bench.corpus import synthetic_question, TOPICS
+from bench.pipeline_bench import percentile
+
+def generate(base_dir: str, users: int, days: int, turns: int, seed: int) -> int:
+    rng = random.Random(seed)
+    today = datetime.now(mem.ASIA_JAKARTA)
+    n = 0
+    for uid in range(1, users + 1):
+        for d in range(1, days + 1):
+            if rng.random() < 0.5:  # tidak semua user aktif setiap hari
+                continue
+            date = (today - timedelta(days=d)).strftime("%Y-%m-%d")
+            coll = rng.choice(list(TOPICS))
+            ts = [{"q": synthetic_question(rng, coll), "a": "jawaban " * 60, "c": coll}
+                  for _ in range(rng.randint(1, turns))]
+            dd = os.path.join(base_dir, str(uid), "daily")
+            os.makedirs(dd, exist_ok=True)
+            with open(os.path.join(dd, f"{date}.json"), "w", encoding="utf-8") as f:
+                mem.json.dump({"turns": ts, "daily_summary": "ringkasan " * 20}, f, ensure_ascii=False, indent=2)
+            n += 1
+    return n
+
+def tree_size(root: str):
+    files = size = 0
+    for dp, _, fns in os.walk(root):
+        for fn in fns:
+            files += 1
+            size += os.path.getsize(os.path.join(dp, fn))
+    return files, size
+
+def timed(fn, reps: int):
+    lat = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return lat
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark arsip Parquet memori harian")
+    ap.add_argument("--users", type=int, default=300)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--turns", type=int, default=6, help="giliran maksimum per user per hari")
+    ap.add_argument("--reads", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mem.BASE_DIR = os.path.join(tmp, "memory")
+        mem.ARCHIVE_DIR = os.path.join(tmp, "memory_archive")
+        n = generate(mem.BASE_DIR, args.users, args.days, args.turns, args.seed)
+        rng = random.Random(args.seed + 1)
+        probes = [(rng.randint(1, args.users), (datetime.now(mem.ASIA_JAKARTA) - timedelta(days=rng.randint(1, args.days)))
+                   .strftime("%Y-%m-%d")) for _ in range(args.reads)]
+
+        files, size = tree_size(mem.BASE_DIR)
+        json_read = timed(lambda: [mem.read_daily(u, d) for u, d in probes], 1)[0] / len(probes)
+        json_top = timed(lambda: mem.top_questions_by_collection(limit=10, days=30), 3)
+
+        t0 = time.perf_counter()
+        st = agent_archive.compact(mem.BASE_DIR, mem.ARCHIVE_DIR, mem.today_date_str())
+        compact_s = time.perf_counter() - t0
+        afiles, asize = tree_size(mem.ARCHIVE_DIR)
+        arch_read = timed(lambda: [mem.read_daily(u, d) for u, d in probes], 1)[0] / len(probes)
+        arch_top = timed(lambda: mem.top_questions_by_collection(limit=10, days=30), 3)
+
+        print(f"{n} hari-user, {st['turns']} giliran; compact {compact_s:.2f}s")
+        print(f"{'':<10}{'file':>9}{'MB':>9}{'baca hari (ms)':>16}{'top 30 hari p50 (ms)':>22}")
+        print(f"{'JSON':<10}{files:>9}{size / 1e6:>9.1f}{json_read:>16.2f}{percentile(json_top, 50):>22.0f}")
+        print(f"{'Parquet':<10}{afiles:>9}{asize / 1e6:>9.1f}{arch_read:>16.2f}{percentile(arch_top, 50):>22.0f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
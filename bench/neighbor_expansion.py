@@ -0,0 +1,66 @@
+# bench/neighbor_expansion.py
+#
+# Bandingkan k besar (k=12, cara lama agar lanjutan penjelasan ikut terambil) dengan k kecil +
+# ekspansi tetangga lewat indeks ketetanggaan (tools/adjacency.py) pada korpus sintetis:
+# latensi retrieval + format konteks, ukuran konteks, dan berapa banyak hit teratas yang chunk
+# lanjutannya ikut masuk konteks.
+#   python -m bench.neighbor_expansion --chunks 3000 --queries 200
+
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+
+from bench.corpus import build_corpus, synthetic_question, TOPICS
+from bench.fakes import HashEmbeddings, FakeChatModel
+
+def run(agent, questions: List[str], k: int, span: int, full_top_n: int = 3) -> Dict[str, float]:
+    agent._ret_cache = {}
+    agent._neighbor_cache.clear()  # semua cache dingin: ekspansi dan embedding dihitung ulang per run
+    agent.embeddings._items.clear()
+    t_total, chars, covered, tops = 0.0, 0, 0, 0
+    for q in questions:
+        t0 = time.perf_counter()
+        docs = agent.retrieve(q, k_override=k, use_mmr=False)
+        ctx = agent.format_context_compact(docs, full_top_n=full_top_n, tail_summaries_max=max(0, k - full_top_n),
+                                           neighbor_span=span)
+        t_total += time.perf_counter() - t0
+        chars += len(ctx)
+        for d in docs[:full_top_n]:
+            _, after = agent.chunk_neighbors(d.metadata, 1)
+            if after:
+                tops += 1
+                covered += after[0].page_content.split(". ")[0][:60] in ctx
+    n = max(1, len(questions))
+    return {"ms": 1000 * t_total / n, "chars": chars / n, "lanjutan": covered / max(1, tops)}
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="k besar vs k kecil + ekspansi chunk tetangga")
+    ap.add_argument("--chunks", type=int, default=3000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--small-k", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    from psionic_agent import PsionicAgent
+    emb = HashEmbeddings(dim=args.dim)
+    rng = random.Random(1)
+    questions = [synthetic_question(rng, rng.choice(list(TOPICS))) for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        build_corpus(tmp, args.chunks, emb)
+        llm = FakeChatModel()
+        agent = PsionicAgent(persist_dir=tmp, embeddings=emb, llm=llm, rewriter=llm, auto_refresh=False)
+        t0 = time.perf_counter()
+        for name in agent.list_collections():
+            agent.adjacency(name)
+        print(f"indeks ketetanggaan: {sum(len(agent.adjacency(n)) for n in agent.collections)} chunk "
+              f"dalam {1000 * (time.perf_counter() - t0):.0f} ms")
+        print(f"{'konfigurasi':<24}{'ms/kueri':>10}{'konteks':>10}{'lanjutan':>10}")
+        for label, k, span in (("k=12", 12, 0), (f"k={args.small_k} + tetangga", args.small_k, 1)):
+            r = run(agent, questions, k, span)
+            print(f"{label:<24}{r['ms']:>10.2f}{r['chars']:>10.0f}{100 * r['lanjutan']:>9.0f}%")
+        agent.close()
+
+if __name__ == "__main__":
+    main()
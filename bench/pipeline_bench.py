@@ -0,0 +1,199 @@
+# bench/pipeline_bench.py
+#
+# Benchmark offline PsionicAgent/AgentBrain dengan backend palsu (bench/fakes.py) di atas korpus sintetis.
+#   python -m bench.pipeline_bench                                   # default
+#   python -m bench.pipeline_bench --sizes 2000,20000 --concurrency 1,8,32 --json hasil.json
+#   python -m bench.pipeline_bench --compare hasil_lama.json         # bandingkan dengan commit lain
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from agent_perf import PERF
+from bench.fakes import HashEmbeddings, FakeChatModel
+from bench.corpus import build_corpus, synthetic_question, TOPICS
+
+TARGETS = ("retrieve", "smart_retrieve", "pipeline")
+
+def percentile(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    data = sorted(vals)
+    return data[min(len(data) - 1, max(0, math.ceil(q / 100.0 * len(data)) - 1))]
+
+def run_load(fn: Callable[[str], Any], questions: List[str], concurrency: int) -> Dict[str, float]:
+    """Jalankan fn untuk semua pertanyaan dengan `concurrency` worker; kembalikan throughput & latensi."""
+    lat: List[float] = []
+    errors = 0
+
+    def one(q: str):
+        t0 = time.perf_counter()
+        try:
+            fn(q)
+            return time.perf_counter() - t0, None
+        except Exception as e:
+            return time.perf_counter() - t0, e
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for dt, err in pool.map(one, questions):
+            lat.append(dt * 1000.0)
+            errors += err is not None
+    wall = time.perf_counter() - t0
+    return {
+        "n": len(questions),
+        "errors": errors,
+        "wall_s": wall,
+        "rps": len(questions) / wall if wall > 0 else 0.0,
+        "mean_ms": sum(lat) / len(lat) if lat else 0.0,
+        "p50_ms": percentile(lat, 50),
+        "p95_ms": percentile(lat, 95),
+        "p99_ms": percentile(lat, 99),
+    }
+
+def make_pair(persist_dir: str, args) -> Any:
+    from psionic_agent import PsionicAgent
+    from agent_brain import AgentBrain
+
+    embed = HashEmbeddings(dim=args.dim, latency=args.embed_latency, seed=1)
+    llm = FakeChatModel(latency=args.llm_latency, refine_rate=args.refine_rate, seed=2)
+    agent = PsionicAgent(
+        persist_dir=persist_dir,
+        use_quant_index=args.quant,
+        embeddings=embed,
+        llm=llm,
+        rewriter=llm,
+        embed_batch=args.embed_batch,
+    )
+    return agent, AgentBrain(agent, llm=llm)
+
+def make_questions(n: int, seed: int, unique: bool) -> List[str]:
+    rng = random.Random(seed)
+    colls = list(TOPICS)
+    pool = [synthetic_question(rng, colls[i % len(colls)]) for i in range(n if unique else max(1, n // 4))]
+    return [pool[i % len(pool)] for i in range(n)]
+
+def bench_size(size: int, persist_dir: str, args) -> List[Dict[str, Any]]:
+    agent, brain = make_pair(persist_dir, args)
+    fns: Dict[str, Callable[[str], Any]] = {
+        "retrieve": lambda q: agent.retrieve(q),
+        "smart_retrieve": lambda q: agent.smart_retrieve(q),
+        "pipeline": lambda q: brain.answer_with_pipeline(
+            user_id=0, question=q, style="terapis", mode=args.mode, history_window=[], memory_summary=None
+        ),
+    }
+    rows = []
+    run = 0
+    for target in args.targets:
+        for conc in args.concurrency:
+            run += 1
+            if not args.cache:
+                agent._ret_cache = {}
+            n = args.requests if target != "pipeline" else args.pipeline_requests
+            questions = make_questions(n, seed=size * 1000 + run, unique=not args.cache)
+            PERF.reset()
+            res = run_load(fns[target], questions, conc)
+            snap = PERF.snapshot()
+            res.update({
+                "size": size,
+                "target": target,
+                "concurrency": conc,
+                "stages_p50_ms": {k: round(v["p50"], 2) for k, v in snap["stages"].items()},
+                "values_p50": {k: v["p50"] for k, v in snap["values"].items()},
+            })
+            rows.append(res)
+            print(format_row(res), flush=True)
+    agent.close()
+    return rows
+
+HEADER = f"{'size':>7} {'target':<15}{'conc':>5}{'n':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+
+def format_row(r: Dict[str, Any]) -> str:
+    return (f"{r['size']:>7} {r['target']:<15}{r['concurrency']:>5}{r['n']:>6}{r['errors']:>5}"
+            f"{r['rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+
+def compare(rows: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[str]:
+    """Selisih req/s dan p95 terhadap hasil lama (dicocokkan per size/target/concurrency)."""
+    base = {(r["size"], r["target"], r["concurrency"]): r for r in baseline}
+    out = [f"{'size':>7} {'target':<15}{'conc':>5}{'req/s lama':>12}{'req/s baru':>12}{'Δ%':>8}{'p95 lama':>10}{'p95 baru':>10}"]
+    for r in rows:
+        b = base.get((r["size"], r["target"], r["concurrency"]))
+        if not b:
+            continue
+        delta = 100.0 * (r["rps"] - b["rps"]) / b["rps"] if b["rps"] else 0.0
+        out.append(f"{r['size']:>7} {r['target']:<15}{r['concurrency']:>5}{b['rps']:>12.1f}{r['rps']:>12.1f}"
+                   f"{delta:>+8.1f}{b['p95_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    return out
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark pipeline offline (LLM & embedding palsu)")
+    ap.add_argument("--sizes", type=_ints, default=[2000, 10000], help="jumlah chunk korpus, dipisah koma")
+    ap.add_argument("--concurrency", type=_ints, default=[1, 4, 16])
+    ap.add_argument("--targets", type=lambda s: [t for t in s.split(",") if t], default=list(TARGETS))
+    ap.add_argument("--requests", type=int, default=64, help="permintaan per run retrieve/smart_retrieve")
+    ap.add_argument("--pipeline-requests", type=int, default=32)
+    ap.add_argument("--mode", default="ringkas")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--embed-latency", default="lognormal:60:0.3")
+    ap.add_argument("--llm-latency", default="lognormal:200:0.4")
+    ap.add_argument("--refine-rate", type=float, default=0.3)
+    ap.add_argument("--embed-batch", type=int, default=0, help="ukuran maksimum micro-batch embedding (0 = mati)")
+    ap.add_argument("--quant", action="store_true", help="pakai indeks int8")
+    ap.add_argument("--cache", action="store_true", help="izinkan pertanyaan berulang (cache hangat)")
+    ap.add_argument("--persist-root", default=None, help="simpan korpus di sini (dipakai ulang antar run)")
+    ap.add_argument("--json", default=None, help="tulis hasil ke file JSON")
+    ap.add_argument("--compare", default=None, help="file JSON hasil run sebelumnya")
+    args = ap.parse_args(argv)
+    bad = [t for t in args.targets if t not in TARGETS]
+    if bad:
+        ap.error(f"target tidak dikenal: {', '.join(bad)}")
+
+    rows: List[Dict[str, Any]] = []
+    tmp = None if args.persist_root else tempfile.TemporaryDirectory()
+    root = args.persist_root or tmp.name
+    print(HEADER)
+    try:
+        for size in args.sizes:
+            persist_dir = os.path.join(root, f"corpus_{size}_{args.dim}", "vectorstore")
+            if not os.path.exists(persist_dir):
+                t0 = time.perf_counter()
+                build_corpus(persist_dir, size, HashEmbeddings(dim=args.dim))
+                print(f"# korpus {size} chunk dibangun dalam {time.perf_counter() - t0:.1f}s", flush=True)
+            rows.extend(bench_size(size, persist_dir, args))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    meta = {"git": git_rev(), "time": time.time(), "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")}}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "rows": rows}, f, indent=2)
+        print(f"Hasil disimpan ke {args.json}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"\nDibandingkan dengan {old.get('meta', {}).get('git') or args.compare}:")
+        print("\n".join(compare(rows, old.get("rows", []))))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# bench/quant_recall.py
+#
+# Bandingkan indeks int8 (tools/quant_index.py) dengan pencarian float32 eksak.
+#   python -m bench.quant_recall                      # korpus sintetis
+#   python -m bench.quant_recall --persist-dir ./bundle_psionic/vectorstore
+
+import os
+import time
+import argparse
+import tempfile
+from typing import List, Tuple
+
+import numpy as np
+
+from tools.quant_index import QuantizedIndex, _exact_distance
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Vektor ter-kluster & ternormalisasi, mirip sebaran embedding teks."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=n)
+    vecs = centers[assign] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs.astype(np.float32)
+
+def load_collection_vectors(persist_dir: str, name: str) -> Tuple[List[str], np.ndarray, str]:
+    from chromadb import PersistentClient
+    from chromadb.config import Settings
+    client = PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    coll = client.get_collection(name)
+    ids, vecs, offset, total = [], [], 0, coll.count()
+    while offset < total:
+        got = coll.get(include=["embeddings"], limit=1000, offset=offset)
+        ids.extend(got["ids"]); vecs.extend(got["embeddings"])
+        offset += 1000
+    return ids, np.asarray(vecs, dtype=np.float32), (coll.metadata or {}).get("hnsw:space", "l2")
+
+def run(ids: List[str], vecs: np.ndarray, queries: np.ndarray, ks: List[int], space: str, rescore_factor: int) -> List[str]:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        idx = QuantizedIndex.build(ids, vecs, tmp, space=space)
+        idx.rescore_factor = rescore_factor
+        ratio = idx.float32_bytes() / max(1, idx.memory_bytes())
+        rows.append(f"N={len(ids)} dim={vecs.shape[1]} space={space} rescore_factor={rescore_factor}")
+        rows.append(f"memori float32={idx.float32_bytes()/1e6:.2f} MB  int8={idx.memory_bytes()/1e6:.2f} MB  rasio={ratio:.2f}x")
+        rows.append(f"{'k':>4} {'recall@k':>9} {'exact ms':>9} {'int8 ms':>9}")
+        pos = {i: n for n, i in enumerate(ids)}
+        for k in ks:
+            hit = 0; t_exact = 0.0; t_q = 0.0
+            for q in queries:
+                t0 = time.perf_counter()
+                d = _exact_distance(vecs, q, space)
+                truth = set(np.argsort(d)[:k].tolist())
+                t_exact += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                got = idx.search(q, k)
+                t_q += time.perf_counter() - t0
+                hit += len(truth & {pos[g] for g, _ in got})
+            nq = max(1, len(queries))
+            rows.append(f"{k:>4} {hit/(nq*k):>9.3f} {1000*t_exact/nq:>9.2f} {1000*t_q/nq:>9.2f}")
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall@k & memori indeks int8 vs float32")
+    ap.add_argument("--persist-dir", default=None)
+    ap.add_argument("--collection", default=None)
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", default="5,12")
+    ap.add_argument("--rescore-factor", type=int, default=4)
+    args = ap.parse_args()
+    ks = [int(x) for x in args.k.split(",") if x]
+
+    if args.persist_dir:
+        from chromadb import PersistentClient
+        from chromadb.config import Settings
+        client = PersistentClient(path=os.path.abspath(args.persist_dir), settings=Settings(anonymized_telemetry=False, allow_reset=True))
+        names = [args.collection] if args.collection else [c.name for c in client.list_collections()]
+        for name in names:
+            ids, vecs, space = load_collection_vectors(os.path.abspath(args.persist_dir), name)
+            rng = np.random.default_rng(1)
+            pick = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+            queries = vecs[pick] + 0.05 * rng.normal(size=(len(pick), vecs.shape[1])).astype(np.float32)
+            print(f"[{name}]")
+            print("\n".join(run(ids, vecs, queries, ks, space, args.rescore_factor)))
+        return
+
+    vecs = synthetic_vectors(args.n, args.dim)
+    ids = [f"c{i}" for i in range(args.n)]
+    queries = synthetic_vectors(args.queries, args.dim, seed=1)
+    print("\n".join(run(ids, vecs, queries, ks, "l2", args.rescore_factor)))
+
+if __name__ == "__main__":
+    main()
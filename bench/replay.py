@@ -0,0 +1,296 @@
+# bench/replay.py
+#
+# Putar ulang pertanyaan nyata dari storage/memory/<user>/daily/*.json + arsip Parquet (dianonimkan)
+# terhadap beberapa konfigurasi agent, dengan LLM palsu.
+#   python -m bench.replay --config base:k=5 --config mmr:k=5,mmr=1 --config k8:k=8
+#   python -m bench.replay --export anon.jsonl                      # simpan pertanyaan anonim saja
+#   python -m bench.replay --questions anon.jsonl --embeddings recorded --config ...
+#
+# Embedding kueri:
+#   --embeddings gemini    embedding Gemini asli; hasilnya direkam ke --embed-cache
+#   --embeddings recorded  hanya dari rekaman --embed-cache (offline; kueri tanpa rekaman dilewati)
+#   --embeddings hash      HashEmbeddings (untuk korpus sintetis bench.corpus)
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from langchain_core.embeddings import Embeddings
+
+from agent_perf import PERF
+from bench.fakes import HashEmbeddings, FakeChatModel
+from bench.pipeline_bench import percentile
+
+TIERS = ("retrieval", "draft", "full")
+
+# ---------- anonimisasi ----------
+_EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+_URL = re.compile(r"https?://\S+")
+_MENTION = re.compile(r"<[@#!&]+\d+>|@\w+")
+_LONG_NUM = re.compile(r"\b\d[\d\s\-]{5,}\d\b")
+
+def anonymize_question(q: str) -> str:
+    q = _URL.sub("<url>", q)
+    q = _EMAIL.sub("<email>", q)
+    q = _MENTION.sub("<user>", q)
+    q = _LONG_NUM.sub("<angka>", q)
+    return " ".join(q.split())
+
+def anon_user(user_id: str, salt: str) -> str:
+    return hashlib.sha1(f"{salt}\x00{user_id}".encode("utf-8")).hexdigest()[:10]
+
+def load_questions(base_dir: str, salt: str = "psionic", days: Optional[int] = None,
+                   archive_dir: Optional[str] = None) -> List[Dict[str, str]]:
+    """Pertanyaan dari log harian (+ arsip Parquet bila ada), urut tanggal (urutan asli per hari dipertahankan)."""
+    records: List[Tuple[str, str, int, str]] = []
+    if archive_dir and os.path.isdir(archive_dir):
+        import agent_archive
+        import pyarrow.compute as pc
+        d = agent_archive.dataset(archive_dir)
+        if d is not None:
+            t = d.to_table(columns=["user_id", "date", "turn", "q"], filter=pc.field("turn") >= 0)
+            for uid, date, i, q in zip(*(t.column(c).to_pylist() for c in ("user_id", "date", "turn", "q"))):
+                q = (q or "").strip()
+                if q:
+                    records.append((date, anon_user(str(uid), salt), i, anonymize_question(q)))
+    if not os.path.isdir(base_dir):
+        base_dir = ""
+    for uid in (os.listdir(base_dir) if base_dir else []):
+        dd = os.path.join(base_dir, uid, "daily")
+        if not os.path.isdir(dd):
+            continue
+        for fn in os.listdir(dd):
+            if not fn.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(dd, fn), "r", encoding="utf-8") as f:
+                    turns = json.load(f).get("turns", [])
+            except (OSError, ValueError):
+                continue
+            for i, t in enumerate(turns):
+                q = (t.get("q") or "").strip()
+                if q:
+                    records.append((fn[:-5], anon_user(uid, salt), i, anonymize_question(q)))
+    records.sort()
+    if days:
+        dates = sorted({r[0] for r in records})[-days:]
+        records = [r for r in records if r[0] in set(dates)]
+    return [{"date": d, "user": u, "q": q} for d, u, _, q in records]
+
+def read_jsonl(path: str) -> List[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------- embedding terekam ----------
+class RecordedEmbeddings(Embeddings):
+    """Embedding kueri dari rekaman SQLite; bila ada `inner`, miss dihitung lalu direkam."""
+
+    def __init__(self, cache_path: str, model: str, inner: Optional[Embeddings] = None):
+        from ingest import EmbeddingCache
+        self.cache = EmbeddingCache(cache_path, f"{model}#query")
+        self.inner = inner
+        self.missing = 0
+
+    def has(self, text: str) -> bool:
+        return self.inner is not None or 0 in self.cache.get_many([text])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        got = self.cache.get_many([text])
+        if 0 in got:
+            return got[0]
+        if self.inner is None:
+            self.missing += 1
+            raise KeyError("embedding kueri belum terekam")
+        vec = self.inner.embed_query(text)
+        self.cache.put_many([text], [vec])
+        return vec
+
+# ---------- konfigurasi ----------
+def parse_config(spec: str) -> Dict[str, Any]:
+    """'nama:k=5,mmr=1,tier=draft,cache=0,quant=1' -> dict."""
+    name, _, body = spec.partition(":")
+    cfg: Dict[str, Any] = {"name": name or spec, "k": 5, "mmr": False, "tier": "retrieval", "cache": True, "quant": False}
+    for part in filter(None, body.split(",")):
+        key, _, val = part.partition("=")
+        key = key.strip()
+        if key == "k":
+            cfg["k"] = int(val)
+        elif key in ("mmr", "cache", "quant"):
+            cfg[key] = val.strip().lower() in ("1", "true", "ya", "on")
+        elif key == "tier":
+            if val not in TIERS:
+                raise ValueError(f"tier harus salah satu dari {TIERS}")
+            cfg["tier"] = val
+        else:
+            raise ValueError(f"opsi konfigurasi tidak dikenal: {key}")
+    return cfg
+
+def doc_keys(docs: Iterable[Any]) -> List[Tuple]:
+    out = []
+    for d in docs:
+        md = getattr(d, "metadata", {}) or {}
+        out.append((md.get("source"), md.get("page"), md.get("chunk_index")))
+    return out
+
+def jaccard(a: Iterable, b: Iterable) -> float:
+    sa, sb = set(a), set(b)
+    if not sa and not sb:
+        return 1.0
+    return len(sa & sb) / len(sa | sb)
+
+def replay_config(cfg: Dict[str, Any], questions: List[Dict[str, str]], persist_dir: str,
+                  embeddings: Embeddings, llm_latency: str) -> Dict[str, Any]:
+    from psionic_agent import PsionicAgent
+    from agent_brain import AgentBrain
+
+    llm = FakeChatModel(latency=llm_latency, seed=2)
+    agent = PsionicAgent(
+        persist_dir=persist_dir,
+        retrieval_k=cfg["k"],
+        use_mmr=cfg["mmr"],
+        use_quant_index=cfg["quant"],
+        embeddings=embeddings,
+        llm=llm,
+        rewriter=llm,
+        auto_refresh=False,
+    )
+    if not cfg["cache"]:
+        agent._ret_ttl = -1.0             # setiap lookup kedaluwarsa
+        agent.embeddings.max_items = 0    # LRU embedding kueri tidak menyimpan apa pun
+    brain = AgentBrain(agent, llm=llm)
+
+    PERF.reset()
+    lat: List[float] = []
+    results: Dict[int, List[Tuple]] = {}
+    skipped = 0
+    for i, rec in enumerate(questions):
+        q = rec["q"]
+        if isinstance(embeddings, RecordedEmbeddings) and not embeddings.has(q):
+            embeddings.missing += 1
+            skipped += 1
+            continue
+        t0 = time.perf_counter()
+        if cfg["tier"] == "full":
+            _, docs, _ = brain.answer_with_pipeline(0, q, "terapis", "ringkas", [], None)
+        else:
+            docs = agent.retrieve(q, k_override=cfg["k"], use_mmr=cfg["mmr"])
+            if cfg["tier"] == "draft":
+                agent.answer_from_docs(docs, q)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        results[i] = doc_keys(docs)
+    snap = PERF.snapshot()["counters"]
+    agent.close()
+
+    def rate(name: str) -> Optional[float]:
+        hit, miss = snap.get(f"{name}_hit", 0), snap.get(f"{name}_miss", 0)
+        return hit / (hit + miss) if hit + miss else None
+
+    return {
+        "config": cfg,
+        "n": len(lat),
+        "skipped": skipped,
+        "p50_ms": percentile(lat, 50),
+        "p95_ms": percentile(lat, 95),
+        "p99_ms": percentile(lat, 99),
+        "mean_ms": sum(lat) / len(lat) if lat else 0.0,
+        "retrieval_cache_hit_rate": rate("retrieval_cache"),
+        "embed_cache_hit_rate": rate("embed_cache"),
+        "docs": results,
+    }
+
+def overlap(base: Dict[int, List[Tuple]], other: Dict[int, List[Tuple]]) -> Dict[str, float]:
+    common = [i for i in base if i in other]
+    if not common:
+        return {"jaccard_mean": 0.0, "jaccard_p10": 0.0, "top1_agree": 0.0}
+    js = [jaccard(base[i], other[i]) for i in common]
+    top1 = [bool(base[i]) and bool(other[i]) and base[i][0] == other[i][0] for i in common]
+    return {
+        "jaccard_mean": sum(js) / len(js),
+        "jaccard_p10": percentile(js, 10),
+        "top1_agree": sum(top1) / len(top1),
+    }
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    def pct(x):
+        return "-" if x is None else f"{100 * x:.0f}%"
+    lines = [f"{'config':<14}{'tier':<11}{'k':>3}{'mmr':>5}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}"
+             f"{'ret-cache':>11}{'emb-cache':>11}{'jaccard':>9}{'top1':>7}"]
+    base = rows[0]["docs"] if rows else {}
+    for r in rows:
+        c = r["config"]
+        ov = overlap(base, r["docs"])
+        lines.append(
+            f"{c['name']:<14}{c['tier']:<11}{c['k']:>3}{'ya' if c['mmr'] else '-':>5}{r['n']:>6}"
+            f"{r['p50_ms']:>8.1f}{r['p95_ms']:>8.1f}{r['p99_ms']:>8.1f}"
+            f"{pct(r['retrieval_cache_hit_rate']):>11}{pct(r['embed_cache_hit_rate']):>11}"
+            f"{ov['jaccard_mean']:>9.2f}{ov['top1_agree']:>7.2f}"
+        )
+    lines.append("(jaccard/top1 dibandingkan dengan konfigurasi pertama; latensi dalam ms)")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Replay pertanyaan nyata terhadap beberapa konfigurasi agent")
+    ap.add_argument("--memory-dir", default=os.path.join("storage", "memory"))
+    ap.add_argument("--archive-dir", default=os.path.join("storage", "memory_archive"), help="arsip Parquet hasil compact")
+    ap.add_argument("--questions", default=None, help="JSONL hasil --export (menggantikan --memory-dir)")
+    ap.add_argument("--export", default=None, help="tulis pertanyaan anonim ke JSONL lalu keluar")
+    ap.add_argument("--salt", default=os.getenv("REPLAY_SALT", "psionic"), help="garam hash id user")
+    ap.add_argument("--days", type=int, default=None, help="hanya N hari terakhir")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--persist-dir", default=os.getenv("PERSIST_DIR", "./bundle_psionic/vectorstore"))
+    ap.add_argument("--embeddings", choices=["gemini", "recorded", "hash"], default="recorded")
+    ap.add_argument("--embed-model", default="models/text-embedding-004")
+    ap.add_argument("--embed-cache", default=None, help="default <bundle>/replay_query_embeddings.sqlite3")
+    ap.add_argument("--dim", type=int, default=768, help="dimensi untuk --embeddings hash")
+    ap.add_argument("--llm-latency", default="0")
+    ap.add_argument("--config", action="append", default=[], help="nama:k=5,mmr=0,tier=retrieval,cache=1,quant=0")
+    ap.add_argument("--json", default=None)
+    args = ap.parse_args(argv)
+
+    questions = read_jsonl(args.questions) if args.questions else load_questions(args.memory_dir, args.salt, args.days, args.archive_dir)
+    if args.limit:
+        questions = questions[: args.limit]
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for rec in questions:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        print(f"{len(questions)} pertanyaan anonim ditulis ke {args.export}")
+        return 0
+    if not questions:
+        print("Tidak ada pertanyaan untuk diputar ulang.")
+        return 1
+
+    persist_dir = os.path.abspath(args.persist_dir)
+    if args.embeddings == "hash":
+        embeddings: Embeddings = HashEmbeddings(dim=args.dim)
+    else:
+        cache_path = args.embed_cache or os.path.join(os.path.dirname(persist_dir), "replay_query_embeddings.sqlite3")
+        inner = None
+        if args.embeddings == "gemini":
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            inner = GoogleGenerativeAIEmbeddings(model=args.embed_model)
+        embeddings = RecordedEmbeddings(cache_path, args.embed_model, inner)
+
+    configs = [parse_config(s) for s in (args.config or ["base:k=5"])]
+    print(f"{len(questions)} pertanyaan, {len({r['user'] for r in questions})} user anonim")
+    rows = [replay_config(cfg, questions, persist_dir, embeddings, args.llm_latency) for cfg in configs]
+    print(format_report(rows))
+    if isinstance(embeddings, RecordedEmbeddings) and embeddings.missing:
+        print(f"{embeddings.missing} kueri dilewati: embedding belum terekam (jalankan sekali dengan --embeddings gemini)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "docs"} for r in rows], f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
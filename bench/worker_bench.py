@@ -0,0 +1,133 @@
+# bench/worker_bench.py
+#
+# Skala mode gateway + worker: N proses worker.py (backend palsu) mengambil job "ask" dari antrean SQLite,
+# gateway tiruan memasukkan job bersamaan dan mengukur throughput, latensi, lag antrean, dan sebaran kerja.
+#   python -m bench.worker_bench --workers 1,2,4 --jobs 400
+#   python -m bench.worker_bench --workers 4 --llm-latency fixed:0 --embed-latency fixed:0   # murni CPU
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from agent_perf import PERF
+from agent_jobs import JobQueue, JobClient
+from bench.fakes import HashEmbeddings, FakeChatModel
+from bench.corpus import build_corpus, synthetic_question, TOPICS
+from bench.pipeline_bench import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def fake_pair(fresh: bool, scheduler=None, breaker=None):
+    """Pabrik worker (worker.py --factory bench.worker_bench:fake_pair); konfigurasi lewat env BENCH_*."""
+    from psionic_agent import PsionicAgent
+    from agent_brain import AgentBrain
+    emb = HashEmbeddings(dim=int(os.environ["BENCH_DIM"]), latency=os.environ["BENCH_EMBED_LATENCY"], seed=1)
+    llm = FakeChatModel(latency=os.environ["BENCH_LLM_LATENCY"], seed=2)
+    agent = PsionicAgent(persist_dir=os.environ["BENCH_PERSIST_DIR"], embeddings=emb, llm=llm, rewriter=llm,
+                         fresh_client=fresh, auto_refresh=False, scheduler=scheduler, breaker=breaker)
+    return agent, AgentBrain(agent, llm=llm, scheduler=scheduler, breaker=breaker, answer_cache_size=0)
+
+def spawn(n: int, queue_path: str, threads: int, env: Dict[str, str]) -> List[subprocess.Popen]:
+    return [subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "worker.py"), "--name", f"w{i}", "--queue", queue_path,
+         "--threads", str(threads), "--factory", "bench.worker_bench:fake_pair"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    ) for i in range(1, n + 1)]
+
+async def drive(client: JobClient, questions: List[str], concurrency: int, timeout_s: float) -> Dict[str, Any]:
+    lat: List[float] = []
+    lag: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+
+    async def sample_lag():
+        while not stop.is_set():
+            lag.append((await asyncio.to_thread(client.queue.stats))["lag_ms"])
+            await asyncio.sleep(0.1)
+
+    async def one(i: int, q: str):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await client.submit("ask", {"tenant": 1000 + i, "guild": None, "args": {
+                    "user_id": 1000 + i, "question": q, "style": "terapis", "mode": "ringkas",
+                    "history_window": [], "memory_summary": None,
+                }}, timeout_s)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+            except Exception:
+                errors += 1
+
+    mon = asyncio.create_task(sample_lag())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await mon
+    return {"wall_s": wall, "lat": lat, "lag": lag, "errors": errors}
+
+def run_one(n_workers: int, args, persist_dir: str, tmp: str) -> Dict[str, Any]:
+    queue_path = os.path.join(tmp, f"queue_{n_workers}.db")
+    env = {**os.environ, "BENCH_PERSIST_DIR": persist_dir, "BENCH_DIM": str(args.dim),
+           "BENCH_LLM_LATENCY": args.llm_latency, "BENCH_EMBED_LATENCY": args.embed_latency,
+           "TRACE_PATH": "", "PERF_DUMP_SECONDS": "0", "WARMUP_POPULAR_N": "0", "PYTHONPATH": ROOT}
+    queue = JobQueue(queue_path, max_depth=0)
+    procs = spawn(n_workers, queue_path, args.threads, env)
+    try:
+        t0 = time.perf_counter()
+        while sum(1 for w in queue.workers() if w["alive"] and w["state"] == "ready") < n_workers:
+            if time.perf_counter() - t0 > 120 or any(p.poll() is not None for p in procs):
+                raise RuntimeError("worker gagal siap")
+            time.sleep(0.2)
+        rng = random.Random(args.seed)
+        topics = list(TOPICS)
+        questions = [synthetic_question(rng, rng.choice(topics)) for _ in range(args.jobs)]
+        PERF.reset()
+        res = asyncio.run(drive(JobClient(queue), questions, args.concurrency, args.timeout_s))
+        time.sleep(2.5)  # heartbeat terakhir memuat jumlah job selesai
+        res["per_worker"] = {w["name"]: w.get("done", 0) for w in queue.workers()}
+        res["job_wait"] = PERF.percentile("job_wait", 50)
+        res["job_run"] = PERF.percentile("job_run", 50)
+        return res
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=30)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark gateway + N proses worker")
+    ap.add_argument("--workers", default="1,2,4", help="daftar jumlah worker, dipisah koma")
+    ap.add_argument("--threads", type=int, default=4, help="job bersamaan per worker")
+    ap.add_argument("--jobs", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=64, help="job yang menunggu bersamaan di gateway")
+    ap.add_argument("--chunks", type=int, default=3000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--embed-latency", default="lognormal:60:0.3")
+    ap.add_argument("--llm-latency", default="lognormal:200:0.4")
+    ap.add_argument("--timeout-s", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_dir = os.path.join(tmp, "vectorstore")
+        build_corpus(persist_dir, args.chunks, HashEmbeddings(dim=args.dim))
+        print(f"{'worker':>6}{'job/s':>8}{'p50':>8}{'p95':>8}{'lag max':>9}{'tunggu':>8}{'jalan':>8}{'gagal':>7}  sebaran")
+        for n in [int(x) for x in args.workers.split(",") if x.strip()]:
+            r = run_one(n, args, persist_dir, tmp)
+            print(f"{n:>6}{len(r['lat']) / r['wall_s']:>8.1f}{percentile(r['lat'], 50):>8.0f}"
+                  f"{percentile(r['lat'], 95):>8.0f}{max(r['lag'] or [0]):>9.0f}{r['job_wait']:>8.0f}"
+                  f"{r['job_run']:>8.0f}{r['errors']:>7}  {r['per_worker']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
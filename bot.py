@@ -2,7 +2,17 @@
 
 import os
 import sys
+import time
+import asyncio
+import atexit
 import logging
+import subprocess
+from functools import partial
+from collections import Counter
+from datetime import time as dt_time
+from concurrent.futures import ThreadPoolExecutor
+
+BOOT_T0 = time.perf_counter()
 from typing import Dict, List, Tuple, Optional
 from dotenv import load_dotenv
 
@@ -18,15 +28,45 @@ logging.getLogger("chromadb").setLevel(logging.ERROR)
 import discord
 from discord.ext import commands, tasks
 
-from psionic_agent import PsionicAgent
-from agent_brain import AgentBrain
-from agent_session import SessionManager
+# psionic_agent/agent_brain (chromadb, langchain, google-genai) diimpor lazy di agent_factory.build_agent_pair
+from agent_runtime import AgentRuntime
+from agent_perf import PERF
+from agent_scheduler import SchedulerBusy, INTERACTIVE, BACKGROUND
+from agent_jobs import JobQueue, JobClient, run_job, dump_docs, load_docs
+from agent_factory import (
+    PERF_DUMP_PATH, PERF_DUMP_SECONDS, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, STARTUP_TIMINGS,
+    build_agent_pair, warmup_queries, configure_tracing, make_scheduler, make_breaker, chunk_texts_reader,
+)
+from agent_session import SessionManager, session_to_dict, session_from_dict
+from agent_state import SharedDict, make_backend
+from agent_nightly import DailySummaryBatch
+from agent_prefetch import SessionPrefetcher, session_context
 import agent_memory as mem
+from tools.citations import format_citations, format_passage
 
 # ================== ENV & BOOT ==================
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-PERSIST_DIR = os.getenv("PERSIST_DIR", "./bundle_psionic/vectorstore")
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")  # background | blocking
+WARMING_UP_REPLY = "Agen masih pemanasan (memuat indeks buku). Coba lagi sebentar lagi, ya."
+PERF_HTTP_PORT = int(os.getenv("PERF_HTTP_PORT", "0"))         # 0 = endpoint /metrics mati
+WORKERS = int(os.getenv("WORKERS", "0"))  # 0 = agen di proses bot; N = gateway + N proses worker.py
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./storage/jobs/queue.db")
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))       # job bersamaan per worker
+JOB_TIMEOUT_S = float(os.getenv("JOB_TIMEOUT_S", "60"))      # gateway berhenti menunggu -> "sedang ramai"
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "200"))       # job antre maksimum; 0 = tanpa batas
+CATALOG_TTL_S = float(os.getenv("CATALOG_TTL_S", "60"))      # cache daftar koleksi/buku di gateway
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")         # memory | sqlite (bersama antar shard/proses)
+STATE_PATH = os.getenv("STATE_PATH", "./storage/state/state.db")
+STATE_CACHE_TTL_S = float(os.getenv("STATE_CACHE_TTL_S", "2"))  # umur cache baca state per proses
+MEMORY_COMPACT_AT = os.getenv("MEMORY_COMPACT_AT", "").strip()  # "HH:MM" WIB: padatkan memori harian ke Parquet; kosong = mati
+NIGHTLY_SUMMARY_AT = os.getenv("NIGHTLY_SUMMARY_AT", "02:00").strip()  # "HH:MM" WIB: ringkasan harian semua user; kosong = mati
+NIGHTLY_SUMMARY_CONCURRENCY = int(os.getenv("NIGHTLY_SUMMARY_CONCURRENCY", "2"))  # panggilan LLM batch bersamaan
+NIGHTLY_SUMMARY_USERS_PER_CALL = int(os.getenv("NIGHTLY_SUMMARY_USERS_PER_CALL", "8"))
+SESSION_PREFETCH = os.getenv("SESSION_PREFETCH", "1") == "1"  # jangkar sesi !new + prefetch latar setelah menjawab
+SESSION_PREFETCH_MAX_INFLIGHT = int(os.getenv("SESSION_PREFETCH_MAX_INFLIGHT", "1"))
+SOURCE_FULL_SPAN = int(os.getenv("SOURCE_FULL_SPAN", "1"))   # !source full: chunk tetangga per sisi (0 = tanpa)
+BUSY_REPLY = "Maaf, bot sedang ramai. Coba tanyakan lagi sebentar lagi, ya."
 
 if not DISCORD_TOKEN:
     print("ERROR: DISCORD_TOKEN tidak ditemukan di .env")
@@ -43,25 +83,151 @@ MEMORY_ON_DEFAULT = True
 HISTORY_WINDOW_SIZE = 3
 SUMMARY_TRIGGER_TURNS = 8
 
-USER_STYLE: Dict[int, str] = {}
-USER_MODE: Dict[int, str] = {}
-USER_DM_PREF: Dict[int, bool] = {}
-USER_LAST_DOCS: Dict[int, List[object]] = {}
-USER_MEMORY_ON: Dict[int, bool] = {}
-USER_HISTORY: Dict[int, List[Tuple[str, str]]] = {}
-USER_SUMMARY: Dict[int, str] = {}
-USER_DEFAULT_COLL: Dict[int, str] = {}
-
-sessions = SessionManager()
+# state per user lewat backend bersama (STATE_BACKEND=sqlite: beberapa shard/replika melihat state yang sama);
+# nilai dikembalikan sebagai salinan, jadi perubahan selalu lewat d[k] = v atau update_value
+STATE = make_backend(STATE_BACKEND, STATE_PATH)
+
+def shared(ns: str, **kw) -> SharedDict:
+    return SharedDict(STATE, ns, ttl_s=STATE_CACHE_TTL_S, **kw)
+
+USER_STYLE = shared("style")                    # user_id -> gaya
+USER_MODE = shared("mode")                      # user_id -> mode
+USER_DM_PREF = shared("dm_pref")                # user_id -> bool
+USER_LAST_DOCS = shared("last_docs", encode=dump_docs, decode=load_docs)  # user_id -> [DocRef]
+USER_MEMORY_ON = shared("memory_on")            # user_id -> bool
+USER_HISTORY = shared("history")                # user_id -> [[pertanyaan, jawaban], ...]
+USER_SUMMARY = shared("summary")                # user_id -> ringkasan berjalan
+USER_DEFAULT_COLL = shared("default_coll")      # user_id -> koleksi
+USER_LAST_TIMINGS = shared("last_timings")      # user_id -> {tahap: ms, "trace_id": ...}
+
+sessions = SessionManager(shared("sessions", encode=session_to_dict, decode=session_from_dict))
+
+# satu penjadwal + sirkuit LLM untuk semua panggilan di proses yang memegang agen (bertahan melewati
+# reload runtime). Dalam mode gateway keduanya milik tiap worker (worker.py), bukan gateway.
+LLM_SCHEDULER = make_scheduler() if not WORKERS else None
+LLM_BREAKER = make_breaker() if not WORKERS else None
+if not WORKERS:
+    configure_tracing()
+
+def install_executor():
+    """Permintaan yang menunggu giliran LLM menahan satu thread; pool default asyncio terlalu kecil
+    sehingga antrean terjadi di executor (tanpa fair queuing/backpressure) alih-alih di penjadwal."""
+    if getattr(bot, "_executor", None) is None:
+        bot._executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY + LLM_MAX_QUEUE + 4,
+                                           thread_name_prefix="psionic")
+        asyncio.get_running_loop().set_default_executor(bot._executor)
+
+# ===== Agent runtime (hot reload indeks) =====
+runtime = AgentRuntime(partial(build_agent_pair, scheduler=LLM_SCHEDULER, breaker=LLM_BREAKER),
+                       warm_queries=warmup_queries)
+
+# teks chunk ternormalisasi (mmap, dibangun agen saat pemanasan) untuk !source dan !why
+CHUNK_TEXTS = chunk_texts_reader()
+
+# daftar koleksi/buku yang terakhir dibaca: {"collections": (waktu, nilai), "books": (waktu, nilai)}
+CATALOG: Dict[str, Tuple[float, object]] = {}
+
+def _on_runtime_swap(old_gen: int, new_gen: int):
+    snap = runtime.current()
+    bot.agent = snap.agent
+    bot.brain = snap.brain
+    CATALOG.clear()
+    if old_gen:
+        print(f"Indeks dimuat ulang: generasi {old_gen} -> {new_gen} (versi indeks {snap.index_version})")
+
+runtime.on_swap(_on_runtime_swap)
+
+PERF.gauge_fn("requests_inflight", lambda: runtime.current().inflight if runtime.ready else 0)
+PERF.gauge_fn("runtime_generation", lambda: runtime.generation)
+PERF.gauge_fn("active_sessions", sessions.active_count)
+
+# ===== Gateway + worker (WORKERS > 0) =====
+JOBS: Optional[JobClient] = JobClient(JobQueue(JOB_QUEUE_PATH, max_depth=JOB_MAX_QUEUE)) if WORKERS else None
+WORKER_PROCS: Dict[str, subprocess.Popen] = {}
+WORKER_HEALTH: Dict[str, object] = {"workers_ready": 0}
+
+def spawn_worker(name: str) -> subprocess.Popen:
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+    return subprocess.Popen([
+        sys.executable, script, "--name", name, "--queue", JOB_QUEUE_PATH,
+        "--threads", str(WORKER_THREADS), "--rpm-share", f"{1.0 / WORKERS:.4f}",
+    ])
+
+def stop_workers():
+    for proc in WORKER_PROCS.values():
+        if proc.poll() is None:
+            proc.terminate()
+    for name, proc in WORKER_PROCS.items():
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            print(f"Worker {name} tidak berhenti; dimatikan paksa.")
+            proc.kill()
+
+atexit.register(stop_workers)
+
+def check_workers() -> Dict[str, float]:
+    """Pulihkan job milik worker mati, matikan worker yang macet (tanpa heartbeat), perbarui gauge."""
+    q = JOBS.queue
+    q.recover()
+    for w in q.workers():
+        proc = WORKER_PROCS.get(w["name"])
+        if proc is not None and proc.poll() is None and not w["alive"] and w["state"] != "stopped":
+            print(f"Worker {w['name']} tanpa heartbeat {w['heartbeat_age_s']:.0f}s; dimatikan.")
+            proc.kill()
+    st = q.stats()
+    for key in ("depth", "lag_ms", "running"):
+        PERF.set_gauge(f"job_queue_{key}", st[key])
+    PERF.set_gauge("workers_alive", st["workers_alive"])
+    PERF.set_gauge("workers_ready", st["workers_ready"])
+    WORKER_HEALTH.update(st)
+    return st
+
+def backend_ready() -> bool:
+    if JOBS is not None:
+        return WORKER_HEALTH["workers_ready"] > 0
+    return runtime.ready
+
+async def run_agent_job(kind: str, args: Dict[str, object], author, guild=None, priority: int = INTERACTIVE,
+                        timeout_s: Optional[float] = None) -> Dict[str, object]:
+    """
+    Satu-satunya jalan ke agen: dalam mode gateway job masuk antrean SQLite dan dijalankan worker;
+    dalam mode satu proses handler yang sama dijalankan di thread (event loop tetap responsif).
+    author=None untuk pekerjaan latar (batch malam).
+    """
+    payload = {"tenant": author.id if author else None, "guild": guild.id if guild else None, "args": args}
+    if JOBS is not None:
+        return await JOBS.submit(kind, payload, timeout_s or JOB_TIMEOUT_S, priority=priority)
+    with runtime.use() as snap:
+        return await asyncio.to_thread(run_job, snap.agent, snap.brain, kind, payload)
+
+async def catalog(kind: str, author) -> object:
+    """Daftar koleksi ("collections") atau judul per koleksi ("books"), di-cache CATALOG_TTL_S."""
+    hit = CATALOG.get(kind)
+    if hit is not None and time.monotonic() - hit[0] < CATALOG_TTL_S:
+        return hit[1]
+    value = (await run_agent_job(kind, {}, author))[kind]
+    CATALOG[kind] = (time.monotonic(), value)
+    return value
+
+async def reload_runtime() -> bool:
+    try:
+        await asyncio.to_thread(runtime.reload)
+        return True
+    except Exception as e:
+        print("Reload indeks gagal:", e)
+        return False
 
-def current_style(ctx) -> str:
-    return USER_STYLE.get(ctx.author.id, DEFAULT_STYLE)
+# state bersama dibaca/ditulis lewat varian async SharedDict (aget/aset/...) dan SessionManager lewat
+# asyncio.to_thread: dengan STATE_BACKEND=sqlite tiap akses bisa berupa transaksi yang memblokir
+async def current_style(ctx) -> str:
+    return await USER_STYLE.aget(ctx.author.id, DEFAULT_STYLE)
 
-def current_mode(ctx) -> str:
-    return USER_MODE.get(ctx.author.id, DEFAULT_MODE)
+async def current_mode(ctx) -> str:
+    return await USER_MODE.aget(ctx.author.id, DEFAULT_MODE)
 
-def memory_on(user_id: int) -> bool:
-    return USER_MEMORY_ON.get(user_id, MEMORY_ON_DEFAULT)
+async def memory_on(user_id: int) -> bool:
+    return await USER_MEMORY_ON.aget(user_id, MEMORY_ON_DEFAULT)
 
 async def safe_send(dest, text: str):
     if not text:
@@ -70,7 +236,7 @@ async def safe_send(dest, text: str):
         await dest.send(text[i:i+1900])
 
 async def reply_or_dm(ctx, text: str):
-    if USER_DM_PREF.get(ctx.author.id, False) and ctx.guild is not None:
+    if ctx.guild is not None and await USER_DM_PREF.aget(ctx.author.id, False):
         try:
             await safe_send(await ctx.author.create_dm(), text)
             await ctx.reply("Jawaban dikirim ke DM Anda.", mention_author=False)
@@ -79,19 +245,50 @@ async def reply_or_dm(ctx, text: str):
     else:
         await safe_send(ctx.channel, text)
 
-def get_history_window(user_id: int) -> List[Tuple[str, str]]:
-    return USER_HISTORY.get(user_id, [])[-HISTORY_WINDOW_SIZE:]
+async def get_history_window(user_id: int) -> List[Tuple[str, str]]:
+    return (await USER_HISTORY.aget(user_id, []))[-HISTORY_WINDOW_SIZE:]
+
+async def memory_context(user_id: int) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """(jendela riwayat, ringkasan memori) bila memori user aktif; ([], None) bila tidak."""
+    if not await memory_on(user_id):
+        return [], None
+    return await get_history_window(user_id), await USER_SUMMARY.aget(user_id)
+
+async def agent_ready(ctx) -> bool:
+    """Balas "pemanasan" bila agen (atau belum ada worker yang) selesai dibangun di background."""
+    if backend_ready():
+        return True
+    await reply_or_dm(ctx, WARMING_UP_REPLY)
+    return False
+
+async def known_collections(ctx) -> Optional[List[str]]:
+    """Daftar koleksi untuk validasi perintah; None (dan pesan ke user) bila gagal dimuat."""
+    try:
+        return await catalog("collections", ctx.author)
+    except SchedulerBusy:
+        await reply_or_dm(ctx, BUSY_REPLY)
+    except Exception as e:
+        await reply_or_dm(ctx, f"Gagal memuat daftar koleksi: {e}")
+    return None
 
-def add_turn_and_maybe_summarize(user_id: int, question: str, answer: str, agent: PsionicAgent):
-    pairs = USER_HISTORY.setdefault(user_id, [])
-    pairs.append((question, answer))
+async def add_turn_and_maybe_summarize(author, question: str, answer: str):
+    user_id = author.id
+    pairs = await USER_HISTORY.aupdate_value(user_id, lambda p: (p or []) + [[question, answer]])
     if len(pairs) >= SUMMARY_TRIGGER_TURNS:
         try:
-            summary = agent.summarize_history(pairs)
-            USER_SUMMARY[user_id] = summary
-            USER_HISTORY[user_id] = pairs[-HISTORY_WINDOW_SIZE:]
+            # ringkasan antre di penjadwal LLM (prioritas rendah); jangan tahan event loop
+            summary = (await run_agent_job("summarize", {"pairs": pairs}, author))["summary"]
+            await USER_SUMMARY.aset(user_id, summary)
         except Exception:
-            USER_HISTORY[user_id] = pairs[-HISTORY_WINDOW_SIZE:]
+            pass
+        # pangkas nilai terkini (giliran yang masuk selama merangkum tetap ada)
+        await USER_HISTORY.aupdate_value(user_id, lambda p: (p or [])[-HISTORY_WINDOW_SIZE:])
+
+def docs_collection(docs) -> Optional[str]:
+    """Koleksi yang paling banyak menyumbang dokumen jawaban (dicatat di memori harian untuk statistik)."""
+    cols = Counter((getattr(d, "metadata", {}) or {}).get("collection") for d in docs or [])
+    cols.pop(None, None)
+    return cols.most_common(1)[0][0] if cols else None
 
 # ================== Fancy Help (Embed + Pagination) ==================
 from discord import Embed, ui
@@ -117,7 +314,7 @@ HELP_PAGES = [
             ("`!ask_in <koleksi> | <pertanyaan>`", "Batasi retrieval ke koleksi tertentu."),
             ("`!in <koleksi>` / `!in clear`", "Set/Clear koleksi default."),
             ("`!books [koleksi]`", "Daftar judul buku (per koleksi atau semua)."),
-            ("`!source` / `!source full <n>`", "Lihat sumber ringkas / kutipan penuh."),
+            ("`!source` / `!source full <n>`", "Lihat sumber ringkas / kutipan penuh beserta potongan sebelum-sesudahnya."),
             ("`!why`", "Alasan dokumen terpilih."),
             ("`!collections`", "Lihat daftar koleksi tersedia."),
         ],
@@ -142,6 +339,15 @@ HELP_PAGES = [
             ("`!clear`", "Bersihkan memori singkat."),
         ],
     },
+    {
+        "title": "Psionic Agent — Bantuan",
+        "subtitle": "Admin",
+        "desc": "Khusus pemilik bot.",
+        "fields": [
+            ("`!reload`", "Muat ulang vectorstore tanpa restart bot."),
+            ("`!perf` / `!perf last` / `!perf reset`", "Latensi p50/p95/p99 per tahap, hit rate cache, antrean."),
+        ],
+    },
 ]
 
 def build_help_embed(page_idx: int, author: discord.abc.User) -> Embed:
@@ -210,20 +416,154 @@ async def rotate_presence():
         status=discord.Status.online,
     )
 
+# ================== Index watcher (hot reload) ==================
+@tasks.loop(seconds=30)
+async def watch_index():
+    if JOBS is None and runtime.ready and runtime.is_stale():  # worker memantau indeksnya sendiri
+        await reload_runtime()
+
+@tasks.loop(seconds=2)
+async def supervise_workers():
+    for name, proc in list(WORKER_PROCS.items()):
+        if proc.poll() is not None:
+            print(f"Worker {name} berhenti (kode {proc.returncode}); dijalankan ulang.")
+            PERF.incr("worker_restarts")
+            WORKER_PROCS[name] = spawn_worker(name)
+    try:
+        await asyncio.to_thread(check_workers)
+    except Exception as e:
+        print("Gagal memeriksa worker:", e)
+
+# ================== Batch malam: ringkasan harian & pemadatan memori ==================
+def _clock(hhmm: str, default: str) -> dt_time:
+    hh, _, mm = (hhmm or default).partition(":")
+    return dt_time(int(hh), int(mm or 0), tzinfo=mem.ASIA_JAKARTA)
+
+def interactive_waiting() -> bool:
+    """Batch malam mengalah selama ada permintaan yang antre (LLM lokal atau antrean job gateway)."""
+    if JOBS is not None:
+        return WORKER_HEALTH.get("depth_interactive", 0) > 0
+    return LLM_SCHEDULER is not None and LLM_SCHEDULER.queue_depth > 0
+
+async def summarize_batch(items) -> Dict[str, str]:
+    res = await run_agent_job("summarize_batch", {"items": items}, None, priority=BACKGROUND,
+                              timeout_s=max(JOB_TIMEOUT_S, 300))
+    return res["summaries"]
+
+NIGHTLY = DailySummaryBatch(summarize_batch, busy=interactive_waiting, concurrency=NIGHTLY_SUMMARY_CONCURRENCY,
+                            max_users_per_call=NIGHTLY_SUMMARY_USERS_PER_CALL)
+# ringkasan malam dan pemadatan tidak pernah berjalan bersamaan (dua arah): batch tidak membaca file
+# yang sedang dipindah ke arsip, dan pemadatan tidak mengarsip hari yang ringkasannya belum tertulis
+MEMORY_JOBS_LOCK = asyncio.Lock()
+
+@tasks.loop(time=_clock(NIGHTLY_SUMMARY_AT, "02:00"))
+async def nightly_summaries():
+    if not backend_ready():
+        print("Ringkasan malam dilewati: agen belum siap.")
+        return
+    date = mem.yesterday_date_str()
+    try:
+        async with MEMORY_JOBS_LOCK:
+            st = await NIGHTLY.run(date)
+        print(f"Ringkasan malam {date}: {st['summarized']}/{st['users']} user dalam {st['calls']} panggilan LLM"
+              + (f", {st['failed']} gagal" if st["failed"] else ""))
+    except Exception as e:
+        print("Ringkasan malam gagal:", e)
+
+@tasks.loop(time=_clock(MEMORY_COMPACT_AT, "03:30"))
+async def compact_memory():
+    import agent_archive  # pyarrow hanya dimuat bila pemadatan aktif
+    try:
+        async with MEMORY_JOBS_LOCK:
+            st = await asyncio.to_thread(agent_archive.compact, mem.BASE_DIR, mem.ARCHIVE_DIR, mem.today_date_str())
+        print(f"Memori harian dipadatkan: {st['days']} hari, {st['files_removed']} file JSON -> {st['parts_written']} part Parquet")
+    except Exception as e:
+        print("Gagal memadatkan memori:", e)
+
+# ================== Metrik (file dump + endpoint lokal) ==================
+@tasks.loop(seconds=max(PERF_DUMP_SECONDS, 1))
+async def dump_perf():
+    try:
+        await asyncio.to_thread(PERF.dump_prometheus, PERF_DUMP_PATH)
+    except Exception as e:
+        print("Gagal menulis metrik:", e)
+
+async def start_perf_http():
+    from aiohttp import web  # sudah terpasang sebagai dependensi discord.py
+
+    async def metrics(_request):
+        return web.Response(text=PERF.render_prometheus(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    web_runner = web.AppRunner(app)
+    await web_runner.setup()
+    await web.TCPSite(web_runner, "127.0.0.1", PERF_HTTP_PORT).start()
+    bot._perf_http = web_runner
+    print(f"Metrik tersedia di http://127.0.0.1:{PERF_HTTP_PORT}/metrics")
+
 # ================== EVENTS ==================
-@bot.event
-async def on_ready():
+def format_startup_timings() -> str:
+    t = {**STARTUP_TIMINGS, **runtime.timings}
+    order = [
+        ("discord_ready_s", "koneksi Discord"),
+        ("import_s", "impor chromadb/langchain"),
+        ("agent_construct_s", "inisialisasi agent (client + retriever)"),
+        ("warm_catalog_s", "pemanasan katalog judul + indeks ketetanggaan chunk"),
+        ("warm_queries_s", f"pemanasan {int(t.get('warm_queries_n', 0))} kueri"),
+        ("agent_ready_s", "total hingga agen siap"),
+    ]
+    return "\n".join(f"- {label}: {t[key]:.2f}s" for key, label in order if key in t)
+
+async def warm_up_agent():
     try:
-        bot.agent = PsionicAgent(persist_dir=PERSIST_DIR)
-        bot.brain = AgentBrain(bot.agent)
-        print("Bot siap. Koleksi:", ", ".join(bot.agent.list_collections()))
+        if STARTUP_MODE == "blocking":
+            runtime.reload()
+        else:
+            await asyncio.to_thread(runtime.reload)
     except Exception as e:
         print("Gagal inisialisasi:", e)
         await bot.close()
         return
+    STARTUP_TIMINGS["agent_ready_s"] = time.perf_counter() - BOOT_T0
+    print("Bot siap. Koleksi:", ", ".join(bot.agent.list_collections()))
+    print("Rincian startup:\n" + format_startup_timings())
+
+@bot.event
+async def on_ready():
+    STARTUP_TIMINGS.setdefault("discord_ready_s", time.perf_counter() - BOOT_T0)
+    install_executor()
+    if JOBS is not None:
+        # gateway: agen dibangun di proses worker; di sini cukup jalankan & awasi worker
+        if not WORKER_PROCS:
+            for i in range(1, WORKERS + 1):
+                WORKER_PROCS[f"w{i}"] = spawn_worker(f"w{i}")
+            print(f"Mode gateway: {WORKERS} worker dijalankan (antrean {JOB_QUEUE_PATH}).")
+        if not supervise_workers.is_running():
+            supervise_workers.start()
+    # on_ready bisa terpanggil lagi saat reconnect; agen cukup dibangun sekali
+    elif not runtime.ready and getattr(bot, "_warmup_task", None) is None:
+        if STARTUP_MODE == "blocking":
+            await warm_up_agent()
+        else:
+            print("Terhubung ke Discord; agen dibangun di background…")
+            bot._warmup_task = asyncio.create_task(warm_up_agent())
     # start rotating presence
     if not rotate_presence.is_running():
         rotate_presence.start()
+    if not watch_index.is_running():
+        watch_index.start()
+    if PERF_DUMP_SECONDS > 0 and not dump_perf.is_running():
+        dump_perf.start()
+    if NIGHTLY_SUMMARY_AT and not nightly_summaries.is_running():
+        nightly_summaries.start()
+    if MEMORY_COMPACT_AT and not compact_memory.is_running():
+        compact_memory.start()
+    if PERF_HTTP_PORT and getattr(bot, "_perf_http", None) is None:
+        try:
+            await start_perf_http()
+        except Exception as e:
+            print("Endpoint metrik gagal dijalankan:", e)
 
 # ================== COMMANDS ==================
 
@@ -238,7 +578,7 @@ async def style_cmd(ctx, *, style: str):
     if style not in ["netral","hangat","terapis","pengajar","rekan"]:
         await reply_or_dm(ctx, "Pilihan: netral | hangat | terapis | pengajar | rekan")
         return
-    USER_STYLE[ctx.author.id] = style
+    await USER_STYLE.aset(ctx.author.id, style)
     await reply_or_dm(ctx, f"Gaya disetel: {style}")
 
 @bot.command(name="mode")
@@ -247,17 +587,17 @@ async def mode_cmd(ctx, *, mode: str):
     if mode not in ["ringkas","panjang","bullet","banding","definisi","langkah"]:
         await reply_or_dm(ctx, "Pilihan: ringkas | panjang | bullet | banding | definisi | langkah")
         return
-    USER_MODE[ctx.author.id] = mode
+    await USER_MODE.aset(ctx.author.id, mode)
     await reply_or_dm(ctx, f"Mode disetel: {mode}")
 
 @bot.command(name="dm")
 async def dm_cmd(ctx, *, arg: str):
     opt = arg.strip().lower()
     if opt == "on":
-        USER_DM_PREF[ctx.author.id] = True
+        await USER_DM_PREF.aset(ctx.author.id, True)
         await reply_or_dm(ctx, "DM mode diaktifkan.")
     elif opt == "off":
-        USER_DM_PREF[ctx.author.id] = False
+        await USER_DM_PREF.aset(ctx.author.id, False)
         await reply_or_dm(ctx, "DM mode dinonaktifkan.")
     else:
         await reply_or_dm(ctx, "Gunakan: !dm on  atau  !dm off")
@@ -266,104 +606,134 @@ async def dm_cmd(ctx, *, arg: str):
 async def in_cmd(ctx, *, arg: str):
     arg = arg.strip().lower()
     if arg == "clear":
-        USER_DEFAULT_COLL.pop(ctx.author.id, None)
-        s = sessions.get(ctx.author.id, ctx.channel.id)
-        if s and s.is_on:
-            s.default_collection = None
+        await USER_DEFAULT_COLL.apop(ctx.author.id, None)
+        await asyncio.to_thread(sessions.set_default_collection, ctx.author.id, ctx.channel.id, None)
         await reply_or_dm(ctx, "Koleksi default dihapus.")
         return
-    cols = bot.agent.list_collections()
+    if not await agent_ready(ctx):
+        return
+    cols = await known_collections(ctx)
+    if cols is None:
+        return
     if arg not in cols:
         await reply_or_dm(ctx, "Koleksi tidak dikenal. Gunakan !collections.")
         return
-    USER_DEFAULT_COLL[ctx.author.id] = arg
-    s = sessions.get(ctx.author.id, ctx.channel.id)
-    if s and s.is_on:
-        s.default_collection = arg
+    await USER_DEFAULT_COLL.aset(ctx.author.id, arg)
+    await asyncio.to_thread(sessions.set_default_collection, ctx.author.id, ctx.channel.id, arg)
     await reply_or_dm(ctx, f"Koleksi default disetel: {arg}")
 
 @bot.command(name="collections")
 async def collections_cmd(ctx):
-    await reply_or_dm(ctx, "Koleksi:\n" + "\n".join(bot.agent.list_collections()))
+    if not await agent_ready(ctx):
+        return
+    cols = await known_collections(ctx)
+    if cols is not None:
+        await reply_or_dm(ctx, "Koleksi:\n" + "\n".join(cols))
 
 @bot.command(name="books")
 async def books_cmd(ctx, *, collection: str = None):
+    if not await agent_ready(ctx):
+        return
     try:
+        # pemindaian metadata semua koleksi berjalan di worker/thread, hasilnya di-cache CATALOG_TTL_S
+        mapping = await catalog("books", ctx.author)
         if collection:
             collection = collection.strip()
-            if collection not in bot.agent.list_collections():
+            if collection not in mapping:
                 await reply_or_dm(ctx, "Koleksi tidak dikenal. Gunakan !collections.")
                 return
-            titles = bot.agent.list_books(collection)
+            titles = mapping[collection]
             if not titles:
                 await reply_or_dm(ctx, f'Tidak ada judul di "{collection}".')
                 return
             await reply_or_dm(ctx, f'Buku dalam "{collection}":\n- ' + "\n- ".join(titles))
         else:
-            mapping = bot.agent.list_all_books()
             parts = []
-            for name in bot.agent.list_collections():
+            for name in mapping:
                 titles = mapping.get(name, [])
                 parts.append(f'[{name}]\n- ' + ("\n- ".join(titles) if titles else "(kosong)"))
             await reply_or_dm(ctx, "\n\n".join(parts))
+    except SchedulerBusy:
+        await reply_or_dm(ctx, BUSY_REPLY)
     except Exception as e:
         await reply_or_dm(ctx, f"Gagal memuat daftar buku: {e}")
 
 @bot.command(name="ask")
 async def ask_cmd(ctx, *, question: str):
-    style = current_style(ctx); mode = current_mode(ctx)
+    if not await agent_ready(ctx):
+        return
+    style = await current_style(ctx); mode = await current_mode(ctx)
     async with ctx.channel.typing():
         try:
-            default_coll = USER_DEFAULT_COLL.get(ctx.author.id)
-            hw = get_history_window(ctx.author.id) if memory_on(ctx.author.id) else []
-            ms = USER_SUMMARY.get(ctx.author.id) if memory_on(ctx.author.id) else None
-
-            answer, docs, meta = bot.brain.answer_with_pipeline(
-                user_id=ctx.author.id,
-                question=question,
-                style=style,
-                mode=mode,
-                history_window=hw,
-                memory_summary=ms,
-                default_collection=default_coll,
-            )
-            USER_LAST_DOCS[ctx.author.id] = docs
+            default_coll = await USER_DEFAULT_COLL.aget(ctx.author.id)
+            hw, ms = await memory_context(ctx.author.id)
+
+            # di worker/thread agar event loop tetap responsif dan permintaan identik bisa digabung (single-flight)
+            res = await run_agent_job("ask", {
+                "user_id": ctx.author.id,
+                "question": question,
+                "style": style,
+                "mode": mode,
+                "history_window": hw,
+                "memory_summary": ms,
+                "default_collection": default_coll,
+            }, ctx.author, ctx.guild)
+            answer, docs, meta = res["answer"], res["docs"], res["meta"]
+            await USER_LAST_DOCS.aset(ctx.author.id, docs)
+            await USER_LAST_TIMINGS.aset(ctx.author.id, {**meta.get("timings", {}), "trace_id": meta.get("trace_id")})
+        except SchedulerBusy:
+            answer = BUSY_REPLY
         except Exception as e:
             answer = f"Terjadi kesalahan: {e}"
     await reply_or_dm(ctx, answer)
 
-    if not answer.startswith("Terjadi kesalahan"):
-        add_turn_and_maybe_summarize(ctx.author.id, question, answer, bot.agent)
-        mem.append_turn(ctx.author.id, question, answer)
+    if answer != BUSY_REPLY and not answer.startswith("Terjadi kesalahan"):
+        await add_turn_and_maybe_summarize(ctx.author, question, answer)
+        mem.append_turn(ctx.author.id, question, answer, collection=docs_collection(docs))
 
 @bot.command(name="ask_in")
 async def ask_in_cmd(ctx, *, arg: str):
-    style = current_style(ctx); mode = current_mode(ctx)
+    if not await agent_ready(ctx):
+        return
+    style = await current_style(ctx); mode = await current_mode(ctx)
     if "|" not in arg:
         await reply_or_dm(ctx, "Format: !ask_in <nama_koleksi> | <pertanyaan>")
         return
     collection, question = [s.strip() for s in arg.split("|", 1)]
-    if collection not in bot.agent.list_collections():
+    cols = await known_collections(ctx)
+    if cols is None:
+        return
+    if collection not in cols:
         await reply_or_dm(ctx, "Koleksi tidak dikenal. Gunakan !collections.")
         return
 
     async with ctx.channel.typing():
         try:
-            hw = get_history_window(ctx.author.id) if memory_on(ctx.author.id) else []
-            ms = USER_SUMMARY.get(ctx.author.id) if memory_on(ctx.author.id) else None
-            docs = bot.agent.retrieve(question, collection=collection)
-            USER_LAST_DOCS[ctx.author.id] = docs
-            answer = bot.agent.answer_from_docs(docs, question, style, hw, ms, mode)
+            hw, ms = await memory_context(ctx.author.id)
+            # saat sirkuit LLM terbuka / timeout, handler menjawab ekstraktif dari potongan buku
+            res = await run_agent_job("ask_in", {
+                "user_id": ctx.author.id,
+                "question": question,
+                "collection": collection,
+                "style": style,
+                "mode": mode,
+                "history_window": hw,
+                "memory_summary": ms,
+            }, ctx.author, ctx.guild)
+            answer, docs = res["answer"], res["docs"]
+            await USER_LAST_DOCS.aset(ctx.author.id, docs)
+        except SchedulerBusy:
+            answer = BUSY_REPLY
         except Exception as e:
             answer = f"Terjadi kesalahan: {e}"
     await reply_or_dm(ctx, answer)
-    if not answer.startswith("Terjadi kesalahan"):
-        add_turn_and_maybe_summarize(ctx.author.id, question, answer, bot.agent)
-        mem.append_turn(ctx.author.id, question, answer)
+    if answer != BUSY_REPLY and not answer.startswith("Terjadi kesalahan"):
+        await add_turn_and_maybe_summarize(ctx.author, question, answer)
+        mem.append_turn(ctx.author.id, question, answer, collection=collection)
 
 @bot.command(name="source")
 async def source_cmd(ctx, *args):
-    docs = USER_LAST_DOCS.get(ctx.author.id)
+    docs = await USER_LAST_DOCS.aget(ctx.author.id)
     if not docs:
         await reply_or_dm(ctx, "Belum ada sumber. Lakukan !ask dulu.")
         return
@@ -376,15 +746,23 @@ async def source_cmd(ctx, *args):
         if idx < 1 or idx > len(docs):
             await reply_or_dm(ctx, f"Nomor tidak valid. 1..{len(docs)}")
             return
-        from psionic_agent import PsionicAgent as _PA
-        await reply_or_dm(ctx, _PA.format_citations([docs[idx-1]], max_len=1000)[0])
+        d = docs[idx-1]
+        before, after = [], []
+        if SOURCE_FULL_SPAN > 0 and backend_ready():
+            try:  # chunk sebelum/sesudah lewat indeks ketetanggaan (tanpa pencarian vektor)
+                res = await run_agent_job("passage", {"meta": dict(d.metadata), "span": SOURCE_FULL_SPAN},
+                                          ctx.author, ctx.guild)
+                before, after = res["docs"][:res["before"]], res["docs"][res["before"]:]
+            except Exception:
+                pass
+        await reply_or_dm(ctx, format_passage(d, before, after, max_len=1000, texts=CHUNK_TEXTS))
         return
-    lines = bot.agent.format_citations(docs, max_len=220)
+    lines = format_citations(docs, max_len=220, texts=CHUNK_TEXTS)
     await reply_or_dm(ctx, "Sumber terakhir:\n" + "\n".join(lines))
 
 @bot.command(name="why")
 async def why_cmd(ctx):
-    docs = USER_LAST_DOCS.get(ctx.author.id)
+    docs = await USER_LAST_DOCS.aget(ctx.author.id)
     if not docs:
         await reply_or_dm(ctx, "Belum ada data retrieval. Lakukan !ask.")
         return
@@ -393,8 +771,11 @@ async def why_cmd(ctx):
         md = getattr(d, "metadata", {}) or {}
         book = md.get("book_title") or md.get("book") or "unknown"
         page = md.get("page"); src = md.get("source")
-        snippet = (getattr(d, "page_content", "") or "").strip().replace("\n"," ")
-        if len(snippet) > 180: snippet = snippet[:180].rstrip() + "..."
+        if CHUNK_TEXTS is not None:
+            snippet = CHUNK_TEXTS.snippet(d, 180)
+        else:
+            snippet = (getattr(d, "page_content", "") or "").strip().replace("\n"," ")
+            if len(snippet) > 180: snippet = snippet[:180].rstrip() + "..."
         lines.append(f"{i}. book={book}; page={page}; source={src}\n   {snippet}")
     await reply_or_dm(ctx, "\n".join(lines))
 
@@ -431,38 +812,103 @@ async def yesterday_cmd(ctx):
 
 @bot.command(name="recap")
 async def recap_cmd(ctx):
-    pairs = USER_HISTORY.get(ctx.author.id, [])
+    pairs = await USER_HISTORY.aget(ctx.author.id, [])
     if not pairs:
         await reply_or_dm(ctx, "Belum ada riwayat singkat.")
         return
+    if not await agent_ready(ctx):
+        return
     try:
-        summary = bot.agent.summarize_history(pairs[-8:])
+        summary = (await run_agent_job("summarize", {"pairs": pairs[-8:]}, ctx.author, ctx.guild))["summary"]
         await reply_or_dm(ctx, "Ringkasan percakapan berjalan:\n" + summary)
+    except SchedulerBusy:
+        await reply_or_dm(ctx, BUSY_REPLY)
     except Exception as e:
         await reply_or_dm(ctx, f"Gagal merangkum: {e}")
 
 @bot.command(name="clear")
 async def clear_cmd(ctx):
-    USER_HISTORY.pop(ctx.author.id, None)
-    USER_SUMMARY.pop(ctx.author.id, None)
+    await USER_HISTORY.apop(ctx.author.id, None)
+    await USER_SUMMARY.apop(ctx.author.id, None)
     await reply_or_dm(ctx, "Memori singkat dibersihkan.")
 
 @bot.command(name="status")
 async def status_cmd(ctx):
-    s = sessions.get(ctx.author.id, ctx.channel.id)
-    coll = USER_DEFAULT_COLL.get(ctx.author.id, "(none)")
-    style = current_style(ctx); mode = current_mode(ctx)
-    mem_on = "on" if memory_on(ctx.author.id) else "off"
-    dm = "on" if USER_DM_PREF.get(ctx.author.id, False) else "off"
+    s = await asyncio.to_thread(sessions.get, ctx.author.id, ctx.channel.id)
+    coll = await USER_DEFAULT_COLL.aget(ctx.author.id, "(none)")
+    style = await current_style(ctx); mode = await current_mode(ctx)
+    mem_on = "on" if await memory_on(ctx.author.id) else "off"
+    dm = "on" if await USER_DM_PREF.aget(ctx.author.id, False) else "off"
     session_line = f"session: {'on' if (s and s.is_on) else 'off'}; topic: {getattr(s,'topic',None)}; turns: {getattr(s,'turns',0)}; session_coll: {getattr(s,'default_collection', None)}"
     await reply_or_dm(ctx,
         f"Status:\n- style: {style}\n- mode: {mode}\n- mem: {mem_on}\n- dm: {dm}\n- default collection: {coll}\n- {session_line}"
     )
 
+# ---- Admin ----
+@bot.command(name="reload")
+@commands.is_owner()
+async def reload_cmd(ctx):
+    if JOBS is not None:
+        gen = await asyncio.to_thread(JOBS.queue.request_reload)
+        CATALOG.clear()
+        await reply_or_dm(ctx, f"Reload indeks diminta ke {len(WORKER_PROCS)} worker (permintaan #{gen}); "
+                               "tiap worker menukar indeksnya setelah pemanasan. Cek dengan !perf workers.")
+        return
+    await reply_or_dm(ctx, "Memuat ulang indeks di background…")
+    ok = await reload_runtime()
+    if not ok:
+        await reply_or_dm(ctx, "Reload gagal; indeks lama tetap dipakai.")
+        return
+    snap = runtime.current()
+    await reply_or_dm(ctx,
+        f"Indeks dimuat ulang. Generasi: {snap.generation}; versi indeks: {snap.index_version}; "
+        f"koleksi: {', '.join(snap.agent.list_collections())}"
+    )
+
+@bot.command(name="perf")
+@commands.is_owner()
+async def perf_cmd(ctx, arg: str = ""):
+    arg = arg.lower().strip()
+    if arg == "reset":
+        PERF.reset()
+        await reply_or_dm(ctx, "Metrik latensi direset.")
+        return
+    if arg == "last":
+        timings = dict(await USER_LAST_TIMINGS.aget(ctx.author.id) or {})
+        trace_id = timings.pop("trace_id", None)
+        if not timings:
+            await reply_or_dm(ctx, "Belum ada rincian waktu. Lakukan !ask dulu.")
+            return
+        lines = [f"{stage:<22}{ms:>9.1f} ms" for stage, ms in sorted(timings.items(), key=lambda x: -x[1])]
+        head = "Rincian permintaan terakhir" + (f" (trace {trace_id})" if trace_id else "") + ":"
+        await reply_or_dm(ctx, head + "\n```\n" + "\n".join(lines) + "\n```")
+        return
+    if arg == "workers":
+        if JOBS is None:
+            await reply_or_dm(ctx, "Mode satu proses (WORKERS=0): tidak ada worker terpisah.")
+            return
+        st = await asyncio.to_thread(check_workers)
+        ws = await asyncio.to_thread(JOBS.queue.workers)
+        lines = [f"antrean: {st['depth']:.0f} job, lag {st['lag_ms']:.0f} ms, berjalan {st['running']:.0f}",
+                 f"{'worker':<8}{'pid':>8}{'status':>10}{'hb':>6}{'aktif':>7}{'selesai':>9}{'gagal':>7}{'gen':>5}"]
+        for w in ws:
+            state = w["state"] if w["alive"] else "mati"
+            lines.append(f"{w['name']:<8}{w['pid']:>8}{state:>10}{w['heartbeat_age_s']:>5.0f}s"
+                         f"{w.get('inflight', 0):>7}{w.get('done', 0):>9}{w.get('failed', 0):>7}{w.get('generation', 0):>5}")
+        await reply_or_dm(ctx, "```\n" + "\n".join(lines) + "\n```")
+        return
+    await reply_or_dm(ctx, "```\n" + PERF.render_text() + "\n```")
+
+@reload_cmd.error
+@perf_cmd.error
+async def admin_cmd_error(ctx, error):
+    if isinstance(error, commands.NotOwner):
+        await reply_or_dm(ctx, "Perintah ini khusus pemilik bot.")
+
 # ---- Session controls ----
 @bot.command(name="new")
 async def new_cmd(ctx, *, args: str = ""):
-    default_coll = None; style = current_style(ctx); mode = current_mode(ctx)
+    default_coll = None; style = await current_style(ctx); mode = await current_mode(ctx)
     tokens = [a.strip() for a in args.split() if a.strip()] if args else []
     for tok in tokens:
         if tok.startswith("mode="):
@@ -471,34 +917,44 @@ async def new_cmd(ctx, *, args: str = ""):
             style = tok.split("=",1)[1].lower()
         else:
             default_coll = tok
-    if default_coll and default_coll not in bot.agent.list_collections():
-        await reply_or_dm(ctx, "Koleksi tidak dikenal. Gunakan !collections.")
-        return
-    s = sessions.start(ctx.author.id, ctx.channel.id, default_coll, style, mode)
+    if default_coll:
+        if not await agent_ready(ctx):
+            return
+        cols = await known_collections(ctx)
+        if cols is None:
+            return
+        if default_coll not in cols:
+            await reply_or_dm(ctx, "Koleksi tidak dikenal. Gunakan !collections.")
+            return
+    s = await asyncio.to_thread(sessions.start, ctx.author.id, ctx.channel.id, default_coll, style, mode)
     await reply_or_dm(ctx, f"Sesi baru dimulai. Mode: {mode}, Style: {style}, Koleksi: {default_coll or '(semua)'}.\nTanyakan apa pun.")
 
 @bot.command(name="topic")
 async def topic_cmd(ctx, *, title: str):
-    sessions.set_topic(ctx.author.id, ctx.channel.id, title.strip())
+    await asyncio.to_thread(sessions.set_topic, ctx.author.id, ctx.channel.id, title.strip())
     await reply_or_dm(ctx, f"Topik sesi disetel: {title.strip()}")
 
 @bot.command(name="end")
 async def end_cmd(ctx):
-    s = sessions.end(ctx.author.id, ctx.channel.id)
+    s = await asyncio.to_thread(sessions.end, ctx.author.id, ctx.channel.id)
     if not s:
         await reply_or_dm(ctx, "Tidak ada sesi aktif.")
         return
-    pairs = USER_HISTORY.get(ctx.author.id, [])[-8:]
+    pairs = (await USER_HISTORY.aget(ctx.author.id, []))[-8:]
     try:
-        daily = bot.agent.summarize_history(pairs) if pairs else ""
+        daily = (await run_agent_job("summarize", {"pairs": pairs}, ctx.author, ctx.guild))["summary"] if pairs else ""
         mem.update_daily_summary(ctx.author.id, daily)
-        rolling = mem.read_rolling_summary(ctx.author.id)
-        combined = (rolling + " " + daily).strip()[:800]
-        mem.update_rolling_summary(ctx.author.id, combined)
+        mem.append_rolling_summary(ctx.author.id, daily)
     except Exception:
         pass
     await reply_or_dm(ctx, "Sesi diakhiri. Ringkasan harian diperbarui.")
 
+# ---- Prefetch sesi (setelah menjawab, sebelum pesan berikutnya datang) ----
+async def prefetch_session(ctx: Dict[str, object]) -> None:
+    await run_agent_job("prefetch", {"session_context": ctx}, None, priority=BACKGROUND)
+
+PREFETCHER = SessionPrefetcher(prefetch_session, busy=interactive_waiting, max_inflight=SESSION_PREFETCH_MAX_INFLIGHT)
+
 # ---- Auto-reply during active session ----
 @bot.event
 async def on_message(message: discord.Message):
@@ -507,31 +963,46 @@ async def on_message(message: discord.Message):
     await bot.process_commands(message)  # prioritas command
     if message.content.startswith("!"):
         return
-    s = sessions.get(message.author.id, message.channel.id)
+    s = await asyncio.to_thread(sessions.get, message.author.id, message.channel.id)
     if not s or not s.is_on:
         return
+    if not backend_ready():
+        await safe_send(message.channel, WARMING_UP_REPLY)
+        return
 
     style = s.style; mode = s.mode
-    default_coll = s.default_collection or USER_DEFAULT_COLL.get(message.author.id)
+    default_coll = s.default_collection or await USER_DEFAULT_COLL.aget(message.author.id)
 
-    hw = USER_HISTORY.get(message.author.id, [])[-HISTORY_WINDOW_SIZE:] if memory_on(message.author.id) else []
-    ms = USER_SUMMARY.get(message.author.id) if memory_on(message.author.id) else None
+    hw, ms = await memory_context(message.author.id)
+    # jangkar sesi: tetangga kutipan giliran sebelumnya, topik, buku fokus (sudah di-prefetch)
+    last_docs = await USER_LAST_DOCS.aget(message.author.id, []) if s.turns else []
+    anchors = session_context(s, last_docs, collection=default_coll) if SESSION_PREFETCH else None
     try:
         async with message.channel.typing():
-            answer, docs, meta = bot.brain.answer_with_pipeline(
-                user_id=message.author.id,
-                question=message.content,
-                style=style,
-                mode=mode,
-                history_window=hw,
-                memory_summary=ms,
-                default_collection=default_coll,
-            )
-            USER_LAST_DOCS[message.author.id] = docs
+            res = await run_agent_job("ask", {
+                "user_id": message.author.id,
+                "question": message.content,
+                "style": style,
+                "mode": mode,
+                "history_window": hw,
+                "memory_summary": ms,
+                "default_collection": default_coll,
+                "session_context": anchors,
+            }, message.author, message.guild)
+            answer, docs, meta = res["answer"], res["docs"], res["meta"]
+            await USER_LAST_DOCS.aset(message.author.id, docs)
+            await USER_LAST_TIMINGS.aset(message.author.id, {**meta.get("timings", {}), "trace_id": meta.get("trace_id")})
         await safe_send(message.channel, answer)
-        add_turn_and_maybe_summarize(message.author.id, message.content, answer, bot.agent)
-        mem.append_turn(message.author.id, message.content, answer)
-        sessions.bump_turn(message.author.id, message.channel.id)
+        if SESSION_PREFETCH:
+            focus = meta.get("book_focus")
+            if focus:
+                await asyncio.to_thread(sessions.set_focus_book, message.author.id, message.channel.id, focus)
+            PREFETCHER.schedule((message.author.id, message.channel.id), session_context(s, docs, focus, default_coll))
+        await add_turn_and_maybe_summarize(message.author, message.content, answer)
+        mem.append_turn(message.author.id, message.content, answer, collection=docs_collection(docs))
+        await asyncio.to_thread(sessions.bump_turn, message.author.id, message.channel.id)
+    except SchedulerBusy:
+        await safe_send(message.channel, BUSY_REPLY)
     except Exception as e:
         await safe_send(message.channel, f"Terjadi kesalahan: {e}")
 
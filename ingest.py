@@ -0,0 +1,447 @@
+# ingest.py
+#
+# Ingesti offline: PDF -> chunk -> embedding -> ChromaDB (layout sama dengan yang dibaca PsionicAgent).
+#   python ingest.py --config books_config.yaml [--workers 4] [--batch-size 100] [--only koleksi_a,koleksi_b] [--full]
+#
+# Inkremental: manifest (hash file -> chunk id) menentukan buku mana yang di-embed ulang,
+# dan embedding chunk yang teksnya tidak berubah diambil dari cache SQLite.
+
+import os
+import sys
+import time
+import random
+import json
+import array
+import sqlite3
+import hashlib
+import logging
+import argparse
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+os.environ["CHROMA_TELEMETRY_IMPLEMENTATION"] = "noop"
+os.environ["CHROMA_TELEMETRY_DISABLED"] = "true"
+os.environ["POSTHOG_DISABLED"] = "1"
+logging.getLogger("chromadb").setLevel(logging.ERROR)
+
+import yaml
+
+from agent_scheduler import is_quota_error
+from tools.index_version import bump_index_version
+from tools.enrich import enrich_metadata, ENRICH_VERSION
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 150
+DEFAULT_EMBED_MODEL = "models/text-embedding-004"
+UPSERT_BATCH = 500
+MANIFEST_FILE = "ingest_manifest.json"
+EMBED_CACHE_FILE = "embed_cache.sqlite3"
+
+@dataclass
+class BookSpec:
+    collection: str
+    path: str
+    title: str
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
+
+# =========================
+# Konfigurasi
+# =========================
+
+def load_config(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    base = os.path.dirname(os.path.abspath(path))
+    cfg.setdefault("source_dir", "data/books")
+    cfg.setdefault("persist_dir", "bundle_psionic/vectorstore")
+    cfg.setdefault("embed_model", DEFAULT_EMBED_MODEL)
+    cfg.setdefault("collections", {})
+    # path relatif dihitung dari lokasi file config
+    for key in ("source_dir", "persist_dir"):
+        if not os.path.isabs(cfg[key]):
+            cfg[key] = os.path.normpath(os.path.join(base, cfg[key]))
+    return cfg
+
+def _title_from_file(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.replace("_", " ").replace("-", " ").strip()
+
+def book_specs(cfg: Dict[str, Any], only: Optional[List[str]] = None) -> List[BookSpec]:
+    """Jabarkan config menjadi daftar buku per koleksi (daftar `books` eksplisit dan/atau folder `dir`)."""
+    defaults = cfg.get("defaults") or {}
+    specs: List[BookSpec] = []
+    for coll, cc in (cfg.get("collections") or {}).items():
+        if only and coll not in only:
+            continue
+        cc = cc or {}
+        size = int(cc.get("chunk_size", defaults.get("chunk_size", DEFAULT_CHUNK_SIZE)))
+        overlap = int(cc.get("chunk_overlap", defaults.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP)))
+        seen = set()
+        for b in cc.get("books") or []:
+            if isinstance(b, str):
+                b = {"file": b}
+            p = os.path.join(cfg["source_dir"], b["file"])
+            seen.add(os.path.abspath(p))
+            specs.append(BookSpec(coll, p, b.get("title") or _title_from_file(p), size, overlap))
+        if cc.get("dir"):
+            d = os.path.join(cfg["source_dir"], cc["dir"])
+            for fn in sorted(os.listdir(d)) if os.path.isdir(d) else []:
+                p = os.path.join(d, fn)
+                if fn.lower().endswith(".pdf") and os.path.abspath(p) not in seen:
+                    specs.append(BookSpec(coll, p, _title_from_file(p), size, overlap))
+    return specs
+
+# =========================
+# Parsing + chunking (jalan di process pool)
+# =========================
+
+def read_pdf_pages(path: str) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(page.extract_text() or "") for page in reader.pages]
+
+def chunk_pages(pages: List[str], chunk_size: int, chunk_overlap: int) -> List[Tuple[int, str]]:
+    """Pecah per halaman agar metadata page tetap akurat. Hasil: [(page, teks)]."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    out = []
+    for page_no, text in enumerate(pages):
+        text = (text or "").strip()
+        if not text:
+            continue
+        for piece in splitter.split_text(text):
+            piece = piece.strip()
+            if piece:
+                out.append((page_no, piece))
+    return out
+
+def chunk_id(collection: str, source: str, chunk_index: int) -> str:
+    return hashlib.sha1(f"{collection}|{source}|{chunk_index}".encode("utf-8")).hexdigest()[:24]
+
+def parse_book(spec: BookSpec) -> Tuple[BookSpec, int, List[Dict[str, Any]]]:
+    """
+    Baca PDF & pecah jadi chunk. Metadata mengikuti konvensi PyPDFLoader (page mulai dari 0),
+    ditambah pengayaan offline (summary, key_terms, n_tokens) yang dipakai saat merakit konteks.
+    """
+    pages = read_pdf_pages(spec.path)
+    chunks = []
+    for i, (page, text) in enumerate(chunk_pages(pages, spec.chunk_size, spec.chunk_overlap)):
+        chunks.append({
+            "id": chunk_id(spec.collection, spec.path, i),
+            "text": text,
+            "metadata": {
+                "source": spec.path,
+                "page": page,
+                "chunk_index": i,
+                "book_title": spec.title,
+                "collection": spec.collection,
+                **enrich_metadata(text),
+            },
+        })
+    return spec, len(pages), chunks
+
+# =========================
+# Manifest & cache embedding
+# =========================
+
+def artifact_dir(persist_dir: str) -> str:
+    """Artefak ingesti disimpan di samping vectorstore (bundle_psionic/), bukan di dalamnya."""
+    return os.path.dirname(os.path.abspath(persist_dir))
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"collections": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.setdefault("collections", {})
+    return data
+
+def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+class EmbeddingCache:
+    """Cache embedding per (model, teks chunk) di SQLite; vektor disimpan sebagai float32."""
+
+    def __init__(self, path: str, model: str):
+        self.model = model
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, List[float]]:
+        keys = [self._key(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            for k, blob in rows:
+                found[k] = array.array("f", blob).tolist()
+        return {i: found[k] for i, k in enumerate(keys) if k in found}
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)",
+            [(self._key(t), array.array("f", v).tobytes()) for t, v in zip(texts, vectors)],
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+# =========================
+# Embedding batch + retry
+# =========================
+
+_TRANSIENT_NAMES = ("ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+                    "TooManyRequests", "ResourceExhausted", "Unavailable", "Aborted")
+_TRANSIENT_TEXT = ("UNAVAILABLE", "DEADLINE_EXCEEDED", "timed out", "Timeout")
+
+def is_transient_error(e: BaseException) -> bool:
+    """Kuota/429, 5xx, dan timeout layak diulang; galat lain (kunci API, input, bug) tidak akan sembuh sendiri."""
+    if is_quota_error(e) or isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if isinstance(code, int) and 500 <= code < 600:
+        return True
+    text = str(e)
+    return type(e).__name__ in _TRANSIENT_NAMES or any(t in text for t in _TRANSIENT_TEXT)
+
+def embed_with_retry(embeddings, texts: List[str], max_retries: int = 5, base_delay: float = 1.0) -> List[List[float]]:
+    attempt = 0
+    while True:
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_transient_error(e):
+                raise
+            delay = base_delay * (2 ** (attempt - 1)) * (1.0 + random.random() * 0.25)
+            print(f"  embed gagal ({e}); ulang {attempt}/{max_retries} dalam {delay:.1f}s", file=sys.stderr)
+            time.sleep(delay)
+
+def _make_client(persist_dir: str):
+    from chromadb import PersistentClient
+    from chromadb.config import Settings
+    os.makedirs(persist_dir, exist_ok=True)
+    # settings harus sama persis dengan PsionicAgent (Chroma singleton per path)
+    return PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False, allow_reset=True))
+
+def _make_embeddings(model: str):
+    from dotenv import load_dotenv
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    load_dotenv()
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise RuntimeError("GOOGLE_API_KEY tidak ditemukan di .env")
+    return GoogleGenerativeAIEmbeddings(model=model, task_type="retrieval_document")
+
+def upsert_chunks(coll, chunks: List[Dict[str, Any]], vectors: List[List[float]]) -> None:
+    for i in range(0, len(chunks), UPSERT_BATCH):
+        part = chunks[i:i + UPSERT_BATCH]
+        coll.upsert(
+            ids=[c["id"] for c in part],
+            embeddings=vectors[i:i + UPSERT_BATCH],
+            documents=[c["text"] for c in part],
+            metadatas=[c["metadata"] for c in part],
+        )
+
+# =========================
+# Pipeline
+# =========================
+
+def _delete_ids(coll, ids: List[str]) -> None:
+    for i in range(0, len(ids), UPSERT_BATCH):
+        coll.delete(ids=ids[i:i + UPSERT_BATCH])
+
+def embed_chunks(chunks: List[Dict[str, Any]], cache: EmbeddingCache, get_embeddings, batch_size: int, stats: Dict[str, Any]) -> List[List[float]]:
+    """Ambil dari cache bila teks chunk sama; sisanya di-embed batch besar lalu disimpan ke cache."""
+    texts = [c["text"] for c in chunks]
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    for i, v in cache.get_many(texts).items():
+        vectors[i] = v
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    stats["cached"] += len(texts) - len(missing)
+    if missing:
+        embeddings = get_embeddings()
+        t0 = time.perf_counter()
+        for j in range(0, len(missing), batch_size):
+            idxs = missing[j:j + batch_size]
+            got = embed_with_retry(embeddings, [texts[i] for i in idxs])
+            cache.put_many([texts[i] for i in idxs], got)
+            for i, v in zip(idxs, got):
+                vectors[i] = v
+        stats["embed_s"] += time.perf_counter() - t0
+        stats["embedded"] += len(missing)
+    return vectors  # type: ignore[return-value]
+
+def ingest(
+    cfg: Dict[str, Any],
+    workers: int = 4,
+    batch_size: int = 100,
+    only: Optional[List[str]] = None,
+    embeddings=None,
+    client=None,
+    full: bool = False,
+) -> Dict[str, Any]:
+    specs = book_specs(cfg, only)
+    client = client or _make_client(cfg["persist_dir"])
+    art = artifact_dir(cfg["persist_dir"])
+    os.makedirs(art, exist_ok=True)
+    manifest_path = os.path.join(art, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    mcolls: Dict[str, Dict[str, Any]] = manifest["collections"]
+    selected = [c for c in (cfg.get("collections") or {}) if not only or c in only]
+
+    holder: Dict[str, Any] = {"emb": embeddings}
+    def get_embeddings():
+        if holder["emb"] is None:
+            holder["emb"] = _make_embeddings(cfg["embed_model"])
+        return holder["emb"]
+
+    stats = {"books": 0, "pages": 0, "chunks": 0, "skipped": 0, "removed": 0, "cached": 0, "embedded": 0,
+             "parse_s": 0.0, "embed_s": 0.0, "upsert_s": 0.0}
+    t_start = time.perf_counter()
+    changed = False
+
+    if full:
+        for name in selected:
+            try:
+                client.delete_collection(name)
+            except Exception:
+                pass
+            mcolls.pop(name, None)
+        changed = True
+
+    # 0) koleksi yang dihapus dari config (hanya bila semua koleksi diproses)
+    if not only:
+        for name in [c for c in mcolls if c not in selected]:
+            try:
+                client.delete_collection(name)
+            except Exception:
+                pass
+            mcolls.pop(name, None)
+            print(f"  [{name}] koleksi dihapus (tidak ada di config)")
+            changed = True
+
+    # 1) tentukan buku baru/berubah lewat hash file
+    todo: List[Tuple[BookSpec, str]] = []
+    current: Dict[str, set] = {name: set() for name in selected}
+    for spec in specs:
+        current.setdefault(spec.collection, set()).add(spec.path)
+        h = file_hash(spec.path)
+        entry = mcolls.get(spec.collection, {}).get(spec.path)
+        if entry and entry.get("hash") == h and entry.get("title") == spec.title \
+                and entry.get("chunking") == [spec.chunk_size, spec.chunk_overlap] \
+                and entry.get("enrich") == ENRICH_VERSION:  # pengayaan lama -> proses ulang (embedding dari cache)
+            stats["skipped"] += 1
+            continue
+        todo.append((spec, h))
+
+    # 2) buku yang hilang dari sumber -> hapus chunk-nya
+    for name in selected:
+        books = mcolls.get(name, {})
+        for src in [p for p in books if p not in current.get(name, set())]:
+            ids = books.pop(src).get("chunk_ids") or []
+            if ids:
+                _delete_ids(client.get_or_create_collection(name), ids)
+            stats["removed"] += 1
+            changed = True
+            print(f"  [{name}] dihapus: {src} ({len(ids)} chunk)")
+
+    # 3) parse + chunk paralel (hanya yang berubah)
+    t0 = time.perf_counter()
+    todo_specs = [spec for spec, _ in todo]
+    if workers > 1 and len(todo_specs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parsed = list(ex.map(parse_book, todo_specs))
+    else:
+        parsed = [parse_book(s) for s in todo_specs]
+    stats["parse_s"] = time.perf_counter() - t0
+
+    # 4) embed (dengan cache) + upsert, lalu buang chunk lama yang tidak terpakai
+    cache = EmbeddingCache(os.path.join(art, EMBED_CACHE_FILE), cfg["embed_model"])
+    try:
+        for (spec, n_pages, chunks), (_, h) in zip(parsed, todo):
+            stats["books"] += 1
+            stats["pages"] += n_pages
+            coll = client.get_or_create_collection(spec.collection)
+            vectors = embed_chunks(chunks, cache, get_embeddings, batch_size, stats)
+            t0 = time.perf_counter()
+            upsert_chunks(coll, chunks, vectors)
+            books = mcolls.setdefault(spec.collection, {})
+            new_ids = [c["id"] for c in chunks]
+            keep = set(new_ids)
+            stale = [i for i in (books.get(spec.path, {}).get("chunk_ids") or []) if i not in keep]
+            if stale:
+                _delete_ids(coll, stale)
+            stats["upsert_s"] += time.perf_counter() - t0
+            stats["chunks"] += len(chunks)
+            books[spec.path] = {
+                "hash": h,
+                "title": spec.title,
+                "chunking": [spec.chunk_size, spec.chunk_overlap],
+                "enrich": ENRICH_VERSION,
+                "chunk_ids": new_ids,
+            }
+            changed = True
+            print(f"  [{spec.collection}] {spec.title}: {n_pages} halaman, {len(chunks)} chunk")
+            # simpan progres per buku agar run yang terputus tidak mengulang dari nol
+            save_manifest(manifest_path, manifest)
+    finally:
+        cache.close()
+
+    save_manifest(manifest_path, manifest)
+    stats["index_version"] = bump_index_version(cfg["persist_dir"]) if changed else None
+    stats["total_s"] = time.perf_counter() - t_start
+    return stats
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    def rate(n, s):
+        return n / s if s > 0 else 0.0
+    return "\n".join([
+        f"Buku: {stats['books']} diproses, {stats['skipped']} tidak berubah, {stats['removed']} dihapus  "
+        f"Halaman: {stats['pages']}  Chunk: {stats['chunks']} ({stats['cached']} dari cache, {stats['embedded']} di-embed)",
+        f"Parse : {stats['parse_s']:.2f}s  ({rate(stats['pages'], stats['parse_s']):.1f} halaman/detik)",
+        f"Embed : {stats['embed_s']:.2f}s  ({rate(stats['embedded'], stats['embed_s']):.1f} chunk/detik)",
+        f"Upsert: {stats['upsert_s']:.2f}s",
+        f"Total : {stats['total_s']:.2f}s  ({rate(stats['pages'], stats['total_s']):.1f} halaman/detik, "
+        f"{rate(stats['chunks'], stats['total_s']):.1f} chunk/detik)",
+        f"Versi indeks: {stats['index_version'] if stats.get('index_version') else '(tidak berubah)'}",
+    ])
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Ingesti PDF ke vectorstore ChromaDB")
+    ap.add_argument("--config", default="books_config.yaml")
+    ap.add_argument("--persist-dir", default=None, help="override persist_dir di config")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--batch-size", type=int, default=100, help="jumlah teks per panggilan embedding")
+    ap.add_argument("--only", default="", help="koleksi dipisah koma")
+    ap.add_argument("--full", action="store_true", help="hapus & bangun ulang koleksi (abaikan manifest)")
+    args = ap.parse_args(argv)
+
+    cfg = load_config(args.config)
+    if args.persist_dir:
+        cfg["persist_dir"] = os.path.abspath(args.persist_dir)
+    only = [x.strip() for x in args.only.split(",") if x.strip()] or None
+    stats = ingest(cfg, workers=args.workers, batch_size=args.batch_size, only=only, full=args.full)
+    print(format_stats(stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
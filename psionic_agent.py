@@ -4,6 +4,11 @@ import os
 import re
 import time
 import logging
+import queue
+import inspect
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional, Any, Tuple, Dict
 from dotenv import load_dotenv
 
@@ -18,9 +23,31 @@ logging.getLogger("chromadb").setLevel(logging.ERROR)
 
 from chromadb.config import Settings
 from chromadb import PersistentClient
+from chromadb.api.client import SharedSystemClient
 from langchain_chroma import Chroma
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from tools.quant_index import QuantizedIndex
+from tools.adjacency import AdjacencyIndex
+from tools.chunk_store import ChunkStore, ChunkStoreSet
+from tools.citations import (
+    split_sentences as _split_sentences,
+    trim_to_chars_by_sentence as _trim_to_chars_by_sentence,
+    tail_by_sentence as _tail_by_sentence,
+    format_citations as _format_citations,
+    format_passage as _format_passage,
+)
+from tools.index_version import read_index_version
+from tools.deadline import Deadline, run_with_timeout
+from tools.token_budget import TokenCountCache, approx_tokens, fill_budget
+from tools.batch_summary import format_batch, parse_batch, transcript
+from agent_perf import PERF
+from agent_scheduler import LLMScheduler, llm_context, wrap_llm, BACKGROUND
+from tools.circuit_breaker import CircuitBreaker
+import agent_trace
 
 # =========================
 # PROMPTS (gaya "kita")
@@ -71,6 +98,18 @@ Riwayat:
 """
 )
 
+PROMPT_SUMMARIZE_BATCH = ChatPromptTemplate.from_template(
+    """Berikut beberapa percakapan TERPISAH milik pengguna berbeda, masing-masing diawali "### <id>".
+Ringkas SETIAP percakapan secara terpisah menjadi poin kontekstual pendek (maksimum 500 karakter).
+Fokus pada tujuan, preferensi gaya, dan istilah yang sudah didefinisikan. Jangan menyimpulkan hal baru
+dan jangan mencampur isi antar percakapan. Jawab hanya dengan format berikut, satu blok per id:
+### <id>
+<ringkasan>
+
+{conversations}
+"""
+)
+
 STYLE_HINTS = {
     "netral": "netral, profesional, langsung ke pokok",
     "hangat": "ramah, empatik, namun tetap ringkas",
@@ -88,41 +127,225 @@ MODE_HINTS = {
     "langkah": "Berikan langkah-langkah praktis bernomor.",
 }
 
+# anggaran token untuk bagian variabel prompt (konteks + riwayat + ringkasan memori) per mode
+MODE_TOKEN_BUDGETS = {
+    "ringkas": 1200,
+    "bullet": 1200,
+    "definisi": 1400,
+    "langkah": 1800,
+    "panjang": 2400,
+    "banding": 2400,
+}
+DEFAULT_TOKEN_BUDGET = 1600
+
+SCAN_RETRY_S = 5.0  # jeda sebelum scan koleksi (indeks ketetanggaan/store teks) yang gagal dicoba lagi
+
+EXTRACTIVE_NOTE = ("Layanan AI sedang terganggu, jadi untuk sementara kita tampilkan kutipan paling relevan "
+                   "langsung dari buku (tanpa ringkasan AI):")
+
+# =========================
+# Anggaran waktu per tahap
+# =========================
+
+# perkiraan awal (ms) sebelum histogram PERF punya sampel
+STAGE_ESTIMATE_MS = {"llm_plan": 1500.0, "llm_draft": 3000.0, "llm_rewrite": 2500.0, "llm_critique": 1500.0, "llm_refine": 3000.0}
+
+def stage_estimate_s(stage: str) -> float:
+    """p50 tahap dari jendela terakhir (detik)."""
+    return PERF.percentile(stage, 50, STAGE_ESTIMATE_MS.get(stage, 1000.0)) / 1000.0
+
+def shed_stage(deadline: Deadline, stage: str) -> None:
+    deadline.shed.append(stage)
+    PERF.incr(f"shed_{stage}")
+    agent_trace.note(shed=list(deadline.shed))
+
+# Bug, bukan gangguan layanan LLM: tidak boleh disamarkan sebagai tahap yang dilewati
+PROGRAMMING_ERRORS = (AttributeError, TypeError, NameError, KeyError, IndexError, AssertionError, ImportError)
+
+def shed_failed_stage(deadline: Optional[Deadline], stage: str, e: Exception) -> None:
+    """
+    Tahap LLM opsional (plan, rewrite, kritik, refine) gagal karena timeout, sirkuit terbuka, antrean
+    penuh, atau error API: catat ke PERF + trace lalu lewati; jawaban terbaik sejauh ini tetap dipakai.
+    PROGRAMMING_ERRORS dilempar ulang.
+    """
+    if isinstance(e, PROGRAMMING_ERRORS):
+        raise e
+    PERF.incr(f"{stage}_errors")
+    agent_trace.note_stage_error(stage, e)
+    if deadline is not None:
+        shed_stage(deadline, stage)
+
+def prefetch_hit_rate() -> float:
+    """Bagian lookup hasil prefetch sesi yang benar-benar dibaca giliran berikutnya."""
+    warmed = PERF.counter("prefetch_warmed")
+    return PERF.counter("prefetch_hit") / warmed if warmed else 0.0
+
 # =========================
-# Util pemangkasan aman
+# Micro-batching embedding kueri
 # =========================
 
-_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
-
-def _split_sentences(text: str) -> List[str]:
-    text = (text or "").strip()
-    if not text:
-        return []
-    return _SENT_SPLIT.split(text)
-
-def _trim_to_chars_by_sentence(text: str, max_chars: int) -> str:
-    """Pangkas di batas kalimat agar makna tetap utuh."""
-    if not text or len(text) <= max_chars:
-        return text or ""
-    sents = _split_sentences(text)
-    out = []
-    total = 0
-    for s in sents:
-        s = s.strip()
-        if not s:
-            continue
-        if total + len(s) + (1 if out else 0) > max_chars:
-            break
-        out.append(s)
-        total += len(s) + (1 if out else 0)
-    joined = " ".join(out).strip()
-    return joined if joined else text[:max_chars].rsplit(" ", 1)[0].rstrip() + "..."
+class EmbeddingBatcher(Embeddings):
+    """
+    Gabungkan embed_query dari permintaan yang bersamaan: kueri yang tiba dalam max_wait_ms
+    (hingga max_batch) dikirim sebagai satu panggilan embed_documents bertipe kueri,
+    lalu future tiap pemanggil diselesaikan. Maksimal max_inflight batch berjalan bersamaan.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch: int = 32, max_wait_ms: float = 5.0,
+                 max_inflight: int = 16, task_type: str = "RETRIEVAL_QUERY"):
+        self.inner = inner
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.task_type = task_type
+        self._queue: "queue.Queue[Optional[Tuple[str, Future, float]]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embed-batch")
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        try:
+            params = inspect.signature(inner.embed_documents).parameters.values()
+            self._pass_task = any(p.name == "task_type" or p.kind is p.VAR_KEYWORD for p in params)
+        except (TypeError, ValueError):
+            self._pass_task = False
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        fut: Future = Future()
+        # cek _closed dan enqueue di bawah lock yang sama dengan close(): tidak ada kueri di belakang sentinel
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._ensure_worker()
+                self._queue.put((text, fut, time.perf_counter()))
+        if closed:  # agent sudah dipensiunkan; pemanggil terlambat langsung ke backend
+            return self.inner.embed_query(text)
+        t0 = time.perf_counter()
+        vec = fut.result()
+        # flush berjalan di thread pool tanpa contextvars pemanggil: waktunya dicatat di sini agar masuk
+        # rincian/trace permintaan ini (!perf last, agent_trace)
+        started, seconds = getattr(fut, "batch_timing", (t0, 0.0))
+        PERF.observe("embed_batch_wait", max(0.0, started - t0), started=t0)
+        PERF.observe("embed_batch", seconds, started=started)
+        return vec
+
+    def close(self) -> None:
+        """Kueri yang sudah antre tetap di-flush collector; pool ditutup collector setelah sentinel."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+            worker = self._worker
+        if worker is None or not worker.is_alive():
+            self._fail_pending(RuntimeError("embedding batcher sudah ditutup"))
+            self._pool.shutdown(wait=False)
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and not item[1].done():
+                item[1].set_exception(exc)
+
+    def _ensure_worker(self) -> None:
+        """Dipanggil dengan _lock terkunci."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+            self._worker.start()
+
+    def _submit(self, batch: List[Tuple[str, Future, float]]) -> None:
+        try:
+            self._pool.submit(self._flush, batch)
+        except RuntimeError:  # pool sudah ditutup: selesaikan di thread ini, jangan biarkan pemanggil menunggu
+            self._flush(batch)
+
+    def _collect(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._pool.shutdown(wait=False)
+                return
+            batch = [first]
+            until = time.perf_counter() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                left = until - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=left) if left > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._submit(batch)
+                    self._pool.shutdown(wait=False)  # batch yang sudah disubmit tetap dijalankan
+                    return
+                batch.append(item)
+            self._submit(batch)
+
+    def _flush(self, batch: List[Tuple[str, Future, float]]) -> None:
+        texts = list(dict.fromkeys(t for t, _, _ in batch))  # kueri identik cukup sekali
+        PERF.observe_value("embed_batch_size", len(batch))
+        try:
+            started = time.perf_counter()
+            if self._pass_task:
+                vecs = self.inner.embed_documents(texts, task_type=self.task_type)
+            else:
+                vecs = self.inner.embed_documents(texts)
+            timing = (started, time.perf_counter() - started)  # dicatat pemanggil (embed_query)
+            by_text = dict(zip(texts, vecs))
+            for t, fut, _ in batch:
+                fut.batch_timing = timing
+                fut.set_result(by_text[t])
+        except Exception as e:
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+
+# =========================
+# Cache embedding kueri
+# =========================
+
+class QueryEmbeddingCache(Embeddings):
+    """LRU untuk embed_query agar kueri populer/berulang tidak memanggil API embedding lagi."""
+
+    def __init__(self, inner: Embeddings, max_items: int = 2048):
+        self.inner = inner
+        self.max_items = max_items
+        self._items: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vec = self._items.get(text)
+            if vec is not None:
+                self._items.move_to_end(text)
+                self.hits += 1
+                PERF.incr("embed_cache_hit")
+                return vec
+            self.misses += 1
+        PERF.incr("embed_cache_miss")
+        with PERF.span("embed_query"):
+            vec = self.inner.embed_query(text)
+        with self._lock:
+            self._items[text] = vec
+            self._items.move_to_end(text)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return vec
 
 # =========================
 # PsionicAgent
 # =========================
 
 class PsionicAgent:
+    chunk_texts: Optional[ChunkStoreSet] = None  # None = teks chunk diolah langsung dari page_content
+
     def __init__(
         self,
         persist_dir: str,
@@ -131,43 +354,181 @@ class PsionicAgent:
         mmr_lambda: float = 0.5,
         model_name: str = "gemini-2.5-flash",
         embed_name: str = "models/text-embedding-004",
+        use_quant_index: bool = False,     # int8 + re-score float32 dari disk
+        quant_dir: Optional[str] = None,
+        use_chunk_store: bool = False,     # teks chunk di-mmap untuk sitasi/konteks (tools/chunk_store.py)
+        chunk_store_dir: Optional[str] = None,
+        fresh_client: bool = False,        # paksa System Chroma baru (dipakai AgentRuntime saat reload)
+        auto_refresh: bool = True,         # refresh in-place saat versi indeks berubah
+        embeddings: Optional[Embeddings] = None,  # backend pengganti (mis. bench/fakes.py)
+        llm: Optional[Any] = None,
+        rewriter: Optional[Any] = None,
+        scheduler: Optional[LLMScheduler] = None,  # semua panggilan chat lewat penjadwal pusat
+        breaker: Optional[CircuitBreaker] = None,  # sirkuit bersama untuk backend chat
+        context_budgets: Optional[Dict[str, int]] = None,  # override MODE_TOKEN_BUDGETS
+        embed_batch: int = 0,           # >1 = micro-batching embed_query antar permintaan bersamaan
+        embed_batch_wait_ms: float = 5.0,
     ) -> None:
         load_dotenv()
-        if not os.getenv("GOOGLE_API_KEY"):
+        needs_google = embeddings is None or llm is None or rewriter is None
+        if needs_google and not os.getenv("GOOGLE_API_KEY"):
             raise RuntimeError("GOOGLE_API_KEY tidak ditemukan di .env")
 
         self.persist_dir = os.path.abspath(persist_dir)
+        self.model_name = model_name
+        self.context_budgets = {**MODE_TOKEN_BUDGETS, **(context_budgets or {})}
+        self.token_counts = TokenCountCache()
         self.retrieval_k = retrieval_k
         self.use_mmr = use_mmr
         self.mmr_lambda = mmr_lambda
+        self.use_quant_index = use_quant_index
+        self.quant_dir = os.path.abspath(quant_dir) if quant_dir else os.path.join(os.path.dirname(self.persist_dir), "quant_index")
+        self._quant_lock = threading.Lock()
+        self._refresh_lock = threading.RLock()  # refresh/maybe_refresh: satu pemanggil saja
 
-        self.client = PersistentClient(
-            path=self.persist_dir,
-            settings=Settings(anonymized_telemetry=False, allow_reset=True),
-        )
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=embed_name)
-        self.llm = ChatGoogleGenerativeAI(model=model_name, temperature=0.2)
-        self.rewriter = ChatGoogleGenerativeAI(model=model_name, temperature=0.3)
+        self.auto_refresh = auto_refresh
+        self.generation = 0
+        self.client = self._open_client(fresh=fresh_client)
+        base = embeddings or GoogleGenerativeAIEmbeddings(model=embed_name)
+        self._batcher = EmbeddingBatcher(base, embed_batch, embed_batch_wait_ms) if embed_batch > 1 else None
+        self.embeddings = QueryEmbeddingCache(self._batcher or base)
+        self.llm = llm or ChatGoogleGenerativeAI(model=model_name, temperature=0.2)
+        self.rewriter = rewriter or ChatGoogleGenerativeAI(model=model_name, temperature=0.3)
+        self.llm = wrap_llm(self.llm, model_name, scheduler, breaker)
+        self.rewriter = wrap_llm(self.rewriter, model_name, scheduler, breaker)
 
         self.collections = [c.name for c in self.client.list_collections()]
         if not self.collections:
             raise RuntimeError("Tidak ada koleksi di vectorstore. Pastikan persist benar.")
 
+        self._stores: Dict[str, Chroma] = {}
+        self._quant: Dict[str, QuantizedIndex] = {}
         self._retrievers = {name: self._make_retriever(name) for name in self.collections}
         self._titles_cache: Optional[Dict[str, List[str]]] = None
 
         # cache retrieval sederhana (TTL 5 menit)
         self._ret_cache: Dict[Tuple[str, str, int, bool], Tuple[float, List[Any]]] = {}
         self._ret_ttl = 300.0
+        # urutan chunk per koleksi (tools/adjacency.py) + chunk tetangga per (koleksi, source, page,
+        # chunk_index, span); keduanya berlaku sampai refresh
+        self._adjacency: Dict[str, AdjacencyIndex] = {}
+        self._adjacency_lock = threading.Lock()
+        self._scan_failed: Dict[str, float] = {}  # koleksi -> waktu scan gagal terakhir (dicoba lagi setelah jeda)
+        # teks chunk ternormalisasi + batas kalimat, di-mmap (sitasi & pemangkasan tanpa regex per panggilan)
+        self.chunk_store_dir = os.path.abspath(chunk_store_dir) if chunk_store_dir else \
+            os.path.join(os.path.dirname(self.persist_dir), "chunk_store")
+        # versi dicek ulang lewat invalidate() saat refresh, bukan tiap akses
+        self.chunk_texts = ChunkStoreSet(self.chunk_store_dir, lambda: self.index_version,
+                                         check_interval_s=60.0) if use_chunk_store else None
+        self._chunk_store_checked: set = set()
+        self._neighbor_cache: "OrderedDict[Tuple, List[Any]]" = OrderedDict()
+        self._neighbor_max = 4096
+        # kunci cache yang diisi prefetch sesi dan belum dibaca giliran berikutnya
+        self._prefetched: "OrderedDict[Tuple, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        PERF.gauge_fn("prefetch_hit_rate", prefetch_hit_rate)
+
+        # versi indeks (ditulis ingest.py); dicek berkala agar indeks baru terbaca tanpa restart
+        self.index_version = read_index_version(self.persist_dir)
+        self._version_checked_at = time.time()
+        self._version_check_interval = 10.0
+
+    def _open_client(self, fresh: bool = False):
+        if fresh:
+            # Lepas System lama dari cache Chroma agar segmen dibaca ulang dari disk.
+            # Client lama tetap memegang server-nya sendiri, jadi retrieval yang sedang jalan aman.
+            SharedSystemClient._identifer_to_system.pop(self.persist_dir, None)
+        client = PersistentClient(
+            path=self.persist_dir,
+            settings=Settings(anonymized_telemetry=False, allow_reset=True),
+        )
+        self._system = SharedSystemClient._identifer_to_system.get(self.persist_dir)
+        return client
+
+    def close(self) -> None:
+        """Hentikan System Chroma milik agent ini bila sudah tidak dipakai client aktif lain."""
+        system = getattr(self, "_system", None)
+        if system is not None and SharedSystemClient._identifer_to_system.get(self.persist_dir) is not system:
+            system.stop()
+        self._system = None
+        if getattr(self, "_batcher", None) is not None:
+            self._batcher.close()
+            self._batcher = None
+
+    # ---------- reload indeks ----------
+    def refresh(self) -> None:
+        """
+        Baca ulang koleksi, retriever, dan katalog judul dari disk. State baru disiapkan di variabel lokal
+        lalu ditukar sekaligus di bawah lock; retrieval yang sedang jalan tetap memakai state lama.
+        """
+        with self._refresh_lock:
+            client = self._open_client(fresh=True)
+            collections = [c.name for c in client.list_collections()]
+            if not collections:
+                raise RuntimeError("Tidak ada koleksi di vectorstore. Pastikan persist benar.")
+            stores = {name: self._new_store(name, client) for name in collections}
+            retrievers = {name: self._make_retriever(name, stores[name]) for name in collections}
+            version = read_index_version(self.persist_dir)
+            # build indeks int8/ketetanggaan yang sedang berjalan selesai dulu (lock-nya), agar hasil versi
+            # lama tidak tertulis ke state baru
+            with self._quant_lock, self._adjacency_lock, self._lock:
+                self.client = client
+                self.collections = collections
+                self._stores = stores
+                self._retrievers = retrievers
+                self._quant = {}
+                self._titles_cache = None
+                self._ret_cache = {}
+                self._adjacency = {}
+                self._scan_failed = {}
+                self._chunk_store_checked = set()
+                self._neighbor_cache.clear()
+                self._prefetched.clear()
+                self.index_version = version
+            if self.chunk_texts is not None:
+                self.chunk_texts.invalidate()
+
+    def maybe_refresh(self) -> bool:
+        """
+        Refresh bila ingest.py menaikkan versi indeks (dicek paling sering tiap _version_check_interval).
+        Satu pemanggil saja yang me-refresh; pemanggil lain lanjut dengan state lama.
+        """
+        if not self.auto_refresh:
+            return False
+        now = time.time()
+        if now - self._version_checked_at < self._version_check_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            if now - self._version_checked_at < self._version_check_interval:
+                return False  # thread lain baru saja mengecek
+            self._version_checked_at = now
+            if read_index_version(self.persist_dir) == self.index_version:
+                return False
+            self.refresh()
+            return True
+        finally:
+            self._refresh_lock.release()
 
     # ---------- retriever ----------
-    def _make_retriever(self, name: str):
-        vs = Chroma(
+    def _new_store(self, name: str, client) -> Chroma:
+        return Chroma(
             collection_name=name,
             persist_directory=self.persist_dir,
             embedding_function=self.embeddings,
-            client=self.client,
+            client=client,
         )
+
+    def _store(self, name: str) -> Chroma:
+        vs = self._stores.get(name)
+        if vs is None:
+            vs = self._new_store(name, self.client)
+            self._stores[name] = vs
+        return vs
+
+    def _make_retriever(self, name: str, vs: Optional[Chroma] = None):
+        vs = vs or self._store(name)
         if self.use_mmr:
             return vs.as_retriever(
                 search_type="mmr",
@@ -176,6 +537,7 @@ class PsionicAgent:
         return vs.as_retriever(search_type="similarity", search_kwargs={"k": self.retrieval_k})
 
     def list_collections(self) -> List[str]:
+        self.maybe_refresh()
         return list(self.collections)
 
     # ---------- retrieval + cache ----------
@@ -197,64 +559,162 @@ class PsionicAgent:
     def _put_cache(self, key, docs):
         self._ret_cache[key] = (time.time(), docs)
 
+    def _lookup(self, key, prefetch: bool, cached_only: bool = False) -> Optional[List[Any]]:
+        """
+        Cache retrieval; lookup prefetch tidak ikut dihitung sebagai hit/miss trafik nyata. cached_only
+        (jangkar sesi) dihitung terpisah di session_anchor_hit/miss.
+        """
+        cached = self._get_cache(key)
+        if prefetch:
+            return cached
+        if cached_only:
+            PERF.incr("session_anchor_hit" if cached is not None else "session_anchor_miss")
+            if cached is not None:
+                self._note_prefetch_hit(key)
+            return cached
+        if cached is not None:
+            PERF.incr("retrieval_cache_hit")
+            agent_trace.note_cache_hit("retrieval")
+            self._note_prefetch_hit(key)
+        else:
+            PERF.incr("retrieval_cache_miss")
+        return cached
+
+    def _note_prefetch_hit(self, key) -> None:
+        with self._lock:
+            hit = self._prefetched.pop(key, False) is None
+        if hit:
+            PERF.incr("prefetch_hit")
+
+    def _note_prefetched(self, key) -> None:
+        with self._lock:
+            self._prefetched[key] = None
+            self._prefetched.move_to_end(key)
+            while len(self._prefetched) > self._neighbor_max:
+                self._prefetched.popitem(last=False)
+        PERF.incr("prefetch_warmed")
+
     def retrieve(
         self,
         question: str,
         collection: Optional[str] = None,
         k_override: Optional[int] = None,
-        use_mmr: Optional[bool] = None
+        use_mmr: Optional[bool] = None,
+        prefetch: bool = False,
+        cached_only: bool = False,
     ) -> List[Any]:
         """
         Retrieval cepat dengan optional override k & MMR + cache.
         Kompatibel dengan agent_brain yang memanggil k_override/use_mmr.
+        prefetch=True: hanya mengisi cache untuk giliran berikutnya (dihitung di prefetch_hit/warmed).
+        cached_only=True: hanya isi cache (mis. hasil prefetch); [] bila belum ada, tanpa pencarian.
         """
+        self.maybe_refresh()
         k = k_override if k_override is not None else self.retrieval_k
         use_mmr_eff = self.use_mmr if use_mmr is None else use_mmr
         key = self._cache_key(question, collection, k, use_mmr_eff)
-        cached = self._get_cache(key)
-        if cached is not None:
-            return cached
+        cached = self._lookup(key, prefetch, cached_only)
+        if cached is not None or cached_only:
+            return cached or []
 
-        if collection:
-            vs = Chroma(
-                collection_name=collection,
-                persist_directory=self.persist_dir,
-                embedding_function=self.embeddings,
-                client=self.client,
-            )
-            retr = vs.as_retriever(
-                search_type="mmr" if use_mmr_eff else "similarity",
-                search_kwargs={"k": k, **({"lambda_mult": self.mmr_lambda} if use_mmr_eff else {})},
-            )
-            try:
-                docs = retr.invoke(question)
-            except Exception:
+        with PERF.span("retrieve"):
+            if collection:
+                try:
+                    docs = self._search(collection, question, k, use_mmr_eff)
+                except Exception:
+                    docs = []
+            else:
+                # lintas koleksi
                 docs = []
+                for name in self.collections:
+                    try:
+                        docs.extend(self._search(name, question, k, use_mmr_eff))
+                    except Exception:
+                        continue
             docs = self._dedupe(docs)[:k]
-            self._put_cache(key, docs)
-            return docs
-
-        # lintas koleksi
-        docs_all = []
-        for name in self.collections:
-            try:
-                vs = Chroma(
-                    collection_name=name,
-                    persist_directory=self.persist_dir,
-                    embedding_function=self.embeddings,
-                    client=self.client,
-                )
-                retr = vs.as_retriever(
-                    search_type="mmr" if use_mmr_eff else "similarity",
-                    search_kwargs={"k": k, **({"lambda_mult": self.mmr_lambda} if use_mmr_eff else {})},
-                )
-                docs_all.extend(retr.invoke(question))
-            except Exception:
-                continue
-        docs = self._dedupe(docs_all)[:k]
         self._put_cache(key, docs)
+        if prefetch:
+            self._note_prefetched(key)
         return docs
 
+    def _search(self, name: str, question: str, k: int, use_mmr: bool) -> List[Any]:
+        """Satu pencarian vektor di satu koleksi (titik tunggal untuk Chroma/indeks int8)."""
+        if not use_mmr and self.use_quant_index:
+            return self._quant_search(name, question, k)
+        # embed terpisah dari pencarian agar waktunya tercatat sendiri-sendiri
+        vec = self.embeddings.embed_query(question)
+        vs = self._store(name)
+        with PERF.span("vector_search"):
+            if use_mmr:
+                scored = [(d, None) for d in vs.max_marginal_relevance_search_by_vector(vec, k=k, lambda_mult=self.mmr_lambda)]
+            else:
+                scored = vs.similarity_search_by_vector_with_relevance_scores(vec, k=k)  # jarak mentah Chroma
+        agent_trace.note_search(name, scored)
+        return [d for d, _ in scored]
+
+    # ---------- indeks int8 ----------
+    def quant_index(self, name: str) -> Optional[QuantizedIndex]:
+        """Indeks int8 koleksi `name` (None bila tidak dipakai); dipanggil saat pemanasan agar tidak dibangun di kueri."""
+        return self._get_quant(name) if self.use_quant_index else None
+
+    def _get_quant(self, name: str) -> QuantizedIndex:
+        idx = self._quant.get(name)
+        if idx is not None:
+            return idx
+        with self._quant_lock:
+            idx = self._quant.get(name)
+            if idx is not None:
+                return idx
+            coll = self.client.get_collection(name)
+            out_dir = os.path.join(self.quant_dir, name)
+            try:
+                idx = QuantizedIndex.load(out_dir) if QuantizedIndex.stored_meta(out_dir) else None
+            except (OSError, ValueError) as e:  # generasi terhapus/tidak konsisten: bangun ulang
+                print(f"Indeks int8 {name} tidak bisa dimuat ({e}), dibangun ulang")
+                idx = None
+            if idx is None or len(idx) != coll.count() or idx.version != self.index_version:
+                idx = self.build_quant_index(name)
+            self._quant[name] = idx
+            return idx
+
+    def build_quant_index(self, name: str, batch: int = 1000) -> QuantizedIndex:
+        """Bangun ulang indeks int8 satu koleksi dari embedding di Chroma."""
+        coll = self.client.get_collection(name)
+        total = coll.count()
+        ids: List[str] = []
+        vecs: List[List[float]] = []
+        offset = 0
+        while offset < total:
+            got = coll.get(include=["embeddings"], limit=batch, offset=offset)
+            ids.extend(got.get("ids") or [])
+            vecs.extend(got.get("embeddings") or [])
+            offset += batch
+        space = (coll.metadata or {}).get("hnsw:space", "l2")
+        idx = QuantizedIndex.build(ids, vecs, os.path.join(self.quant_dir, name), space=space, version=self.index_version)
+        self._quant[name] = idx
+        return idx
+
+    def _quant_search(self, name: str, question: str, k: int) -> List[Any]:
+        idx = self._get_quant(name)
+        vec = self.embeddings.embed_query(question)
+        with PERF.span("quant_search"):
+            hits = idx.search(vec, k)
+        if not hits:
+            return []
+        with PERF.span("doc_fetch"):
+            got = self.client.get_collection(name).get(ids=[h[0] for h in hits], include=["documents", "metadatas"])
+        by_id = {
+            i: (doc, md)
+            for i, doc, md in zip(got.get("ids") or [], got.get("documents") or [], got.get("metadatas") or [])
+        }
+        scored = []
+        for doc_id, dist in hits:
+            if doc_id in by_id:
+                text, md = by_id[doc_id]
+                scored.append((Document(page_content=text or "", metadata=md or {}), dist))
+        agent_trace.note_search(name, scored)
+        return [d for d, _ in scored]
+
     @staticmethod
     def _dedupe(docs: List[Any]) -> List[Any]:
         seen = set()
@@ -293,11 +753,15 @@ class PsionicAgent:
         return sorted(titles, key=lambda x: x.lower())
 
     def list_all_books(self) -> Dict[str, List[str]]:
-        return {name: self.list_books(name) for name in self.collections}
+        self.maybe_refresh()
+        with PERF.span("catalog"):
+            return {name: self.list_books(name) for name in self.collections}
 
     def _all_titles_by_collection(self) -> Dict[str, List[str]]:
         if self._titles_cache is not None:
+            PERF.incr("title_catalog_hit")
             return self._titles_cache
+        PERF.incr("title_catalog_miss")
         self._titles_cache = self.list_all_books()
         return self._titles_cache
 
@@ -325,21 +789,173 @@ class PsionicAgent:
                 out.append(d)
         return out
 
-    def retrieve_by_book(self, question: str, collection: str, book_title: str, k_override: Optional[int] = None) -> List[Any]:
+    def retrieve_by_book(self, question: str, collection: str, book_title: str, k_override: Optional[int] = None,
+                         prefetch: bool = False, cached_only: bool = False) -> List[Any]:
         k = k_override if k_override is not None else max(self.retrieval_k, 12)
+        self.maybe_refresh()
+        key = self._cache_key(question, f"{collection}/{book_title}", k, False)
+        cached = self._lookup(key, prefetch, cached_only)
+        if cached is not None or cached_only:
+            return cached or []
         try:
-            vs = Chroma(
-                collection_name=collection,
-                persist_directory=self.persist_dir,
-                embedding_function=self.embeddings,
-                client=self.client,
-            )
-            retr = vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
-            docs = self._dedupe(retr.invoke(question))
-            filtered = self._filter_docs_by_title(docs, book_title)
-            return (filtered or docs)[: self.retrieval_k]
+            with PERF.span("retrieve_by_book"):
+                docs = self._dedupe(self._search(collection, question, k, use_mmr=False))
+                filtered = self._filter_docs_by_title(docs, book_title)
+                docs = (filtered or docs)[: self.retrieval_k]
         except Exception:
             return []
+        self._put_cache(key, docs)
+        if prefetch:
+            self._note_prefetched(key)
+        return docs
+
+    # ---------- chunk tetangga ----------
+    def adjacency(self, name: str) -> AdjacencyIndex:
+        """
+        Indeks urutan chunk koleksi `name`, dibangun sekali per generasi indeks dari scan metadata.
+        Bila scan gagal, indeks kosong dikembalikan tanpa di-cache (dicoba lagi setelah SCAN_RETRY_S).
+        """
+        idx = self._adjacency_or_none(name)
+        return idx if idx is not None else AdjacencyIndex()
+
+    def _adjacency_or_none(self, name: str) -> Optional[AdjacencyIndex]:
+        idx = self._adjacency.get(name)
+        if idx is None:
+            self._scan_collection(name)
+            idx = self._adjacency.get(name)
+        return idx
+
+    def chunk_store(self, name: str) -> Optional[ChunkStore]:
+        """Store teks chunk (tools/chunk_store.py) koleksi `name`; dibangun bila belum ada atau usang."""
+        if self.chunk_texts is None:
+            return None
+        store = self.chunk_texts.get(name)
+        if store is None and name not in self._chunk_store_checked:
+            self._scan_collection(name)
+            store = self.chunk_texts.get(name)
+        return store
+
+    def _scan_collection(self, name: str) -> None:
+        """Satu scan koleksi untuk indeks ketetanggaan dan, bila usang, store teks chunk."""
+        with self._adjacency_lock:
+            need_store = self.chunk_texts is not None and name not in self._chunk_store_checked
+            if name in self._adjacency and not need_store:
+                return
+            if time.monotonic() - self._scan_failed.get(name, -SCAN_RETRY_S) < SCAN_RETRY_S:
+                return
+            rows: List[Tuple[str, Dict, str]] = []
+            try:
+                coll = self.client.get_collection(name)
+                total = coll.count()
+                need_store = need_store and not self.chunk_texts.is_fresh(name, total)
+                include = ["metadatas", "documents"] if need_store else ["metadatas"]
+                with PERF.span("adjacency_build"):
+                    offset, limit = 0, 1000
+                    while offset < total:
+                        batch = coll.get(include=include, limit=limit, offset=offset)
+                        docs = batch.get("documents") or [""] * len(batch.get("ids") or [])
+                        rows.extend(zip(batch.get("ids") or [], batch.get("metadatas") or [], docs))
+                        offset += limit
+            except Exception as e:
+                # error Chroma sesaat: jangan cache indeks kosong, coba lagi setelah SCAN_RETRY_S
+                self._scan_failed[name] = time.monotonic()
+                PERF.incr("adjacency_scan_errors")
+                print(f"Scan koleksi {name} gagal: {e}")
+                return
+            self._scan_failed.pop(name, None)
+            if name not in self._adjacency:
+                self._adjacency[name] = AdjacencyIndex.build((i, md) for i, md, _ in rows)
+            if need_store:
+                try:
+                    with PERF.span("chunk_store_build"):
+                        store = ChunkStore.build(((i, text, md) for i, md, text in rows),
+                                                 self.chunk_texts.path(name), version=self.index_version)
+                    self.chunk_texts.put(name, store)
+                except OSError as e:  # folder read-only: tetap jalan dengan string biasa
+                    print(f"Store teks chunk {name} gagal dibangun: {e}")
+            self._chunk_store_checked.add(name)
+
+    def chunk_neighbors(self, md: Dict, span: int = 1, prefetch: bool = False,
+                        cached_only: bool = False) -> Tuple[List[Any], List[Any]]:
+        """
+        (chunk sebelum, chunk sesudah) sebuah chunk dalam urutan baca source-nya, paling banyak `span`
+        per sisi. Diambil lewat id dari indeks ketetanggaan, tanpa pencarian vektor; hasil di-cache (LRU).
+        cached_only=True: ([], []) bila belum ada di cache.
+        """
+        self.maybe_refresh()
+        colls = [md["collection"]] if md.get("collection") in self.collections else list(self.collections)
+        if not md.get("source") or md.get("chunk_index") is None:
+            return [], []
+        key = ("neighbors", tuple(colls), md.get("source"), md.get("page"), md.get("chunk_index"), span)
+        with self._lock:
+            found = self._neighbor_cache.get(key)
+            if found is not None:
+                self._neighbor_cache.move_to_end(key)
+        if cached_only:
+            PERF.incr("session_anchor_hit" if found is not None else "session_anchor_miss")
+        if found is not None:
+            if not prefetch:
+                PERF.incr("neighbor_cache_hit")
+                self._note_prefetch_hit(key)
+            return found
+        if cached_only:
+            return [], []
+        if not prefetch:
+            PERF.incr("neighbor_cache_miss")
+        found, complete = ([], []), True
+        for name in colls:
+            idx = self._adjacency_or_none(name)
+            if idx is None:
+                complete = False  # scan koleksi gagal: hasil kosong tidak di-cache
+                continue
+            ids = idx.neighbors(md, span)
+            if ids is not None:
+                fetched = self._fetch_chunks(name, ids[0], ids[1])
+                found, complete = fetched or ([], []), fetched is not None
+                break
+        if not complete:
+            return found
+        with self._lock:
+            self._neighbor_cache[key] = found
+            while len(self._neighbor_cache) > self._neighbor_max:
+                self._neighbor_cache.popitem(last=False)
+        if prefetch:
+            self._note_prefetched(key)
+        return found
+
+    def _fetch_chunks(self, name: str, before: List[str], after: List[str]) -> Optional[Tuple[List[Any], List[Any]]]:
+        """Chunk sebelum/sesudah lewat id; None bila get gagal (hasil tidak di-cache)."""
+        if not before and not after:
+            return [], []
+        try:
+            with PERF.span("neighbor_lookup"):
+                res = self.client.get_collection(name).get(ids=before + after, include=["documents", "metadatas"])
+        except Exception:
+            return None
+        by_id = {i: Document(page_content=text or "", metadata=m or {})
+                 for i, text, m in zip(res.get("ids") or [], res.get("documents") or [], res.get("metadatas") or [])}
+        return [by_id[i] for i in before if i in by_id], [by_id[i] for i in after if i in by_id]
+
+    def neighbor_chunks(self, metas: List[Dict], span: int = 1, prefetch: bool = False,
+                        cached_only: bool = False) -> List[Any]:
+        """
+        Tetangga (sebelum lalu sesudah) dari tiap dokumen bermetadata `metas`, berurutan per dokumen;
+        dokumen yang sudah ada di `metas` atau muncul lebih dulu tidak diulang.
+        """
+        seen = {self._doc_key(md) for md in metas}
+        out: List[Any] = []
+        for md in metas:
+            before, after = self.chunk_neighbors(md, span, prefetch=prefetch, cached_only=cached_only)
+            for d in before + after:
+                dk = self._doc_key(d.metadata)
+                if dk not in seen:
+                    seen.add(dk)
+                    out.append(d)
+        return out
+
+    @staticmethod
+    def _doc_key(md: Dict) -> Tuple:
+        return (md.get("source"), md.get("page"), md.get("chunk_index"))
 
     def smart_retrieve(self, question: str) -> Tuple[List[Any], Optional[str], Optional[str]]:
         hit = self._match_title(question)
@@ -359,17 +975,42 @@ class PsionicAgent:
         book_title = meta.get("book_title") or meta.get("book") or "unknown"
         return f"[book:{book_title}, source:{_os.path.basename(src)}, page:{page}]"
 
+    def _trimmed_content(self, d: Any, char_limit: int) -> str:
+        """Isi chunk terpangkas di batas kalimat; dari store teks chunk bila ada (tanpa regex per panggilan)."""
+        trimmed = self.chunk_texts.trim(d, char_limit) if self.chunk_texts is not None else None
+        if trimmed is None:
+            trimmed = _trim_to_chars_by_sentence((getattr(d, "page_content", str(d)) or "").strip(), char_limit)
+        return trimmed
+
     def _format_full_block(self, d: Any, char_limit: int) -> str:
         meta = getattr(d, "metadata", {}) or {}
-        content = (getattr(d, "page_content", str(d)) or "").strip()
-        trimmed = _trim_to_chars_by_sentence(content, char_limit)
-        return trimmed + "\n" + self._cite_line(meta)
+        return self._trimmed_content(d, char_limit) + "\n" + self._cite_line(meta)
+
+    def expanded_text(self, d: Any, char_limit: int = 1200, span: int = 1, neighbor_char_limit: int = 400) -> str:
+        """Isi chunk diapit akhir chunk sebelumnya dan awal chunk sesudahnya (tanpa sitasi)."""
+        meta = getattr(d, "metadata", {}) or {}
+        before, after = self.chunk_neighbors(meta, span)
+        content = self._trimmed_content(d, char_limit)
+        prev = " ".join((getattr(b, "page_content", "") or "").strip() for b in before)
+        nxt = " ".join((getattr(a, "page_content", "") or "").strip() for a in after)
+        parts = [_tail_by_sentence(prev, neighbor_char_limit), content, _trim_to_chars_by_sentence(nxt, neighbor_char_limit)]
+        return "\n".join(p for p in parts if p)
+
+    def _format_expanded_block(self, d: Any, char_limit: int, span: int, neighbor_char_limit: int) -> str:
+        return self.expanded_text(d, char_limit, span, neighbor_char_limit) + "\n" + \
+            self._cite_line(getattr(d, "metadata", {}) or {})
 
     def _one_line_summary(self, d: Any, char_limit: int = 280) -> str:
+        """Ringkasan ekstraktif dari ingesti (metadata "summary") bila ada; selain itu potong teks."""
         meta = getattr(d, "metadata", {}) or {}
-        text = (getattr(d, "page_content", "") or "").strip().replace("\n", " ")
-        if len(text) > char_limit:
-            text = text[:char_limit].rstrip() + "..."
+        text = (meta.get("summary") or "").strip()
+        if not text or len(text) > char_limit:
+            if self.chunk_texts is not None:
+                text = self.chunk_texts.snippet(d, char_limit)
+            else:
+                text = (getattr(d, "page_content", "") or "").strip().replace("\n", " ")
+                if len(text) > char_limit:
+                    text = text[:char_limit].rstrip() + "..."
         return f"- {text} {self._cite_line(meta)}"
 
     def format_context_compact(
@@ -379,47 +1020,165 @@ class PsionicAgent:
         full_char_limit: int = 1200,
         tail_summaries_max: int = 3,
         tail_summary_char_limit: int = 280,
+        neighbor_span: int = 0,
+        neighbor_char_limit: int = 400,
     ) -> str:
         """
         2–3 potongan dibawa utuh (dipangkas di batas kalimat),
         sisanya diringkas 1 kalimat/dokumen.
+        neighbor_span > 0: potongan utuh disambung dengan akhir chunk sebelumnya dan awal chunk
+        sesudahnya (indeks ketetanggaan), sehingga k kecil tetap membawa penjelasan yang bersambung.
         """
         if not docs:
             return ""
-        blocks = []
-        top_full = docs[:full_top_n]
-        for d in top_full:
-            blocks.append(self._format_full_block(d, full_char_limit))
-        tail = docs[full_top_n: full_top_n + tail_summaries_max]
-        if tail:
+        if neighbor_span > 0:
+            full = [self._format_expanded_block(d, full_char_limit, neighbor_span, neighbor_char_limit)
+                    for d in docs[:full_top_n]]
+        else:
+            full = [self._format_full_block(d, full_char_limit) for d in docs[:full_top_n]]
+        tail = [self._one_line_summary(d, tail_summary_char_limit)
+                for d in docs[full_top_n: full_top_n + tail_summaries_max]]
+        return self._render_context(full, tail)
+
+    @staticmethod
+    def _render_context(full_blocks: List[str], tail_lines: List[str]) -> str:
+        blocks = list(full_blocks)
+        if tail_lines:
             blocks.append("\nCatatan ringkas tambahan:")
-            for d in tail:
-                blocks.append(self._one_line_summary(d, tail_summary_char_limit))
+            blocks.extend(tail_lines)
         return "\n\n---\n\n".join(blocks).strip()
 
-    @staticmethod
-    def format_citations(docs: List[Any], max_len: int = 220) -> List[str]:
-        import os as _os
-        lines = []
-        for i, d in enumerate(docs, start=1):
+    def _chunk_tokens(self, d: Any, form: str, text: str) -> int:
+        """
+        Jumlah token satu bentuk potongan. Bentuk utuh yang tidak terpangkas memakai n_tokens dari
+        ingesti; sisanya dihitung sekali lalu di-cache per (source, page, chunk_index, bentuk).
+        """
+        meta = getattr(d, "metadata", {}) or {}
+        pre = meta.get("n_tokens")
+        if pre is not None and form.startswith("full:"):
+            content = (getattr(d, "page_content", "") or "").strip()
+            if len(content) <= int(form.split(":", 1)[1]):
+                PERF.incr("token_count_precomputed")
+                return int(pre) + approx_tokens(self._cite_line(meta))
+        key = (meta.get("source"), meta.get("page"), meta.get("chunk_index"), form)
+        n = self.token_counts.get(key)
+        if n is None:
+            PERF.incr("token_count_miss")
+            n = approx_tokens(text)
+            self.token_counts.put(key, n)
+        else:
+            PERF.incr("token_count_hit")
+        return n
+
+    def assemble_context(
+        self,
+        docs: List[Any],
+        history_window: Optional[List[Tuple[str, str]]] = None,
+        memory_summary: Optional[str] = None,
+        mode: Optional[str] = None,
+        budget: Optional[int] = None,
+        full_char_limit: int = 1200,
+        tail_char_limit: int = 280,
+    ) -> Tuple[str, str, int]:
+        """
+        Isi anggaran token per mode secara greedy menurut nilai: dokumen (peringkat retrieval),
+        ringkasan memori, dan riwayat (terbaru lebih bernilai). Tiap item punya bentuk utuh dan ringkas;
+        dipilih bentuk terkaya yang masih muat. Kembalikan (context, history_block, token_terpakai).
+        """
+        if budget is None:
+            budget = self.context_budgets.get((mode or "").lower(), DEFAULT_TOKEN_BUDGET)
+        texts: Dict[Tuple, List[str]] = {}
+        cands = []
+        for i, d in enumerate(docs):
+            full = self._format_full_block(d, full_char_limit)
+            tail = self._one_line_summary(d, tail_char_limit)
+            texts[("doc", i)] = [full, tail]
+            cands.append((1.0 / (1 + i), ("doc", i),
+                          [self._chunk_tokens(d, f"full:{full_char_limit}", full),
+                           self._chunk_tokens(d, f"tail:{tail_char_limit}", tail)]))
+        if memory_summary:
+            short = _trim_to_chars_by_sentence(memory_summary, 400)
+            texts[("summary", 0)] = [memory_summary, short]
+            cands.append((0.6, ("summary", 0), [approx_tokens(memory_summary), approx_tokens(short)]))
+        pairs = list(history_window or [])
+        for j, (q, a) in enumerate(reversed(pairs)):  # j=0 giliran terbaru
+            idx = len(pairs) - 1 - j
+            short = (_trim_to_chars_by_sentence(q or "", 200), _trim_to_chars_by_sentence(a or "", 300))
+            texts[("turn", idx)] = [(q, a), short]
+            cands.append((0.55 / (1 + j), ("turn", idx),  # giliran terbaru di atas bukti peringkat 2
+                          [approx_tokens(f"{q} {a}") + 6, approx_tokens(f"{short[0]} {short[1]}") + 6]))
+
+        chosen = fill_budget(cands, budget)
+        if docs and not any(k[0] == "doc" for k in chosen):
+            chosen[("doc", 0)] = 1  # minimal satu bukti, walau anggaran sangat kecil
+        used = sum(c[2][chosen[c[1]]] for c in cands if c[1] in chosen)
+
+        full_blocks = [texts[("doc", i)][0] for i in range(len(docs)) if chosen.get(("doc", i)) == 0]
+        tail_lines = [texts[("doc", i)][1] for i in range(len(docs)) if chosen.get(("doc", i)) == 1]
+        summary = texts[("summary", 0)][chosen[("summary", 0)]] if ("summary", 0) in chosen else None
+        turns = [texts[("turn", i)][chosen[("turn", i)]] for i in range(len(pairs)) if ("turn", i) in chosen]
+        agent_trace.note(context_tokens=used)
+        return self._render_context(full_blocks, tail_lines), self._history_block(turns, summary), used
+
+    # pemformatan sitasi ada di tools/citations.py (dipakai juga gateway tanpa memuat agen)
+    format_citations = staticmethod(_format_citations)
+    format_passage = staticmethod(_format_passage)
+
+    def extractive_answer(self, docs: List[Any], question: str, per_doc_chars: int = 360) -> str:
+        """
+        Jawaban tanpa LLM (mode terdegradasi): dari tiap potongan teratas diambil kalimat yang paling
+        banyak memuat kata kunci pertanyaan, dipangkas di batas kalimat, lalu blok Rujukan.
+        """
+        if not docs:
+            return "Tidak ditemukan di indeks."
+        terms = {w for w in re.findall(r"\w+", (question or "").lower()) if len(w) > 3}
+        quotes = []
+        for d in docs[:3]:
             meta = getattr(d, "metadata", {}) or {}
-            src = meta.get("source", "unknown")
-            page = meta.get("page")
-            book_title = meta.get("book_title") or meta.get("book") or "unknown"
-            content = (getattr(d, "page_content", "") or "").strip().replace("\n", " ")
-            if len(content) > max_len:
-                content = content[:max_len].rstrip() + "..."
-            lines.append(f"{i}. [book:{book_title}, file:{_os.path.basename(src)}, page:{page}] — {content}")
-        return lines
+            sents = self.chunk_texts.sentences(d) if self.chunk_texts is not None else None
+            if sents is None:
+                sents = _split_sentences((getattr(d, "page_content", "") or "").replace("\n", " "))
+            if not sents:
+                continue
+            overlap = lambda i: len(terms & set(re.findall(r"\w+", sents[i].lower())))
+            best = sorted(sorted(range(len(sents)), key=lambda i: (-overlap(i), i))[:2])  # urutan asli
+            excerpt = _trim_to_chars_by_sentence(" ".join(sents[i].strip() for i in best), per_doc_chars)
+            quotes.append(f"- {excerpt} {self._cite_line(meta)}")
+        return "\n".join([
+            EXTRACTIVE_NOTE,
+            "",
+            *quotes,
+            "",
+            "Rujukan:",
+            *self.format_citations(docs[:3], max_len=80, texts=self.chunk_texts),
+        ])
 
     # ---------- memory helpers ----------
     def summarize_history(self, pairs: List[Tuple[str, str]]) -> str:
         if not pairs:
             return ""
         text = "\n".join([f"User: {q}\nBot: {a}" for q, a in pairs if q or a])
-        res = self.rewriter.invoke(PROMPT_SUMMARIZE.format_messages(history_text=text)).content
+        with PERF.span("llm_summarize"), llm_context(priority=BACKGROUND):
+            res = self.rewriter.invoke(PROMPT_SUMMARIZE.format_messages(history_text=text)).content
         return res.strip()
 
+    def summarize_batch(self, items: List[Tuple[str, List[Tuple[str, str]]]], max_chars: int = 4000) -> Dict[str, str]:
+        """
+        Beberapa percakapan pendek dalam satu panggilan LLM: [(id, pairs)] -> {id: ringkasan}.
+        Id yang tidak muncul di jawaban tidak dikembalikan; pemanggil boleh mengulangnya satu per satu.
+        """
+        members = [(k, transcript(p, max_chars)) for k, p in items if p]
+        if not members:
+            return {}
+        if len(members) == 1:
+            k, text = members[0]
+            with PERF.span("llm_summarize"), llm_context(priority=BACKGROUND):
+                res = self.rewriter.invoke(PROMPT_SUMMARIZE.format_messages(history_text=text)).content
+            return {k: res.strip()}
+        with PERF.span("llm_summarize_batch"), llm_context(priority=BACKGROUND):
+            res = self.rewriter.invoke(PROMPT_SUMMARIZE_BATCH.format_messages(conversations=format_batch(members))).content
+        return parse_batch(res, [k for k, _ in members])
+
     def _history_block(self, history_window: List[Tuple[str, str]], memory_summary: Optional[str]) -> str:
         parts = []
         if memory_summary:
@@ -440,18 +1199,35 @@ class PsionicAgent:
         history_window: Optional[List[Tuple[str, str]]] = None,
         memory_summary: Optional[str] = None,
         mode: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> str:
+        """Draft + rewrite gaya. Dengan deadline: rewrite dilewati (draft dikembalikan) bila waktu tidak cukup."""
         if not docs:
             return "Tidak ditemukan di indeks."
-        history_block = self._history_block(history_window or [], memory_summary)
         format_hint = MODE_HINTS.get((mode or "").lower(), "Ikuti format default yang paling jelas.")
-        context = self.format_context_compact(docs)  # kompresi aman
-        draft = self.llm.invoke(PROMPT_RAG.format_messages(
+        # konteks + riwayat diisi sesuai anggaran token mode (bukti paling relevan lebih dulu)
+        context, history_block, _ = self.assemble_context(docs, history_window, memory_summary, mode)
+        msgs = PROMPT_RAG.format_messages(
             history_block=history_block,
             context=context,
             question=question,
             format_hint=format_hint,
-        )).content
+        )
+        with PERF.span("llm_draft"):
+            draft = run_with_timeout(lambda: self.llm.invoke(msgs).content,
+                                     deadline.call_timeout(essential=True) if deadline else None)
+        agent_trace.note_llm("llm_draft", msgs, draft)
+        if deadline is not None and not deadline.allows(stage_estimate_s("llm_rewrite")):
+            shed_stage(deadline, "rewrite")
+            return draft
         style_label = STYLE_HINTS.get(style.lower(), STYLE_HINTS["terapis"])
-        refined = self.rewriter.invoke(PROMPT_REWRITE.format_messages(draft=draft, style=style_label)).content
+        rw_msgs = PROMPT_REWRITE.format_messages(draft=draft, style=style_label)
+        try:
+            with PERF.span("llm_rewrite"):
+                refined = run_with_timeout(lambda: self.rewriter.invoke(rw_msgs).content,
+                                           deadline.call_timeout() if deadline else None)
+        except Exception as e:  # rewrite opsional: draft yang sudah jadi tidak dibuang
+            shed_failed_stage(deadline, "rewrite", e)
+            return draft
+        agent_trace.note_llm("llm_rewrite", rw_msgs, refined)
         return refined
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from bench.fakes import HashEmbeddings, FakeChatModel
+from bench.corpus import build_corpus
+
+@pytest.fixture
+def perf():
+    """PERF global dikosongkan selama satu tes lalu dipulihkan, agar sampel tes lain tidak ikut terhapus."""
+    from agent_perf import PERF
+
+    with PERF._lock:
+        saved = (PERF._hists, PERF._values, PERF._counters)
+        PERF._hists, PERF._values, PERF._counters = {}, {}, {}
+    yield PERF
+    with PERF._lock:
+        PERF._hists, PERF._values, PERF._counters = saved
+
+@pytest.fixture
+def fake_agent(tmp_path, monkeypatch):
+    """
+    Pabrik PsionicAgent offline: korpus sintetis di tmp_path, HashEmbeddings(dim=64), dan FakeChatModel
+    (atau `llm` yang diberikan, juga dipakai sebagai rewriter). Argumen lain diteruskan ke PsionicAgent.
+    """
+    from psionic_agent import PsionicAgent
+
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr("psionic_agent.load_dotenv", lambda: None)
+    agents = []
+
+    def make(llm=None, chunks: int = 60, collections=("psikologi",), **kw):
+        persist = str(tmp_path / "vectorstore")
+        emb = HashEmbeddings(dim=64)
+        if not os.path.exists(persist):
+            build_corpus(persist, chunks, emb, collections=list(collections))
+        llm = llm if llm is not None else FakeChatModel()
+        kw.setdefault("rewriter", llm)
+        agent = PsionicAgent(persist_dir=persist, embeddings=emb, llm=llm, **kw)
+        agents.append(agent)
+        return agent
+
+    yield make
+    for agent in agents:
+        agent.close()
@@ -0,0 +1,63 @@
+from tools.adjacency import AdjacencyIndex
+
+def test_adjacency_orders_chunks_per_source_across_pages():
+    rows = [
+        ("b", {"source": "x.pdf", "page": 0, "chunk_index": 1}),
+        ("d", {"source": "x.pdf", "page": 1, "chunk_index": 0}),   # chunk_index per halaman
+        ("a", {"source": "x.pdf", "page": 0, "chunk_index": 0}),
+        ("c", {"source": "x.pdf", "page": 0, "chunk_index": 2}),
+        ("z", {"source": "y.pdf", "page": 0, "chunk_index": 0}),
+        ("n", {"source": "y.pdf"}),                                 # tanpa chunk_index: dilewati
+    ]
+    idx = AdjacencyIndex.build(rows)
+    assert len(idx) == 5
+    assert idx.neighbors({"source": "x.pdf", "page": 0, "chunk_index": 2}) == (["b"], ["d"])
+    assert idx.neighbors({"source": "x.pdf", "page": 0, "chunk_index": 0}, span=2) == ([], ["b", "c"])
+    assert idx.neighbors({"source": "y.pdf", "page": 0, "chunk_index": 0}) == ([], [])
+    assert idx.neighbors({"source": "x.pdf", "page": 9, "chunk_index": 0}) is None
+
+def test_agent_expands_top_hits_with_neighbors(fake_agent, perf):
+    from psionic_agent import PsionicAgent
+    from agent_jobs import run_job
+
+    agent = fake_agent()
+
+    # buku_1: chunk ke-2 halaman 0 diikuti chunk ke-0 halaman 1
+    md = {"collection": "psikologi", "source": "books/psikologi/buku_1.pdf", "page": 0, "chunk_index": 2}
+    before, after = agent.chunk_neighbors(md)
+    assert [(d.metadata["page"], d.metadata["chunk_index"]) for d in before + after] == [(0, 1), (1, 0)]
+    agent.chunk_neighbors(md)
+    assert perf.counter("neighbor_cache_miss") == 1 and perf.counter("neighbor_cache_hit") == 1
+    assert perf.snapshot()["stages"]["neighbor_lookup"]["count"] == 1   # satu get lewat id, tanpa pencarian vektor
+
+    docs = agent.retrieve("empati kecemasan", k_override=2)
+    _, nxt = agent.chunk_neighbors(docs[0].metadata)
+    plain = agent.format_context_compact(docs, full_top_n=1)
+    expanded = agent.format_context_compact(docs, full_top_n=1, neighbor_span=1, neighbor_char_limit=5000)
+    assert nxt[0].page_content.strip() not in plain and nxt[0].page_content.strip() in expanded
+
+    res = run_job(agent, None, "passage", {"args": {"meta": md, "span": 1}})
+    assert res["before"] == 1 and len(res["docs"]) == 2
+    text = PsionicAgent.format_passage(docs[0], res["docs"][:1], res["docs"][1:])
+    assert text.startswith("… (sebelumnya, page:0)") and "(lanjutan, page:1)" in text
+
+def test_failed_scan_is_not_cached(fake_agent, monkeypatch):
+    agent = fake_agent()
+    real = agent.client.get_collection
+    down = [True]
+
+    def flaky(name):
+        if down[0]:
+            raise RuntimeError("chroma sibuk")
+        return real(name)
+
+    monkeypatch.setattr(agent.client, "get_collection", flaky)
+    md = {"collection": "psikologi", "source": "books/psikologi/buku_1.pdf", "page": 0, "chunk_index": 2}
+    assert len(agent.adjacency("psikologi")) == 0 and agent.chunk_neighbors(md) == ([], [])
+    assert "psikologi" not in agent._adjacency
+    down[0] = False
+    assert len(agent.adjacency("psikologi")) == 0          # masih dalam jeda coba ulang
+    monkeypatch.setattr("psionic_agent.SCAN_RETRY_S", 0.0)
+    assert len(agent.adjacency("psikologi")) == 60
+    before, after = agent.chunk_neighbors(md)               # hasil kosong saat gagal tidak tersimpan di cache
+    assert before and after
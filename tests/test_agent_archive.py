@@ -0,0 +1,80 @@
+import os
+import glob
+import json
+
+import agent_archive
+import agent_memory as mem
+
+def _write_day(base, user, date, turns, summary=""):
+    dd = os.path.join(base, str(user), "daily")
+    os.makedirs(dd, exist_ok=True)
+    with open(os.path.join(dd, f"{date}.json"), "w", encoding="utf-8") as f:
+        json.dump({"turns": turns, "daily_summary": summary}, f)
+
+def test_compact_then_read_daily_falls_back_to_archive(tmp_path, monkeypatch):
+    base, arch = str(tmp_path / "memory"), str(tmp_path / "archive")
+    monkeypatch.setattr(mem, "BASE_DIR", base)
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", arch)
+    y = mem.yesterday_date_str()
+    _write_day(base, 1, y, [{"q": "Apa itu empati?", "a": "A1", "c": "psikologi"}, {"q": "Lalu?", "a": "A2"}], "hari tenang")
+    _write_day(base, 17, y, [], "hanya ringkasan")   # bucket sama dengan user 1 (16 bucket)
+    _write_day(base, 2, "2026-01-05", [{"q": "apa itu  EMPATI?", "a": "B", "c": "psikologi"}])
+    mem.append_turn(1, "hari ini", "belum ditutup")
+
+    st = agent_archive.compact(base, arch, before=mem.today_date_str())
+    assert st["days"] == 3 and st["turns"] == 3 and st["files_removed"] == 3
+    assert os.listdir(os.path.join(base, "1", "daily")) == [f"{mem.today_date_str()}.json"]
+    assert glob.glob(os.path.join(arch, f"month={y[:7]}", "bucket=01", "part-*.parquet"))
+
+    data = mem.read_daily(1, y)
+    assert data == {"turns": [{"q": "Apa itu empati?", "a": "A1", "c": "psikologi"}, {"q": "Lalu?", "a": "A2"}],
+                    "daily_summary": "hari tenang"}
+    assert mem.read_daily(17, y) == {"turns": [], "daily_summary": "hanya ringkasan"}
+    assert mem.read_daily(3, y) == {"turns": [], "daily_summary": ""}
+    assert mem.read_daily(1)["turns"][0]["q"] == "hari ini"  # hari berjalan tetap dari JSON
+
+    # compact ulang tanpa file baru tidak menulis apa pun; file baru untuk hari yang sudah diarsip digabung
+    assert agent_archive.compact(base, arch, before=mem.today_date_str())["parts_written"] == 0
+    _write_day(base, 1, y, [{"q": "versi baru", "a": "x"}])
+    agent_archive.compact(base, arch, before=mem.today_date_str(), max_parts=1)
+    assert len(glob.glob(os.path.join(arch, f"month={y[:7]}", "bucket=01", "part-*.parquet"))) == 1
+    assert [t["q"] for t in mem.read_daily(1, y)["turns"]] == ["Apa itu empati?", "Lalu?", "versi baru"]
+    assert mem.read_daily(17, y)["daily_summary"] == "hanya ringkasan"
+
+def test_summary_of_archived_day_keeps_its_turns(tmp_path, monkeypatch):
+    base, arch = str(tmp_path / "memory"), str(tmp_path / "archive")
+    monkeypatch.setattr(mem, "BASE_DIR", base)
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", arch)
+    y = mem.yesterday_date_str()
+    turns = [{"q": "Apa itu empati?", "a": "A1", "c": "psikologi"}, {"q": "Lalu?", "a": "A2"}]
+    _write_day(base, 1, y, turns)
+    agent_archive.compact(base, arch, before=mem.today_date_str())
+
+    mem.update_daily_summary(1, "ringkasan malam", y)   # batch malam / !end setelah compact
+    assert mem.read_daily(1, y)["turns"] == turns and mem.read_daily(1, y)["summarized_turns"] == 2
+    agent_archive.compact(base, arch, before=mem.today_date_str())
+    assert mem.read_daily(1, y) == {"turns": turns, "daily_summary": "ringkasan malam"}
+
+    _write_day(base, 1, y, [], "hanya ringkasan")   # file versi lama: ringkasan saja
+    agent_archive.compact(base, arch, before=mem.today_date_str(), max_parts=1)
+    assert mem.read_daily(1, y) == {"turns": turns, "daily_summary": "hanya ringkasan"}
+
+def test_top_questions_merge_hot_files_and_archive(tmp_path, monkeypatch):
+    base, arch = str(tmp_path / "memory"), str(tmp_path / "archive")
+    monkeypatch.setattr(mem, "BASE_DIR", base)
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", arch)
+    y = mem.yesterday_date_str()
+    _write_day(base, 1, y, [{"q": "Apa itu empati?", "a": "", "c": "psikologi"},
+                            {"q": "Siapa Frankl?", "a": "", "c": "filsafat"}])
+    _write_day(base, 2, y, [{"q": "apa itu   empati?", "a": "", "c": "psikologi"}])
+    _write_day(base, 3, "2020-01-01", [{"q": "Siapa Frankl?", "a": "", "c": "filsafat"}] * 5)  # di luar jendela
+    agent_archive.compact(base, arch, before=mem.today_date_str())
+    mem.append_turn(4, "Siapa Frankl?", "", collection="filsafat")
+    mem.append_turn(4, "Apa itu empati?", "", collection="psikologi")
+
+    assert mem.top_questions(limit=1)[0].lower().split() == ["apa", "itu", "empati?"]
+    by_coll = mem.top_questions_by_collection(limit=5)
+    assert list(by_coll) == ["psikologi", "filsafat"]
+    assert by_coll["filsafat"] == ["Siapa Frankl?"]
+    assert agent_archive.question_counts(arch, since="2019-12-31", until="2020-01-02") == \
+        [("filsafat", "siapa frankl?", "Siapa Frankl?", 5)]
@@ -23,3 +23,12 @@ def test_rolling_summary(tmp_path, monkeypatch):
     assert mem.read_rolling_summary(user) == ""
     mem.update_rolling_summary(user, "ringkas kemarin")
     assert mem.read_rolling_summary(user).startswith("ringkas kemarin")
+
+def test_top_questions_counts_across_users(tmp_path, monkeypatch):
+    monkeypatch.setattr(mem, "BASE_DIR", os.path.join(tmp_path, "memory"))
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", os.path.join(tmp_path, "memory_archive"))  # bukan arsip di cwd
+    mem.append_turn(1, "Apa itu empati?", "A")
+    mem.append_turn(2, "apa itu  empati?", "B")
+    mem.append_turn(2, "Apa itu logoterapi?", "C")
+    top = mem.top_questions(limit=1)
+    assert len(top) == 1 and top[0].lower().split() == ["apa", "itu", "empati?"]
@@ -0,0 +1,46 @@
+import asyncio
+
+from agent_perf import PerfRegistry, RollingHistogram
+
+def test_rolling_percentiles_use_window():
+    h = RollingHistogram(window=100)
+    for v in range(1, 201):
+        h.observe(float(v))
+    p = h.percentiles()
+    assert h.count == 200
+    assert p[50] == 150.0 and p[95] == 195.0 and p[99] == 199.0
+
+def test_collect_timings_follow_to_thread():
+    perf = PerfRegistry()
+
+    def work():
+        with perf.span("llm_draft"):
+            pass
+        perf.observe("retrieve", 0.25)
+
+    async def main():
+        with perf.collect() as timings:
+            await asyncio.to_thread(work)
+        return timings
+
+    timings = asyncio.run(main())
+    assert set(timings) == {"llm_draft", "retrieve"}
+    assert timings["retrieve"] == 250.0
+    # di luar collect() tidak ada dict yang ikut terisi
+    perf.observe("retrieve", 0.1)
+    assert timings["retrieve"] == 250.0
+
+def test_render_counters_gauges_and_prometheus():
+    perf = PerfRegistry()
+    perf.observe("vector_search", 0.01)
+    perf.incr("embed_cache_hit", 3)
+    perf.incr("embed_cache_miss")
+    perf.add_gauge("pipelines_inflight", 1)
+    perf.gauge_fn("queue_depth", lambda: 7)
+    text = perf.render_text()
+    assert "vector_search" in text and "embed_cache: 75.0% (3/4)" in text
+    prom = perf.render_prometheus()
+    assert 'psionic_stage_seconds_count{stage="vector_search"} 1' in prom
+    assert "psionic_embed_cache_hit_total 3" in prom
+    assert "psionic_queue_depth 7" in prom
+    assert "psionic_pipelines_inflight 1" in prom
@@ -0,0 +1,49 @@
+from agent_runtime import AgentRuntime
+
+class DummyAgent:
+    def __init__(self, n, fresh):
+        self.n = n
+        self.fresh = fresh
+        self.closed = False
+        self.index_version = n
+        self.persist_dir = "/tidak/ada"
+        self.warmed = []
+    def list_all_books(self):
+        self.warmed.append("catalog")
+        return {}
+    def retrieve(self, q):
+        self.warmed.append(q)
+        return []
+    def close(self):
+        self.closed = True
+
+def _runtime():
+    built = []
+    def factory(fresh):
+        a = DummyAgent(len(built) + 1, fresh)
+        built.append(a)
+        return a, ("brain", a.n)
+    return AgentRuntime(factory, warm_queries=["apa itu empati"]), built
+
+def test_reload_warms_and_bumps_generation():
+    rt, built = _runtime()
+    swaps = []
+    rt.on_swap(lambda old, new: swaps.append((old, new)))
+    assert not rt.ready
+    rt.reload()
+    assert rt.ready and rt.generation == 1 and built[0].fresh is False
+    assert built[0].warmed == ["catalog", "apa itu empati"]
+    rt.reload()
+    assert rt.generation == 2 and built[1].fresh is True
+    assert swaps == [(0, 1), (1, 2)]
+    assert built[0].closed and not built[1].closed
+
+def test_inflight_request_keeps_old_snapshot_until_done():
+    rt, built = _runtime()
+    rt.reload()
+    with rt.use() as snap:
+        rt.reload()
+        assert snap.agent is built[0] and snap.generation == 1
+        assert rt.current().agent is built[1]
+        assert not built[0].closed  # masih dipakai
+    assert built[0].closed
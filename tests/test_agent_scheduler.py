@@ -0,0 +1,69 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agent_scheduler import (
+    LLMScheduler, ScheduledLLM, SchedulerBusy, llm_context, parse_rpm, INTERACTIVE, BACKGROUND,
+)
+
+def _fill(sched, n=1):
+    """Tahan n slot agar tiket berikutnya mengantre."""
+    for _ in range(n):
+        sched.acquire("m", tenant="holder")
+
+def _wait_depth(sched, n):
+    deadline = time.time() + 2
+    while sched.queue_depth < n and time.time() < deadline:
+        time.sleep(0.005)
+
+def test_priority_and_fair_queuing():
+    sched = LLMScheduler(max_concurrency=1, max_wait_s=5)
+    _fill(sched)
+    order, threads = [], []
+    # user A membanjiri antrean lebih dulu, B dan ringkasan datang belakangan
+    for i, (tenant, prio) in enumerate([("A", INTERACTIVE)] * 3 + [("summary", BACKGROUND), ("B", INTERACTIVE)]):
+        threads.append(threading.Thread(
+            target=lambda t=tenant, p=prio: sched.call(lambda: order.append(t), "m", tenant=t, priority=p)))
+        threads[-1].start()
+        _wait_depth(sched, i + 1)
+    sched.release()
+    for t in threads:
+        t.join()
+    # B tidak menunggu semua pertanyaan A; ringkasan (BACKGROUND) paling akhir
+    assert order.index("B") < 3
+    assert order[-1] == "summary"
+
+def test_busy_when_queue_full_or_wait_too_long():
+    sched = LLMScheduler(max_concurrency=1, max_queue=1, max_wait_s=0.2)
+    _fill(sched)
+    waiter = threading.Thread(target=lambda: pytest.raises(SchedulerBusy, sched.acquire, "m", "x"))
+    waiter.start()
+    _wait_depth(sched, 1)
+    with pytest.raises(SchedulerBusy):
+        sched.acquire("m", "y")  # antrean penuh -> langsung ditolak
+    waiter.join()  # menunggu > max_wait_s -> SchedulerBusy
+    assert sched.queue_depth == 0
+
+def test_scheduled_llm_rate_limit_and_quota_error():
+    sched = LLMScheduler(max_concurrency=4, rpm={"m": 600})  # 10/s, burst 50
+    calls = []
+    inner = SimpleNamespace(invoke=lambda msgs: calls.append(msgs) or SimpleNamespace(content="ok"))
+    llm = ScheduledLLM(inner, sched, "m")
+    with llm_context(tenant=1, guild=7):
+        assert llm.invoke("halo").content == "ok"
+    assert calls == ["halo"] and sched.running == 0
+
+    def quota(msgs):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded")
+    with pytest.raises(SchedulerBusy):
+        ScheduledLLM(SimpleNamespace(invoke=quota), sched, "m").invoke("x")
+    assert sched._bucket("m").wait_time(time.monotonic()) > 0  # bucket dikuras setelah error kuota
+    assert parse_rpm("a=60, b=10") == {"a": 60.0, "b": 10.0}
+
+def test_idle_flows_are_forgotten():
+    sched = LLMScheduler(max_concurrency=4)
+    for i in range(500):   # banyak user berbeda, masing-masing satu panggilan
+        sched.call(lambda: None, "m", tenant=f"user{i}", guild="g1" if i % 2 else None)
+    assert len(sched._last_tag) <= 1 and len(sched._flow_guild) <= 1
@@ -0,0 +1,90 @@
+import pytest
+
+from agent_state import MemoryStateBackend, SQLiteStateBackend, SharedDict, VersionConflict
+from agent_session import SessionManager, session_to_dict, session_from_dict
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_backend_optimistic_versioning(tmp_path, kind):
+    be = MemoryStateBackend() if kind == "memory" else SQLiteStateBackend(str(tmp_path / "state.db"))
+    assert be.get("style", "1") == (None, 0)
+    assert be.put("style", "1", '"hangat"', 0) == 1
+    with pytest.raises(VersionConflict):
+        be.put("style", "1", '"netral"', 0)  # sudah ada
+    assert be.put("style", "1", '"netral"', 1) == 2
+    with pytest.raises(VersionConflict):
+        be.delete("style", "1", 1)
+    be.delete("style", "1", 2)
+    assert be.get("style", "1") == (None, 0) and be.keys("style") == []
+
+def test_shards_share_state_through_sqlite(tmp_path):
+    path = str(tmp_path / "state.db")
+    # dua "shard": backend & cache terpisah di atas file yang sama
+    a = SharedDict(SQLiteStateBackend(path), "history", ttl_s=60)
+    b = SharedDict(SQLiteStateBackend(path), "history", ttl_s=60)
+    assert b.get(7) is None  # b meng-cache "tidak ada"
+    a[7] = [["q1", "a1"]]
+    assert b.get(7) is None  # masih dalam TTL: tanpa round-trip
+    b.invalidate(7)
+    assert b[7] == [["q1", "a1"]]
+
+    # a menulis lagi; b masih memegang versi lama -> bentrok, dibaca ulang, update diterapkan ulang
+    a.update_value(7, lambda p: p + [["q2", "a2"]])
+    b.update_value(7, lambda p: p + [["q3", "a3"]])
+    assert [q for q, _ in a.update_value(7, lambda p: p)] == ["q1", "q2", "q3"]
+
+    a[(1, 2)] = {"x": 1}
+    assert set(SharedDict(SQLiteStateBackend(path), "history")) == {7, (1, 2)}
+    assert len(a) == 2
+    del b[7]
+    a.invalidate()
+    assert 7 not in a and a.pop(7, "hilang") == "hilang"
+
+def test_sessions_across_shards(tmp_path):
+    path = str(tmp_path / "state.db")
+    def shard():
+        return SessionManager(SharedDict(SQLiteStateBackend(path), "sessions", ttl_s=60,
+                                         encode=session_to_dict, decode=session_from_dict))
+    s1, s2 = shard(), shard()
+    s1.start(1, 2, "psy", "terapis", "ringkas")
+    assert s2.get(1, 2).default_collection == "psy"
+    s1.bump_turn(1, 2)
+    s2.bump_turn(1, 2)  # cache s2 basi: versi bentrok lalu diulang, tidak ada giliran yang hilang
+    s2.set_default_collection(1, 2, "filsafat")
+    s1._sessions.invalidate()
+    s = s1.get(1, 2)
+    assert s.turns == 2 and s.default_collection == "filsafat"
+    s1.end(1, 2)
+    s2._sessions.invalidate()
+    assert s2.get(1, 2).is_on is False and s2.get(9, 9) is None
+
+def test_async_accessors_keep_backend_io_off_the_event_loop():
+    import asyncio
+    import threading
+
+    class Recording(MemoryStateBackend):
+        def __init__(self):
+            super().__init__()
+            self.threads = []
+
+        def get(self, ns, key):
+            self.threads.append(threading.get_ident())
+            return super().get(ns, key)
+
+        def put(self, ns, key, raw, expected_version):
+            self.threads.append(threading.get_ident())
+            return super().put(ns, key, raw, expected_version)
+
+    be = Recording()
+    d = SharedDict(be, "history", ttl_s=60)
+
+    async def handler():
+        assert await d.aget(1, []) == []
+        await d.aset(1, [["q", "a"]])
+        assert await d.aupdate_value(1, lambda p: p + [["q2", "a2"]]) == [["q", "a"], ["q2", "a2"]]
+        calls = len(be.threads)
+        assert await d.aget(1) == [["q", "a"], ["q2", "a2"]] and len(be.threads) == calls  # cache segar: tanpa I/O
+        assert await d.apop(1) == [["q", "a"], ["q2", "a2"]] and await d.aget(1) is None
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(handler())
+    assert be.threads and loop_thread not in be.threads
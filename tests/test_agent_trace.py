@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+import agent_trace
+from agent_perf import PERF
+from agent_trace import Tracer, read_traces, stage_breakdown, main
+
+def _doc(page):
+    return SimpleNamespace(page_content="isi", metadata={"source": "a.pdf", "page": page, "chunk_index": 0})
+
+def test_trace_records_spans_docs_and_llm_sizes(tmp_path):
+    path = str(tmp_path / "traces" / "req.jsonl")
+    tracer = Tracer()
+    tracer.configure(path, sample_rate=1.0)
+    docs = [_doc(1), _doc(2)]
+    with tracer.start(42, mode="ringkas", question_chars=10) as tr:
+        with PERF.span("vector_search"):
+            agent_trace.note_search("psikologi", [(docs[0], 0.12), (docs[1], 0.3)])
+        agent_trace.note_llm("llm_draft", [SimpleNamespace(content="x" * 50)], "jawab")
+        agent_trace.note(refine=True)
+        tracer.finish_docs(tr, docs[:1])
+    # di luar trace, hook tidak melakukan apa-apa
+    agent_trace.note_llm("llm_draft", [], "abaikan")
+    tracer.close()
+
+    (rec,) = read_traces(path)
+    assert rec["user_id"] == 42 and rec["refine"] is True
+    assert rec["collections"] == ["psikologi"]
+    assert rec["docs"] == [{"key": ["a.pdf", 1, 0], "distance": 0.12}]
+    assert rec["llm"] == [{"stage": "llm_draft", "prompt_chars": 50, "response_chars": 5}]
+    assert [s["stage"] for s in rec["spans"]] == ["vector_search"]
+    assert stage_breakdown([rec])["vector_search"]["n"] == 1
+
+def test_sampling_keeps_slow_tail_and_cli_lists_slowest(tmp_path, capsys):
+    path = str(tmp_path / "req.jsonl")
+    tracer = Tracer()
+    tracer.configure(path, sample_rate=0.0, slow_ms=20)
+    with tracer.start(1):
+        pass  # cepat -> tidak tersampel
+    with tracer.start(2):
+        with PERF.span("llm_draft"):
+            time.sleep(0.03)
+    tracer.close()
+
+    recs = read_traces(path)
+    assert [r["user_id"] for r in recs] == [2]
+    assert main(["--path", path, "--slowest", "1"]) == 0
+    out = capsys.readouterr().out
+    assert recs[0]["trace_id"] in out and "llm_draft" in out
+
+def test_full_queue_counts_drop_instead_of_blocking(tmp_path):
+    tracer = Tracer()
+    tracer.configure(str(tmp_path / "req.jsonl"))
+    listener, tracer._listener = tracer._listener, None
+    listener.stop()  # penulis macet: antrean tidak lagi dikuras
+    tracer._queue.maxsize = 1
+    tracer._queue.put_nowait(None)
+    dropped = PERF.counter("traces_dropped")
+    with tracer.start(7):
+        pass
+    assert PERF.counter("traces_dropped") == dropped + 1
+    tracer.close()
+    for h in listener.handlers:
+        h.close()
+
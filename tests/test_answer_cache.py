@@ -0,0 +1,35 @@
+import time
+
+from bench.fakes import FakeChatModel
+from tools.ttl_cache import TTLCache
+
+def test_ttl_cache_lru_and_expiry():
+    c = TTLCache(max_items=2, ttl=0.05)
+    c.put("a", 1); c.put("b", 2)
+    assert c.get("a") == 1
+    c.put("c", 3)  # "b" paling lama tidak dipakai
+    assert c.get("b") is None and c.get("a") == 1
+    time.sleep(0.06)
+    assert c.get("a") is None
+    assert not TTLCache(max_items=0).enabled
+
+def test_pipeline_answer_cache_hit_bypass_and_generation(fake_agent):
+    from agent_brain import AgentBrain
+
+    llm = FakeChatModel()
+    agent = fake_agent(llm)
+    brain = AgentBrain(agent, llm=llm)
+
+    ask = lambda q, hw=(): brain.answer_with_pipeline(0, q, "terapis", "panjang", list(hw), None)
+    a1, _, m1 = ask("apa itu empati?")
+    calls = llm.calls
+    a2, _, m2 = ask("Apa itu  EMPATI?")
+    assert a2 == a1 and m2.get("answer_cache") == "hit" and llm.calls == calls
+
+    ask("apa itu empati?", hw=[("q", "a")])  # ada riwayat -> tidak memakai cache
+    assert llm.calls > calls
+
+    calls = llm.calls
+    agent.generation += 1  # indeks di-reload -> entri lama tidak berlaku
+    _, _, m3 = ask("apa itu empati?")
+    assert "answer_cache" not in m3 and llm.calls > calls
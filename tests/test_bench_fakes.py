@@ -0,0 +1,40 @@
+import numpy as np
+
+from bench.fakes import HashEmbeddings, FakeChatModel, LatencyModel
+from bench.corpus import build_corpus
+
+def test_hash_embeddings_deterministic_and_topical():
+    emb = HashEmbeddings(dim=256)
+    a, b, c = (np.array(v) for v in emb.embed_documents(
+        ["empati dan kecemasan", "kecemasan serta empati", "film serial penonton"]))
+    assert np.allclose(a, emb.embed_query("empati dan kecemasan"))
+    assert a @ b > a @ c
+
+def test_latency_model_and_fake_chat():
+    assert LatencyModel("fixed:5").sample_ms() == 5.0
+    assert 20 <= LatencyModel("uniform:20:30").sample_ms() <= 30
+    llm = FakeChatModel(refine_rate=1.0)
+    assert llm.invoke("Anda adalah pemeriksa singkat.").content.startswith("1) TIDAK")
+    assert "Rujukan:" in llm.invoke("Kita hanya menjawab dari KONTEN").content
+
+def test_agent_runs_offline_with_injected_backends(tmp_path, monkeypatch):
+    from psionic_agent import PsionicAgent
+    from agent_brain import AgentBrain
+
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr("psionic_agent.load_dotenv", lambda: None)
+    persist = str(tmp_path / "vectorstore")
+    emb = HashEmbeddings(dim=64)
+    counts = build_corpus(persist, 60, emb, collections=["psikologi", "media"])
+    assert counts == {"psikologi": 30, "media": 30}
+
+    llm = FakeChatModel()
+    agent = PsionicAgent(persist_dir=persist, embeddings=emb, llm=llm, rewriter=llm)
+    docs = agent.retrieve("empati dan trauma", collection="psikologi")
+    assert docs and all(d.metadata["collection"] == "psikologi" for d in docs)
+
+    brain = AgentBrain(agent, llm=llm)
+    answer, docs, meta = brain.answer_with_pipeline(0, "apa itu parasosial", "terapis", "ringkas", [], None)
+    assert "Rujukan:" in answer and docs
+    assert {"pipeline", "llm_draft", "llm_critique"} <= set(meta["timings"])
+    agent.close()
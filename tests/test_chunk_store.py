@@ -0,0 +1,88 @@
+import random
+
+from tools.chunk_store import ChunkStore, ChunkStoreSet, normalize
+
+def _md(i):
+    return {"source": "x.pdf", "page": 0, "chunk_index": i, "collection": "c"}
+
+def test_chunk_store_trim_and_snippet_match_string_path(tmp_path):
+    from psionic_agent import _trim_to_chars_by_sentence, _split_sentences
+
+    rng = random.Random(3)
+    words = ["empati", "kecemasan", "café", "naïve", "jiwa", "Mr.", "fokus", "—", "ya!", "apa?", "x" * 30]
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 60))).replace(" ya!", " ya!\n\n")
+             for _ in range(80)] + ["", "satu kalimat saja"]
+    rows = [(f"id{i}", t, _md(i)) for i, t in enumerate(texts)]
+    store = ChunkStore.build(rows, str(tmp_path / "c"), version=7)
+    store = ChunkStore.load(str(tmp_path / "c"))
+    assert len(store) == len(texts) and store.meta["version"] == 7
+    for i, t in enumerate(texts):
+        line = normalize(t)
+        row = store.row("id%d" % i)
+        assert row == store.row(md=_md(i)) == i
+        assert store.line(row) == line
+        assert store.sentences(row) == _split_sentences(line)
+        for limit in (5, 40, 120, 400):
+            assert store.trim(row, limit) == _trim_to_chars_by_sentence(line, limit)
+            expect = line if len(line) <= limit else line[:limit].rstrip() + "..."
+            assert store.snippet(row, limit) == expect
+
+def test_chunk_store_set_ignores_stale_version(tmp_path):
+    version = {"v": 1}
+    texts = ChunkStoreSet(str(tmp_path), lambda: version["v"])
+    ChunkStore.build([("a", "Halo  dunia.\nApa kabar?", _md(0))], texts.path("c"), version=1)
+    doc = type("D", (), {"id": "a", "page_content": "lama", "metadata": _md(0)})()
+    assert texts.line(doc) == "Halo dunia. Apa kabar?" and texts.is_fresh("c", 1)
+    version["v"] = 2   # indeks di-ingest ulang: store lama tidak dipakai, jatuh ke page_content
+    assert texts.get("c") is None and texts.line(doc) == "lama" and texts.trim(doc, 10) is None
+    assert not texts.is_fresh("c", 1)
+
+def test_concurrent_builds_of_same_collection_all_succeed(tmp_path):
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    rows = [(f"id{i}", f"Kalimat {i}. Lanjut {i}.", _md(i)) for i in range(50)]
+    out = str(tmp_path / "c")
+    old = ChunkStore.build(rows[:10], out, version=1)
+    with ThreadPoolExecutor(4) as pool:   # beberapa worker menjalankan warm bersamaan
+        stores = list(pool.map(lambda _: ChunkStore.build(rows, out, version=2), range(4)))
+    assert all(len(s) == 50 for s in stores) and old.line(3) == "Kalimat 3. Lanjut 3."
+    assert ChunkStore.stored_meta(out)["version"] == 2 and os.listdir(tmp_path) == ["c"]
+
+def test_mismatched_files_are_treated_as_missing(tmp_path):
+    import os
+    import json
+    import numpy as np
+    import pytest
+    from tools.atomic_files import current_dir
+
+    texts = ChunkStoreSet(str(tmp_path), lambda: 1)
+    ChunkStore.build([(f"id{i}", f"Kalimat {i}.", _md(i)) for i in range(5)], texts.path("c"), version=1)
+    gen = current_dir(texts.path("c"))
+    np.save(os.path.join(gen, "offsets.npy"), np.arange(4, dtype=np.uint64))   # tabel dari build lain
+    with pytest.raises(ValueError):
+        ChunkStore.load(texts.path("c"))
+    assert texts.get("c") is None
+    with open(os.path.join(gen, "ids.json"), "w") as f:
+        json.dump(["id0"], f)
+    with pytest.raises(ValueError):
+        ChunkStore.load(texts.path("c"))
+
+def test_agent_builds_chunk_store_and_formats_same_citations(fake_agent):
+    from psionic_agent import PsionicAgent
+
+    agent = fake_agent(chunks=40, use_chunk_store=True)
+    store = agent.chunk_store("psikologi")
+    assert store is not None and len(store) == 40
+    assert store.meta["version"] == agent.index_version
+
+    docs = agent.retrieve("empati kecemasan", k_override=4)
+    assert all(agent.chunk_texts.locate(d) for d in docs)
+    legacy = PsionicAgent.format_citations(docs, max_len=80)
+    assert PsionicAgent.format_citations(docs, max_len=80, texts=agent.chunk_texts) == legacy
+    plain = PsionicAgent.__new__(PsionicAgent)
+    assert agent.format_context_compact(docs, full_top_n=2) == plain.format_context_compact(docs, full_top_n=2)
+
+    # gateway: pembaca saja, memakai berkas yang sama
+    reader = ChunkStoreSet(agent.chunk_store_dir, lambda: agent.index_version)
+    assert reader.snippet(docs[0], 80) == agent.chunk_texts.snippet(docs[0], 80)
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from bench.fakes import FakeChatModel
+from agent_scheduler import SchedulerBusy
+from tools.circuit_breaker import CircuitBreaker, CircuitOpen, CLOSED, HALF_OPEN, OPEN
+
+def _boom():
+    raise RuntimeError("503 unavailable")
+
+def test_breaker_opens_probes_and_recovers():
+    br = CircuitBreaker(failure_threshold=2, reset_timeout_s=0.05)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            br.call(_boom)
+    assert br.state == OPEN
+    with pytest.raises(CircuitOpen):
+        br.call(lambda: "ok")
+    time.sleep(0.06)
+    assert br.state == HALF_OPEN
+    with pytest.raises(RuntimeError):
+        br.call(_boom)  # probe gagal -> terbuka lagi
+    assert br.is_open()
+    time.sleep(0.06)
+    assert br.call(lambda: "ok") == "ok" and br.state == CLOSED
+
+    def busy():
+        raise SchedulerBusy("antrean penuh")
+    for _ in range(3):  # backpressure lokal tidak membuka sirkuit
+        with pytest.raises(SchedulerBusy):
+            br.call(busy, ignore=(SchedulerBusy,))
+    assert br.state == CLOSED
+
+def test_queue_wait_is_not_counted_as_slow_call():
+    import threading
+    from types import SimpleNamespace
+    from agent_scheduler import LLMScheduler, wrap_llm
+
+    br = CircuitBreaker(failure_threshold=1, reset_timeout_s=60, slow_call_s=0.1)
+    sched = LLMScheduler(max_concurrency=1, max_wait_s=5)
+    llm = wrap_llm(SimpleNamespace(invoke=lambda m: time.sleep(0.06) or m), "m", sched, br)
+    threads = [threading.Thread(target=llm.invoke, args=("x",)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert br.state == CLOSED   # antre ~0.18 dtk + panggilan 0.06 dtk: backend sendiri tidak lambat
+
+    br.record_failure()
+    invoked = []
+    gated = wrap_llm(SimpleNamespace(invoke=invoked.append), "m", sched, br)
+    with pytest.raises(CircuitOpen):
+        gated.invoke("x")
+    assert invoked == [] and sched.queue_depth == 0   # ditolak sebelum antre
+
+class FlakyChat(FakeChatModel):
+    down = True
+
+    def invoke(self, messages):
+        if self.down:
+            raise RuntimeError("503 unavailable")
+        return super().invoke(messages)
+
+def test_pipeline_serves_extractive_answer_while_open(fake_agent):
+    from psionic_agent import EXTRACTIVE_NOTE
+    from agent_brain import AgentBrain
+
+    llm = FlakyChat()
+    br = CircuitBreaker(failure_threshold=1, reset_timeout_s=0.1)
+    agent = fake_agent(llm, breaker=br)
+    brain = AgentBrain(agent, llm=llm, breaker=br)
+    ask = lambda q: brain.answer_with_pipeline(0, q, "terapis", "ringkas", [], None)
+
+    answer, docs, meta = ask("apa itu empati?")
+    assert meta["degraded"] == "RuntimeError" and br.is_open()
+    assert answer.startswith(EXTRACTIVE_NOTE) and "Rujukan:" in answer and docs
+    answer, _, meta = ask("apa itu trauma?")  # sirkuit terbuka: tanpa menyentuh LLM
+    assert meta["degraded"] == "circuit_open" and answer.startswith(EXTRACTIVE_NOTE)
+
+    llm.down = False
+    time.sleep(0.12)  # half-open: draft menjadi probe dan memulihkan jawaban penuh
+    answer, _, meta = ask("apa itu kecemasan?")
+    assert "degraded" not in meta and br.state == CLOSED and not answer.startswith(EXTRACTIVE_NOTE)
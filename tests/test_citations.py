@@ -0,0 +1,21 @@
+import sys
+import subprocess
+from types import SimpleNamespace
+
+from tools.citations import format_citations, format_passage
+
+def _doc(text, page):
+    return SimpleNamespace(page_content=text, metadata={"source": "books/x/buku.pdf", "page": page, "book_title": "Buku"})
+
+def test_citations_format_without_agent():
+    d = _doc("Empati adalah kemampuan\nmemahami perasaan. " * 10, 3)
+    line = format_citations([d], max_len=40)[0]
+    assert line.startswith("1. [book:Buku, file:buku.pdf, page:3] — Empati adalah") and line.endswith("...")
+    text = format_passage(d, [_doc("Awal. Akhir bab.", 2)], [_doc("Lanjut. Lagi.", 4)], neighbor_len=10)
+    assert text.startswith("… (sebelumnya, page:2) Akhir bab.") and text.endswith("(lanjutan, page:4) Lanjut. …")
+
+def test_gateway_citations_do_not_load_agent_stack():
+    code = ("import sys, tools.citations; "
+            "print(any(m.split('.')[0] in ('chromadb', 'langchain_core', 'psionic_agent') for m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "False"
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from agent_perf import PERF
+from bench.fakes import FakeChatModel
+from tools.deadline import Deadline, StageTimeout, run_with_timeout, parse_budgets
+
+def test_deadline_and_timeout_bounded_call():
+    d = Deadline(0.5, call_timeout_s=0.05)
+    assert d.allows(0.4) and not d.allows(0.6)
+    assert d.call_timeout() == 0.05 and d.call_timeout(essential=True) == 0.05
+    assert Deadline(0).remaining() == float("inf") and Deadline(0).call_timeout() is None
+    assert run_with_timeout(lambda: "ok", 1.0) == "ok"
+    t0 = time.perf_counter()
+    with pytest.raises(StageTimeout):
+        run_with_timeout(lambda: time.sleep(0.5), 0.05)
+    assert time.perf_counter() - t0 < 0.3
+    assert parse_budgets("ringkas=12, Panjang=25") == {"ringkas": 12.0, "panjang": 25.0}
+
+def test_pipeline_sheds_optional_stages_under_tight_budget(fake_agent, perf):
+    from agent_brain import AgentBrain
+
+    # `perf` kosong: estimasi tahap dari nilai awal, bukan sampel tes lain
+    llm = FakeChatModel(latency="fixed:50", refine_rate=1.0)
+    agent = fake_agent(llm)
+
+    tight = AgentBrain(agent, llm=llm, budgets={"panjang": 1.0}, answer_cache_size=0)
+    answer, docs, meta = tight.answer_with_pipeline(0, "apa itu empati?", "terapis", "panjang", [], None)
+    assert meta["shed"] == ["plan", "rewrite", "critique"]
+    assert "Rujukan:" in answer and docs
+    assert llm.calls == 1  # hanya draft
+    assert perf.counter("shed_plan") == 1 and perf.counter("shed_critique") == 1
+
+    relaxed = AgentBrain(agent, llm=llm, answer_cache_size=0)  # tanpa anggaran: semua tahap jalan
+    _, _, meta = relaxed.answer_with_pipeline(0, "apa itu trauma?", "terapis", "panjang", [], None)
+    assert meta["shed"] == [] and meta["plan_steps"]
+
+def test_rewrite_error_keeps_draft(fake_agent):
+    from agent_scheduler import SchedulerBusy
+
+    llm = FakeChatModel()
+
+    class BusyRewriter:
+        def invoke(self, msgs):
+            raise SchedulerBusy("antrean LLM penuh")
+
+    agent = fake_agent(llm, rewriter=BusyRewriter())
+    docs = agent.retrieve("empati", k_override=3)
+    d = Deadline(60)
+    answer = agent.answer_from_docs(docs, "apa itu empati?", deadline=d)
+    assert answer and llm.calls == 1 and d.shed == ["rewrite"]   # draft dikembalikan, bukan error
+
+def test_optional_stage_errors_keep_best_answer(fake_agent):
+    from agent_brain import AgentBrain
+    from agent_scheduler import SchedulerBusy
+
+    class Flaky(FakeChatModel):
+        def __init__(self, fail_on, exc):
+            super().__init__(refine_rate=1.0)
+            self.fail_on, self.exc = fail_on, exc
+
+        def invoke(self, msgs, *args, **kwargs):
+            if self.fail_on in self._prompt_text(msgs):
+                raise self.exc
+            return super().invoke(msgs)
+
+    agent = fake_agent()
+    busy = AgentBrain(agent, llm=Flaky("pemeriksa singkat", SchedulerBusy("antrean LLM penuh")), answer_cache_size=0)
+    answer, _, meta = busy.answer_with_pipeline(0, "apa itu empati?", "terapis", "ringkas", [], None)
+    assert answer and meta["shed"] == ["critique"]   # draft dipakai, bukan "bot sibuk"
+
+    before = PERF.counter("refine_errors")
+    broken = AgentBrain(agent, llm=Flaky("Perhalus jawaban", RuntimeError("503 backend")), answer_cache_size=0)
+    answer, _, meta = broken.answer_with_pipeline(0, "apa itu trauma?", "terapis", "ringkas", [], None)
+    assert answer and meta["shed"] == ["refine"] and "TIDAK" in meta["critique"]
+    assert PERF.counter("refine_errors") == before + 1
+
+def test_rewrite_failure_is_counted_but_bugs_propagate(fake_agent):
+    class Rewriter:
+        def __init__(self, exc):
+            self.exc = exc
+
+        def invoke(self, msgs):
+            raise self.exc
+
+    agent = fake_agent(rewriter=Rewriter(RuntimeError("500 backend")))
+    docs = agent.retrieve("empati", k_override=3)
+    before = PERF.counter("rewrite_errors")
+    assert agent.answer_from_docs(docs, "apa itu empati?")   # tanpa deadline: draft, tapi tercatat
+    assert PERF.counter("rewrite_errors") == before + 1
+    agent.rewriter = Rewriter(AttributeError("bug"))
+    with pytest.raises(AttributeError):
+        agent.answer_from_docs(docs, "apa itu empati?")
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from agent_perf import PERF
+from bench.fakes import HashEmbeddings
+from psionic_agent import EmbeddingBatcher
+
+def test_concurrent_queries_share_batched_calls(perf):
+    emb = HashEmbeddings(dim=64, latency="fixed:30")
+    batcher = EmbeddingBatcher(emb, max_batch=8, max_wait_ms=10)
+    questions = [f"pertanyaan {i % 12} tentang empati" for i in range(48)]
+    with ThreadPoolExecutor(16) as ex:
+        vecs = list(ex.map(batcher.embed_query, questions))
+    assert all(np.allclose(v, emb._vec(q)) for v, q in zip(vecs, questions))
+    assert emb.calls < len(questions) // 3  # satu panggilan per batch
+    snap = perf.snapshot()
+    assert snap["values"]["embed_batch_size"]["p50"] > 1
+    assert snap["stages"]["embed_batch_wait"]["count"] == len(questions)
+    batcher.close()
+    assert np.allclose(batcher.embed_query("setelah ditutup"), emb._vec("setelah ditutup"))
+
+def test_batch_timing_lands_in_each_callers_request():
+    emb = HashEmbeddings(dim=16, latency="fixed:20")
+    batcher = EmbeddingBatcher(emb, max_batch=8, max_wait_ms=10)
+
+    def ask(i):
+        with PERF.collect() as timings:
+            batcher.embed_query(f"q{i}")
+        return timings
+    with ThreadPoolExecutor(6) as ex:
+        per_request = list(ex.map(ask, range(6)))
+    batcher.close()
+    assert emb.calls < 6
+    for timings in per_request:  # flush di thread pool, tapi waktunya tercatat di konteks pemanggil
+        assert timings["embed_batch"] >= 15 and "embed_batch_wait" in timings
+
+def test_batch_errors_reach_every_caller():
+    class Broken(HashEmbeddings):
+        def embed_documents(self, texts, **kwargs):
+            raise RuntimeError("429 kuota")
+
+    batcher = EmbeddingBatcher(Broken(dim=8), max_batch=4, max_wait_ms=20)
+    errors = []
+
+    def ask(i):
+        try:
+            batcher.embed_query(f"q{i}")
+        except RuntimeError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    assert len(errors) == 4
+    batcher.close()
+
+def test_close_during_queries_never_strands_callers():
+    emb = HashEmbeddings(dim=16, latency="fixed:5")
+    for _ in range(20):
+        batcher = EmbeddingBatcher(emb, max_batch=4, max_wait_ms=2, max_inflight=2)
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(batcher.embed_query(f"q{i}")))
+                   for i in range(12)]
+        for t in threads:
+            t.start()
+        batcher.close()   # bersamaan dengan kueri yang sedang masuk antrean
+        for t in threads:
+            t.join(timeout=5)
+        assert not any(t.is_alive() for t in threads) and len(results) == 12
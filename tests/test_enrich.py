@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from tools.enrich import extractive_summary, key_terms, enrich_metadata, ENRICH_VERSION
+
+TEXT = ("Empati adalah kemampuan memahami perasaan orang lain. Cuaca hari ini cerah. "
+        "Empati membantu terapis membangun hubungan dengan klien. Empati bisa dilatih.")
+
+def test_summary_keeps_sentence_boundaries_and_key_terms():
+    s = extractive_summary(TEXT, max_chars=120)
+    assert len(s) <= 120 and s.endswith(".")
+    assert "Cuaca" not in s and s.startswith("Empati")
+    terms = key_terms(TEXT, n=3)
+    assert terms[0] == "empati" and "adalah" not in terms
+    meta = enrich_metadata(TEXT)
+    assert meta["enrich_v"] == ENRICH_VERSION and meta["n_tokens"] > 0
+    assert isinstance(meta["key_terms"], str)
+
+def test_one_line_summary_prefers_ingested_summary():
+    from psionic_agent import PsionicAgent
+    agent = PsionicAgent.__new__(PsionicAgent)
+    meta = {"source": "a.pdf", "page": 0, "book_title": "Buku", "summary": "Ringkasan pendek."}
+    d = SimpleNamespace(page_content="x " * 500, metadata=meta)
+    assert agent._one_line_summary(d, 280).startswith("- Ringkasan pendek.")
+    d.metadata = dict(meta, summary="")
+    assert agent._one_line_summary(d, 20).startswith("- x x")
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+import ingest
+
+def _write_pdf(path, pages):
+    """PDF teks minimal (Helvetica) tanpa dependensi tambahan."""
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_no = len(objs)
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_no} 0 R >>")
+        kids.append(f"{len(objs)} 0 R")
+    objs[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, o in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{o}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objs)+1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objs)+1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+
+class FakeEmbeddings:
+    def __init__(self, fail_first=0):
+        self.calls = 0
+        self.fail_first = fail_first
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise RuntimeError("quota")
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+class FakeColl:
+    def __init__(self):
+        self.rows = {}
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for i, e, d, m in zip(ids, embeddings, documents, metadatas):
+            self.rows[i] = (e, d, m)
+    def delete(self, ids):
+        for i in ids:
+            self.rows.pop(i, None)
+
+class FakeClient:
+    def __init__(self):
+        self.colls = {}
+    def get_or_create_collection(self, name, **kw):
+        return self.colls.setdefault(name, FakeColl())
+    def delete_collection(self, name):
+        self.colls.pop(name, None)
+
+def _config(tmp_path):
+    (tmp_path / "books" / "psy").mkdir(parents=True)
+    _write_pdf(tmp_path / "books" / "psy" / "buku_satu.pdf", ["Halaman pertama tentang empati.", "Halaman kedua."])
+    cfg_path = tmp_path / "books_config.yaml"
+    cfg_path.write_text("source_dir: books\npersist_dir: bundle/vectorstore\n"
+                        "collections:\n  psy:\n    dir: psy\n    chunk_size: 200\n")
+    return ingest.load_config(str(cfg_path))
+
+def test_book_specs_from_dir(tmp_path):
+    cfg = _config(tmp_path)
+    specs = ingest.book_specs(cfg)
+    assert len(specs) == 1
+    assert specs[0].title == "buku satu" and specs[0].chunk_size == 200
+
+def test_ingest_upserts_pages_with_metadata(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.time, "sleep", lambda s: None)
+    cfg = _config(tmp_path)
+    client = FakeClient()
+    stats = ingest.ingest(cfg, workers=1, embeddings=FakeEmbeddings(fail_first=1), client=client)
+    assert stats["pages"] == 2 and stats["chunks"] == 2
+    rows = client.colls["psy"].rows
+    metas = sorted((m["page"], m["chunk_index"]) for _, _, m in rows.values())
+    assert metas == [(0, 0), (1, 1)]
+    assert all(m["book_title"] == "buku satu" for _, _, m in rows.values())
+    assert "chunk/detik" in ingest.format_stats(stats)
+
+def test_incremental_reindex_by_hash(tmp_path):
+    from tools.index_version import read_index_version
+    cfg = _config(tmp_path)
+    client, emb = FakeClient(), FakeEmbeddings()
+    ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    assert read_index_version(cfg["persist_dir"]) == 1
+
+    # tanpa perubahan: tidak ada parse/embed, versi tetap
+    stats = ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    assert stats["skipped"] == 1 and stats["books"] == 0 and stats["index_version"] is None
+
+    # buku baru + buku lama diubah satu halaman: halaman yang sama diambil dari cache
+    _write_pdf(tmp_path / "books" / "psy" / "buku_satu.pdf", ["Halaman pertama tentang empati.", "Halaman baru."])
+    _write_pdf(tmp_path / "books" / "psy" / "buku_dua.pdf", ["Isi buku dua."])
+    stats = ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    assert stats["books"] == 2 and stats["cached"] == 1 and stats["embedded"] == 2
+    assert len(client.colls["psy"].rows) == 3
+
+    # buku dihapus dari sumber -> chunk-nya ikut dihapus
+    (tmp_path / "books" / "psy" / "buku_dua.pdf").unlink()
+    stats = ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    assert stats["removed"] == 1 and len(client.colls["psy"].rows) == 2
+    assert read_index_version(cfg["persist_dir"]) == 3
+
+def test_chunks_enriched_and_old_enrichment_reprocessed(tmp_path):
+    cfg = _config(tmp_path)
+    client, emb = FakeClient(), FakeEmbeddings()
+    ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    metas = [m for _, _, m in client.colls["psy"].rows.values()]
+    first = next(m for m in metas if m["page"] == 0)
+    assert first["summary"] == "Halaman pertama tentang empati."
+    assert "empati" in first["key_terms"] and first["n_tokens"] > 0
+
+    # manifest dari versi pengayaan lama -> buku diproses ulang, embedding tetap dari cache
+    mpath = os.path.join(ingest.artifact_dir(cfg["persist_dir"]), ingest.MANIFEST_FILE)
+    manifest = ingest.load_manifest(mpath)
+    for entry in manifest["collections"]["psy"].values():
+        entry["enrich"] = 0
+    ingest.save_manifest(mpath, manifest)
+    calls = emb.calls
+    stats = ingest.ingest(cfg, workers=1, embeddings=emb, client=client)
+    assert stats["books"] == 1 and stats["cached"] == 2 and emb.calls == calls
+
+def test_embed_retry_only_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(ingest.time, "sleep", lambda s: None)
+    flaky = FakeEmbeddings(fail_first=2)  # "quota" -> diulang
+    assert ingest.embed_with_retry(flaky, ["ab"]) == [[2.0, 1.0, 0.0]] and flaky.calls == 3
+
+    class BadKey(FakeEmbeddings):
+        def embed_documents(self, texts):
+            self.calls += 1
+            raise ValueError("API key not valid")
+    bad = BadKey()
+    with pytest.raises(ValueError):
+        ingest.embed_with_retry(bad, ["ab"])
+    assert bad.calls == 1  # langsung dilempar, tanpa backoff
+
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agent_jobs import JobQueue, JobClient, JobWorker, JobFailed, DocRef, run_job
+from agent_runtime import AgentRuntime
+from agent_scheduler import SchedulerBusy, BACKGROUND, current_llm_context
+
+def test_queue_claim_order_recovery_and_backpressure(tmp_path):
+    q = JobQueue(str(tmp_path / "q.db"), lease_s=0.2, max_attempts=2, max_depth=3)
+    low = q.enqueue("summarize", {"n": 1}, priority=BACKGROUND)
+    a = q.enqueue("ask", {"n": 2})
+    b = q.enqueue("ask", {"n": 3})
+    with pytest.raises(SchedulerBusy):
+        q.enqueue("ask", {"n": 4})  # antrean penuh -> "sedang ramai"
+    assert q.stats()["depth"] == 3 and q.stats()["lag_ms"] >= 0
+    assert q.cancel(b)
+
+    q.heartbeat("w1", "ready")
+    job = q.claim("w1")
+    assert job.id == a and job.payload == {"n": 2} and job.attempts == 1  # interaktif lebih dulu
+    q.finish(job.id, {"answer": "ok"})
+    done = q.take_finished([a, low])
+    assert list(done) == [a] and done[a]["result"] == {"answer": "ok"}
+    assert q.take_finished([a]) == {}  # hasil hanya diambil sekali
+
+    # worker mati di tengah job: dikembalikan ke antrean, lalu digagalkan setelah max_attempts
+    assert q.claim("w1").id == low
+    time.sleep(0.25)
+    assert q.recover() == {"requeued": 1, "failed": 0}
+    q.heartbeat("w2", "ready")
+    assert q.claim("w2").attempts == 2
+    assert q.release("w2") == {"requeued": 0, "failed": 1}  # w2 restart: job miliknya habis jatah
+    assert q.take_finished([low])[low]["error_kind"] == "WorkerLost"
+    assert q.stats()["workers_alive"] == 1 and q.stats()["depth"] == 0
+
+class DummyAgent:
+    persist_dir = "/tidak/ada"
+    def list_collections(self):
+        return ["psikologi"]
+    def list_all_books(self):
+        return {"psikologi": ["Buku A"]}
+    def summarize_history(self, pairs):
+        if pairs[0][0] == "ramai":
+            raise SchedulerBusy("antrean LLM penuh")
+        return f"{len(pairs)} giliran; tenant={current_llm_context().get('tenant')}"
+    def close(self):
+        pass
+
+class DummyBrain:
+    breaker = None
+    def answer_with_pipeline(self, user_id, question, style, mode, history_window, memory_summary, default_collection=None):
+        assert all(isinstance(p, tuple) for p in history_window)
+        if question == "meledak":
+            raise ValueError("indeks rusak")
+        doc = SimpleNamespace(page_content="Empati adalah ...", metadata={"source": "a.pdf", "page": 3})
+        return f"jawaban: {question}", [doc], {"timings": {"pipeline": 1.0}, "trace_id": None}
+
+def test_worker_runs_jobs_for_gateway_client(tmp_path):
+    q = JobQueue(str(tmp_path / "q.db"))
+    built = []
+    def factory(fresh):
+        built.append(fresh)
+        return DummyAgent(), DummyBrain()
+    runtime = AgentRuntime(factory)
+    worker = JobWorker(q, runtime, "w1", threads=2, heartbeat_s=0.05, watch_s=0)
+    stop = threading.Event()
+    t = threading.Thread(target=worker.run, args=(stop,))
+    t.start()
+
+    def ask(question):
+        return {"tenant": 7, "guild": None, "args": {
+            "user_id": 7, "question": question, "style": "terapis", "mode": "ringkas",
+            "history_window": [["q1", "a1"]], "memory_summary": None}}
+
+    async def scenario():
+        client = JobClient(q, poll_s=0.01)
+        res = await client.submit("ask", ask("apa itu empati?"), timeout_s=5)
+        assert res["answer"] == "jawaban: apa itu empati?"
+        assert res["docs"] == [DocRef("Empati adalah ...", {"source": "a.pdf", "page": 3})]
+        summary = await client.submit("summarize", {"tenant": 7, "args": {"pairs": [["a", "b"]]}}, timeout_s=5)
+        assert summary == {"summary": "1 giliran; tenant=7"}
+        with pytest.raises(SchedulerBusy):
+            await client.submit("summarize", {"args": {"pairs": [["ramai", "x"]]}}, timeout_s=5)
+        with pytest.raises(JobFailed, match="indeks rusak"):
+            await client.submit("ask", ask("meledak"), timeout_s=5)
+        books = await asyncio.gather(*(client.submit("books", {}, timeout_s=5) for _ in range(5)))
+        assert books[0] == {"books": {"psikologi": ["Buku A"]}}
+
+    try:
+        asyncio.run(scenario())
+        q.request_reload()  # gateway meminta reload: worker membangun generasi baru
+        deadline = time.time() + 3
+        while runtime.generation < 2 and time.time() < deadline:
+            time.sleep(0.02)
+        assert runtime.generation == 2 and built == [False, True]
+        w = q.workers()[0]
+        assert w["state"] == "ready" and w["done"] == 7 and w["failed"] == 2
+    finally:
+        stop.set()
+        t.join(timeout=5)
+    assert q.workers()[0]["state"] == "stopped"
+
+def test_run_job_in_process_matches_worker_contract():
+    res = run_job(DummyAgent(), DummyBrain(), "collections", {"args": {}})
+    assert res == {"collections": ["psikologi"]}
+    with pytest.raises(ValueError):
+        run_job(DummyAgent(), DummyBrain(), "tidak_ada", {})
@@ -0,0 +1,115 @@
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+import agent_memory as mem
+from agent_nightly import DailySummaryBatch
+from agent_scheduler import SchedulerBusy
+from tools.batch_summary import pack, parse_batch, transcript, format_batch
+
+def test_pack_and_parse_batch():
+    bins = pack([("1", "a" * 50), ("2", "b" * 30), ("3", "c" * 90), ("4", "d" * 20)], max_chars=100, max_items=2)
+    assert [[k for k, _ in b] for b in bins] == [["3"], ["1", "2"], ["4"]]
+    assert transcript([("q1", "a1"), ("q2", "a2")], max_chars=20) == "User: q2\nBot: a2"  # giliran terbaru
+    text = format_batch([("7", "x"), ("8", "y")])
+    assert text.startswith("### 7\nx")
+    reply = "### 7\nSuka empati.\n\n### 99\nasing\n### [8]\n\n### 8\nBelajar Frankl."
+    assert parse_batch(reply, ["7", "8"]) == {"7": "Suka empati.", "8": "Belajar Frankl."}
+
+def test_agent_summarize_batch_one_call_for_many_users():
+    from psionic_agent import PsionicAgent
+    prompts = []
+    def invoke(messages):
+        prompts.append(messages[0].content)
+        return SimpleNamespace(content="### 1\nRingkas A\n### 2\nRingkas B")
+    agent = SimpleNamespace(rewriter=SimpleNamespace(invoke=invoke))
+    out = PsionicAgent.summarize_batch(agent, [("1", [("qa", "aa")]), ("2", [("qb", "ab")]), ("3", [])])
+    assert out == {"1": "Ringkas A", "2": "Ringkas B"} and len(prompts) == 1
+    assert "### 1\nUser: qa" in prompts[0] and "### 3" not in prompts[0]
+
+def test_nightly_batch_packs_users_checkpoints_and_yields(tmp_path, monkeypatch):
+    monkeypatch.setattr(mem, "BASE_DIR", str(tmp_path / "memory"))
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", str(tmp_path / "memory_archive"))
+    y = mem.yesterday_date_str()
+    for uid in (1, 2, 3):
+        for i in range(2):
+            mem.append_turn(uid, f"q{uid}-{i}", "a")
+    # pindahkan log "hari ini" ke kemarin
+    for uid in (1, 2, 3):
+        dd = os.path.join(mem.BASE_DIR, str(uid), "daily")
+        os.replace(os.path.join(dd, f"{mem.today_date_str()}.json"), os.path.join(dd, f"{y}.json"))
+    mem.update_daily_summary(3, "sudah diringkas !end", date_str=y)   # user 3 tidak perlu diproses
+    mem.update_rolling_summary(2, "lama")
+
+    calls, busy = [], [2]
+    async def summarize(items):
+        calls.append([k for k, _ in items])
+        if len(calls) == 1:
+            raise SchedulerBusy("penuh", retry_after=0)  # mundur, bukan kegagalan user
+        if len(items) > 1:
+            return {"1": "ringkasan 1"}                  # id 2 hilang dari jawaban gabungan
+        return {k: f"ringkasan {k}" for k, _ in items}
+    def interactive_waiting():
+        busy[0] -= 1
+        return busy[0] >= 0
+
+    batch = DailySummaryBatch(summarize, busy=interactive_waiting, yield_s=0.001, max_users_per_call=8)
+    st = asyncio.run(batch.run(y))
+    assert st == {"users": 2, "summarized": 2, "failed": 0, "calls": 2}
+    assert sorted(calls[0]) == ["1", "2"] and calls[-1] == ["2"]
+    assert busy[0] < 0  # menunggu antrean interaktif kosong dulu
+    d1 = mem.read_daily(1, y)
+    assert d1["daily_summary"] == "ringkasan 1" and mem.unsummarized_turns(d1) == 0
+    assert mem.read_rolling_summary(2) == "lama ringkasan 2"
+    with open(batch.checkpoint_path(y), encoding="utf-8") as f:
+        cp = json.load(f)
+    assert sorted(cp["done"]) == [1, 2] and "finished_at" in cp
+
+    # run ulang: tidak ada yang tersisa; giliran baru setelah ringkasan diproses lagi
+    assert asyncio.run(batch.run(y))["users"] == 0
+    assert batch.pending(y) == []
+    with open(os.path.join(mem.BASE_DIR, "1", "daily", f"{y}.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    data["turns"].append({"q": "baru", "a": "b"})
+    with open(os.path.join(mem.BASE_DIR, "1", "daily", f"{y}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert [(u, had) for u, _, had in batch.pending(y)] == [(1, True)]
+
+def test_nightly_batch_counts_failures_and_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(mem, "BASE_DIR", str(tmp_path / "memory"))
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", str(tmp_path / "memory_archive"))
+    mem.append_turn(5, "q", "a")
+    today = mem.today_date_str()
+    async def broken(items):
+        raise RuntimeError("LLM error")
+    batch = DailySummaryBatch(broken, max_attempts=2)
+    for _ in range(2):
+        assert asyncio.run(batch.run(today))["failed"] == 1
+    assert asyncio.run(batch.run(today))["users"] == 0  # melewati user setelah max_attempts
+    assert mem.read_daily(5)["daily_summary"] == ""
+
+def test_nightly_batch_summarizes_days_already_compacted(tmp_path, monkeypatch):
+    import agent_archive
+
+    monkeypatch.setattr(mem, "BASE_DIR", str(tmp_path / "memory"))
+    monkeypatch.setattr(mem, "ARCHIVE_DIR", str(tmp_path / "memory_archive"))
+    y = mem.yesterday_date_str()
+    for uid, turns in ((1, [{"q": "q1", "a": "a1"}, {"q": "q2", "a": "a2"}]), (2, [{"q": "x", "a": "y"}])):
+        dd = os.path.join(mem.BASE_DIR, str(uid), "daily")
+        os.makedirs(dd, exist_ok=True)
+        with open(os.path.join(dd, f"{y}.json"), "w", encoding="utf-8") as f:
+            json.dump({"turns": turns, "daily_summary": "sudah" if uid == 2 else ""}, f)
+    agent_archive.compact(mem.BASE_DIR, mem.ARCHIVE_DIR, mem.today_date_str())   # MEMORY_COMPACT_AT lebih awal
+
+    async def summarize(items):
+        return {k: f"ringkasan {k}" for k, _ in items}
+
+    batch = DailySummaryBatch(summarize, yield_s=0)
+    assert batch.pending(y, include_archived=False) == []
+    assert [uid for uid, _, _ in batch.pending(y)] == [1]   # user 2 sudah diringkas sebelum dipadatkan
+    assert asyncio.run(batch.run(y))["summarized"] == 1
+    agent_archive.compact(mem.BASE_DIR, mem.ARCHIVE_DIR, mem.today_date_str())
+    assert mem.read_daily(1, y) == {"turns": [{"q": "q1", "a": "a1"}, {"q": "q2", "a": "a2"}],
+                                    "daily_summary": "ringkasan 1"}
+    assert batch.pending(y) == []
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from bench.fakes import FakeChatModel
+from agent_prefetch import SessionPrefetcher, session_context
+
+def test_session_turn_reads_what_prefetch_warmed(fake_agent, perf):
+    from psionic_agent import prefetch_hit_rate
+    from agent_brain import AgentBrain
+    from agent_jobs import run_job
+
+    llm = FakeChatModel()
+    agent = fake_agent(llm)
+    brain = AgentBrain(agent, llm=llm)
+
+    session = SimpleNamespace(topic="resiliensi", default_collection="psikologi", focus_book=None)
+    _, docs, meta = brain.answer_with_pipeline(0, "apa itu empati?", "terapis", "ringkas", [], None, "psikologi")
+    ctx = session_context(session, docs, {"collection": "psikologi", "title": "Psikologi Sintetis 2"})
+    assert ctx["neighbors_of"] and "book_focus" in meta
+
+    out = run_job(agent, brain, "prefetch", {"args": {"session_context": ctx}})
+    warmed = perf.counter("prefetch_warmed")
+    assert out["warmed"] > 0 and warmed == len(ctx["neighbors_of"]) + 2   # tetangga + topik + buku
+    misses = perf.counter("retrieval_cache_miss")
+
+    _, docs2, _ = brain.answer_with_pipeline(0, "lalu bagaimana caranya?", "terapis", "ringkas", [], None,
+                                             "psikologi", session_context=ctx)
+    assert perf.counter("prefetch_hit") == warmed and prefetch_hit_rate() == 1.0
+    assert perf.counter("retrieval_cache_miss") == misses + 1            # hanya pertanyaan baru
+    assert perf.counter("neighbor_cache_miss") == 0
+    neighbor_keys = {(d.metadata["source"], d.metadata["chunk_index"]) for d in agent.neighbor_chunks(ctx["neighbors_of"])}
+    assert neighbor_keys & {(d.metadata["source"], d.metadata["chunk_index"]) for d in docs2}
+    assert perf.counter("session_anchor_miss") == 0
+
+    # prefetch dilewati (mis. saat ramai): jangkar tidak dicari inline, giliran hanya mencari pertanyaan baru
+    cold = dict(ctx, topic="trauma masa kecil", neighbors_of=[dict(m, chunk_index=0) for m in ctx["neighbors_of"]])
+    misses = perf.counter("retrieval_cache_miss")
+    brain.answer_with_pipeline(0, "apa tandanya?", "terapis", "ringkas", [], None, "psikologi", session_context=cold)
+    assert perf.counter("retrieval_cache_miss") == misses + 1 and perf.counter("neighbor_cache_miss") == 0
+    assert perf.counter("session_anchor_miss") >= 2
+
+def test_prefetcher_keeps_latest_per_session_and_yields(perf):
+    ran, busy = [], [False]
+
+    async def run(ctx):
+        ran.append(ctx["topic"])
+
+    async def main():
+        p = SessionPrefetcher(run, busy=lambda: busy[0])
+        p.schedule("s1", {"topic": "lama"})
+        p.schedule("s1", {"topic": "baru"})   # belum jalan -> diganti
+        p.schedule("s2", None)                 # tanpa jangkar
+        await p.join()
+        busy[0] = True
+        p.schedule("s1", {"topic": "ditolak"})
+        await p.join()
+
+    asyncio.run(main())
+    assert ran == ["baru"]
+    assert perf.counter("prefetch_superseded") == 1 and perf.counter("prefetch_dropped") == 1
+    assert session_context(SimpleNamespace(topic=None, focus_book=None), []) is None
@@ -20,3 +20,32 @@ def test_format_citations_staticmethod():
     assert "[book:Book A" in lines[0]
     assert "page:3" in lines[0]
     assert lines[1].endswith("...")
+
+def test_concurrent_maybe_refresh_is_single_flight(fake_agent):
+    import threading
+    from tools.index_version import bump_index_version
+
+    agent = fake_agent(auto_refresh=True)
+    calls = []
+    real = agent.refresh
+    started, release = threading.Event(), threading.Event()
+
+    def slow_refresh():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        real()
+
+    agent.refresh = slow_refresh
+    agent._version_checked_at = 0.0
+    version = bump_index_version(agent.persist_dir)
+    first = threading.Thread(target=agent.maybe_refresh)
+    first.start()
+    assert started.wait(5)
+    agent._version_checked_at = 0.0
+    assert agent.maybe_refresh() is False                  # sedang di-refresh thread lain: lanjut
+    assert agent.retrieve("empati", k_override=2)          # state lama tetap utuh selama refresh
+    release.set()
+    first.join(5)
+    assert calls == [1] and agent.index_version == version
+    assert agent.retrieve("empati kecemasan", k_override=2)
@@ -0,0 +1,65 @@
+import numpy as np
+from tools.quant_index import QuantizedIndex, quantize_int8, _exact_distance
+
+def _vecs(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.normal(size=(n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+def test_quantize_roundtrip_error_small():
+    v = _vecs(50, 256)
+    codes, scales = quantize_int8(v, block_size=128)
+    assert codes.dtype == np.int8 and scales.shape == (50, 2)
+    deq = np.concatenate([codes[:, :128] * scales[:, :1].astype(np.float32),
+                          codes[:, 128:] * scales[:, 1:].astype(np.float32)], axis=1)
+    assert np.abs(deq - v).max() < 0.01
+
+def test_search_recall_and_memory(tmp_path):
+    v = _vecs(2000, 768)
+    ids = [f"id{i}" for i in range(len(v))]
+    idx = QuantizedIndex.build(ids, v, str(tmp_path / "q"))
+    assert idx.float32_bytes() / idx.memory_bytes() > 3.5
+    queries = _vecs(20, 768, seed=3)
+    hit = 0
+    for q in queries:
+        truth = {f"id{i}" for i in np.argsort(_exact_distance(v, q, "l2"))[:5]}
+        hit += len(truth & {i for i, _ in idx.search(q, 5)})
+    assert hit / (20 * 5) >= 0.95
+
+def test_load_matches_build(tmp_path):
+    v = _vecs(100, 64)
+    ids = [str(i) for i in range(100)]
+    out = str(tmp_path / "q")
+    QuantizedIndex.build(ids, v, out, space="cosine", block_size=32)
+    idx = QuantizedIndex.load(out)
+    assert QuantizedIndex.stored_count(out) == 100
+    assert idx.space == "cosine"
+    top = idx.search(v[7], 1)
+    assert top[0][0] == "7" and abs(top[0][1]) < 1e-5
+
+def test_rebuild_keeps_open_index_valid_and_leaves_no_staging(tmp_path):
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    out = str(tmp_path / "q")
+    old = QuantizedIndex.build([str(i) for i in range(100)], _vecs(100, 64), out, version=1)
+    with ThreadPoolExecutor(4) as pool:   # beberapa "worker" membangun ulang folder yang sama bersamaan
+        list(pool.map(lambda _: QuantizedIndex.build([str(i) for i in range(80)], _vecs(80, 64, seed=1), out,
+                                                     version=2), range(4)))
+    assert old.search(_vecs(100, 64)[7], 1)[0][0] == "7"   # memmap lama tetap terbaca
+    assert QuantizedIndex.stored_meta(out)["version"] == 2 and len(QuantizedIndex.load(out)) == 80
+    assert os.listdir(tmp_path) == ["q"]
+
+def test_load_rejects_mismatched_files(tmp_path):
+    import os
+    import json
+    import pytest
+    from tools.atomic_files import current_dir
+
+    out = str(tmp_path / "q")
+    QuantizedIndex.build([str(i) for i in range(20)], _vecs(20, 64), out, version=3)
+    assert QuantizedIndex.load(out).version == 3
+    with open(os.path.join(current_dir(out), "ids.json"), "w") as f:   # ids dari build lain
+        json.dump([str(i) for i in range(15)], f)
+    with pytest.raises(ValueError):
+        QuantizedIndex.load(out)
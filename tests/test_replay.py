@@ -0,0 +1,33 @@
+import json
+
+from bench.fakes import HashEmbeddings
+from bench.replay import anonymize_question, load_questions, overlap, parse_config, RecordedEmbeddings
+
+def _daily(base, uid, date, qs):
+    d = base / str(uid) / "daily"
+    d.mkdir(parents=True, exist_ok=True)
+    (d / f"{date}.json").write_text(json.dumps({"turns": [{"q": q, "a": ""} for q in qs], "daily_summary": ""}))
+
+def test_load_questions_anonymized_and_ordered(tmp_path):
+    _daily(tmp_path, 222, "2026-10-02", ["halo <@123456> apa kabar", "kontak saya a.b@mail.com"])
+    _daily(tmp_path, 111, "2026-10-01", ["apa itu empati?"])
+    recs = load_questions(str(tmp_path))
+    assert [r["q"] for r in recs] == ["apa itu empati?", "halo <user> apa kabar", "kontak saya <email>"]
+    assert "111" not in recs[0]["user"] and recs[1]["user"] == recs[2]["user"]
+    assert anonymize_question("telp 0812-3456-7890 ya") == "telp <angka> ya"
+
+def test_overlap_and_config_parsing():
+    a = {0: [("a", 1, 0), ("a", 2, 0)], 1: [("b", 1, 0)]}
+    b = {0: [("a", 1, 0), ("a", 3, 0)], 1: [("b", 1, 0)]}
+    ov = overlap(a, b)
+    assert abs(ov["jaccard_mean"] - (1 / 3 + 1) / 2) < 1e-9 and ov["top1_agree"] == 1.0
+    cfg = parse_config("mmr8:k=8,mmr=1,tier=draft,cache=0")
+    assert (cfg["name"], cfg["k"], cfg["mmr"], cfg["tier"], cfg["cache"]) == ("mmr8", 8, True, "draft", False)
+
+def test_recorded_embeddings_replay_offline(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    live = RecordedEmbeddings(path, "m", inner=HashEmbeddings(dim=16))
+    vec = live.embed_query("apa itu empati")
+    offline = RecordedEmbeddings(path, "m")
+    assert offline.has("apa itu empati") and not offline.has("lain")
+    assert offline.embed_query("apa itu empati") == vec
@@ -11,3 +11,16 @@ def test_session_lifecycle_and_bump():
     assert sm.get(1,2).topic == "uji"
     sm.end(1,2)
     assert sm.get(1,2).is_on is False
+
+def test_active_count_does_not_scan_store():
+    class NoScan(dict):
+        def values(self):
+            raise AssertionError("gauge tidak boleh membaca semua sesi")
+
+    sm = SessionManager(NoScan())
+    sm.start(1, 2, None, "terapis", "ringkas")
+    sm.start(3, 4, None, "terapis", "ringkas")
+    assert sm.active_count() == 2
+    sm.end(1, 2)
+    sm.end(9, 9)   # tidak ada sesi: tidak mengubah hitungan
+    assert sm.active_count() == 1
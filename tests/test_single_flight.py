@@ -0,0 +1,55 @@
+import time
+import threading
+
+from tools.single_flight import SingleFlight
+from agent_brain import AgentBrain
+
+def _run_concurrently(n, target):
+    out, threads = [None] * n, []
+    start = threading.Barrier(n)
+
+    def worker(i):
+        start.wait()
+        try:
+            out[i] = target()
+        except Exception as e:
+            out[i] = e
+    for i in range(n):
+        threads.append(threading.Thread(target=worker, args=(i,)))
+        threads[-1].start()
+    for t in threads:
+        t.join()
+    return out
+
+def test_identical_calls_share_one_execution():
+    sf = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "jawaban"
+
+    out = _run_concurrently(5, lambda: sf.do("k", slow))
+    assert len(calls) == 1 and sf.executions == 1 and sf.saved == 4
+    assert sorted(shared for _, shared in out) == [False, True, True, True, True]
+    assert all(res == "jawaban" for res, _ in out)
+    # setelah selesai key dilepas: panggilan berikutnya dieksekusi lagi
+    assert sf.do("k", lambda: "baru") == ("baru", False)
+
+def test_error_propagates_to_waiters():
+    sf = SingleFlight()
+
+    def boom():
+        time.sleep(0.1)
+        raise ValueError("gagal")
+
+    out = _run_concurrently(3, lambda: sf.do("k", boom))
+    assert all(isinstance(e, ValueError) for e in out)
+    assert sf.inflight() == 0
+
+def test_flight_key_normalizes_question_but_keeps_personal_context():
+    k1 = AgentBrain.flight_key("Apa itu  Empati?", "terapis", "ringkas", [], None, None)
+    k2 = AgentBrain.flight_key("apa itu empati?", "Terapis", "ringkas", [], None, None)
+    k3 = AgentBrain.flight_key("apa itu empati?", "terapis", "ringkas", [("q", "a")], None, None)
+    assert k1 == k2 and k1 != k3
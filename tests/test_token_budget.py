@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from tools.token_budget import approx_tokens, fill_budget, TokenCountCache
+
+def _doc(i, text):
+    return SimpleNamespace(page_content=text, metadata={"source": f"b{i}.pdf", "page": i, "chunk_index": 0,
+                                                        "book_title": f"Buku {i}"})
+
+def test_approx_tokens_and_greedy_fill():
+    assert approx_tokens("") == 0
+    assert approx_tokens("empati, ya.") == 4
+    assert approx_tokens("psikoterapeutik") == 3  # kata panjang dipecah subword
+    # nilai tertinggi dulu; yang tidak muat utuh turun ke bentuk ringkas, sisanya dilewati
+    chosen = fill_budget([(1.0, "a", [50, 10]), (0.5, "b", [40, 10]), (0.2, "c", [30, 20])], 70)
+    assert chosen == {"a": 0, "b": 1}
+    c = TokenCountCache(max_items=1)
+    c.put("x", 3); c.put("y", 4)
+    assert c.get("x") is None and c.get("y") == 4
+
+def test_assemble_context_respects_budget_and_relevance(monkeypatch):
+    from psionic_agent import PsionicAgent
+
+    agent = PsionicAgent.__new__(PsionicAgent)  # tanpa Chroma/LLM: hanya perakitan konteks
+    agent.context_budgets = {"ringkas": 450}
+    agent.token_counts = TokenCountCache()
+    docs = [_doc(i, f"Kalimat bukti nomor {i} tentang empati. " * 30) for i in range(6)]
+    history = [("pertanyaan lama " * 40, "jawaban lama sekali. " * 60), ("apa itu empati?", "Empati adalah ...")]
+
+    context, history_block, used = agent.assemble_context(docs, history, "ringkasan memori singkat", "ringkas")
+    assert used <= 450 and approx_tokens(context + history_block) <= 480
+    assert "Buku 0" in context and "Buku 5" not in context  # bukti teratas diutamakan
+    assert "Ringkasan memori" in history_block and "apa itu empati?" in history_block
+    assert len(agent.token_counts) == 12
+
+    big, _, used_big = agent.assemble_context(docs, history, None, "ringkas", budget=5000)
+    assert used_big > used and big.count("[book:") == 6
@@ -0,0 +1,53 @@
+# tools/adjacency.py
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+Key = Tuple[Any, Any, Any]  # (source, page, chunk_index), sama dengan kunci dedupe dokumen
+
+def _order(md: Dict[str, Any]) -> Tuple[int, int]:
+    try:
+        return int(md.get("page") or 0), int(md.get("chunk_index") or 0)
+    except (TypeError, ValueError):
+        return 0, 0
+
+class AdjacencyIndex:
+    """
+    Urutan baca chunk per source dari metadata (page, chunk_index) -> id. Cocok untuk chunk_index
+    global per source (ingest.py) maupun per halaman (bench/corpus.py), dan tetangga boleh melewati
+    batas halaman. Dipakai untuk mengambil chunk sebelum/sesudah lewat id, tanpa pencarian vektor.
+    """
+
+    def __init__(self) -> None:
+        self._by_source: Dict[str, List[Tuple[Tuple[int, int], str]]] = {}
+        self._pos: Dict[Key, Tuple[str, int]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, Dict[str, Any]]]) -> "AdjacencyIndex":
+        """rows = (id, metadata); metadata tanpa source atau chunk_index dilewati."""
+        idx = cls()
+        for chunk_id, md in rows:
+            md = md or {}
+            src = md.get("source")
+            if src is None or md.get("chunk_index") is None:
+                continue
+            idx._by_source.setdefault(src, []).append((_order(md), chunk_id))
+        for src, items in idx._by_source.items():
+            items.sort()
+            for i, ((page, ci), _) in enumerate(items):
+                idx._pos[(src, page, ci)] = (src, i)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def neighbors(self, md: Dict[str, Any], span: int = 1) -> Optional[Tuple[List[str], List[str]]]:
+        """(id sebelum, id sesudah) paling banyak `span` per sisi, urut baca; None bila chunk tidak dikenal."""
+        page, ci = _order(md)
+        hit = self._pos.get((md.get("source"), page, ci))
+        if hit is None:
+            return None
+        src, i = hit
+        items = self._by_source[src]
+        before = [chunk_id for _, chunk_id in items[max(0, i - span): i]]
+        after = [chunk_id for _, chunk_id in items[i + 1: i + 1 + span]]
+        return before, after
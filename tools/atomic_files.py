@@ -0,0 +1,75 @@
+# tools/atomic_files.py
+#
+# Folder indeks yang dibaca bersama beberapa proses (worker, gateway) disimpan per generasi:
+#   <out_dir>/g-<waktu>-<uuid>/...   satu generasi lengkap (semua berkas satu build)
+#   <out_dir>/CURRENT                nama generasi aktif, diganti atomik dengan os.replace
+# Build menulis di <out_dir>/.tmp-<pid>-<uuid>/ lalu folder itu di-rename menjadi generasi baru dan
+# CURRENT dialihkan. Pembaca yang membuka berkas lewat current_dir() selalu mendapat satu generasi
+# utuh; berkas dari dua build tidak pernah tercampur. Generasi lama dihapus setelah masa tenggang
+# (mmap yang sudah terbuka tetap valid walau berkasnya di-unlink).
+#
+# Folder lama tanpa CURRENT (berkas langsung di out_dir) tetap terbaca sebagai satu generasi.
+
+import os
+import time
+import uuid
+import shutil
+from typing import Optional
+
+_CURRENT = "CURRENT"
+_GEN_PREFIX = "g-"
+_STAGING_PREFIX = ".tmp-"
+
+GEN_GRACE_S = 60.0        # generasi non-aktif lebih tua dari ini dihapus saat publish berikutnya
+STALE_STAGING_S = 3600.0  # staging sisa build yang mati di tengah jalan
+
+def staging_dir(out_dir: str) -> str:
+    """Folder sementara unik (pid + uuid) di dalam out_dir, di filesystem yang sama."""
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{_STAGING_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(path)
+    return path
+
+def current_dir(out_dir: str) -> str:
+    """Folder generasi aktif (out_dir sendiri bila belum ada CURRENT: tata letak lama)."""
+    try:
+        with open(os.path.join(out_dir, _CURRENT), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return out_dir
+    return os.path.join(out_dir, name) if name else out_dir
+
+def publish(staging: str, out_dir: str) -> str:
+    """Jadikan staging generasi baru, alihkan CURRENT ke sana, lalu bersihkan generasi lama. Kembalikan path generasi."""
+    out_dir = os.path.abspath(out_dir)
+    name = f"{_GEN_PREFIX}{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+    gen = os.path.join(out_dir, name)
+    try:
+        os.rename(staging, gen)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    pointer = os.path.join(out_dir, f"{_STAGING_PREFIX}{_CURRENT}-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(out_dir, _CURRENT))
+    _prune(out_dir, keep=name)
+    return gen
+
+def _prune(out_dir: str, keep: str) -> None:
+    now = time.time()
+    for entry in os.scandir(out_dir):
+        if entry.name == keep or not entry.is_dir(follow_symlinks=False):
+            continue
+        if entry.name.startswith(_GEN_PREFIX):
+            grace = GEN_GRACE_S          # pembaca mungkin baru saja membaca CURRENT lama
+        elif entry.name.startswith(_STAGING_PREFIX):
+            grace = STALE_STAGING_S      # build lain mungkin masih menulis
+        else:
+            continue
+        try:
+            if now - entry.stat(follow_symlinks=False).st_mtime > grace:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
@@ -0,0 +1,52 @@
+# tools/batch_summary.py
+
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+Pair = Tuple[str, str]
+
+_HEADER_RE = re.compile(r"^\s*#{2,}\s*\[?([\w:-]+)\]?\s*$", re.M)
+
+def transcript(pairs: Sequence[Pair], max_chars: int = 4000) -> str:
+    """Teks "User:/Bot:" satu hari; bila terlalu panjang, giliran terbaru yang dipertahankan."""
+    lines: List[str] = []
+    total = 0
+    for q, a in reversed(list(pairs)):
+        block = f"User: {(q or '').strip()}\nBot: {(a or '').strip()}"
+        if lines and total + len(block) > max_chars:
+            break
+        lines.append(block[-max_chars:])
+        total += len(block) + 1
+    return "\n".join(reversed(lines))
+
+def pack(items: Iterable[Tuple[str, str]], max_chars: int = 6000, max_items: int = 8) -> List[List[Tuple[str, str]]]:
+    """
+    Kelompokkan (id, transkrip) ke beberapa panggilan LLM: first-fit menurun per panjang, maksimal
+    max_chars teks dan max_items percakapan per panggilan. Transkrip yang sendirian sudah melebihi
+    max_chars tetap mendapat panggilannya sendiri.
+    """
+    bins: List[Tuple[int, List[Tuple[str, str]]]] = []
+    for key, text in sorted(items, key=lambda kv: -len(kv[1])):
+        for i, (used, members) in enumerate(bins):
+            if used + len(text) <= max_chars and len(members) < max_items:
+                members.append((key, text))
+                bins[i] = (used + len(text), members)
+                break
+        else:
+            bins.append((len(text), [(key, text)]))
+    return [members for _, members in bins]
+
+def format_batch(members: Sequence[Tuple[str, str]]) -> str:
+    return "\n\n".join(f"### {key}\n{text}" for key, text in members)
+
+def parse_batch(text: str, keys: Sequence[str]) -> Dict[str, str]:
+    """Pecah jawaban "### <id>\\n<ringkasan>" per id; id asing atau ringkasan kosong diabaikan."""
+    wanted = set(keys)
+    out: Dict[str, str] = {}
+    found = list(_HEADER_RE.finditer(text or ""))
+    for i, m in enumerate(found):
+        end = found[i + 1].start() if i + 1 < len(found) else len(text)
+        body = text[m.end():end].strip()
+        if m.group(1) in wanted and body:
+            out[m.group(1)] = body
+    return out
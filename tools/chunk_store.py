@@ -0,0 +1,297 @@
+# tools/chunk_store.py
+#
+# Teks chunk per koleksi dalam satu buffer UTF-8 bersambung (text.bin, di-mmap) + tabel offset numpy.
+# Teks disimpan sudah dinormalisasi (satu baris, spasi tunggal) dan batas kalimatnya dihitung sekali
+# saat build, sehingga cuplikan sitasi dan pemangkasan di batas kalimat cukup memotong buffer, tanpa
+# strip/replace/regex per dokumen per panggilan. Berkas sama dibaca bersama oleh worker dan gateway
+# (page cache OS), dan divalidasi lewat jumlah chunk + versi indeks seperti tools/quant_index.py.
+
+import os
+import re
+import json
+import mmap
+import time
+import shutil
+import bisect
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tools.atomic_files import staging_dir, publish, current_dir
+
+_TEXT = "text.bin"
+_OFFSETS = "offsets.npy"        # uint64[n+1]: byte awal tiap chunk di text.bin
+_CHAR_LEN = "char_len.npy"      # uint32[n]: panjang teks (karakter)
+_SENT_INDEX = "sent_index.npy"  # uint64[n+1]: rentang kalimat tiap chunk di dua tabel berikut
+_SENT_CHAR = "sent_char.npy"    # uint32: akhir kalimat (karakter, relatif ke awal chunk)
+_SENT_BYTE = "sent_byte.npy"    # uint32: akhir kalimat (byte, relatif ke awal chunk)
+_IDS = "ids.json"
+_KEYS = "keys.json"
+_META = "meta.json"
+
+MISSING_RETRY_S = 5.0  # jeda cek ulang store yang belum ada / masih usang
+
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')  # sama dengan tools.citations.SENT_SPLIT
+
+def normalize(text: str) -> str:
+    """Satu baris, spasi tunggal (bentuk yang dipakai sitasi, !why, dan konteks)."""
+    return " ".join((text or "").split())
+
+def doc_key(md: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """(source, page, chunk_index), sama dengan kunci dedupe dokumen dan tools/adjacency.py."""
+    return md.get("source"), md.get("page"), md.get("chunk_index")
+
+def _sentence_ends(line: str) -> List[int]:
+    ends = [m.start() for m in _SENT_SPLIT.finditer(line)]
+    return ends + [len(line)] if line else []
+
+class ChunkStore:
+    def __init__(self, out_dir: str, ids: List[str], keys: List[List[Any]], buf, offsets: memoryview, char_len: memoryview,
+                 sent_index: memoryview, sent_char: memoryview, sent_byte: memoryview, meta: Dict[str, Any]):
+        self.out_dir = out_dir
+        self.ids = ids
+        self.meta = meta
+        self._buf = buf
+        self._offsets = offsets
+        self._char_len = char_len
+        self._sent_index = sent_index
+        self._sent_char = sent_char
+        self._sent_byte = sent_byte
+        self._by_id = {i: r for r, i in enumerate(ids)}
+        self._by_key = {tuple(k): r for r, k in enumerate(keys)}
+
+    # ---------- build / load ----------
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, str, Dict[str, Any]]], out_dir: str,
+              version: Optional[int] = None) -> "ChunkStore":
+        """rows = (id, page_content, metadata)."""
+        ids: List[str] = []
+        keys: List[Tuple[Any, Any, Any]] = []
+        offsets = [0]
+        char_len: List[int] = []
+        sent_index = [0]
+        sent_char: List[int] = []
+        sent_byte: List[int] = []
+        # tiap worker membangun di staging sendiri (pid + uuid), lalu diterbitkan sebagai satu generasi (tools/atomic_files.py)
+        tmp = staging_dir(out_dir)
+        try:
+            with open(os.path.join(tmp, _TEXT), "wb") as f:
+                for chunk_id, text, md in rows:
+                    line = normalize(text)
+                    data = line.encode("utf-8")
+                    ends = _sentence_ends(line)
+                    ids.append(chunk_id)
+                    keys.append(doc_key(md or {}))
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+                    char_len.append(len(line))
+                    sent_char.extend(ends)
+                    if len(data) == len(line):  # ASCII: byte == karakter
+                        sent_byte.extend(ends)
+                    else:
+                        sent_byte.extend(len(line[:e].encode("utf-8")) for e in ends)
+                    sent_index.append(len(sent_char))
+            arrays = {_OFFSETS: (offsets, np.uint64), _CHAR_LEN: (char_len, np.uint32), _SENT_INDEX: (sent_index, np.uint64),
+                      _SENT_CHAR: (sent_char, np.uint32), _SENT_BYTE: (sent_byte, np.uint32)}
+            for name, (values, dtype) in arrays.items():
+                np.save(os.path.join(tmp, name), np.asarray(values, dtype=dtype))
+            meta = {"count": len(ids), "version": version, "bytes": offsets[-1], "sentences": len(sent_char)}
+            for name, value in ((_IDS, ids), (_KEYS, keys), (_META, meta)):
+                with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+                    json.dump(value, f)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return cls.load(publish(tmp, out_dir))
+
+    @classmethod
+    def load(cls, out_dir: str) -> "ChunkStore":
+        gen = current_dir(out_dir)
+        with open(os.path.join(gen, _META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(gen, _IDS), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        with open(os.path.join(gen, _KEYS), "r", encoding="utf-8") as f:
+            keys = json.load(f)
+        buf = b""
+        if meta.get("bytes"):
+            with open(os.path.join(gen, _TEXT), "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # memoryview atas memmap: tetap tanpa salinan, tapi indeks/slice jadi int Python murah (tanpa objek numpy)
+        load = lambda name: memoryview(np.load(os.path.join(gen, name), mmap_mode="r").view(np.ndarray))
+        offsets, sent_index = load(_OFFSETS), load(_SENT_INDEX)
+        char_len, sent_char, sent_byte = load(_CHAR_LEN), load(_SENT_CHAR), load(_SENT_BYTE)
+        # tabel, teks, dan meta harus dari build yang sama; bila tidak, store dianggap tidak ada
+        count = meta.get("count")
+        if not (isinstance(count, int) and len(ids) == len(keys) == len(char_len) == count
+                    and len(offsets) == len(sent_index) == count + 1
+                    and offsets[-1] == len(buf) == meta.get("bytes")
+                    and sent_index[-1] == len(sent_char) == len(sent_byte) == meta.get("sentences")):
+            raise ValueError(f"store teks chunk di {out_dir} tidak konsisten (count={count})")
+        return cls(out_dir, ids, keys, buf, offsets, char_len, sent_index, sent_char, sent_byte, meta)
+
+    @staticmethod
+    def stored_meta(out_dir: str) -> Optional[Dict[str, Any]]:
+        p = os.path.join(current_dir(out_dir), _META)
+        if not os.path.exists(p):
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        """Ukuran berkas yang di-mmap (teks + tabel); resident hanya halaman yang pernah dibaca."""
+        arrays = (self._offsets, self._char_len, self._sent_index, self._sent_char, self._sent_byte)
+        return len(self._buf) + sum(a.nbytes for a in arrays)
+
+    # ---------- akses ----------
+    def row(self, chunk_id: Optional[str] = None, md: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        row = self._by_id.get(chunk_id) if chunk_id is not None else None
+        if row is None and md:
+            row = self._by_key.get((md.get("source"), md.get("page"), md.get("chunk_index")))
+        return row
+
+    def _bytes(self, row: int, n_bytes: Optional[int] = None) -> str:
+        start = self._offsets[row]
+        end = self._offsets[row + 1] if n_bytes is None else start + n_bytes
+        return self._buf[start:end].decode("utf-8")
+
+    def line(self, row: int) -> str:
+        return self._bytes(row)
+
+    def char_len(self, row: int) -> int:
+        return self._char_len[row]
+
+    def _prefix(self, row: int, max_chars: int) -> str:
+        if self._offsets[row + 1] - self._offsets[row] == self._char_len[row]:
+            return self._bytes(row, max_chars)  # ASCII: potong buffer langsung
+        return self.line(row)[:max_chars]
+
+    def snippet(self, row: int, max_chars: int) -> str:
+        """Cuplikan sitasi: `max_chars` karakter pertama + "..." bila terpotong."""
+        if self._char_len[row] <= max_chars:
+            return self.line(row)
+        return self._prefix(row, max_chars).rstrip() + "..."
+
+    def sentences(self, row: int) -> List[str]:
+        line = self.line(row)
+        out, start = [], 0
+        for end in self._sent_char[self._sent_index[row]:self._sent_index[row + 1]].tolist():
+            out.append(line[start:end])
+            start = end + 1
+        return out
+
+    def trim(self, row: int, max_chars: int) -> str:
+        """Kalimat-kalimat awal yang muat `max_chars` (semantik tools.citations.trim_to_chars_by_sentence)."""
+        if self._char_len[row] <= max_chars:
+            return self.line(row)
+        s0, s1 = self._sent_index[row], self._sent_index[row + 1]
+        # kalimat pertama muat bila panjangnya <= max; kalimat ke-j berikutnya bila akhir_j + 1 <= max
+        if s1 == s0 or self._sent_char[s0] > max_chars:
+            return self._prefix(row, max_chars).rsplit(" ", 1)[0].rstrip() + "..."
+        m = bisect.bisect_right(self._sent_char, max_chars - 1, s0 + 1, s1)
+        return self._bytes(row, self._sent_byte[m - 1])
+
+class ChunkStoreSet:
+    """
+    Store per koleksi di bawah satu folder (<root>/<koleksi>/). Agen membangunnya (put); gateway hanya
+    membaca. Store yang versinya tidak sama dengan version_fn() tidak dipakai (dokumen jatuh ke jalur
+    string biasa) sampai dibangun ulang.
+    """
+
+    def __init__(self, root: str, version_fn: Callable[[], Optional[int]], check_interval_s: float = 0.0):
+        self.root = os.path.abspath(root)
+        self.version_fn = version_fn
+        self.check_interval_s = check_interval_s
+        self._stores: Dict[str, Optional[ChunkStore]] = {}
+        self._missing: Dict[str, float] = {}  # koleksi tanpa store yang valid -> waktu terakhir dicek
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _current_version(self) -> Optional[int]:
+        now = time.monotonic()
+        if self._checked_at == 0.0 or now - self._checked_at >= self.check_interval_s:
+            version = self.version_fn()
+            self._checked_at = now
+            if version != self._version:
+                self._version = version
+                self._stores = {}  # store lama tetap hidup selama masih dirujuk pemanggil
+                self._missing = {}
+        return self._version
+
+    def is_fresh(self, name: str, count: int) -> bool:
+        meta = ChunkStore.stored_meta(self.path(name))
+        return bool(meta) and meta.get("count") == count and meta.get("version") == self._current_version()
+
+    def put(self, name: str, store: Optional[ChunkStore]) -> None:
+        with self._lock:
+            self._current_version()
+            self._stores[name] = store
+            self._missing.pop(name, None)
+
+    def invalidate(self) -> None:
+        """Paksa cek versi pada akses berikutnya (dipanggil agen setelah indeks di-reload)."""
+        self._checked_at = 0.0
+
+    def get(self, name: Optional[str]) -> Optional[ChunkStore]:
+        if not name:
+            return None
+        store = self._stores.get(name)
+        if store is not None and self._checked_at and time.monotonic() - self._checked_at < self.check_interval_s:
+            return store  # jalur cepat tanpa lock: versi baru saja dicek
+        with self._lock:
+            version = self._current_version()
+            store = self._stores.get(name)
+            if store is not None:
+                return store
+            now = time.monotonic()
+            if now - self._missing.get(name, -MISSING_RETRY_S) < MISSING_RETRY_S:
+                return None
+            if ChunkStore.stored_meta(self.path(name)):
+                try:
+                    store = ChunkStore.load(self.path(name))
+                except (OSError, ValueError):  # generasi terhapus atau berkas tidak konsisten
+                    store = None
+            if store is not None and store.meta.get("version") != version:
+                store = None
+            if store is None:
+                self._missing[name] = now  # mungkin sedang dibangun agen: dicek lagi nanti
+            else:
+                self._stores[name] = store
+            return store
+
+    def locate(self, d: Any) -> Optional[Tuple[ChunkStore, int]]:
+        md = getattr(d, "metadata", None) or {}
+        store = self.get(md.get("collection"))
+        if store is None:
+            return None
+        row = store.row(getattr(d, "id", None), md)
+        return (store, row) if row is not None else None
+
+    # ---------- teks dokumen (jatuh ke string biasa bila tidak ada di store) ----------
+    def line(self, d: Any) -> str:
+        hit = self.locate(d)
+        return hit[0].line(hit[1]) if hit else normalize(getattr(d, "page_content", "") or "")
+
+    def snippet(self, d: Any, max_chars: int) -> str:
+        hit = self.locate(d)
+        if hit:
+            return hit[0].snippet(hit[1], max_chars)
+        text = normalize(getattr(d, "page_content", "") or "")
+        return text if len(text) <= max_chars else text[:max_chars].rstrip() + "..."
+
+    def trim(self, d: Any, max_chars: int) -> Optional[str]:
+        """Teks terpangkas di batas kalimat, atau None bila dokumen tidak ada di store."""
+        hit = self.locate(d)
+        return hit[0].trim(hit[1], max_chars) if hit else None
+
+    def sentences(self, d: Any) -> Optional[List[str]]:
+        hit = self.locate(d)
+        return hit[0].sentences(hit[1]) if hit else None
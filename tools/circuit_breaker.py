@@ -0,0 +1,97 @@
+# tools/circuit_breaker.py
+
+import time
+import threading
+from typing import Any, Callable, Optional, Tuple, Type
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+class CircuitOpen(RuntimeError):
+    """Sirkuit terbuka: panggilan ditolak tanpa menyentuh backend."""
+
+class CircuitBreaker:
+    """
+    Breaker klasik: terbuka setelah `failure_threshold` kegagalan beruntun (error atau panggilan
+    lebih lambat dari slow_call_s). Setelah reset_timeout_s, satu panggilan percobaan (half-open)
+    diloloskan; sukses menutup sirkuit, gagal membukanya lagi.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0, slow_call_s: float = 0.0,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.slow_call_s = slow_call_s  # 0 = lambat tidak dihitung gagal
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_inflight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                return HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """Terbuka dan belum waktunya percobaan (tanpa memakai jatah probe)."""
+        return self.state == OPEN
+
+    def _set(self, state: str) -> None:
+        old, self._state = self._state, state
+        if old != state and self.on_change is not None:
+            try:
+                self.on_change(old, state)
+            except Exception:
+                pass
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self._set(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probe_inflight:
+                self._probe_inflight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_inflight = False
+            self._set(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._probe_inflight = False
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+
+    def call(self, fn: Callable[[], Any], ignore: Tuple[Type[BaseException], ...] = (),
+             ignore_if: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """
+        Jalankan fn lewat breaker; exception bertipe `ignore` atau yang lolos `ignore_if` (mis. backpressure
+        lokal, error kuota) tidak dihitung.
+        """
+        if not self.allow():
+            raise CircuitOpen("layanan LLM sedang tidak tersedia")
+        t0 = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            if isinstance(e, ignore) or (ignore_if is not None and ignore_if(e)):
+                with self._lock:
+                    self._probe_inflight = False
+            else:
+                self.record_failure()
+            raise
+        if self.slow_call_s and time.monotonic() - t0 > self.slow_call_s:
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
@@ -0,0 +1,81 @@
+# tools/citations.py
+#
+# Pemangkasan di batas kalimat dan format sitasi (!source, !why, mode terdegradasi). Tanpa
+# chromadb/langchain, sehingga gateway bisa memformat sitasi tanpa memuat psionic_agent.
+
+import os
+import re
+from typing import Any, List, Optional
+
+SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+def split_sentences(text: str) -> List[str]:
+    text = (text or "").strip()
+    if not text:
+        return []
+    return SENT_SPLIT.split(text)
+
+def trim_to_chars_by_sentence(text: str, max_chars: int) -> str:
+    """Pangkas di batas kalimat agar makna tetap utuh."""
+    if not text or len(text) <= max_chars:
+        return text or ""
+    sents = split_sentences(text)
+    out = []
+    total = 0
+    for s in sents:
+        s = s.strip()
+        if not s:
+            continue
+        if total + len(s) + (1 if out else 0) > max_chars:
+            break
+        out.append(s)
+        total += len(s) + (1 if out else 0)
+    joined = " ".join(out).strip()
+    return joined if joined else text[:max_chars].rsplit(" ", 1)[0].rstrip() + "..."
+
+def tail_by_sentence(text: str, max_chars: int) -> str:
+    """Kebalikan trim_to_chars_by_sentence: kalimat-kalimat TERAKHIR yang muat max_chars."""
+    if not text or len(text) <= max_chars:
+        return text or ""
+    out: List[str] = []
+    total = 0
+    for s in reversed(split_sentences(text)):
+        s = s.strip()
+        if not s:
+            continue
+        if total + len(s) + (1 if out else 0) > max_chars:
+            break
+        out.append(s)
+        total += len(s) + (1 if out else 0)
+    joined = " ".join(reversed(out)).strip()
+    return joined if joined else "..." + text[-max_chars:].split(" ", 1)[-1].lstrip()
+
+def format_citations(docs: List[Any], max_len: int = 220, texts: Optional[Any] = None) -> List[str]:
+    """texts: ChunkStoreSet (cuplikan diambil dengan memotong buffer yang sudah dinormalisasi)."""
+    lines = []
+    for i, d in enumerate(docs, start=1):
+        meta = getattr(d, "metadata", {}) or {}
+        src = meta.get("source", "unknown")
+        page = meta.get("page")
+        book_title = meta.get("book_title") or meta.get("book") or "unknown"
+        if texts is not None:
+            content = texts.snippet(d, max_len)
+        else:
+            content = (getattr(d, "page_content", "") or "").strip().replace("\n", " ")
+            if len(content) > max_len:
+                content = content[:max_len].rstrip() + "..."
+        lines.append(f"{i}. [book:{book_title}, file:{os.path.basename(src)}, page:{page}] — {content}")
+    return lines
+
+def format_passage(d: Any, before: List[Any], after: List[Any], max_len: int = 1000, neighbor_len: int = 500,
+                   texts: Optional[Any] = None) -> str:
+    """Sitasi penuh satu dokumen (seperti format_citations) diapit akhir chunk sebelum dan awal chunk sesudahnya."""
+    lines = []
+    for b in before:
+        text = tail_by_sentence((getattr(b, "page_content", "") or "").strip().replace("\n", " "), neighbor_len)
+        lines.append(f"… (sebelumnya, page:{(getattr(b, 'metadata', {}) or {}).get('page')}) {text}")
+    lines.append(format_citations([d], max_len=max_len, texts=texts)[0])
+    for a in after:
+        text = trim_to_chars_by_sentence((getattr(a, "page_content", "") or "").strip().replace("\n", " "), neighbor_len)
+        lines.append(f"(lanjutan, page:{(getattr(a, 'metadata', {}) or {}).get('page')}) {text} …")
+    return "\n\n".join(lines)
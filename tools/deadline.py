@@ -0,0 +1,74 @@
+# tools/deadline.py
+
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+class StageTimeout(TimeoutError):
+    """Panggilan melewati batas waktunya; hasilnya dibuang (panggilan aslinya tetap selesai di background)."""
+
+class Deadline:
+    """Anggaran latensi satu permintaan; dicek pipeline di antara tahap. budget_s 0 = tanpa anggaran."""
+
+    def __init__(self, budget_s: float, call_timeout_s: float = 0.0):
+        self.budget_s = budget_s
+        self.call_timeout_s = call_timeout_s  # batas per panggilan LLM (memotong ekor lambat); 0 = tanpa batas
+        self.t0 = time.monotonic()
+        self.shed: List[str] = []              # tahap opsional yang dilewati
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.t0
+
+    def remaining(self) -> float:
+        if self.budget_s <= 0:
+            return float("inf")  # 0 = tanpa anggaran
+        return max(0.0, self.budget_s - self.elapsed())
+
+    def allows(self, estimate_s: float) -> bool:
+        """Masih cukup waktu untuk tahap yang diperkirakan makan estimate_s?"""
+        return self.remaining() >= estimate_s
+
+    def call_timeout(self, essential: bool = False) -> Optional[float]:
+        """Batas waktu panggilan berikutnya; tahap esensial (draft) tidak dipotong oleh sisa anggaran."""
+        t = float("inf") if essential else self.remaining()
+        if self.call_timeout_s > 0:
+            t = min(t, self.call_timeout_s)
+        return None if t == float("inf") else t
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # panggilan yang ditunggu bisa masih antre di penjadwal LLM; pool perlu lega
+            _POOL = ThreadPoolExecutor(max_workers=64, thread_name_prefix="deadline")
+        return _POOL
+
+def run_with_timeout(fn: Callable[[], Any], timeout_s: Optional[float]) -> Any:
+    """
+    Jalankan fn dengan batas waktu; StageTimeout bila lewat. Konteks (trace, timing, identitas LLM)
+    ikut disalin ke thread pelaksana. timeout_s None/inf = panggil langsung.
+    """
+    if timeout_s is None or timeout_s == float("inf"):
+        return fn()
+    if timeout_s <= 0:
+        raise StageTimeout("anggaran waktu habis")
+    ctx = contextvars.copy_context()
+    fut = _pool().submit(ctx.run, fn)
+    try:
+        return fut.result(timeout=timeout_s)
+    except FutureTimeout:
+        raise StageTimeout(f"lewat {timeout_s:.1f}s") from None
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """'ringkas=12,panjang=25' -> {mode: detik}."""
+    out: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        mode, _, val = part.partition("=")
+        if val:
+            out[mode.strip().lower()] = float(val)
+    return out
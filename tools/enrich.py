@@ -0,0 +1,69 @@
+# tools/enrich.py
+#
+# Pengayaan metadata chunk saat ingesti (tanpa LLM): ringkasan ekstraktif, kata kunci, jumlah token.
+# Dipakai ingest.parse_book; PsionicAgent membaca field ini saat merakit konteks tanpa biaya saat query.
+
+import re
+from collections import Counter
+from typing import Dict, List
+
+from tools.token_budget import approx_tokens
+
+ENRICH_VERSION = 1  # naikkan bila format field berubah -> ingest memproses ulang buku lama
+
+_WORD = re.compile(r"[^\W\d_]{3,}")
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = set("""
+yang dan di ke dari ini itu untuk dengan pada adalah dalam tidak akan atau juga oleh sebagai karena
+ada dapat bahwa lebih kita kami mereka saya anda dia ia telah sudah masih bisa harus seperti jika
+maka agar namun tetapi sehingga saat ketika antara tentang setiap semua para hanya lagi pun sangat
+banyak secara tersebut bagi hal nya kepada serta bila yaitu yakni begitu sendiri lain dua satu
+the and for with that this from are was were have has not but can will into about their there which
+what when they them than then also more most such these those been being its our your
+""".split())
+
+def _terms(text: str) -> List[str]:
+    return [w for w in (m.group(0).lower() for m in _WORD.finditer(text or "")) if w not in STOPWORDS]
+
+def key_terms(text: str, n: int = 6) -> List[str]:
+    """Kata paling sering (tanpa stopword), urut frekuensi lalu kemunculan pertama."""
+    counts = Counter(_terms(text))
+    return [w for w, _ in sorted(counts.items(), key=lambda kv: -kv[1])[:n]]
+
+def extractive_summary(text: str, max_chars: int = 240) -> str:
+    """
+    Kalimat dengan skor kata kunci tertinggi (rata-rata frekuensi term dalam chunk), disusun kembali
+    sesuai urutan asli sampai max_chars. Selalu berhenti di batas kalimat.
+    """
+    text = " ".join((text or "").split())
+    sents = [s for s in _SENT_SPLIT.split(text) if s.strip()]
+    if not sents:
+        return ""
+    freq = Counter(_terms(text))
+
+    def score(s: str) -> float:
+        ts = _terms(s)
+        return sum(freq[t] for t in ts) / (len(ts) ** 0.5) if ts else 0.0
+
+    ranked = sorted(range(len(sents)), key=lambda i: (-score(sents[i]), i))
+    picked: List[int] = []
+    total = 0
+    for i in ranked:
+        n = len(sents[i]) + (1 if picked else 0)
+        if total + n > max_chars:
+            continue
+        picked.append(i)
+        total += n
+    if not picked:  # kalimat terbaik pun terlalu panjang: potong di batas kata
+        return sents[ranked[0]][:max_chars].rsplit(" ", 1)[0].rstrip() + "..."
+    return " ".join(sents[i] for i in sorted(picked))
+
+def enrich_metadata(text: str, summary_chars: int = 240, n_terms: int = 6) -> Dict[str, object]:
+    """Field skalar (aman untuk metadata Chroma): summary, key_terms (dipisah koma), n_tokens."""
+    return {
+        "summary": extractive_summary(text, summary_chars),
+        "key_terms": ", ".join(key_terms(text, n_terms)),
+        "n_tokens": approx_tokens(text),
+        "enrich_v": ENRICH_VERSION,
+    }
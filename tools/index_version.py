@@ -0,0 +1,33 @@
+# tools/index_version.py
+#
+# Penanda versi indeks yang ditulis ingest.py dan dibaca PsionicAgent.
+# Disimpan di samping vectorstore: bundle_psionic/index_version.json
+
+import os
+import json
+from datetime import datetime, timezone
+
+VERSION_FILE = "index_version.json"
+
+def version_path(persist_dir: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(persist_dir)), VERSION_FILE)
+
+def read_index_version(persist_dir: str) -> int:
+    p = version_path(persist_dir)
+    if not os.path.exists(p):
+        return 0
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("version", 0))
+    except (ValueError, OSError):
+        return 0
+
+def bump_index_version(persist_dir: str) -> int:
+    """Naikkan versi secara atomik (tulis file sementara lalu os.replace)."""
+    p = version_path(persist_dir)
+    version = read_index_version(persist_dir) + 1
+    tmp = p + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated_at": datetime.now(timezone.utc).isoformat()}, f)
+    os.replace(tmp, p)
+    return version
@@ -0,0 +1,214 @@
+# tools/quant_index.py
+
+import os
+import json
+import shutil
+from typing import List, Tuple, Optional
+
+import numpy as np
+
+from tools.atomic_files import staging_dir, publish, current_dir
+
+# Berkas yang disimpan per indeks
+_CODES = "codes.npy"      # int8 (N, D)       -> resident di RAM
+_SCALES = "scales.npy"    # float16 (N, B)    -> resident di RAM
+_NORMS = "norms.npy"      # float32 (N,)      -> resident di RAM
+_FULL = "full.npy"        # float32 (N, D)    -> memmap, hanya dibaca saat re-score
+_IDS = "ids.json"
+_META = "meta.json"
+
+def quantize_int8(vectors: np.ndarray, block_size: int = 128) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kuantisasi skalar int8 simetris dengan satu skala per blok dimensi.
+    x ≈ codes[:, blok] * scales[:, b]
+    """
+    vecs = np.asarray(vectors, dtype=np.float32)
+    n, dim = vecs.shape
+    n_blocks = (dim + block_size - 1) // block_size
+    codes = np.empty((n, dim), dtype=np.int8)
+    scales = np.empty((n, n_blocks), dtype=np.float16)
+    for b in range(n_blocks):
+        sl = slice(b * block_size, min(dim, (b + 1) * block_size))
+        block = vecs[:, sl]
+        amax = np.abs(block).max(axis=1)
+        scale = np.where(amax > 0, amax / 127.0, 1.0).astype(np.float16)
+        # pakai skala yang sudah dibulatkan ke float16 agar dekode konsisten
+        s32 = scale.astype(np.float32)[:, None]
+        codes[:, sl] = np.clip(np.rint(block / s32), -127, 127).astype(np.int8)
+        scales[:, b] = scale
+    return codes, scales
+
+def _exact_distance(full: np.ndarray, q: np.ndarray, space: str) -> np.ndarray:
+    if space == "cosine":
+        denom = np.linalg.norm(full, axis=1) * (np.linalg.norm(q) or 1.0)
+        denom = np.where(denom > 0, denom, 1.0)
+        return 1.0 - (full @ q) / denom
+    if space == "ip":
+        return 1.0 - full @ q
+    diff = full - q
+    return np.einsum("ij,ij->i", diff, diff)  # squared L2, sama seperti Chroma
+
+class QuantizedIndex:
+    """
+    Indeks vektor terkompresi untuk satu koleksi.
+    Pencarian kasar memakai kode int8 + skala per blok (~4x lebih hemat dari float32),
+    lalu kandidat teratas di-skor ulang dengan vektor float32 penuh yang di-memmap dari disk.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        codes: np.ndarray,
+        scales: np.ndarray,
+        norms: np.ndarray,
+        full: np.ndarray,
+        space: str = "l2",
+        block_size: int = 128,
+        rescore_factor: int = 4,
+        scan_rows: int = 8192,
+        version: Optional[int] = None,
+    ) -> None:
+        self.ids = list(ids)
+        self.codes = codes
+        self.scales = scales
+        self.norms = norms
+        self.full = full
+        self.space = space
+        self.block_size = block_size
+        self.rescore_factor = rescore_factor
+        self.scan_rows = scan_rows
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.codes.shape[1]) if self.codes.ndim == 2 else 0
+
+    # ---------- build / load ----------
+    @classmethod
+    def build(
+        cls,
+        ids: List[str],
+        vectors,
+        out_dir: str,
+        space: str = "l2",
+        block_size: int = 128,
+        version: Optional[int] = None,
+    ) -> "QuantizedIndex":
+        vecs = np.asarray(vectors, dtype=np.float32)
+        if vecs.ndim != 2 or len(ids) != vecs.shape[0]:
+            raise ValueError("ids dan vectors harus sejajar (N, D)")
+        codes, scales = quantize_int8(vecs, block_size)
+        norms = np.linalg.norm(vecs, axis=1).astype(np.float32)
+        # beberapa worker bisa membangun bersamaan: tulis di staging sendiri, terbitkan sebagai satu generasi
+        tmp = staging_dir(out_dir)
+        try:
+            np.save(os.path.join(tmp, _FULL), vecs)
+            np.save(os.path.join(tmp, _CODES), codes)
+            np.save(os.path.join(tmp, _SCALES), scales)
+            np.save(os.path.join(tmp, _NORMS), norms)
+            with open(os.path.join(tmp, _IDS), "w", encoding="utf-8") as f:
+                json.dump(list(ids), f)
+            with open(os.path.join(tmp, _META), "w", encoding="utf-8") as f:
+                json.dump({"space": space, "block_size": block_size, "count": len(ids),
+                           "dim": int(vecs.shape[1]), "version": version}, f)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return cls.load(publish(tmp, out_dir))
+
+    @classmethod
+    def load(cls, out_dir: str, **kwargs) -> "QuantizedIndex":
+        """Muat generasi aktif; ValueError bila berkasnya tidak saling cocok (pemanggil membangun ulang)."""
+        gen = current_dir(out_dir)
+        with open(os.path.join(gen, _META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(gen, _IDS), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        codes = np.load(os.path.join(gen, _CODES))
+        scales = np.load(os.path.join(gen, _SCALES))
+        norms = np.load(os.path.join(gen, _NORMS))
+        full = np.load(os.path.join(gen, _FULL), mmap_mode="r")
+        count = meta.get("count")
+        rows = {len(ids), codes.shape[0], scales.shape[0], norms.shape[0], full.shape[0]}
+        if rows != {count} or codes.shape[1:] != full.shape[1:] or (codes.ndim == 2 and codes.shape[1] != meta.get("dim")):
+            raise ValueError(f"indeks int8 di {out_dir} tidak konsisten (count={count}, baris={sorted(rows)})")
+        return cls(
+            ids=ids,
+            codes=codes,
+            scales=scales,
+            norms=norms,
+            full=full,
+            space=meta.get("space", "l2"),
+            block_size=int(meta.get("block_size", 128)),
+            version=meta.get("version"),
+            **kwargs,
+        )
+
+    @staticmethod
+    def stored_meta(out_dir: str) -> Optional[dict]:
+        p = os.path.join(current_dir(out_dir), _META)
+        if not os.path.exists(p):
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def stored_count(out_dir: str) -> Optional[int]:
+        meta = QuantizedIndex.stored_meta(out_dir)
+        return int(meta.get("count", -1)) if meta else None
+
+    # ---------- ukuran ----------
+    def memory_bytes(self) -> int:
+        """Byte yang resident di RAM (kode + skala + norma)."""
+        return int(self.codes.nbytes + self.scales.nbytes + self.norms.nbytes)
+
+    def float32_bytes(self) -> int:
+        """Byte yang dibutuhkan bila semua embedding float32 disimpan di RAM."""
+        return int(len(self) * self.dim * 4)
+
+    # ---------- search ----------
+    def approx_dot(self, query) -> np.ndarray:
+        q = np.asarray(query, dtype=np.float32).ravel()
+        n = len(self)
+        out = np.zeros(n, dtype=np.float32)
+        bs = self.block_size
+        n_blocks = self.scales.shape[1]
+        for start in range(0, n, self.scan_rows):
+            stop = min(n, start + self.scan_rows)
+            acc = np.zeros(stop - start, dtype=np.float32)
+            for b in range(n_blocks):
+                sl = slice(b * bs, min(self.dim, (b + 1) * bs))
+                part = self.codes[start:stop, sl].astype(np.float32) @ q[sl]
+                acc += part * self.scales[start:stop, b].astype(np.float32)
+            out[start:stop] = acc
+        return out
+
+    def _approx_distance(self, q: np.ndarray) -> np.ndarray:
+        dots = self.approx_dot(q)
+        if self.space == "cosine":
+            denom = self.norms * (np.linalg.norm(q) or 1.0)
+            return 1.0 - dots / np.where(denom > 0, denom, 1.0)
+        if self.space == "ip":
+            return 1.0 - dots
+        return self.norms ** 2 - 2.0 * dots + float(q @ q)
+
+    def search(self, query, k: int, n_candidates: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Kembalikan [(id, jarak)] terurut naik, jarak dihitung ulang dengan float32 penuh."""
+        n = len(self)
+        if n == 0 or k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32).ravel()
+        k = min(k, n)
+        cand = min(n, max(k, n_candidates or k * self.rescore_factor))
+        approx = self._approx_distance(q)
+        if cand < n:
+            idx = np.argpartition(approx, cand - 1)[:cand]
+        else:
+            idx = np.arange(n)
+        idx = np.sort(idx)  # akses memmap berurutan
+        exact = _exact_distance(np.asarray(self.full[idx], dtype=np.float32), q, self.space)
+        order = np.argsort(exact)[:k]
+        return [(self.ids[int(idx[i])], float(exact[i])) for i in order]
@@ -0,0 +1,60 @@
+# tools/single_flight.py
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class _Call:
+    __slots__ = ("done", "result", "error", "dups")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.dups = 0
+
+class SingleFlight:
+    """
+    Gabungkan pemanggilan identik yang sedang berjalan: pemanggil pertama (leader) mengeksekusi fn,
+    pemanggil lain dengan key sama menunggu dan menerima hasil/exception yang sama.
+    Key dilepas begitu eksekusi selesai, jadi ini bukan cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.saved = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Kembalikan (hasil, shared); shared=True bila hasil didapat dari eksekusi pemanggil lain."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.dups += 1
+                self.saved += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
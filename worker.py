@@ -0,0 +1,75 @@
+# worker.py
+#
+# Proses worker untuk mode gateway (WORKERS > 0 di bot.py): memiliki PsionicAgent + AgentBrain sendiri,
+# mengambil job dari antrean SQLite, menjalankan pipeline, dan menulis hasilnya kembali.
+# Biasanya dijalankan (dan di-restart) oleh bot.py; bisa juga manual, mis. untuk debug:
+#   python worker.py --name w1 --queue ./storage/jobs/queue.db --threads 4 --rpm-share 0.5
+
+import os
+import sys
+import signal
+import argparse
+import importlib
+import threading
+from functools import partial
+
+# ---- Quiet noisy libs (sama dengan bot.py)
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+os.environ["CHROMA_TELEMETRY_IMPLEMENTATION"] = "noop"
+os.environ["CHROMA_TELEMETRY_DISABLED"] = "true"
+os.environ["POSTHOG_DISABLED"] = "1"
+
+from agent_perf import PERF
+from agent_runtime import AgentRuntime
+from agent_jobs import JobQueue, JobWorker
+import agent_factory as cfg
+
+def dump_perf_loop(path: str, every_s: int, stop: threading.Event) -> None:
+    while not stop.wait(every_s):
+        try:
+            PERF.dump_prometheus(path)
+        except Exception as e:
+            print("Gagal menulis metrik:", e)
+
+def load_factory(spec: str):
+    """"modul:fungsi" -> callable(fresh, scheduler=..., breaker=...) -> (agent, brain)."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Worker jawaban untuk gateway Discord")
+    ap.add_argument("--name", required=True, help="nama unik worker (heartbeat & file metrik/trace)")
+    ap.add_argument("--queue", default=os.getenv("JOB_QUEUE_PATH", "./storage/jobs/queue.db"))
+    ap.add_argument("--threads", type=int, default=int(os.getenv("WORKER_THREADS", "4")),
+                    help="job yang dijalankan bersamaan di proses ini")
+    ap.add_argument("--rpm-share", type=float, default=1.0,
+                    help="porsi LLM_RPM untuk proses ini (mis. 1/jumlah worker)")
+    ap.add_argument("--factory", default="agent_factory:build_agent_pair",
+                    help="pembangun (agent, brain) alternatif, mis. backend palsu untuk bench")
+    args = ap.parse_args(argv)
+
+    cfg.configure_tracing(args.name)
+    scheduler = cfg.make_scheduler(args.rpm_share)
+    breaker = cfg.make_breaker()
+    runtime = AgentRuntime(partial(load_factory(args.factory), scheduler=scheduler, breaker=breaker),
+                           warm_queries=cfg.warmup_queries)
+    PERF.gauge_fn("runtime_generation", lambda: runtime.generation)
+    queue = JobQueue(args.queue)
+    worker = JobWorker(queue, runtime, args.name, threads=args.threads)
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    if cfg.PERF_DUMP_SECONDS > 0:
+        threading.Thread(target=dump_perf_loop, daemon=True,
+                         args=(cfg.with_suffix(cfg.PERF_DUMP_PATH, args.name), cfg.PERF_DUMP_SECONDS, stop)).start()
+    print(f"[{args.name}] worker berjalan (pid {os.getpid()}, {args.threads} thread)")
+    worker.run(stop)
+    if runtime.ready:
+        runtime.current().agent.close()
+    print(f"[{args.name}] worker berhenti")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())